@@ -0,0 +1,5 @@
+# src/__main__.py
+"""python -m src <команда> — см. src/cli.py."""
+from src.cli import main
+
+raise SystemExit(main())
@@ -0,0 +1,134 @@
+# src/benchmarks/harness.py
+"""
+Минимальный harness для бенчмарков: замер, результаты и сравнение с baseline.
+
+Каждый бенчмарк отдаёт BenchResult с метрикой «больше — лучше»
+(операций в секунду). Baseline — JSON прошлого прогона; регрессией
+считается падение ops_per_sec больше чем на tolerance (доля).
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from src.io.file_io import write_json_atomic
+
+
+@dataclass
+class BenchResult:
+    name: str
+    params: Dict[str, Any]
+    ops: int  # сколько операций (SKU, строк, вызовов) в одном повторе
+    timings: List[float]  # секунды на повтор
+    unit: str = "op"
+
+    @property
+    def key(self) -> str:
+        params = ",".join(f"{k}={v}" for k, v in sorted(self.params.items()))
+        return f"{self.name}[{params}]" if params else self.name
+
+    @property
+    def best_seconds(self) -> float:
+        return min(self.timings)
+
+    @property
+    def ops_per_sec(self) -> float:
+        # Лучший повтор — наименее зашумлённая оценка на общей машине
+        return self.ops / self.best_seconds if self.best_seconds > 0 else float("inf")
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.update(
+            key=self.key,
+            ops_per_sec=self.ops_per_sec,
+            best_seconds=self.best_seconds,
+            median_seconds=statistics.median(self.timings),
+        )
+        return data
+
+
+def measure(fn: Callable[[], Any], repeat: int = 5, warmup: int = 1) -> List[float]:
+    """Время повторов синхронной функции (после warmup прогревочных вызовов)."""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def measure_async(factory: Callable[[], Awaitable[Any]], repeat: int = 3, warmup: int = 1) -> List[float]:
+    """То же для корутин: каждый повтор — свежая корутина в одном event loop."""
+
+    async def run() -> List[float]:
+        for _ in range(warmup):
+            await factory()
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await factory()
+            timings.append(time.perf_counter() - started)
+        return timings
+
+    return asyncio.run(run())
+
+
+def environment_info() -> Dict[str, Any]:
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "created_at": datetime.utcnow().isoformat(),
+    }
+
+
+def save_results(path: str | Path, results: List[BenchResult]) -> None:
+    write_json_atomic(path, {"environment": environment_info(), "results": [r.to_dict() for r in results]})
+
+
+def load_baseline(path: str | Path) -> Dict[str, float]:
+    """key -> ops_per_sec из сохранённого прогона."""
+    with open(path, encoding="utf-8") as fh:
+        data = json.load(fh)
+    return {item["key"]: float(item["ops_per_sec"]) for item in data.get("results", [])}
+
+
+@dataclass
+class Comparison:
+    key: str
+    current: float
+    baseline: Optional[float]
+    change: Optional[float] = None  # относительное изменение ops/sec (+0.1 = на 10% быстрее)
+    regression: bool = False
+
+
+@dataclass
+class ComparisonReport:
+    tolerance: float
+    items: List[Comparison] = field(default_factory=list)
+
+    @property
+    def regressions(self) -> List[Comparison]:
+        return [c for c in self.items if c.regression]
+
+
+def compare_to_baseline(results: List[BenchResult], baseline: Dict[str, float], tolerance: float = 0.2) -> ComparisonReport:
+    report = ComparisonReport(tolerance=tolerance)
+    for result in results:
+        base = baseline.get(result.key)
+        item = Comparison(key=result.key, current=result.ops_per_sec, baseline=base)
+        if base:
+            item.change = result.ops_per_sec / base - 1
+            item.regression = item.change < -tolerance
+        report.items.append(item)
+    return report
@@ -0,0 +1,93 @@
+# src/benchmarks/mock_llm.py
+"""
+Офлайн-имитация API провайдера LLM через httpx.MockTransport.
+
+Ответ приходит через latency секунд плюс token_latency на каждый выходной
+токен (asyncio.sleep — как сетевое ожидание и генерация, без занятия CPU),
+формат — как у chat/completions: JSON-ответ модели в choices[0].message.content
+и usage. Если промпт просит компактную схему, ответ компактный; на первый
+вызов split-пайплайна (без дерева) — только МНН, форма, возраст и OTC. Код категории
+выбирается детерминированно по имени SKU, так что прогоны воспроизводимы.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import zlib
+from typing import List, Optional
+
+import httpx
+
+from src.classifier.category_snapshot import estimate_tokens
+from src.classifier.prompt_builder import EXTRACT_OUTPUT_FORMAT
+from src.classifier.response_schema import COMPACT_KEYS, COMPACT_OUTPUT_FORMAT
+from src.data_models import Category
+
+_FULL_TO_COMPACT = {full: short for short, full in COMPACT_KEYS.items()}
+
+
+def _sku_from_prompt(payload: dict) -> str:
+    user = next((m["content"] for m in payload.get("messages", []) if m.get("role") == "user"), "")
+    return user.rstrip().rsplit("\n", 1)[-1].strip()
+
+
+def make_mock_transport(
+    categories: List[Category],
+    latency: float = 0.0,
+    error_rate: float = 0.0,
+    token_latency: float = 0.0,
+) -> httpx.MockTransport:
+    """
+    MockTransport, отвечающий как провайдер. error_rate — доля ответов 503
+    (по хэшу SKU и номеру запроса), чтобы нагрузить ретраи.
+    """
+    counter = {"n": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        counter["n"] += 1
+        payload = json.loads(request.content or b"{}")
+        sku = _sku_from_prompt(payload)
+        seed = zlib.crc32(sku.encode("utf-8"))
+        if error_rate and (seed + counter["n"]) % 1000 < error_rate * 1000:
+            if latency:
+                await asyncio.sleep(latency)
+            return httpx.Response(503, json={"error": "overloaded"})
+
+        category: Optional[Category] = categories[seed % len(categories)] if categories else None
+        content = {
+            "inn": category.inn_cluster if category else None,
+            "dosage_form": "таблетки",
+            "age_restriction": "взрослые",
+            "otc": bool(seed % 2),
+            "category_code": category.code if category else None,
+            "category_path": None,
+            "confidence": round(0.5 + (seed % 50) / 100, 2),
+            "needs_review_hint": seed % 7 == 0,
+            "reason": f"Синтетический ответ для {sku}",
+        }
+        prompt_text = "".join(m.get("content", "") for m in payload.get("messages", []))
+        if EXTRACT_OUTPUT_FORMAT in prompt_text:
+            content = {key: content[key] for key in ("inn", "dosage_form", "age_restriction", "otc", "confidence")}
+        elif COMPACT_OUTPUT_FORMAT in prompt_text:
+            content.pop("category_path")
+            content["reason_code"] = "exact"
+            content["reason_note"] = content.pop("reason")[:40]
+            content = {_FULL_TO_COMPACT[key]: value for key, value in content.items()}
+        text = json.dumps(content, ensure_ascii=False, separators=(",", ":"))
+        completion_tokens = estimate_tokens(text)
+        if latency or token_latency:
+            await asyncio.sleep(latency + completion_tokens * token_latency)
+        prompt_tokens = len(prompt_text) // 3
+        return httpx.Response(
+            200,
+            json={
+                "choices": [{"message": {"role": "assistant", "content": text}}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            },
+        )
+
+    return httpx.MockTransport(handler)
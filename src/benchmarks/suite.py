@@ -0,0 +1,270 @@
+# src/benchmarks/suite.py
+"""
+Бенчмарки горячих путей классификации (офлайн, без сети и реальной БД).
+
+- prompt_build / prompt_build_cached — PromptBuilder.build_user_prompt без
+  и с заранее отрендеренным блоком категорий;
+- inn_lookup — ClassifierService._get_categories_for_inn;
+- category_index — построение CategoryIndex и поиск пути по коду;
+- multi_cluster_safety — ClassifierService._apply_multi_cluster_safety;
+- classify_sku_parse — ProviderLLMClient.classify_sku через MockTransport без
+  задержки (сборка payload, HTTP-стек httpx, разбор JSON);
+- classify_sku_split — то же для split-пайплайна (короткий вызов без дерева
+  + локальный выбор кода, второй вызов — только при неоднозначности);
+- db_write / db_read — save_classification_results и get_product_links_by_ids
+  на временной SQLite;
+- e2e_batch — путь run_batch_classification (LLM с задержкой + AsyncDB.write)
+  при разном параллелизме и размере дерева.
+"""
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, Iterator, List, Optional
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.benchmarks.harness import BenchResult, measure, measure_async
+from src.benchmarks.mock_llm import make_mock_transport
+from src.benchmarks.synthetic import INN_STEMS, make_categories
+from src.classifier.category_index import CategoryIndex
+from src.classifier.classifier_service import ClassifierService
+from src.classifier.prompt_builder import PromptBuilder
+from src.config import config
+from src.data_models import SKU, ClassificationResult
+from src.io.async_db import AsyncDB
+from src.io.db_backend import configure_sqlite_engine
+from src.io.db_io import (
+    Base,
+    ProductLink,
+    get_product_links_by_ids,
+    save_classification_result,
+    save_classification_results,
+)
+from src.llm_client.base import LLMClient
+from src.llm_client.provider_client import ProviderLLMClient
+
+
+@dataclass
+class BenchProfile:
+    tree_sizes: List[int] = field(default_factory=lambda: [100, 1000, 5000])
+    concurrency: List[int] = field(default_factory=lambda: [1, 8, 32])
+    skus: int = 200
+    db_rows: int = 5000
+    latency: float = 0.02
+    repeat: int = 5
+
+    @classmethod
+    def quick(cls) -> "BenchProfile":
+        return cls(tree_sizes=[100], concurrency=[1, 8], skus=40, db_rows=500, latency=0.01, repeat=3)
+
+
+def _sku_names(n: int) -> List[str]:
+    return [f"{INN_STEMS[i % len(INN_STEMS)].upper()} ТАБЛ. {100 + i % 5 * 100}МГ №{10 + i % 3 * 10}" for i in range(n)]
+
+
+class _NullLLMClient(LLMClient):
+    async def classify_sku_raw(self, sku_name: str):
+        raise NotImplementedError
+
+    async def classify_sku(self, sku: SKU) -> ClassificationResult:
+        raise NotImplementedError
+
+
+def _result(sku_name: str, inn: Optional[str], code: Optional[str] = None) -> ClassificationResult:
+    return ClassificationResult(
+        sku_name=sku_name, category_code=code, category_path=None, inn=inn, dosage_form="таблетки",
+        age_restriction="взрослые", otc=False, confidence=0.9, needs_review=False, reason="ok",
+    )
+
+
+def bench_prompt_build(profile: BenchProfile) -> List[BenchResult]:
+    builder = PromptBuilder()
+    skus = [SKU(name=n) for n in _sku_names(profile.skus)]
+    results = []
+    for size in profile.tree_sizes:
+        categories = make_categories(size)
+        block = builder.build_categories_block(categories)
+        results.append(BenchResult(
+            "prompt_build", {"tree": size}, len(skus),
+            measure(lambda: [builder.build_user_prompt(s, categories) for s in skus], profile.repeat), "prompt",
+        ))
+        results.append(BenchResult(
+            "prompt_build_cached", {"tree": size}, len(skus),
+            measure(lambda: [builder.build_user_prompt(s, categories, block) for s in skus], profile.repeat), "prompt",
+        ))
+    return results
+
+
+def bench_inn_lookup(profile: BenchProfile) -> List[BenchResult]:
+    results = []
+    for size in profile.tree_sizes:
+        categories = make_categories(size)
+        service = ClassifierService(_NullLLMClient(), categories)
+        inns = [c.inn_cluster or "нет такого мнн" for c in categories] * max(1, 10_000 // size)
+        results.append(BenchResult(
+            "inn_lookup", {"tree": size}, len(inns),
+            measure(lambda: [service._get_categories_for_inn(i) for i in inns], profile.repeat), "lookup",
+        ))
+    return results
+
+
+def bench_category_index(profile: BenchProfile) -> List[BenchResult]:
+    results = []
+    for size in profile.tree_sizes:
+        categories = make_categories(size)
+        results.append(BenchResult(
+            "category_index_build", {"tree": size}, size,
+            measure(lambda: CategoryIndex(categories), profile.repeat), "category",
+        ))
+        index = CategoryIndex(categories)
+        codes = [c.code for c in categories] * max(1, 10_000 // size)
+        results.append(BenchResult(
+            "category_path_lookup", {"tree": size}, len(codes),
+            measure(lambda: [index.path(code) for code in codes], profile.repeat), "lookup",
+        ))
+    return results
+
+
+def bench_multi_cluster_safety(profile: BenchProfile) -> List[BenchResult]:
+    results = []
+    for size in profile.tree_sizes:
+        categories = make_categories(size)
+        service = ClassifierService(_NullLLMClient(), categories)
+        template = [_result(f"SKU {i}", c.inn_cluster, c.code) for i, c in enumerate(categories)]
+
+        def run() -> None:
+            for r in template:
+                service._apply_multi_cluster_safety(replace(r))
+
+        results.append(BenchResult("multi_cluster_safety", {"tree": size}, len(template), measure(run, profile.repeat), "result"))
+    return results
+
+
+def _ensure_api_key() -> None:
+    # Офлайн: ключ нужен только чтобы конструктор клиента не упал
+    os.environ.setdefault(config.llm.api_key_env_var, "benchmark")
+
+
+def bench_classify_sku_parse(profile: BenchProfile) -> List[BenchResult]:
+    _ensure_api_key()
+    categories = make_categories(profile.tree_sizes[0])
+    skus = [SKU(name=n) for n in _sku_names(profile.skus)]
+
+    async def run() -> None:
+        async with httpx.AsyncClient(transport=make_mock_transport(categories)) as http:
+            client = ProviderLLMClient(categories=categories, http_client=http)
+            for sku in skus:
+                await client.classify_sku(sku)
+
+    results = []
+    default_pipeline = config.llm.pipeline
+    try:
+        for name, pipeline in (("classify_sku_parse", "single"), ("classify_sku_split", "split")):
+            config.llm.pipeline = pipeline
+            results.append(BenchResult(
+                name, {"tree": profile.tree_sizes[0]}, len(skus), measure_async(run, profile.repeat), "call",
+            ))
+    finally:
+        config.llm.pipeline = default_pipeline
+    return results
+
+
+@contextmanager
+def _scratch_db(rows: int) -> Iterator[sessionmaker]:
+    """Временная SQLite с rows записями product_links; удаляется после бенчмарка."""
+    directory = tempfile.mkdtemp(prefix="farmacat-bench-")
+    engine = configure_sqlite_engine(create_engine(f"sqlite:///{directory}/bench.db", future=True))
+    try:
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
+        with factory.begin() as session:
+            session.execute(
+                ProductLink.__table__.insert(),
+                [{"id": i, "name_1c": name, "is_active": True} for i, name in enumerate(_sku_names(rows), start=1)],
+            )
+        yield factory
+    finally:
+        engine.dispose()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def bench_db(profile: BenchProfile) -> List[BenchResult]:
+    with _scratch_db(profile.db_rows) as factory:
+        return _bench_db(factory, profile)
+
+
+def _bench_db(factory: sessionmaker, profile: BenchProfile) -> List[BenchResult]:
+    ids = list(range(1, profile.db_rows + 1))
+    items = [(i, _result(f"SKU {i}", "ибупрофен", "LS_BOL_00001")) for i in ids]
+
+    def write() -> None:
+        with factory.begin() as session:
+            save_classification_results(session, items)
+
+    def read() -> None:
+        with factory() as session:
+            for start in range(0, len(ids), config.queue.chunk_size):
+                get_product_links_by_ids(session, ids[start:start + config.queue.chunk_size])
+
+    return [
+        BenchResult("db_write", {"rows": profile.db_rows}, len(items), measure(write, profile.repeat), "row"),
+        BenchResult("db_read", {"rows": profile.db_rows}, len(ids), measure(read, profile.repeat), "row"),
+    ]
+
+
+def bench_e2e_batch(profile: BenchProfile) -> List[BenchResult]:
+    _ensure_api_key()
+    with _scratch_db(profile.skus) as factory:
+        return _bench_e2e_batch(factory, profile)
+
+
+def _bench_e2e_batch(factory: sessionmaker, profile: BenchProfile) -> List[BenchResult]:
+    results = []
+    for size in profile.tree_sizes:
+        categories = make_categories(size)
+        for concurrency in profile.concurrency:
+
+            async def run() -> None:
+                transport = make_mock_transport(categories, latency=profile.latency)
+                async with httpx.AsyncClient(transport=transport) as http, AsyncDB(session_factory=factory) as db:
+                    client = ProviderLLMClient(categories=categories, http_client=http)
+                    service = ClassifierService(client, categories)
+                    links = await db.read(get_product_links_by_ids, list(range(1, profile.skus + 1)))
+                    skus = (SKU(name=pl.name_1c, external_id=str(pl.id)) for pl in links)
+                    async for item in service.classify_many(skus, concurrency=concurrency):
+                        await db.write(save_classification_result, links[item.index].id, item.result)
+
+            results.append(BenchResult(
+                "e2e_batch",
+                {"tree": size, "concurrency": concurrency, "latency_ms": int(profile.latency * 1000)},
+                profile.skus,
+                measure_async(run, repeat=max(1, profile.repeat // 2), warmup=0),
+                "sku",
+            ))
+    return results
+
+
+BENCHMARKS: Dict[str, Callable[[BenchProfile], List[BenchResult]]] = {
+    "prompt_build": bench_prompt_build,
+    "inn_lookup": bench_inn_lookup,
+    "category_index": bench_category_index,
+    "multi_cluster_safety": bench_multi_cluster_safety,
+    "classify_sku_parse": bench_classify_sku_parse,
+    "db": bench_db,
+    "e2e_batch": bench_e2e_batch,
+}
+
+
+def run_suite(profile: BenchProfile, only: Optional[List[str]] = None) -> List[BenchResult]:
+    results: List[BenchResult] = []
+    for name, bench in BENCHMARKS.items():
+        if only and not any(pattern in name for pattern in only):
+            continue
+        results.extend(bench(profile))
+    return results
@@ -0,0 +1,276 @@
+# src/benchmarks/synthetic.py
+"""
+Синтетические данные для бенчмарков и нагрузочных прогонов.
+
+Реальный каталог аптеки не покидает магазин, а в тестовых фикстурах одна
+категория, поэтому для проверки памяти, пагинации, дедупликации и записи в БД
+на масштабе прода данные генерируются:
+
+- make_categories — дерево заданного размера с МНН-кластерами из нескольких кодов;
+- iter_product_rows — поток записей product_links: наименования в стиле 1С
+  («НУРОФЕН ТАБЛ. П/ПЛЕН/ОБ. 200МГ №10») и АСНА («Нурофен таблетки покрытые
+  пленочной оболочкой 200 мг 10 шт»), дубли с другим кодом/регистром/пробелами,
+  мусор «nan» и пустые производители;
+- populate_database — заливка всего этого в scratch-БД чанками.
+
+Генерация детерминирована (seed), строки отдаются генератором — память
+не зависит от числа записей.
+"""
+from __future__ import annotations
+
+import csv
+import random
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy.engine import Engine
+
+from src.classifier.category_snapshot import categories_content_hash
+from src.data_models import Category
+from src.io.db_io import AppMeta, Base, CATEGORIES_VERSION_KEY, CategoryDB, ProductLink
+from src.io.xlsx_stream import chunked
+
+DIRECTIONS = ["ОРВИ", "Боль", "ЖКТ", "Сердце", "Кожа", "Витамины", "Аллергия", "Нервная система"]
+
+INN_STEMS = [
+    "валацикловир", "ибупрофен", "парацетамол", "пантопразол", "суматриптан", "эналаприл",
+    "лизиноприл", "урсодезоксихолевая кислота", "римантадин", "омепразол", "цетиризин",
+    "лоратадин", "амлодипин", "метформин", "аторвастатин", "диклофенак", "кетопрофен",
+]
+
+
+def make_categories(size: int, cluster_size: int = 3, seed: int = 0) -> List[Category]:
+    """
+    Дерево из size категорий. Примерно половина строк входит в МНН-кластеры
+    по cluster_size кодов (*_01, *_02, ...), остальные — без МНН-кластера.
+    """
+    rng = random.Random(seed)
+    categories: List[Category] = []
+    cluster_no = 0
+    while len(categories) < size:
+        direction = rng.choice(DIRECTIONS)
+        prefix = f"LS_{direction[:3].upper()}"
+        if rng.random() < 0.5:
+            cluster_no += 1
+            stem = INN_STEMS[cluster_no % len(INN_STEMS)]
+            inn = f"{stem.capitalize()} {cluster_no}" if cluster_no >= len(INN_STEMS) else stem.capitalize()
+            for k in range(1, cluster_size + 1):
+                if len(categories) >= size:
+                    break
+                categories.append(
+                    Category(
+                        code=f"{prefix}_MNN_{cluster_no:05d}_{k:02d}",
+                        level="3",
+                        direction=direction,
+                        need=f"Потребность {cluster_no % 40}",
+                        group=f"{inn} — подгруппа {k}",
+                        inn_cluster=inn,
+                    )
+                )
+        else:
+            n = len(categories)
+            categories.append(
+                Category(
+                    code=f"{prefix}_{n:05d}",
+                    level="2",
+                    direction=direction,
+                    need=f"Потребность {n % 40}",
+                    group=f"Группа {n}",
+                )
+            )
+    return categories
+
+
+BRANDS = [
+    "Нурофен", "Валтрекс", "Урсодез", "Арбидол", "Ингавирин", "Терафлю", "Кагоцел", "Називин",
+    "Но-шпа", "Цитрамон П", "Омез", "Линекс", "Мезим", "Супрастин", "Зодак", "Амлодипин-Тева",
+]
+
+MANUFACTURERS = [
+    "Рекитт Бенкизер", "ГлаксоСмитКляйн", "Фармстандарт", "Отисифарм", "Канонфарма", "Озон",
+    "Вертекс", "Тева", "Санофи", "Байер", "Эвалар", "Алиум", "Гедеон Рихтер", "КРКА",
+]
+
+# (форма в стиле 1С, форма в стиле АСНА, единица дозировки)
+FORMS = [
+    ("ТАБЛ.", "таблетки", "МГ"),
+    ("ТАБЛ. П/ПЛЕН/ОБ.", "таблетки покрытые пленочной оболочкой", "МГ"),
+    ("ТАБЛ. КИШ-РАСТ. П/ПЛЕН/ОБ.", "таблетки кишечнорастворимые покрытые пленочной оболочкой", "МГ"),
+    ("КАПС.", "капсулы", "МГ"),
+    ("СУСП. Д/ПРИЕМА ВНУТРЬ", "суспензия для приема внутрь", "МГ/5МЛ"),
+    ("СПРЕЙ НАЗ.", "спрей назальный дозированный", "МКГ/ДОЗА"),
+    ("ПОР. Д/ПРИГ. Р-РА", "порошок для приготовления раствора", "Г"),
+    ("ГЕЛЬ Д/НАРУЖ. ПРИМ.", "гель для наружного применения", "%"),
+]
+
+DOSES = ["5", "10", "20", "40", "50", "100", "200", "250", "400", "500", "1000"]
+PACKS = ["1", "2", "6", "10", "14", "20", "28", "30", "50", "100"]
+
+
+@dataclass
+class CatalogueStats:
+    products: int = 0
+    duplicates: int = 0
+    garbage_names: int = 0
+    asna_only: int = 0
+    categories: int = 0
+
+
+def _product_names(rng: random.Random) -> Dict[str, str]:
+    base = rng.choice(BRANDS) if rng.random() < 0.6 else rng.choice(INN_STEMS).capitalize()
+    form_1c, form_asna, unit = rng.choice(FORMS)
+    dose = rng.choice(DOSES)
+    pack = rng.choice(PACKS)
+    manufacturer = rng.choice(MANUFACTURERS)
+    return {
+        "name_1c": f"{base.upper()} {form_1c} {dose}{unit} №{pack}",
+        "name_asna": f"{base} {form_asna} {dose} {unit.lower()} {pack} шт",
+        "manufacturer_1c": manufacturer,
+    }
+
+
+def _noisy_variant(name: str, rng: random.Random) -> str:
+    """Тот же товар, записанный иначе: регистр, лишние пробелы, точки в сокращениях."""
+    variant = name
+    if rng.random() < 0.5:
+        variant = variant.lower()
+    if rng.random() < 0.5:
+        variant = variant.replace(" ", "  ", 1)
+    if rng.random() < 0.3:
+        variant = variant.replace(".", "")
+    return f" {variant} " if rng.random() < 0.3 else variant
+
+
+def iter_product_rows(
+    count: int,
+    seed: int = 0,
+    duplicate_rate: float = 0.05,
+    garbage_rate: float = 0.02,
+    asna_only_rate: float = 0.03,
+    inactive_rate: float = 0.05,
+    start_id: int = 1,
+    stats: Optional[CatalogueStats] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Поток из count записей product_links (id с start_id).
+
+    - duplicate_rate — доля повторов уже выданного товара с новым кодом 1С и
+      «шумным» наименованием (как при заведении товара дважды);
+    - garbage_rate — name_1c = "nan" или пустая строка, производитель "nan"/None;
+    - asna_only_rate — товар есть только в АСНА (code_1c = None, name_1c = "").
+    """
+    rng = random.Random(seed)
+    stats = stats if stats is not None else CatalogueStats()
+    recent: List[Dict[str, str]] = []
+    epoch = datetime(2024, 1, 1)
+
+    for offset in range(count):
+        product_id = start_id + offset
+        if recent and rng.random() < duplicate_rate:
+            names = dict(rng.choice(recent))
+            names["name_1c"] = _noisy_variant(names["name_1c"], rng)
+            stats.duplicates += 1
+        else:
+            names = _product_names(rng)
+            # Небольшое окно «недавних» товаров: дубли появляются рядом, как в реальных выгрузках
+            if len(recent) < 1000:
+                recent.append(names)
+            else:
+                recent[rng.randrange(1000)] = names
+
+        code_1c: Optional[int] = 100_000 + product_id
+        roll = rng.random()
+        if roll < garbage_rate:
+            names["name_1c"] = rng.choice(["nan", "", "NaN", " "])
+            names["manufacturer_1c"] = rng.choice(["nan", None])
+            stats.garbage_names += 1
+        elif roll < garbage_rate + asna_only_rate:
+            code_1c = None
+            names["name_1c"] = ""
+            stats.asna_only += 1
+
+        created = epoch + timedelta(minutes=product_id % 500_000)
+        stats.products += 1
+        yield {
+            "id": product_id,
+            "code_1c": code_1c,
+            "code_asna": 9_000_000 + product_id,
+            "name_1c": names["name_1c"],
+            "manufacturer_1c": names["manufacturer_1c"],
+            "name_asna": names["name_asna"],
+            "created_at": created,
+            "updated_at": created,
+            "is_active": rng.random() >= inactive_rate,
+        }
+
+
+def category_rows(categories: List[Category]) -> List[Dict[str, Any]]:
+    """Category -> строки таблицы categories (имена колонок CategoryDB)."""
+    rows = []
+    for cat in categories:
+        data = asdict(cat)
+        rows.append(
+            {
+                "code": data["code"],
+                "level": data["level"],
+                "direction": data["direction"],
+                "need": data["need"],
+                "category": data["group"],
+                "inn_cluster": data["inn_cluster"],
+                "product_type": data["dosage_form"],
+                "age_segment": data["age_segment"],
+            }
+        )
+    return rows
+
+
+def populate_database(
+    engine_: Engine,
+    products: int,
+    categories: int,
+    cluster_size: int = 3,
+    seed: int = 0,
+    chunk_size: int = 10_000,
+    duplicate_rate: float = 0.05,
+    garbage_rate: float = 0.02,
+    progress: Optional[Any] = None,
+) -> CatalogueStats:
+    """
+    Создаёт все таблицы ORM в engine_ и заливает синтетический каталог и дерево.
+    Запись чанками по chunk_size строк (executemany, транзакция на чанк).
+    progress(done, total) вызывается после каждого чанка.
+    """
+    Base.metadata.create_all(engine_)
+    stats = CatalogueStats()
+
+    tree = make_categories(categories, cluster_size=cluster_size, seed=seed)
+    with engine_.begin() as conn:
+        conn.execute(CategoryDB.__table__.delete())
+        conn.execute(CategoryDB.__table__.insert(), category_rows(tree))
+        conn.execute(AppMeta.__table__.delete().where(AppMeta.key == CATEGORIES_VERSION_KEY))
+        conn.execute(AppMeta.__table__.insert().values(key=CATEGORIES_VERSION_KEY, value=categories_content_hash(tree)))
+    stats.categories = len(tree)
+
+    rows = iter_product_rows(products, seed=seed, duplicate_rate=duplicate_rate, garbage_rate=garbage_rate, stats=stats)
+    for chunk in chunked(rows, chunk_size):
+        with engine_.begin() as conn:
+            conn.execute(ProductLink.__table__.insert(), chunk)
+        if progress is not None:
+            progress(stats.products, products)
+    return stats
+
+
+FEED_HEADER = ["Код 1С", "Код АСНА", "Наименование 1С", "Производитель", "Наименование АСНА"]
+
+
+def write_feed_csv(path: str, rows: Iterator[Dict[str, Any]], delimiter: str = ";") -> int:
+    """Пишет записи в CSV в формате выгрузки 1С/АСНА (для import_product_feed)."""
+    written = 0
+    with open(path, "w", newline="", encoding="utf-8-sig") as fh:
+        writer = csv.writer(fh, delimiter=delimiter)
+        writer.writerow(FEED_HEADER)
+        for row in rows:
+            writer.writerow([row["code_1c"] or "", row["code_asna"] or "", row["name_1c"], row["manufacturer_1c"] or "", row["name_asna"] or ""])
+            written += 1
+    return written
@@ -0,0 +1,258 @@
+# src/classifier/attributes.py
+"""
+Локальное извлечение признаков из названия SKU регулярными выражениями.
+
+Из «ВАЛТРЕКС ТАБЛ. П/ПЛЕН/ОБ. 500МГ №10» без LLM получаем:
+    дозировку (500 мг, 5 мг/мл, 0,05%), лекарственную форму по сокращениям
+    (табл., капс., р-р, сусп., супп. ...), способ введения (в/в, рект., назал.),
+    число единиц в упаковке (№10, N10, 10 шт) и возрастной маркер (детск., д/детей, взросл.).
+
+Признаки детерминированы и бесплатны, поэтому используются:
+- как структурная подсказка в промпте (SkuAttributes.prompt_hint);
+- для выбора кода внутри МНН-кластера по правилам дерева
+  (src/classifier/cluster_resolver.py).
+
+Пакетно (extract_many) названия разбираются векторно через pandas
+Series.str.extract скомпилированными шаблонами; по одному (extract) — теми же
+шаблонами через re. Результаты кэшируются по нормализованному названию.
+pandas импортируется только в extract_many.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Ключ формы -> (подпись, шаблон сокращений). Порядок важен: первая совпавшая альтернатива
+FORMS = {
+    "tablets": ("таблетки", r"таб(?:л(?:етк[аи]|еток|\.)?|\.)?(?:\s*шип\.?)?|драже"),
+    "capsules": ("капсулы", r"капс(?:ул[аы]|\.)?"),
+    "solution": ("раствор", r"р-р[аы]?|раствор[аы]?|р\.р\.?"),
+    "suspension": ("суспензия", r"сусп(?:ензи[яи]|\.)?"),
+    "syrup": ("сироп", r"сироп"),
+    "drops": ("капли", r"капли|капл\.?|кап\."),
+    "spray": ("спрей", r"спрей|аэроз(?:оль|\.)?"),
+    "ointment": ("мазь", r"мазь|маз\."),
+    "gel": ("гель", r"гель"),
+    "cream": ("крем", r"крем"),
+    "suppositories": ("суппозитории", r"супп(?:озитори[йи]|\.)?|свечи|св\.(?:\s*рект\.?|\s*ваг\.?)?"),
+    "powder": ("порошок", r"пор(?:ошок|\.|-к)?|лиоф(?:илизат|\.)?"),
+    "granules": ("гранулы", r"гран(?:улы|\.)?"),
+    "lozenges": ("пастилки", r"паст(?:илки|\.)?|лед(?:енцы|\.)"),
+}
+# Ключ способа введения -> (подпись, шаблон)
+ROUTES = {
+    "injection": ("инъекционно", r"в/в|в/м|п/к|д/ин\w*|инъекц\w*|инфуз\w*|парентерал\w*"),
+    "rectal": ("ректально", r"рект\w*"),
+    "vaginal": ("вагинально", r"ваг\w*|интравагинал\w*"),
+    "nasal": ("назально", r"назал\w*|наз\.|интраназал\w*|в нос"),
+    "ophthalmic": ("в глаза", r"глазн\w*|офтальм\w*"),
+    "inhalation": ("ингаляционно", r"ингал\w*|д/ингал\w*"),
+    "topical": ("наружно", r"наружн\w*|нар\.|местн\w*|накожн\w*"),
+    "oral": ("внутрь", r"внутрь|перорал\w*|д/приема внутрь|жеват\w*|шип\w*|диспергир\w*"),
+}
+# Способ введения, который следует из формы, если в названии он не указан
+FORM_ROUTES = {
+    "tablets": "oral", "capsules": "oral", "syrup": "oral", "suspension": "oral",
+    "granules": "oral", "lozenges": "oral", "ointment": "topical", "gel": "topical", "cream": "topical",
+}
+AGE_LABELS = {"children": "дети", "adults": "взрослые"}
+
+# Буква (кириллица/латиница) вокруг совпадения означает, что это часть слова
+_LEFT = r"(?<![а-яa-z])"
+_RIGHT = r"(?![а-яa-z])"
+
+DOSE_PATTERN = re.compile(
+    r"(?P<dose_value>\d+(?:[.,]\d+)?)\s*"
+    r"(?P<dose_unit>мкг|мг|г|мл|тыс\.?\s*ме|ме|ед|%)" + _RIGHT +
+    r"(?:\s*/\s*(?P<dose_per>мл|г|доза|дозу|сут|ч)" + _RIGHT + ")?"
+)
+FORM_PATTERN = re.compile(
+    _LEFT + "(?:" + "|".join(f"(?P<{key}>{pattern})" for key, (_, pattern) in FORMS.items()) + ")" + r"(?![а-я])"
+)
+ROUTE_PATTERN = re.compile(
+    _LEFT + "(?:" + "|".join(f"(?P<{key}>{pattern})" for key, (_, pattern) in ROUTES.items()) + ")"
+)
+# Латинская n — номер упаковки только отдельно от слова: "aspirin 500мг" не даёт 500 шт.
+PACK_PATTERN = re.compile(r"(?:(?:№|" + _LEFT + r"n)\s*(?P<pack_no>\d+)|(?P<pack_pcs>\d+)\s*шт" + _RIGHT + ")")
+AGE_PATTERN = re.compile(
+    _LEFT + r"(?:(?P<children>дет(?:и|ей|ск\w*|\.)|д/дет\w*|малыш\w*|с\s*\d+\s*мес\w*)|(?P<adults>взросл\w*|д/взр\w*))"
+)
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_sku_name(name: Optional[str]) -> str:
+    """Ключ кэша и текст для шаблонов: нижний регистр, ё -> е, одиночные пробелы."""
+    if not name:
+        return ""
+    return _SPACES.sub(" ", str(name).lower().replace("ё", "е")).strip()
+
+
+@dataclass(frozen=True)
+class SkuAttributes:
+    """Признаки SKU из названия (None — признак не найден)."""
+    dose_value: Optional[float] = None
+    dose_unit: Optional[str] = None  # мг, мкг, г, мл, ме, ед, %
+    dose_per: Optional[str] = None  # знаменатель: 5 мг/мл -> "мл"
+    form: Optional[str] = None  # ключ FORMS
+    route: Optional[str] = None  # ключ ROUTES (указанный в названии явно)
+    pack_count: Optional[int] = None
+    age: Optional[str] = None  # "children" | "adults"
+
+    @property
+    def dosage(self) -> Optional[str]:
+        if self.dose_value is None:
+            return None
+        value = f"{self.dose_value:g}".replace(".", ",")
+        return f"{value} {self.dose_unit}" + (f"/{self.dose_per}" if self.dose_per else "")
+
+    @property
+    def form_label(self) -> Optional[str]:
+        return FORMS[self.form][0] if self.form else None
+
+    @property
+    def implied_route(self) -> Optional[str]:
+        """Способ введения: явный из названия или следующий из формы."""
+        return self.route or FORM_ROUTES.get(self.form or "")
+
+    @property
+    def is_empty(self) -> bool:
+        return self == EMPTY_ATTRIBUTES
+
+    def prompt_hint(self) -> str:
+        """Строка для промпта: «дозировка 500 мг; форма: таблетки; №10»; пустая — признаков нет."""
+        parts = []
+        if self.dosage:
+            parts.append(f"дозировка {self.dosage}")
+        if self.form:
+            parts.append(f"форма: {self.form_label}")
+        if self.route:
+            parts.append(f"способ введения: {ROUTES[self.route][0]}")
+        if self.pack_count is not None:
+            parts.append(f"в упаковке {self.pack_count} шт.")
+        if self.age:
+            parts.append(f"возраст: {AGE_LABELS[self.age]}")
+        return "; ".join(parts)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {**asdict(self), "dosage": self.dosage}
+
+
+EMPTY_ATTRIBUTES = SkuAttributes()
+
+
+def _dose_value(text: Optional[str]) -> Optional[float]:
+    return float(text.replace(",", ".")) if text else None
+
+
+def _dose_unit(text: Optional[str]) -> Optional[str]:
+    if not text:
+        return None
+    return "тыс. ме" if text.startswith("тыс") else text
+
+
+def _pack(no: Optional[str], pcs: Optional[str]) -> Optional[int]:
+    value = no or pcs
+    return int(value) if value else None
+
+
+def _match_attributes(text: str) -> SkuAttributes:
+    """Разбор одного нормализованного названия (те же шаблоны, что в extract_many)."""
+    dose = DOSE_PATTERN.search(text)
+    form = FORM_PATTERN.search(text)
+    route = ROUTE_PATTERN.search(text)
+    pack = PACK_PATTERN.search(text)
+    age = AGE_PATTERN.search(text)
+    return SkuAttributes(
+        dose_value=_dose_value(dose.group("dose_value")) if dose else None,
+        dose_unit=_dose_unit(dose.group("dose_unit")) if dose else None,
+        dose_per=dose.group("dose_per") if dose else None,
+        form=form.lastgroup if form else None,
+        route=route.lastgroup if route else None,
+        pack_count=_pack(pack.group("pack_no"), pack.group("pack_pcs")) if pack else None,
+        age=age.lastgroup if age else None,
+    )
+
+
+def _first_group(groups: "pd.DataFrame") -> "pd.Series":
+    """Имя первой непустой колонки str.extract по строкам (None — совпадений нет)."""
+    found = groups.notna()
+    return found.idxmax(axis=1).where(found.any(axis=1), None)
+
+
+def extract_frame(names: "pd.Series") -> "pd.DataFrame":
+    """
+    Векторный разбор Series названий: по колонке на поле SkuAttributes
+    (индекс — как у names). Названия ожидаются уже нормализованными.
+    """
+    import pandas as pd
+
+    text = names.fillna("").astype(str)
+    dose = text.str.extract(DOSE_PATTERN)
+    pack = text.str.extract(PACK_PATTERN)
+    return pd.DataFrame(
+        {
+            "dose_value": pd.to_numeric(dose["dose_value"].str.replace(",", ".", regex=False), errors="coerce"),
+            "dose_unit": dose["dose_unit"].where(~dose["dose_unit"].str.startswith("тыс", na=False), "тыс. ме"),
+            "dose_per": dose["dose_per"],
+            "form": _first_group(text.str.extract(FORM_PATTERN)),
+            "route": _first_group(text.str.extract(ROUTE_PATTERN)),
+            "pack_count": pd.to_numeric(pack["pack_no"].where(pack["pack_no"].notna(), pack["pack_pcs"]), errors="coerce").astype("Int64"),
+            "age": _first_group(text.str.extract(AGE_PATTERN)),
+        },
+        index=names.index,
+    )
+
+
+class AttributeExtractor:
+    """
+    Извлечение признаков с кэшем по нормализованному названию.
+    Кэш ограничен max_entries (вытесняются самые старые записи).
+    """
+
+    def __init__(self, max_entries: int = 200_000) -> None:
+        self.max_entries = max_entries
+        self._cache: Dict[str, SkuAttributes] = {}
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def _store(self, key: str, attrs: SkuAttributes) -> None:
+        if len(self._cache) >= self.max_entries:
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[key] = attrs
+
+    def extract(self, name: Optional[str]) -> SkuAttributes:
+        key = normalize_sku_name(name)
+        if not key:
+            return EMPTY_ATTRIBUTES
+        attrs = self._cache.get(key)
+        if attrs is None:
+            attrs = _match_attributes(key)
+            self._store(key, attrs)
+        return attrs
+
+    def extract_many(self, names: Iterable[Optional[str]]) -> List[SkuAttributes]:
+        """
+        Признаки для пачки названий: новые разбираются одним векторным
+        проходом (extract_frame), известные берутся из кэша.
+        """
+        keys = [normalize_sku_name(name) for name in names]
+        missing = list(dict.fromkeys(k for k in keys if k and k not in self._cache))
+        if missing:
+            import pandas as pd
+
+            frame = extract_frame(pd.Series(missing, dtype=object)).astype(object)
+            frame = frame.where(frame.notna(), None)
+            for key, row in zip(missing, frame.to_dict("records")):
+                self._store(key, SkuAttributes(**row))
+        return [self._cache.get(k, EMPTY_ATTRIBUTES) if k else EMPTY_ATTRIBUTES for k in keys]
+
+
+# Общий экземпляр: промпт (LLM-клиент) и постобработка (ClassifierService) делят кэш
+attribute_extractor = AttributeExtractor()
+
@@ -0,0 +1,175 @@
+# src/classifier/category_index.py
+"""
+Иерархия дерева категорий в памяти.
+
+Category — плоская запись (direction / need / group / code), поэтому всё,
+чему нужна «категория с кодом X», её путь или соседи по кластеру, раньше
+проходило по списку. CategoryIndex строится один раз на дерево и даёт:
+- поиск категории по коду за O(1) (get, in);
+- заранее собранные человекочитаемые пути (path: «направление > потребность > группа»);
+- узлы иерархии direction -> need -> group с родителем и детьми (node, parent);
+- соседей: категории того же узла (siblings) и того же МНН-кластера
+  (cluster, cluster_siblings);
+- обход поддерева (subtree).
+
+Пустые уровни пропускаются: категория без group висит прямо на узле need.
+Индекс общий для ClassifierService, LLM-клиента и отчётов; в снапшоте
+(CategorySnapshot.index) строится лениво и кэшируется.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.classifier.inn_index import build_inn_index, normalize_inn, split_inn_cluster
+from src.data_models import Category
+
+PATH_LEVELS = ("direction", "need", "group")
+PATH_SEPARATOR = " > "
+
+
+def category_path_parts(category: Category) -> Tuple[str, ...]:
+    """Непустые уровни пути категории: (направление, потребность, группа)."""
+    parts = (getattr(category, level) for level in PATH_LEVELS)
+    return tuple(str(p).strip() for p in parts if p and str(p).strip())
+
+
+def category_path_for(category: Optional[Category]) -> Optional[str]:
+    """Человекочитаемый путь категории по дереву: направление > потребность > группа."""
+    if category is None:
+        return None
+    parts = category_path_parts(category)
+    return PATH_SEPARATOR.join(parts) if parts else None
+
+
+@dataclass(eq=False)
+class CategoryNode:
+    """Узел иерархии: уровень пути и категории, висящие прямо на нём."""
+    name: str
+    parent: Optional["CategoryNode"] = field(default=None, repr=False)
+    children: Dict[str, "CategoryNode"] = field(default_factory=dict, repr=False)
+    categories: List[Category] = field(default_factory=list, repr=False)
+
+    @property
+    def path(self) -> Tuple[str, ...]:
+        parts = []
+        node: Optional[CategoryNode] = self
+        while node is not None and node.parent is not None:
+            parts.append(node.name)
+            node = node.parent
+        return tuple(reversed(parts))
+
+    @property
+    def depth(self) -> int:
+        return len(self.path)
+
+    def iter_categories(self) -> Iterator[Category]:
+        """Все категории поддерева (в порядке исходного списка внутри узла, обход в глубину)."""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield from node.categories
+            stack.extend(reversed(list(node.children.values())))
+
+
+class CategoryIndex:
+    """
+    Индекс дерева категорий: код -> категория/путь, иерархия узлов, МНН-кластеры.
+    """
+
+    def __init__(
+        self,
+        categories: Iterable[Category],
+        inn_index: Optional[Dict[str, List[Category]]] = None,
+    ) -> None:
+        self.categories: List[Category] = list(categories)
+        self.root = CategoryNode(name="")
+        self._by_code: Dict[str, Category] = {}
+        self._paths: Dict[str, Optional[str]] = {}
+        self._nodes: Dict[str, CategoryNode] = {}
+
+        for cat in self.categories:
+            if cat.code in self._by_code:
+                continue  # дубликат кода: первая запись выигрывает, как в inn-индексе
+            self._by_code[cat.code] = cat
+            node = self.root
+            for part in category_path_parts(cat):
+                child = node.children.get(part)
+                if child is None:
+                    child = node.children[part] = CategoryNode(name=part, parent=node)
+                node = child
+            node.categories.append(cat)
+            self._nodes[cat.code] = node
+            self._paths[cat.code] = PATH_SEPARATOR.join(node.path) or None
+
+        self._inn_index = inn_index if inn_index is not None else build_inn_index(self.categories)
+
+    # ---------- код -> категория ----------
+
+    def __len__(self) -> int:
+        return len(self._by_code)
+
+    def __contains__(self, code: object) -> bool:
+        return code in self._by_code
+
+    def __iter__(self) -> Iterator[Category]:
+        return iter(self._by_code.values())
+
+    def get(self, code: Optional[str]) -> Optional[Category]:
+        return self._by_code.get(code) if code is not None else None
+
+    @property
+    def codes(self) -> List[str]:
+        return list(self._by_code)
+
+    def path(self, code: Optional[str]) -> Optional[str]:
+        """Путь категории «направление > потребность > группа» (None — код неизвестен)."""
+        return self._paths.get(code) if code is not None else None
+
+    # ---------- иерархия ----------
+
+    def node(self, *path: str) -> Optional[CategoryNode]:
+        """Узел по пути уровней: node("ЛС", "Боль"); без аргументов — корень."""
+        node = self.root
+        for part in path:
+            node = node.children.get(part)
+            if node is None:
+                return None
+        return node
+
+    def parent(self, code: str) -> Optional[CategoryNode]:
+        """Узел, на котором висит категория."""
+        return self._nodes.get(code)
+
+    def siblings(self, code: str) -> List[Category]:
+        """Другие категории того же узла (та же группа)."""
+        node = self._nodes.get(code)
+        return [cat for cat in node.categories if cat.code != code] if node is not None else []
+
+    def subtree(self, *path: str) -> List[Category]:
+        """Все категории под узлом path (пустой список — узла нет)."""
+        node = self.node(*path)
+        return list(node.iter_categories()) if node is not None else []
+
+    # ---------- МНН-кластеры ----------
+
+    @property
+    def inn_index(self) -> Dict[str, List[Category]]:
+        return self._inn_index
+
+    def cluster(self, inn: Optional[str]) -> List[Category]:
+        """Категории МНН-кластера по найденному МНН (варианты записи учтены)."""
+        key = normalize_inn(inn)
+        return list(self._inn_index.get(key, [])) if key else []
+
+    def cluster_siblings(self, code: str) -> List[Category]:
+        """Другие категории с тем же МНН в кластере, что и у code (без повторов)."""
+        cat = self._by_code.get(code)
+        if cat is None:
+            return []
+        seen: Dict[str, Category] = {}
+        for variant in split_inn_cluster(cat.inn_cluster):
+            for other in self._inn_index.get(variant, []):
+                if other.code != code:
+                    seen.setdefault(other.code, other)
+        return list(seen.values())
@@ -0,0 +1,179 @@
+# src/classifier/category_snapshot.py
+"""
+Скомпилированный снапшот дерева категорий.
+
+Каждый скрипт раньше строил дерево заново: ORM-запрос, category_db_to_domain
+на каждую строку, затем индекс МНН и текстовый блок категорий для промпта.
+Снапшот — один JSON-файл, где всё это уже посчитано:
+
+- доменные категории (Category) в исходном порядке;
+- индекс «нормализованное МНН -> коды категорий» (как build_inn_index);
+- готовый блок категорий для user-промпта и оценка его размера в токенах;
+- content_hash — sha256 от содержимого категорий и версии формата;
+- source_version — версия дерева из app_meta (пишет load_categories_from_xlsx).
+
+load_category_snapshot сверяет source_version с БД одним запросом по ключу и
+при расхождении (или смене формата) перестраивает файл. Запись атомарная
+(временный файл + os.replace), поэтому параллельно стартующие воркеры видят
+либо старый, либо новый снапшот целиком и работают с одинаковым деревом.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from src.classifier.category_index import CategoryIndex
+from src.classifier.inn_index import build_inn_index
+from src.classifier.prompt_builder import PromptBuilder
+from src.config import config
+from src.data_models import Category
+from src.io.db_io import AppMeta, CATEGORIES_VERSION_KEY, get_all_categories, get_meta, set_meta
+
+
+logger = logging.getLogger(__name__)
+
+# Меняется при изменении формата файла или рендеринга блока категорий
+SNAPSHOT_FORMAT_VERSION = 2  # 2: способ введения и комментарий категории
+
+# Грубая оценка для русского текста: ~3 символа на токен (без токенизатора провайдера)
+CHARS_PER_TOKEN = 3.0
+
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / CHARS_PER_TOKEN) + 1 if text else 0
+
+
+def categories_content_hash(categories: List[Category]) -> str:
+    """sha256 от содержимого категорий (в исходном порядке) и версии формата."""
+    digest = hashlib.sha256(f"v{SNAPSHOT_FORMAT_VERSION}\n".encode("utf-8"))
+    for cat in categories:
+        digest.update(json.dumps(asdict(cat), sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+@dataclass
+class CategorySnapshot:
+    categories: List[Category]
+    inn_index: Dict[str, List[str]]  # нормализованное МНН -> коды категорий
+    categories_block: str
+    token_estimate: int
+    content_hash: str
+    source_version: Optional[str] = None
+    format_version: int = SNAPSHOT_FORMAT_VERSION
+    created_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+
+    @cached_property
+    def index(self) -> CategoryIndex:
+        """Иерархия дерева (код -> категория/путь, кластеры); строится один раз на снапшот."""
+        return CategoryIndex(self.categories, self.inn_index_categories())
+
+    def inn_index_categories(self) -> Dict[str, List[Category]]:
+        """Индекс МНН в формате build_inn_index (списки Category, а не кодов)."""
+        by_code = {cat.code: cat for cat in self.categories}
+        return {inn: [by_code[code] for code in codes] for inn, codes in self.inn_index.items()}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CategorySnapshot":
+        data = dict(data)
+        data["categories"] = [Category(**c) for c in data["categories"]]
+        return cls(**data)
+
+
+def build_snapshot(categories: List[Category], source_version: Optional[str] = None) -> CategorySnapshot:
+    block = PromptBuilder().build_categories_block(categories)
+    return CategorySnapshot(
+        categories=list(categories),
+        inn_index={inn: [cat.code for cat in cats] for inn, cats in build_inn_index(categories).items()},
+        categories_block=block,
+        token_estimate=estimate_tokens(block),
+        content_hash=categories_content_hash(categories),
+        source_version=source_version,
+    )
+
+
+def save_snapshot(snapshot: CategorySnapshot, path: str | Path) -> None:
+    """Атомарно пишет снапшот: временный файл в том же каталоге + os.replace."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump(snapshot.to_dict(), fh, ensure_ascii=False)
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+
+def read_snapshot(path: str | Path) -> Optional[CategorySnapshot]:
+    """Читает снапшот; битый файл или файл старого формата -> None."""
+    try:
+        with open(path, encoding="utf-8") as fh:
+            data = json.load(fh)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as exc:
+        logger.warning("Category snapshot %s is unreadable: %s", path, exc)
+        return None
+    if data.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        return None
+    try:
+        return CategorySnapshot.from_dict(data)
+    except (KeyError, TypeError) as exc:
+        logger.warning("Category snapshot %s is malformed: %s", path, exc)
+        return None
+
+
+def rebuild_snapshot(session: Session, path: Optional[str | Path] = None) -> CategorySnapshot:
+    """
+    Строит снапшот из БД и сохраняет его. Если версии дерева в app_meta ещё нет
+    (дерево загружено до появления снапшотов), ею становится content_hash.
+    """
+    categories = get_all_categories(session)
+    source_version = get_meta(session, CATEGORIES_VERSION_KEY)
+    snapshot = build_snapshot(categories, source_version=source_version)
+    if source_version is None:
+        snapshot.source_version = snapshot.content_hash
+        set_meta(session, CATEGORIES_VERSION_KEY, snapshot.content_hash)
+    save_snapshot(snapshot, path or config.snapshot.path)
+    logger.info(
+        "Category snapshot rebuilt: %s categories, ~%s prompt tokens, hash %s",
+        len(snapshot.categories), snapshot.token_estimate, snapshot.content_hash[:12],
+    )
+    return snapshot
+
+
+def load_category_snapshot(session: Session, path: Optional[str | Path] = None) -> CategorySnapshot:
+    """
+    Снапшот для старта процесса: файл, если он актуален для версии дерева в БД,
+    иначе — перестроенный из БД. При config.snapshot.enabled=False строится
+    в памяти без записи на диск.
+    """
+    # На БД без миграции таблицы app_meta ещё нет
+    AppMeta.__table__.create(session.connection(), checkfirst=True)
+
+    if not config.snapshot.enabled and path is None:
+        return build_snapshot(get_all_categories(session), get_meta(session, CATEGORIES_VERSION_KEY))
+
+    path = path or config.snapshot.path
+    snapshot = read_snapshot(path)
+    if snapshot is not None:
+        current = get_meta(session, CATEGORIES_VERSION_KEY)
+        if current is not None and current == snapshot.source_version:
+            return snapshot
+    return rebuild_snapshot(session, path)
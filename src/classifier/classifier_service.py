@@ -1,11 +1,69 @@
 # src/classifier/classifier_service.py
 from __future__ import annotations
 
-from typing import Optional, List
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Set, Union
 
 from src.config import config
 from src.data_models import SKU, ClassificationResult, Category
+from src.classifier.attributes import EMPTY_ATTRIBUTES, SkuAttributes, attribute_extractor
+from src.classifier.category_index import CategoryIndex
+from src.classifier.cluster_resolver import ClusterResolver
+from src.classifier.prefilter import Prefilter
 from src.llm_client.base import LLMClient
+from src.observability.metrics import current_tags, metrics, tagged
+
+if TYPE_CHECKING:
+    from src.classifier.category_snapshot import CategorySnapshot
+
+
+@dataclass
+class ClassificationOutcome:
+    """
+    Исход классификации одного SKU в classify_many: результат или ошибка
+    (исключение не пробрасывается, чтобы один SKU не обрывал поток).
+    index — позиция SKU во входной последовательности.
+    """
+    index: int
+    sku: SKU
+    result: Optional[ClassificationResult] = None
+    error: Optional[Exception] = None
+    elapsed_seconds: float = 0.0  # от старта вызова LLM до готового результата
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+async def _aiter_skus(skus: Union[Iterable[SKU], AsyncIterable[SKU]]) -> AsyncIterator[SKU]:
+    if hasattr(skus, "__aiter__"):
+        async for sku in skus:  # type: ignore[union-attr]
+            yield sku
+    else:
+        for sku in skus:  # type: ignore[union-attr]
+            yield sku
+
+
+def multi_cluster_note(inn: Optional[str], matched_count: int) -> str:
+    """
+    Пояснение, которое добавляется в reason, когда в МНН-кластере несколько кодов.
+    Общий текст для ClassifierService и пересчёта по архиву (rescoring).
+    """
+    return (
+        f" Дополнительно: для МНН '{inn}' в дереве категорий найдено "
+        f"{matched_count} строк в одном МНН-кластере, поэтому решение "
+        f"помечено как требующее ревью и уверенность ограничена."
+    )
+
+
+def _append_reason(result: ClassificationResult, note: str) -> None:
+    """Добавляет пояснение в reason (без задвоения при повторной постобработке)."""
+    if not result.reason:
+        result.reason = note.lstrip()
+    elif note.strip() not in result.reason:
+        result.reason = result.reason.rstrip() + note
 
 
 class ClassifierService:
@@ -19,22 +77,166 @@ class ClassifierService:
       с учётом количества категорий внутри МНН-кластера.
     """
 
-    def __init__(self, llm_client: LLMClient, categories: List[Category]) -> None:
+    def __init__(
+        self,
+        llm_client: LLMClient,
+        categories: List[Category],
+        inn_index: Optional[Dict[str, List[Category]]] = None,
+        category_index: Optional[CategoryIndex] = None,
+        prefilter: Optional[Prefilter] = None,
+    ) -> None:
         self._llm_client = llm_client
         self._categories = categories
+        self._index = category_index if category_index is not None else CategoryIndex(categories, inn_index)
         self._conf_threshold = config.classifier.confidence_threshold
         self._hard_reject_threshold = config.classifier.hard_reject_threshold
+        self._multi_cluster_cap = config.classifier.multi_cluster_confidence_cap
+        self._use_attributes = config.classifier.use_sku_attributes
+        self._resolver = (
+            ClusterResolver(self._index)
+            if self._use_attributes and config.classifier.resolve_clusters_locally
+            else None
+        )
+        # Нелекарственные товары и мусорные строки — локально, без вызова LLM
+        if prefilter is None and config.prefilter.enabled:
+            prefilter = Prefilter.from_config(self._index)
+        self._prefilter = prefilter
+
+    @classmethod
+    def from_snapshot(cls, llm_client: LLMClient, snapshot: "CategorySnapshot") -> "ClassifierService":
+        """Сервис на готовом снапшоте: индекс дерева и МНН не пересчитывается."""
+        return cls(llm_client=llm_client, categories=snapshot.categories, category_index=snapshot.index)
 
     async def classify_product(self, sku: SKU) -> ClassificationResult:
         """
         Классифицирует один SKU:
-        - вызывает LLM;
+        - мусорные строки и нелекарственные товары разбирает предфильтр (без LLM);
+        - иначе вызывает LLM;
         - применяет пороговую логику;
         - применяет «multi-cluster safety» для МНН-кластеров с несколькими кодами.
         """
-        raw_result = await self._llm_client.classify_sku(sku)
-        result = raw_result  # предполагаем, что LLM уже вернул ClassificationResult-совместный объект
+        raw_result = self._prefiltered(sku)
+        if raw_result is None:
+            raw_result = await self._llm_client.classify_sku(sku)
+
+        with metrics.timer("post_process"):
+            attrs = attribute_extractor.extract(sku.name) if self._use_attributes else EMPTY_ATTRIBUTES
+            return self._postprocess(raw_result, attrs)
+
+    async def classify_many(
+        self,
+        skus: Union[Iterable[SKU], AsyncIterable[SKU]],
+        concurrency: int = 8,
+        ordered: bool = False,
+    ) -> AsyncIterator[ClassificationOutcome]:
+        """
+        Потоковая классификация: отдаёт ClassificationOutcome по мере готовности.
+
+        - skus — обычный или асинхронный итератор; читается лениво, по мере
+          освобождения слотов, поэтому вход может быть сколь угодно длинным.
+        - concurrency — сколько вызовов LLM одновременно в полёте.
+        - ordered=False — в порядке завершения; ordered=True — в порядке входа
+          (готовые вне очереди ждут в буфере, буфер ограничен, чтобы один
+          медленный SKU не копил память без предела).
+        - Ошибка SKU не прерывает поток: она в outcome.error.
+        - Мусорные строки и нелекарственные товары (Prefilter) получают
+          результат сразу, без вызова LLM.
+        - Постобработка (пороги, multi-cluster safety) выполняется пачкой над
+          всеми вызовами, завершившимися к очередному пробуждению.
 
+        Если потребитель прекращает итерацию, незавершённые вызовы отменяются.
+        """
+        concurrency = max(1, concurrency)
+        max_buffered = 4 * concurrency
+        source = _aiter_skus(skus).__aiter__()
+        pending: Set[asyncio.Task] = set()
+        buffered: Dict[int, ClassificationOutcome] = {}
+        next_index = 0  # индекс следующего SKU из источника
+        next_to_yield = 0  # для ordered: следующий индекс на выдачу
+        exhausted = False
+
+        try:
+            while True:
+                while not exhausted and len(pending) < concurrency and len(buffered) < max_buffered:
+                    try:
+                        sku = await source.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    pending.add(asyncio.ensure_future(self._call_llm(next_index, sku)))
+                    next_index += 1
+                if not pending:
+                    break
+
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                outcomes = sorted((task.result() for task in done), key=lambda o: o.index)
+                self._postprocess_outcomes(outcomes)
+
+                if not ordered:
+                    for outcome in outcomes:
+                        yield outcome
+                    continue
+                for outcome in outcomes:
+                    buffered[outcome.index] = outcome
+                while next_to_yield in buffered:
+                    yield buffered.pop(next_to_yield)
+                    next_to_yield += 1
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _call_llm(self, index: int, sku: SKU) -> ClassificationOutcome:
+        # Замеры LLM-этапов помечаем id SKU, если вызывающий код не пометил их сам
+        tags = {}
+        if sku.external_id is not None and "product_link_id" not in current_tags():
+            external_id = str(sku.external_id)
+            tags["product_link_id"] = int(external_id) if external_id.isdigit() else external_id
+        started = time.perf_counter()
+        prefiltered = self._prefiltered(sku)
+        if prefiltered is not None:
+            return ClassificationOutcome(index, sku, result=prefiltered, elapsed_seconds=time.perf_counter() - started)
+        try:
+            with tagged(**tags):
+                result = await self._llm_client.classify_sku(sku)
+        except Exception as exc:  # noqa: BLE001 — ошибка SKU возвращается в outcome
+            return ClassificationOutcome(index, sku, error=exc, elapsed_seconds=time.perf_counter() - started)
+        return ClassificationOutcome(index, sku, result=result, elapsed_seconds=time.perf_counter() - started)
+
+    def _prefiltered(self, sku: SKU) -> Optional[ClassificationResult]:
+        """Результат предфильтра (карантин или нелекарственный товар) или None — нужен вызов LLM."""
+        if self._prefilter is None:
+            return None
+        decision = self._prefilter.check(sku.name)
+        if decision is None:
+            return None
+        metrics.inc(f"prefilter_{decision.kind}_total")
+        return decision.to_result(sku.name, self._prefilter.confidence)
+
+    def _postprocess_outcomes(self, outcomes: List[ClassificationOutcome]) -> None:
+        """Постобработка пачки завершившихся вызовов (одно наблюдение post_process на пачку)."""
+        with metrics.timer("post_process", batch=len(outcomes)):
+            # Признаки всей пачки — одним векторным проходом (известные названия — из кэша)
+            if self._use_attributes and len(outcomes) > 1:
+                attributes = attribute_extractor.extract_many(o.sku.name for o in outcomes)
+            elif self._use_attributes:
+                attributes = [attribute_extractor.extract(o.sku.name) for o in outcomes]
+            else:
+                attributes = [EMPTY_ATTRIBUTES] * len(outcomes)
+            for outcome, attrs in zip(outcomes, attributes):
+                if outcome.result is None:
+                    continue
+                try:
+                    outcome.result = self._postprocess(outcome.result, attrs)
+                except Exception as exc:  # noqa: BLE001
+                    outcome.result, outcome.error = None, exc
+
+    def _postprocess(self, result: ClassificationResult, attrs: SkuAttributes = EMPTY_ATTRIBUTES) -> ClassificationResult:
+        """
+        Пороги confidence, hint модели и multi-cluster safety поверх ответа LLM.
+        attrs — признаки из названия SKU для выбора кода внутри кластера.
+        """
         # 1) базовое решение по порогам confidence
         needs_review_by_conf = self._should_mark_needs_review(result.confidence)
 
@@ -43,10 +245,12 @@ class ClassifierService:
 
         result.needs_review = model_hint or needs_review_by_conf
 
-        # 3) дополнительная защита: если в МНН-кластере несколько категорий,
-        #    не позволяем высокой уверенности без ревью
-        result = self._apply_multi_cluster_safety(result)
+        # 3) дополнительная защита: если в МНН-кластере несколько категорий и правила
+        #    дерева не выбирают код, не позволяем высокой уверенности без ревью
+        result = self._apply_multi_cluster_safety(result, attrs)
 
+        # 4) путь категории — из дерева по коду (модель его не генерирует или может ошибиться)
+        result.category_path = self._index.path(result.category_code) or result.category_path
         return result
 
     def _should_mark_needs_review(self, confidence: float) -> bool:
@@ -71,58 +275,48 @@ class ClassifierService:
         Возвращает все категории, чьи inn_cluster соответствует найденному МНН
         (с учётом вариантов записи через слэш и разных регистров).
         """
-        if not detected_inn:
-            return []
+        # поддерживаем конструкции вида "Римантадин/Rimantadine" — варианты уже разложены в индексе
+        return self._index.cluster(detected_inn)
 
-        norm_inn = detected_inn.strip().lower()
-        matched: list[Category] = []
-
-        for cat in self._categories:
-            if not getattr(cat, "inn_cluster", None):
-                continue
-
-            cluster_str = cat.inn_cluster.lower()
-
-            # поддерживаем конструкции вида "Римантадин/Rimantadine"
-            parts = [p.strip() for p in cluster_str.replace("\\", "/").split("/")]
-
-            if norm_inn in parts:
-                matched.append(cat)
-
-        return matched
-
-    def _apply_multi_cluster_safety(self, result: ClassificationResult) -> ClassificationResult:
+    def _apply_multi_cluster_safety(
+        self, result: ClassificationResult, attrs: SkuAttributes = EMPTY_ATTRIBUTES
+    ) -> ClassificationResult:
         """
         Применяет «консервативное» правило для МНН-кластеров с несколькими кодами.
 
         Идея:
         - если для найденного МНН в дереве категорий существует >1 строка с этим inn_cluster,
           считаем, что внутри кластера есть тонкие различия (*_01, *_02 и т.п.);
-        - в такой ситуации решение не должно быть высоко уверенным и без ревью.
+        - в такой ситуации решение не должно быть высоко уверенным и без ревью;
+        - исключение: правила строк кластера (форма, возраст, способ введения,
+          пороги дозировки из комментария) однозначно выбирают код по признакам
+          из названия (ClusterResolver) — тогда берём этот код без ревью.
         """
         matched_cats = self._get_categories_for_inn(result.inn)
         if len(matched_cats) <= 1:
             # В кластере нет развилки — ничего дополнительно не делаем.
             return result
 
+        if self._resolver is not None:
+            resolution = self._resolver.resolve(result.inn, attrs)
+            if resolution.resolved:
+                # Правила строк кластера однозначно выбирают код по признакам из названия
+                metrics.inc("cluster_resolved_total")
+                if resolution.code != result.category_code:
+                    metrics.inc("cluster_overridden_total")
+                    result.category_code = resolution.code
+                    _append_reason(result, resolution.note())
+                return result
+            metrics.inc("cluster_escalated_total")
+
         # Если модель не поставила needs_review, но внутри кластера несколько вариантов — ставим.
         if not result.needs_review:
             result.needs_review = True
 
         # Ограничиваем верхнюю границу confidence для таких случаев.
-        if result.confidence > 0.6:
-            result.confidence = 0.6
+        if result.confidence > self._multi_cluster_cap:
+            result.confidence = self._multi_cluster_cap
 
         # Добавляем пояснение в reason (аккуратно, чтобы не задвоить текст при повторных вызовах).
-        extra_note = (
-            f" Дополнительно: для МНН '{result.inn}' в дереве категорий найдено "
-            f"{len(matched_cats)} строк в одном МНН-кластере, поэтому решение "
-            f"помечено как требующее ревью и уверенность ограничена."
-        )
-        if result.reason:
-            if extra_note not in result.reason:
-                result.reason = result.reason.rstrip() + extra_note
-        else:
-            result.reason = extra_note.lstrip()
-
+        _append_reason(result, multi_cluster_note(result.inn, len(matched_cats)))
         return result
@@ -0,0 +1,189 @@
+# src/classifier/cluster_resolver.py
+"""
+Локальный выбор кода внутри МНН-кластера с несколькими кодами.
+
+Раньше любая развилка в кластере (A15_01 / A15_02) означала needs_review и
+потолок confidence. Но строки кластера обычно различаются признаками,
+которые видны в названии SKU: формой, возрастом, способом введения,
+дозировкой из «Комментарий / правила включения». ClusterResolver сверяет
+правила строк дерева с признаками SKU (src/classifier/attributes.py):
+
+- правило строки (CategoryRule) собирается из dosage_form, age_segment,
+  administration_route и comment (форма/возраст/способ введения, упомянутые
+  в комментарии, используются, если соответствующее поле пусто; пороги
+  дозировки — «до 100 мг», «более 500 мг», «от 250 мг»);
+- признак, противоречащий правилу, исключает строку; совпавший даёт +1;
+  не указанный с одной из сторон ничего не меняет;
+- код выбран, если осталась одна строка или у одной строки строго больше
+  совпадений, чем у остальных. Иначе — эскалация на ревью, как раньше.
+
+Если противоречат все строки, признакам не доверяем: эскалация со всеми кодами.
+"""
+from __future__ import annotations
+
+import operator
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.classifier.attributes import AGE_LABELS, FORMS, ROUTES, SkuAttributes, attribute_extractor
+from src.classifier.category_index import CategoryIndex
+from src.classifier.inn_index import normalize_inn
+from src.data_models import Category
+
+_DOSE_OPS: Dict[str, Callable[[float, float], bool]] = {
+    "до": operator.le, "не более": operator.le, "<=": operator.le, "≤": operator.le,
+    "менее": operator.lt, "меньше": operator.lt, "<": operator.lt,
+    "от": operator.ge, "не менее": operator.ge, ">=": operator.ge, "≥": operator.ge,
+    "более": operator.gt, "больше": operator.gt, "свыше": operator.gt, ">": operator.gt,
+}
+DOSE_RULE_PATTERN = re.compile(
+    r"(?P<op>не более|не менее|до|менее|меньше|от|более|больше|свыше|<=|>=|≤|≥|<|>)\s*"
+    r"(?P<value>\d+(?:[.,]\d+)?)\s*(?P<unit>мкг|мг|г|мл|ме|ед)(?![а-яa-z])"
+)
+
+
+@dataclass(frozen=True)
+class DoseRule:
+    """Порог дозировки из комментария строки: «до 100 мг»."""
+    op: str
+    value: float
+    unit: str
+
+    def check(self, attrs: SkuAttributes) -> Optional[bool]:
+        """True/False — выполнено ли; None — неприменимо (дозы нет или другая единица)."""
+        if attrs.dose_value is None or attrs.dose_unit != self.unit:
+            return None
+        return _DOSE_OPS[self.op](attrs.dose_value, self.value)
+
+
+@dataclass(frozen=True)
+class CategoryRule:
+    """Признаки строки дерева, по которым она отличается от соседей по кластеру."""
+    code: str
+    form: Optional[str] = None
+    age: Optional[str] = None
+    route: Optional[str] = None
+    doses: Tuple[DoseRule, ...] = ()
+
+    @classmethod
+    def from_category(cls, category: Category) -> "CategoryRule":
+        form = attribute_extractor.extract(category.dosage_form)
+        age = attribute_extractor.extract(category.age_segment)
+        route = attribute_extractor.extract(category.administration_route)
+        comment = attribute_extractor.extract(category.comment)
+        comment_text = (category.comment or "").lower()
+        doses = tuple(
+            DoseRule(m.group("op"), float(m.group("value").replace(",", ".")), m.group("unit"))
+            for m in DOSE_RULE_PATTERN.finditer(comment_text)
+        )
+        return cls(
+            code=category.code,
+            form=form.form or comment.form,
+            age=age.age or comment.age,
+            route=route.route or route.implied_route or comment.route,
+            doses=doses,
+        )
+
+    def match(self, attrs: SkuAttributes) -> Tuple[bool, List[str]]:
+        """(строка допустима, совпавшие признаки)."""
+        matched: List[str] = []
+        checks = (
+            ("форма", self.form, attrs.form, lambda key: FORMS[key][0]),
+            ("возраст", self.age, attrs.age, AGE_LABELS.get),
+            ("способ введения", self.route, attrs.implied_route, lambda key: ROUTES[key][0]),
+        )
+        for name, expected, actual, label in checks:
+            if expected is None or actual is None:
+                continue
+            if expected != actual:
+                return False, []
+            matched.append(f"{name} {label(expected)}")
+        for dose in self.doses:
+            verdict = dose.check(attrs)
+            if verdict is False:
+                return False, []
+            if verdict:
+                matched.append(f"дозировка {dose.op} {dose.value:g} {dose.unit}")
+        return True, matched
+
+
+@dataclass(frozen=True)
+class ClusterResolution:
+    """Итог разбора кластера: код (None — не разделить) и оставшиеся кандидаты."""
+    code: Optional[str]
+    candidates: Tuple[str, ...]
+    matched: Tuple[str, ...] = ()  # признаки, по которым выбран код
+
+    @property
+    def resolved(self) -> bool:
+        return self.code is not None
+
+    def note(self) -> str:
+        """Пояснение для reason."""
+        if self.resolved:
+            return f" Код {self.code} выбран внутри МНН-кластера по признакам из названия: {', '.join(self.matched)}."
+        return f" Внутри МНН-кластера не удалось выбрать между {', '.join(self.candidates)}."
+
+    def local_reason(self, inn: str) -> str:
+        """reason результата split-пайплайна, где код выбран локально (без вызова с деревом)."""
+        return (
+            f"МНН '{inn}' определён моделью без дерева категорий; код {self.code} "
+            f"выбран локально по МНН-кластеру" + (f": {', '.join(self.matched)}." if self.matched else ".")
+        )
+
+
+class ClusterResolver:
+    """
+    Выбор кода внутри МНН-кластера по правилам строк дерева.
+    Правила строк и решения по (МНН, признаки) кэшируются; кэш решений
+    ограничен max_entries (вытесняются самые старые записи).
+    """
+
+    def __init__(self, index: CategoryIndex, max_entries: int = 100_000) -> None:
+        self._index = index
+        self.max_entries = max_entries
+        self._rules: Dict[str, CategoryRule] = {}
+        self._cache: Dict[Tuple[str, SkuAttributes], ClusterResolution] = {}
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def rule(self, category: Category) -> CategoryRule:
+        rule = self._rules.get(category.code)
+        if rule is None:
+            rule = self._rules[category.code] = CategoryRule.from_category(category)
+        return rule
+
+    def resolve(self, inn: Optional[str], attrs: SkuAttributes) -> ClusterResolution:
+        key = (normalize_inn(inn), attrs)
+        resolution = self._cache.get(key)
+        if resolution is None:
+            resolution = self._resolve(self._index.cluster(inn), attrs)
+            if len(self._cache) >= self.max_entries:
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[key] = resolution
+        return resolution
+
+    def _resolve(self, categories: List[Category], attrs: SkuAttributes) -> ClusterResolution:
+        codes = tuple(cat.code for cat in categories)
+        if len(categories) <= 1:
+            return ClusterResolution(codes[0] if codes else None, codes)
+
+        kept: List[Tuple[str, List[str]]] = []
+        for cat in categories:
+            allowed, matched = self.rule(cat).match(attrs)
+            if allowed:
+                kept.append((cat.code, matched))
+        if not kept:
+            # Противоречат все строки — признаки ненадёжны
+            return ClusterResolution(None, codes)
+        if len(kept) == 1:
+            code, matched = kept[0]
+            return ClusterResolution(code, (code,), tuple(matched) or ("остальные коды кластера противоречат названию",))
+
+        kept.sort(key=lambda item: len(item[1]), reverse=True)
+        (best_code, best_matched), (_, runner_up) = kept[0], kept[1]
+        if len(best_matched) > len(runner_up):
+            return ClusterResolution(best_code, tuple(code for code, _ in kept), tuple(best_matched))
+        return ClusterResolution(None, tuple(code for code, _ in kept))
@@ -0,0 +1,43 @@
+# src/classifier/inn_index.py
+"""
+Индекс «нормализованное МНН -> категории с таким МНН-кластером».
+
+Раньше ClassifierService для каждого SKU проходил по всему списку категорий
+и заново разбирал строку inn_cluster. Индекс строится один раз на дерево
+категорий и даёт поиск за O(1).
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+from src.data_models import Category
+
+
+def normalize_inn(value: Optional[str]) -> str:
+    """Приводит МНН к виду для сравнения: trim + lower."""
+    if not value:
+        return ""
+    return str(value).strip().lower()
+
+
+def split_inn_cluster(cluster: Optional[str]) -> List[str]:
+    """
+    Разбирает значение «МНН-кластер» на варианты записи.
+    Поддерживаем конструкции вида "Римантадин/Rimantadine" и "Римантадин\\Rimantadine".
+    """
+    if not cluster:
+        return []
+    cluster_str = str(cluster).lower()
+    return [p.strip() for p in cluster_str.replace("\\", "/").split("/")]
+
+
+def build_inn_index(categories: List[Category]) -> Dict[str, List[Category]]:
+    """
+    Строит индекс: каждому варианту записи МНН — список категорий кластера
+    (в порядке исходного списка, без повторов).
+    """
+    index: Dict[str, List[Category]] = {}
+    for cat in categories:
+        for part in dict.fromkeys(split_inn_cluster(getattr(cat, "inn_cluster", None))):
+            index.setdefault(part, []).append(cat)
+    return index
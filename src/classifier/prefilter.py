@@ -0,0 +1,257 @@
+# src/classifier/prefilter.py
+"""
+Локальный предфильтр: нелекарственные товары и мусорные строки без вызова LLM.
+
+Заметная часть аптечного ассортимента — косметика, медизделия, гигиена,
+детское питание; ещё часть строк — мусор («UNKNOWN_SKU», «nan»). Промпт
+LLM рассчитан на лекарства, поэтому такие SKU разбираются локально:
+
+- мусорная строка (пусто, «nan», «UNKNOWN_SKU», нет ни одной буквы) —
+  карантин: needs_review, без кода и без вызова API;
+- нелекарственный товар — по ключевым словам групп (PrefilterGroup).
+  Если у группы задан code и он есть в дереве — код ставится сразу,
+  иначе строка уходит на ручную разметку (needs_review) без вызова API.
+
+Все ключевые слова групп и МНН из дерева собраны в один автомат
+Ахо–Корасик (KeywordAutomaton): название просматривается за один проход
+независимо от числа слов. Совпавшее МНН или дозировка в мг/мкг/МЕ/ЕД
+означают лекарство — такие SKU идут в LLM как раньше («крем ацикловир 5%»,
+«пластырь вольтарен»).
+
+Списки ключевых слов — DEFAULT_GROUPS или JSON из config.prefilter.keywords_path:
+{"cosmetics": {"label": "косметика", "code": null, "keywords": ["шампун", ...]}, ...}.
+Ключевые слова — основы в нижнем регистре, совпадают с начала слова.
+"""
+from __future__ import annotations
+
+import json
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Generic, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from src.classifier.attributes import attribute_extractor, normalize_sku_name
+from src.classifier.category_index import CategoryIndex
+from src.config import PrefilterConfig, config
+from src.data_models import ClassificationResult
+
+T = TypeVar("T")
+
+# Названия, которые приходят из 1С/Excel вместо пустого значения
+JUNK_NAMES = {"", "nan", "none", "null", "unknown_sku", "н/д", "-"}
+_HAS_LETTER = re.compile(r"[a-zа-я]")
+# Единицы дозировки, по которым SKU точно считается лекарством
+DRUG_DOSE_UNITS = {"мг", "мкг", "ме", "тыс. ме", "ед"}
+
+
+class KeywordAutomaton(Generic[T]):
+    """
+    Автомат Ахо–Корасик: поиск всех ключевых слов в строке за один проход.
+    Совпадение засчитывается только с начала слова (слева не буква).
+    """
+
+    def __init__(self) -> None:
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, T]]] = [[]]  # (длина слова, payload)
+        self._built = True
+
+    def add(self, keyword: str, payload: T) -> None:
+        node = 0
+        for char in keyword:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(keyword), payload))
+        self._built = False
+
+    def build(self) -> None:
+        """Суффиксные ссылки обходом в ширину; выходы наследуются по ним."""
+        queue = deque(self._goto[0].values())
+        for child in queue:
+            self._fail[child] = 0
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+                queue.append(child)
+        self._built = True
+
+    def search(self, text: str) -> Iterator[Tuple[int, int, T]]:
+        """(начало, конец, payload) всех совпадений с начала слова."""
+        if not self._built:
+            self.build()
+        node = 0
+        for end, char in enumerate(text, start=1):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length, payload in self._out[node]:
+                start = end - length
+                if start == 0 or not text[start - 1].isalpha():
+                    yield start, end, payload
+
+
+@dataclass(frozen=True)
+class PrefilterGroup:
+    """Группа нелекарственных товаров: подпись, код дерева (если есть) и ключевые слова."""
+    label: str
+    keywords: Tuple[str, ...]
+    code: Optional[str] = None
+
+
+DEFAULT_GROUPS: Dict[str, PrefilterGroup] = {
+    "cosmetics": PrefilterGroup("косметика", (
+        "шампун", "бальзам для волос", "кондиционер для волос", "маска для волос", "маска для лица",
+        "тушь", "помад", "гель для душа", "пенка для умывания", "мицеллярн", "тоник для лица",
+        "крем для лица", "крем для рук", "крем для ног", "крем для тела", "крем для век",
+        "дезодорант", "антиперспирант", "лосьон для тела", "скраб", "сыворотка для лица", "солнцезащитн",
+    )),
+    "devices": PrefilterGroup("медицинские изделия", (
+        "тонометр", "термометр", "глюкометр", "тест-полоск", "тест полоск", "небулайзер",
+        "ингалятор компрессорн", "шприц", "бинт", "вата", "ватн", "перчатк", "маска медицинск",
+        "катетер", "бахил", "презерватив", "тест на беременность", "пипетк", "грелк", "бандаж",
+        "ортез", "компрессионн", "контактные линз", "контейнер для линз", "лейкопластыр",
+    )),
+    "hygiene": PrefilterGroup("гигиена", (
+        "зубная паст", "з/паст", "зубная щетк", "з/щетк", "зубная нить", "ополаскиватель для полости рта",
+        "подгузник", "пеленк", "прокладк", "тампон", "салфетки влажн", "влажные салфетк",
+        "ватные палоч", "мыло", "гель для интимн", "трусы впитыв",
+    )),
+    "baby_food": PrefilterGroup("детское питание", (
+        "молочная смесь", "смесь молочн", "детская смесь", "детское питание", "каша", "пюре",
+        "нутрилон", "nutrilon", "фрутоняня", "агуша", "хипп", "hipp", "симилак", "similac", "малютка",
+    )),
+}
+
+
+@dataclass(frozen=True)
+class PrefilterDecision:
+    """Решение предфильтра: карантин мусорной строки или нелекарственный товар."""
+    kind: str  # "junk" | "non_drug"
+    group: Optional[str] = None
+    label: Optional[str] = None
+    code: Optional[str] = None  # код дерева; None — на ручную разметку
+    keywords: Tuple[str, ...] = ()
+
+    def to_result(self, sku_name: str, confidence: float) -> ClassificationResult:
+        if self.kind == "junk":
+            reason = "Карантин: в строке нет названия товара (пусто, «nan» или служебное значение). LLM не вызывалась."
+            confidence = 0.0
+        elif self.code is not None:
+            reason = (
+                f"Нелекарственный товар ({self.label}): ключевые слова {', '.join(self.keywords)}. "
+                f"Категория выбрана локально, LLM не вызывалась."
+            )
+        else:
+            reason = (
+                f"Нелекарственный товар ({self.label}): ключевые слова {', '.join(self.keywords)}. "
+                f"Промпт LLM рассчитан на лекарства — строка отправлена на ручную разметку без вызова LLM."
+            )
+        return ClassificationResult(
+            sku_name=sku_name,
+            category_code=self.code,
+            category_path=None,
+            inn=None,
+            dosage_form=None,
+            age_restriction=None,
+            otc=None,
+            confidence=confidence,
+            needs_review=self.code is None,
+            reason=reason,
+            raw_llm_response={"_prefilter": {"kind": self.kind, "group": self.group, "keywords": list(self.keywords)}},
+        )
+
+
+def prefilter_kind(result: ClassificationResult) -> Optional[str]:
+    """"junk" | "non_drug", если результат выдал предфильтр (без вызова LLM), иначе None."""
+    raw = result.raw_llm_response
+    marker = raw.get("_prefilter") if isinstance(raw, dict) else None
+    return marker.get("kind") if isinstance(marker, dict) else None
+
+
+def load_groups(path: str) -> Dict[str, PrefilterGroup]:
+    """Группы из JSON-файла (формат — в docstring модуля)."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {
+        name: PrefilterGroup(
+            label=item.get("label") or name,
+            keywords=tuple(item.get("keywords") or ()),
+            code=item.get("code"),
+        )
+        for name, item in data.items()
+    }
+
+
+_DRUG = object()  # payload автомата для МНН из дерева
+
+
+class Prefilter:
+    """
+    Предфильтр на одном автомате: ключевые слова групп + МНН из дерева.
+    Код группы, которого нет в дереве, не используется (строка уходит на ревью).
+    """
+
+    def __init__(
+        self,
+        index: CategoryIndex,
+        groups: Optional[Dict[str, PrefilterGroup]] = None,
+        confidence: float = 0.85,
+    ) -> None:
+        self.groups = dict(DEFAULT_GROUPS if groups is None else groups)
+        self.confidence = confidence
+        self._codes = {name: g.code if g.code in index else None for name, g in self.groups.items()}
+        self._automaton: KeywordAutomaton[object] = KeywordAutomaton()
+        for name, group in self.groups.items():
+            for keyword in group.keywords:
+                self._automaton.add(normalize_sku_name(keyword) or keyword, name)
+        for inn in index.inn_index:
+            if inn:
+                self._automaton.add(inn, _DRUG)
+        self._automaton.build()
+
+    @classmethod
+    def from_config(cls, index: CategoryIndex, prefilter_config: Optional[PrefilterConfig] = None) -> "Prefilter":
+        conf = prefilter_config or config.prefilter
+        groups = load_groups(conf.keywords_path) if conf.keywords_path else None
+        return cls(index, groups, conf.local_confidence)
+
+    def check(self, name: Optional[str]) -> Optional[PrefilterDecision]:
+        """Решение для одного названия; None — обычный путь через LLM."""
+        text = normalize_sku_name(name)
+        if text in JUNK_NAMES or not _HAS_LETTER.search(text):
+            return PrefilterDecision("junk")
+
+        hits: Dict[str, List[str]] = {}
+        for start, end, payload in self._automaton.search(text):
+            if payload is _DRUG:
+                return None
+            hits.setdefault(payload, []).append(text[start:end].strip())  # type: ignore[arg-type]
+        if not hits:
+            return None
+        if attribute_extractor.extract(name).dose_unit in DRUG_DOSE_UNITS:
+            return None
+
+        # Больше совпадений — надёжнее; при равенстве — порядок групп в конфиге
+        order = list(self.groups)
+        group = max(hits, key=lambda g: (len(hits[g]), -order.index(g)))
+        return PrefilterDecision(
+            "non_drug",
+            group=group,
+            label=self.groups[group].label,
+            code=self._codes[group],
+            keywords=tuple(dict.fromkeys(hits[group])),
+        )
+
+    def check_many(self, names: Iterable[Optional[str]]) -> List[Optional[PrefilterDecision]]:
+        return [self.check(name) for name in names]
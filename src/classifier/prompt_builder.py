@@ -2,8 +2,9 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional
 
+from src.classifier.response_schema import COMPACT_FEW_SHOT_EXAMPLES, COMPACT_OUTPUT_FORMAT
 from src.data_models import SKU, Category
 
 
@@ -115,6 +116,22 @@ PROMPT_OUTPUT_FORMAT = r"""
 """.strip()
 
 
+# Первый вызов split-пайплайна (config.llm.pipeline = "split"): только признаки препарата,
+# без дерева категорий. Код категории подбирается локально по МНН-кластеру.
+EXTRACT_SYSTEM_INSTRUCTIONS = """
+Ты — эксперт по фармацевтическим препаратам и аптечным товарам.
+По названию товара (SKU) определи МНН (действующее вещество), лекарственную форму,
+возрастные ограничения и отпуск без рецепта (OTC). Не выдумывай данные: если МНН
+определить нельзя (не лекарство, комбинированный или неизвестный товар) — inn = null
+и низкий confidence. МНН пиши по-русски, в именительном падеже, без бренда и дозировки.
+""".strip()
+
+EXTRACT_OUTPUT_FORMAT = r"""
+Верни ОДИН объект JSON (без текста вокруг):
+{"inn": string или null, "dosage_form": string или null, "age_restriction": string или null, "otc": true/false/null, "confidence": number от 0 до 1}
+""".strip()
+
+
 FEW_SHOT_EXAMPLES = """
 Примеры разбора SKU и выбора категории.
 Во всех примерах структура JSON-ответа строго совпадает с требуемой схемой.
@@ -209,8 +226,13 @@ SKU:
 class PromptBuilder:
     """
     Строитель промпта для классификации одного SKU.
+
+    compact — компактная схема ответа (src/classifier/response_schema.py):
+    короткие ключи и код причины вместо развёрнутого reason.
     """
 
+    compact: bool = False
+
     def build_categories_block(self, categories: List[Category]) -> str:
         """
         Формирует текстовый блок со списком категорий.
@@ -232,25 +254,44 @@ class PromptBuilder:
             lines.append(f"- {cat.code}: {path_str}")
         return "\n".join(lines)
 
-    def build_user_prompt(self, sku: SKU, categories: List[Category]) -> str:
+    def build_user_prompt(
+        self,
+        sku: SKU,
+        categories: List[Category],
+        categories_block: Optional[str] = None,
+        attribute_hint: Optional[str] = None,
+    ) -> str:
         """
         Основной текст запроса (user message) к модели.
+
+        categories_block — заранее отрендеренный блок категорий (из снапшота
+        или кэша клиента); если не передан, строится из categories.
+        attribute_hint — признаки, извлечённые из названия локально
+        (SkuAttributes.prompt_hint); пустая строка или None — без подсказки.
         """
-        categories_block = self.build_categories_block(categories)
+        if categories_block is None:
+            categories_block = self.build_categories_block(categories)
+        output_format = COMPACT_OUTPUT_FORMAT if self.compact else PROMPT_OUTPUT_FORMAT
+        examples = COMPACT_FEW_SHOT_EXAMPLES if self.compact else FEW_SHOT_EXAMPLES
+        hint_line = (
+            f"\nПризнаки из названия (извлечены автоматически, сверь с описанием препарата): {attribute_hint}\n"
+            if attribute_hint
+            else ""
+        )
 
         prompt = f"""
 Товар (SKU): "{sku.name}"
-
+{hint_line}
 Сначала внимательно изучи дерево категорий и используй поле «МНН-кластер» для выбора.
 
 {categories_block}
 
 Структура JSON-ответа, который ты ДОЛЖЕН вернуть:
-{PROMPT_OUTPUT_FORMAT}
+{output_format}
 
 Примеры правильного разбора SKU и выбора категории (few-shot):
 
-{FEW_SHOT_EXAMPLES}
+{examples}
 
 Теперь обработай следующий SKU по тем же правилам и верни только один JSON-объект указанной структуры (без текста вокруг):
 
@@ -259,3 +300,16 @@ SKU:
 """.strip()
 
         return prompt
+
+    def build_extract_prompt(self, sku: SKU, attribute_hint: Optional[str] = None) -> str:
+        """
+        Короткий запрос первого вызова split-пайплайна: МНН, форма, возраст, OTC
+        без дерева категорий (пара сотен токенов вместо десятков тысяч).
+        """
+        hint_line = f"Признаки из названия (извлечены автоматически): {attribute_hint}\n" if attribute_hint else ""
+        return f"""
+{EXTRACT_OUTPUT_FORMAT}
+
+{hint_line}SKU:
+{sku.name}
+""".strip()
@@ -0,0 +1,181 @@
+# src/classifier/rescoring.py
+"""
+Пересчёт needs_review / confidence по сохранённым ответам LLM без новых вызовов API.
+
+Берёт последние ответы из архива (src/io/response_archive.py) и повторяет
+постобработку ClassifierService (_should_mark_needs_review +
+_apply_multi_cluster_safety с выбором кода ClusterResolver) векторно в pandas для всей таблицы сразу.
+Нужен, когда меняются пороги ClassifierConfig или правила безопасности:
+миллионы строк пересчитываются за секунды вместо полной переклассификации.
+
+Первый вызов split-пайплайна архивируется без кода (kind="extract"). Если он
+последний для SKU, код выбирается заново локально по МНН-кластеру, как в
+ProviderLLMClient._classify_split; если выбрать не удаётся, строка не пересчитывается.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.classifier.attributes import attribute_extractor
+from src.classifier.category_index import CategoryIndex
+from src.classifier.classifier_service import multi_cluster_note
+from src.classifier.cluster_resolver import ClusterResolver
+from src.config import ClassifierConfig, config
+from src.data_models import Category
+
+# Поля ответа LLM, которые нужны для пересчёта и записи в product_links
+RESPONSE_FIELDS = [
+    "category_code",
+    "category_path",
+    "inn",
+    "dosage_form",
+    "age_restriction",
+    "otc",
+    "confidence",
+    "needs_review_hint",
+    "reason",
+]
+
+
+def responses_to_frame(records: Iterable[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Строит DataFrame последних успешных ответов по каждому product_link_id
+    из потока записей архива (ResponseArchive.iter_records()).
+    """
+    rows: Dict[int, Dict[str, Any]] = {}
+    for record in records:
+        product_link_id = record.get("product_link_id")
+        response = record.get("response")
+        if product_link_id is None or not isinstance(response, dict):
+            continue
+        row = {field: response.get(field) for field in RESPONSE_FIELDS}
+        row["product_link_id"] = int(product_link_id)
+        row["sku_name"] = record.get("sku_name")
+        row["kind"] = record.get("kind") or "classify"
+        row["started_at"] = record.get("started_at")
+        # Записи идут от старых к новым внутри сегмента; на всякий случай сравниваем время
+        prev = rows.get(row["product_link_id"])
+        if prev is None or (row["started_at"] or "") >= (prev["started_at"] or ""):
+            rows[row["product_link_id"]] = row
+
+    columns = ["product_link_id", "sku_name", "kind", "started_at", *RESPONSE_FIELDS]
+    return pd.DataFrame(list(rows.values()), columns=columns)
+
+
+def _normalized_inn(series: pd.Series) -> pd.Series:
+    return series.where(series.notna(), "").astype(str).str.strip().str.lower()
+
+
+def rescore_frame(
+    df: pd.DataFrame,
+    categories: List[Category],
+    classifier_config: Optional[ClassifierConfig] = None,
+) -> pd.DataFrame:
+    """
+    Векторная постобработка ответов LLM с текущими порогами и деревом категорий.
+
+    Вход — DataFrame в формате responses_to_frame. Выход — колонки product_links:
+    id, category_code, category_path, inn, dosage_form, age_restriction, otc,
+    confidence, needs_review, classification_reason.
+    Логика повторяет ClassifierService.classify_product. Строки kind="extract",
+    для которых код локально не выбирается, в выход не попадают.
+    """
+    conf = classifier_config or config.classifier
+
+    # confidence: float с защитой от мусора и ограничением [0, 1] (как в ProviderLLMClient)
+    confidence = pd.to_numeric(df["confidence"], errors="coerce").fillna(0.0).clip(0.0, 1.0)
+    hint = df["needs_review_hint"].where(df["needs_review_hint"].notna(), False).map(bool)
+
+    # 1) пороги; 2) hint модели
+    needs_review = hint | (confidence < conf.hard_reject_threshold) | (confidence < conf.confidence_threshold)
+
+    # 3) multi-cluster safety: размер МНН-кластера найденного МНН
+    index = CategoryIndex(categories)
+    cluster_sizes = {inn: len(cats) for inn, cats in index.inn_index.items()}
+    norm_inn = _normalized_inn(df["inn"])
+    matched = norm_inn.map(cluster_sizes).fillna(0).astype(int)
+    matched = matched.where(norm_inn != "", 0)
+    multi = matched > 1
+
+    category_code = df["category_code"].copy()
+    reason = df["reason"].where(df["reason"].notna(), "").astype(str)
+    resolver = ClusterResolver(index)
+
+    # 3-split) ответ первого вызова split-пайплайна без кода: код — по МНН-кластеру, как в клиенте
+    extract = df["kind"].eq("extract") if "kind" in df else pd.Series(False, index=df.index)
+    unresolved = extract.copy()
+    if extract.any():
+        idx = extract[extract].index
+        attributes = attribute_extractor.extract_many(df.loc[idx, "sku_name"])
+        for i, inn, attrs in zip(idx, df.loc[idx, "inn"], attributes):
+            if not isinstance(inn, str) or not inn.strip():
+                continue
+            resolution = resolver.resolve(inn, attrs)
+            if resolution.resolved:
+                unresolved.loc[i] = False
+                category_code.loc[i] = resolution.code
+                reason.loc[i] = resolution.local_reason(inn)
+        multi = multi & ~extract  # выбранный правилами код ClassifierService не эскалирует
+
+    # 3a) код внутри кластера, который однозначно выбирают правила строк дерева
+    if multi.any() and conf.use_sku_attributes and conf.resolve_clusters_locally and "sku_name" in df:
+        idx = multi[multi].index
+        attributes = attribute_extractor.extract_many(df.loc[idx, "sku_name"])
+        for i, inn, attrs in zip(idx, df.loc[idx, "inn"], attributes):
+            resolution = resolver.resolve(inn, attrs)
+            if not resolution.resolved:
+                continue
+            multi.loc[i] = False
+            if resolution.code != category_code.loc[i]:
+                category_code.loc[i] = resolution.code
+                note = resolution.note()
+                if not reason.loc[i]:
+                    reason.loc[i] = note.lstrip()
+                elif note.strip() not in reason.loc[i]:
+                    reason.loc[i] = reason.loc[i].rstrip() + note
+
+    needs_review = needs_review | multi
+    cap = conf.multi_cluster_confidence_cap
+    confidence = confidence.where(~(multi & (confidence > cap)), cap)
+
+    if multi.any():
+        idx = multi[multi].index
+        notes = pd.Series(
+            [multi_cluster_note(inn, n) for inn, n in zip(df.loc[idx, "inn"], matched.loc[idx])],
+            index=idx,
+        )
+        current = reason.loc[idx]
+        already = pd.Series([n in r for r, n in zip(current, notes)], index=idx, dtype=bool)
+        appended = np.where(current != "", current.str.rstrip() + notes, notes.str.lstrip())
+        reason.loc[idx] = np.where(already, current, appended)
+
+    # 4) путь категории — из дерева по коду, как в ClassifierService
+    category_path = category_code.map(index.path)
+    category_path = category_path.where(category_path.notna(), df["category_path"])
+
+    rescored = pd.DataFrame(
+        {
+            "id": df["product_link_id"].astype(int),
+            "category_code": category_code,
+            "category_path": category_path,
+            "inn": df["inn"],
+            "dosage_form": df["dosage_form"],
+            "age_restriction": df["age_restriction"],
+            "otc": df["otc"],
+            "confidence": confidence.astype(float),
+            "needs_review": needs_review.astype(bool),
+            "classification_reason": reason,
+        }
+    )
+    return rescored[~unresolved]
+
+
+def frame_to_update_rows(rescored: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Переводит результат rescore_frame в строки для bulk_update_by_pk (NaN -> None).
+    """
+    clean = rescored.astype(object).where(rescored.notna(), None)
+    return clean.to_dict(orient="records")
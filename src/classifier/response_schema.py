@@ -0,0 +1,96 @@
+# src/classifier/response_schema.py
+"""
+Компактная схема ответа LLM и поля, которые считаются локально.
+
+Время генерации растёт с числом выходных токенов, а полная схема просит
+у модели длинные ключи, category_path и развёрнутый reason на каждый SKU.
+В компактном режиме (config.llm.response_schema = "compact"):
+- ключи однобуквенные (COMPACT_KEYS);
+- reason — код причины из REASON_CODES плюс короткая заметка (например,
+  какие коды кластера сравнивались);
+- category_path модель не генерирует: он берётся из дерева по коду
+  (CategoryIndex.path), как и в полной схеме, если код есть в дереве.
+
+decode_compact переводит компактный ответ в ключи полной схемы, дальше
+он проходит ту же проверку и сборку ClassificationResult.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+RESPONSE_SCHEMAS = ("full", "compact")
+
+# Короткий ключ -> поле полной схемы
+COMPACT_KEYS = {
+    "c": "category_code",
+    "i": "inn",
+    "f": "dosage_form",
+    "a": "age_restriction",
+    "o": "otc",
+    "p": "confidence",
+    "r": "needs_review_hint",
+    "w": "reason_code",
+    "n": "reason_note",
+}
+
+# Код причины -> текст для reason (то, что раньше модель писала сама)
+REASON_CODES = {
+    "exact": "МНН, форма и показания явно совпадают со строкой МНН-кластера",
+    "cluster_ambiguous": "в МНН-кластере несколько подходящих кодов, данных для выбора недостаточно",
+    "no_cluster": "в дереве нет кластера с этим МНН, категория выбрана по общим признакам",
+    "inn_unknown": "МНН не удалось определить надёжно",
+    "not_drug": "товар не является лекарственным препаратом",
+    "insufficient": "недостаточно данных о товаре",
+}
+
+REASON_NOTE_MAX_CHARS = 80
+
+COMPACT_OUTPUT_FORMAT = (
+    """
+Верни ОДИН объект JSON СТРОГО следующей структуры (короткие ключи, без пробелов и текста вокруг):
+
+{"c":код категории или null,"i":МНН или null,"f":лекарственная форма или null,"a":возраст или null,"o":true/false/null (OTC),"p":уверенность 0..1,"r":true/false (нужна проверка),"w":код причины,"n":заметка}
+
+Код причины w — строго один из: """
+    + ", ".join(f"{code} ({text})" for code, text in REASON_CODES.items())
+    + f""".
+Заметка n — не длиннее {REASON_NOTE_MAX_CHARS} символов: только то, чего нет в коде причины
+(например, сравниваемые коды «A39_01 и A39_02»), иначе пустая строка.
+Путь категории не возвращай — он известен по коду. Никакого текста до или после JSON.
+"""
+).strip()
+
+COMPACT_FEW_SHOT_EXAMPLES = """
+Примеры (SKU -> JSON-ответ):
+
+ВАЛТРЕКС ТАБЛ. П/ПЛЕН/ОБ. 500МГ №10
+{"c":"LS_ORVI_MNN_A39_02","i":"валацикловир","f":"таблетки, покрытые пленочной оболочкой","a":"взрослые","o":false,"p":0.9,"r":false,"w":"exact","n":""}
+
+ВАЛАЦИКЛОВИР ТАБЛ. П/ПЛЕН/ОБ. 500МГ №10
+{"c":"LS_ORVI_MNN_A39_02","i":"валацикловир","f":"таблетки, покрытые пленочной оболочкой","a":"взрослые","o":false,"p":0.6,"r":true,"w":"cluster_ambiguous","n":"A39_01 и A39_02"}
+
+ПАНТОПРАЗОЛ ТАБЛ. КИШ-РАСТ. П/ПЛЕН/ОБ. 20МГ №28 ИНТЕРФАРМА
+{"c":"LS_GIT_MNN_C03_02","i":"пантопразол","f":"таблетки кишечнорастворимые","a":"взрослые","o":false,"p":0.9,"r":false,"w":"exact","n":""}
+""".strip()
+
+
+def reason_text(code: Optional[str], note: Optional[str] = None) -> str:
+    """reason из кода причины и заметки; неизвестный код оставляем как есть."""
+    text = REASON_CODES.get(code or "", code or "")
+    note = (note or "").strip()[:REASON_NOTE_MAX_CHARS]
+    if note:
+        return f"{text}: {note}" if text else note
+    return text
+
+
+def decode_compact(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Компактный ответ -> ключи полной схемы. Длинные ключи (модель ответила
+    по полной схеме) пропускаются как есть, так что декодер безопасен для обоих форматов.
+    """
+    data: Dict[str, Any] = {}
+    for key, value in raw.items():
+        data[COMPACT_KEYS.get(key, key)] = value
+    if "reason" not in data and ("reason_code" in data or "reason_note" in data):
+        data["reason"] = reason_text(data.get("reason_code"), data.pop("reason_note", None))
+    return data
@@ -0,0 +1,374 @@
+# src/classifier/validation.py
+"""
+Локальная проверка и починка ответа LLM до того, как тратить повторный вызов.
+
+Порядок:
+1) parse_llm_json — JSON из content: как есть, затем без ```-ограждений,
+   по внешним фигурным скобкам, без висячих запятых и «умных» кавычек,
+   с Python-литералами True/False/None и с дозакрытием обрезанного ответа.
+2) coerce_fields — типы полей: confidence "0,85" / "85%" / 85 -> 0.85,
+   otc "да"/"Rx" -> bool, пустые строки и "null" -> None, вложенный объект
+   {"result": {...}} или список из одного объекта -> сам объект.
+3) ResponseValidator.validate — смысл по дереву категорий:
+   - category_code, которого нет в дереве, подтягивается к валидному:
+     регистр/разделители, однозначный «хвост» кода (A39_02), единственный
+     код МНН-кластера, ближайший по написанию код внутри кластера или
+     во всём дереве (difflib);
+   - МНН, которого нет ни в одном кластере, подтягивается к ближайшему
+     варианту записи из индекса (опечатки);
+   - код из чужого МНН-кластера при известном МНН — проблема.
+
+Каждое исправление записывается в fixes, неустранимое — в problems.
+Неуверенные исправления (по похожести) ставят needs_review_hint.
+Если остались проблемы, требующие повторного вызова (needs_followup),
+клиент задаёт модели уточняющий вопрос (followup_prompt) со списком
+допустимых кодов.
+"""
+from __future__ import annotations
+
+import difflib
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.classifier.inn_index import build_inn_index, normalize_inn
+from src.config import ValidationConfig, config
+from src.data_models import Category
+
+STRING_FIELDS = ("inn", "dosage_form", "age_restriction", "category_code", "category_path")
+FIELD_ALIASES = {"needs_review": "needs_review_hint", "code": "category_code", "mnn": "inn"}
+NULL_STRINGS = {"", "null", "none", "nan", "n/a", "-", "нет данных"}
+TRUE_STRINGS = {"true", "1", "yes", "да", "otc", "безрецептурный", "без рецепта"}
+FALSE_STRINGS = {"false", "0", "no", "нет", "rx", "рецептурный", "по рецепту"}
+
+# Проблемы, ради которых стоит повторно спросить модель
+FOLLOWUP_PROBLEMS = ("invalid_json", "unknown_category_code", "code_outside_inn_cluster")
+
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_PY_LITERALS = (("True", "true"), ("False", "false"), ("None", "null"))
+
+
+# ---------- JSON ----------
+
+def _close_truncated(text: str) -> str:
+    """Дозакрывает строку и скобки обрезанного JSON (ответ упёрся в лимит токенов)."""
+    stack: List[str] = []
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    tail = '"' if in_string else ""
+    return _TRAILING_COMMA_RE.sub(r"\1", (text + tail).rstrip().rstrip(",")) + "".join(reversed(stack))
+
+
+def parse_llm_json(content: Optional[str]) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    JSON-объект из content модели с локальными починками.
+    Починки применяются накопительно, пока разбор не удастся.
+    Возвращает (объект, список применённых починок); ValueError — не удалось.
+    """
+    if content is None:
+        raise ValueError("empty content")
+    text = content.strip()
+
+    # (имя починки, функция текст -> текст); каждая следующая — поверх предыдущих
+    def unfence(t: str) -> str:
+        return _FENCE_RE.sub("", t)
+
+    def cut_object(t: str) -> str:
+        start, end = t.find("{"), t.rfind("}")
+        if start < 0:
+            return t
+        return t[start:end + 1] if end > start else t[start:]
+
+    def clean_punctuation(t: str) -> str:
+        t = t.replace("\u201c", '"').replace("\u201d", '"')
+        return _TRAILING_COMMA_RE.sub(r"\1", t)
+
+    def json_literals(t: str) -> str:
+        for py, js in _PY_LITERALS:
+            t = re.sub(rf"(?<![\w\"]){py}(?![\w\"])", js, t)
+        return t
+
+    repairs = (
+        ("code_fence", unfence),
+        ("surrounding_text", cut_object),
+        ("punctuation", clean_punctuation),
+        ("python_literals", json_literals),
+        ("truncated", _close_truncated),
+    )
+
+    fixes: List[str] = []
+    value: Any = None
+    for name, repair in ((None, None),) + repairs:
+        if repair is not None:
+            repaired = repair(text)
+            if repaired == text:
+                continue
+            text = repaired
+            fixes.append(f"json:{name}")
+        try:
+            value = json.loads(text)
+            break
+        except json.JSONDecodeError:
+            continue
+    else:
+        raise ValueError("content is not valid JSON")
+
+    if isinstance(value, list) and len(value) == 1 and isinstance(value[0], dict):
+        value = value[0]
+        fixes.append("json:single_item_list")
+    if not isinstance(value, dict):
+        raise ValueError(f"expected a JSON object, got {type(value).__name__}")
+    return value, fixes
+
+
+# ---------- типы полей ----------
+
+def _to_bool(value: Any) -> Optional[bool]:
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in TRUE_STRINGS:
+        return True
+    if text in FALSE_STRINGS:
+        return False
+    return None
+
+
+def _to_confidence(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        text = value.strip().replace(",", ".")
+        percent = text.endswith("%")
+        try:
+            number = float(text.rstrip("%").strip())
+        except ValueError:
+            return None
+        return number / 100 if percent else (number / 100 if 1 < number <= 100 else number)
+    if isinstance(value, (int, float)):
+        return value / 100 if 1 < value <= 100 else float(value)
+    return None
+
+
+def coerce_fields(raw: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """Приводит поля ответа к типам схемы. Возвращает (новый dict, fixes)."""
+    fixes: List[str] = []
+    data = dict(raw)
+
+    # {"result": {...}} — модель обернула ответ
+    if "category_code" not in data and len(data) == 1:
+        (key, inner), = data.items()
+        if isinstance(inner, dict):
+            data = dict(inner)
+            fixes.append(f"unwrapped:{key}")
+
+    for alias, name in FIELD_ALIASES.items():
+        if alias in data and name not in data:
+            data[name] = data.pop(alias)
+            fixes.append(f"renamed:{alias}")
+
+    for name in STRING_FIELDS:
+        value = data.get(name)
+        if value is None:
+            continue
+        text = str(value).strip()
+        new = None if text.lower() in NULL_STRINGS else text
+        if new != value:
+            data[name] = new
+            fixes.append(f"coerced:{name}")
+
+    for name in ("otc", "needs_review_hint"):
+        if name in data and not (data[name] is None or isinstance(data[name], bool)):
+            data[name] = _to_bool(data[name])
+            fixes.append(f"coerced:{name}")
+
+    if "confidence" in data:
+        value = data["confidence"]
+        number = _to_confidence(value)
+        if number is None or number != value:
+            data["confidence"] = min(max(number or 0.0, 0.0), 1.0)
+            fixes.append("coerced:confidence")
+
+    if "reason" in data and not isinstance(data["reason"], str):
+        data["reason"] = "" if data["reason"] is None else str(data["reason"])
+    return data, fixes
+
+
+# ---------- смысл ----------
+
+@dataclass
+class ValidationReport:
+    """Результат проверки: починенный ответ, что исправлено и что осталось."""
+    data: Dict[str, Any]
+    fixes: List[str] = field(default_factory=list)
+    problems: List[str] = field(default_factory=list)
+    candidates: List[str] = field(default_factory=list)  # допустимые коды для уточняющего вопроса
+
+    @property
+    def needs_followup(self) -> bool:
+        return any(p.split(":", 1)[0] in FOLLOWUP_PROBLEMS for p in self.problems)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"fixes": list(self.fixes), "problems": list(self.problems)}
+
+
+def _code_key(code: str) -> str:
+    return re.sub(r"[\s\-.]+", "_", code.strip().upper())
+
+
+class ResponseValidator:
+    """
+    Проверка ответа LLM по дереву категорий. Строится один раз на дерево
+    (индексы кодов и МНН), validate вызывается на каждый ответ.
+    """
+
+    def __init__(
+        self,
+        categories: List[Category],
+        inn_index: Optional[Dict[str, List[Category]]] = None,
+        validation_config: Optional[ValidationConfig] = None,
+    ) -> None:
+        self._conf = validation_config or config.validation
+        self._codes: Dict[str, str] = {c.code: c.code for c in categories}
+        self._by_key: Dict[str, str] = {_code_key(c.code): c.code for c in categories}
+        self._inn_index = inn_index if inn_index is not None else build_inn_index(categories)
+
+    @classmethod
+    def from_snapshot(cls, snapshot) -> "ResponseValidator":
+        return cls(snapshot.categories, snapshot.index.inn_index)
+
+    def validate_content(
+        self,
+        content: Optional[str],
+        decode: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+    ) -> ValidationReport:
+        """
+        parse_llm_json + validate; невалидный JSON — проблема invalid_json.
+        decode переводит разобранный объект в ключи полной схемы (компактный ответ).
+        """
+        try:
+            raw, json_fixes = parse_llm_json(content)
+        except ValueError as exc:
+            return ValidationReport(data={}, problems=[f"invalid_json: {exc}"])
+        if decode is not None:
+            raw = decode(raw)
+        report = self.validate(raw)
+        report.fixes[:0] = json_fixes
+        return report
+
+    def validate(self, raw: Dict[str, Any]) -> ValidationReport:
+        data, fixes = coerce_fields(raw)
+        report = ValidationReport(data=data, fixes=fixes)
+        if not self._codes:
+            return report  # дерево неизвестно — проверять не по чему
+
+        inn_key = self._check_inn(report)
+        self._check_code(report, inn_key)
+        return report
+
+    def _cluster_codes(self, inn_key: Optional[str]) -> List[str]:
+        return [c.code for c in self._inn_index.get(inn_key, [])] if inn_key else []
+
+    def _check_inn(self, report: ValidationReport) -> Optional[str]:
+        inn = report.data.get("inn")
+        key = normalize_inn(inn)
+        if not key:
+            return None
+        if key in self._inn_index:
+            return key
+        match = difflib.get_close_matches(key, list(self._inn_index), n=1, cutoff=self._conf.similarity_cutoff)
+        if match:
+            report.data["inn"] = match[0]
+            report.fixes.append(f"snapped:inn {inn!r} -> {match[0]!r}")
+            return match[0]
+        # МНН вне дерева — не ошибка модели (кластера может не быть), но отмечаем
+        report.problems.append(f"unknown_inn: {inn}")
+        return None
+
+    def _check_code(self, report: ValidationReport, inn_key: Optional[str]) -> None:
+        code = report.data.get("category_code")
+        cluster = self._cluster_codes(inn_key)
+        if code is None:
+            return
+        if code in self._codes:
+            if cluster and code not in cluster:
+                report.problems.append(f"code_outside_inn_cluster: {code} not in cluster of {inn_key!r}")
+                report.candidates = cluster[: self._conf.max_candidates]
+            return
+
+        snapped, confident = self._snap_code(code, cluster)
+        if snapped is None:
+            report.problems.append(f"unknown_category_code: {code}")
+            report.candidates = (cluster or self._similar_codes(code))[: self._conf.max_candidates]
+            return
+        report.data["category_code"] = snapped
+        report.fixes.append(f"snapped:category_code {code!r} -> {snapped!r}")
+        if not confident:
+            report.data["needs_review_hint"] = True
+
+    def _snap_code(self, code: str, cluster: List[str]) -> Tuple[Optional[str], bool]:
+        """(код, уверенно ли) для кода вне дерева; (None, False) — не нашли."""
+        key = _code_key(code)
+        if key in self._by_key:
+            return self._by_key[key], True
+
+        # Модель вернула только «хвост» кода (A39_02) — берём, если он однозначен
+        scope = cluster or list(self._codes)
+        tails = [c for c in scope if _code_key(c).endswith("_" + key)]
+        if len(tails) == 1:
+            return tails[0], True
+
+        if len(cluster) == 1:
+            return cluster[0], False
+        pool = {_code_key(c): c for c in scope}
+        match = difflib.get_close_matches(key, list(pool), n=1, cutoff=self._conf.similarity_cutoff)
+        if match:
+            return pool[match[0]], False
+        return None, False
+
+    def _similar_codes(self, code: str) -> List[str]:
+        pool = {_code_key(c): c for c in self._codes}
+        matches = difflib.get_close_matches(_code_key(code), list(pool), n=self._conf.max_candidates, cutoff=0.5)
+        return [pool[m] for m in matches]
+
+
+def followup_prompt(report: ValidationReport) -> str:
+    """Уточняющий вопрос модели по неустранённым проблемам ответа."""
+    lines = ["Твой предыдущий ответ не прошёл проверку:"]
+    lines += [f"- {problem}" for problem in report.problems if problem.split(":", 1)[0] in FOLLOWUP_PROBLEMS]
+    if report.candidates:
+        lines.append("category_code выбери строго из списка: " + ", ".join(report.candidates) + ".")
+    else:
+        lines.append("category_code должен быть кодом из переданного дерева категорий или null.")
+    lines.append("Верни ровно один JSON-объект той же структуры, без текста вокруг.")
+    return "\n".join(lines)
+
+
+def merge_followup(first: ValidationReport, second: ValidationReport) -> ValidationReport:
+    """
+    Итог после уточняющего вызова: ответ второго вызова, если он не хуже первого,
+    иначе первый.
+    """
+    if second.data and (not first.data or len(second.problems) <= len(first.problems)):
+        best = second
+    else:
+        best = first
+    best.fixes.append("followup")
+    return best
@@ -0,0 +1,70 @@
+# src/cli.py
+"""
+Единая точка входа: python -m src <команда> [аргументы команды].
+
+    python -m src batch --limit 100
+    python -m src eval --all --use-cache
+    python -m src debug-sku 8 --show-prompt
+    python -m src load-categories categories.xlsx
+    python -m src migrate
+    python -m src worker --exit-when-idle
+    python -m src serve --port 8080
+    python -m src <команда> --help
+
+Модуль команды импортируется только после выбора команды, поэтому
+`python -m src --help` и короткие команды не тянут sqlalchemy/httpx/pandas
+остальных скриптов. Аргументы каждой команды описаны в её скрипте (main(argv)).
+"""
+from __future__ import annotations
+
+import importlib
+import sys
+from typing import Dict, List, Optional, Tuple
+
+# команда -> (модуль со скриптом, описание)
+COMMANDS: Dict[str, Tuple[str, str]] = {
+    "batch": ("src.scripts.run_batch_classification", "sequential batch classification of active product_links"),
+    "worker": ("src.scripts.run_queue_worker", "persistent queue worker and queue admin"),
+    "serve": ("src.scripts.run_server", "online classification HTTP server for the ERP"),
+    "eval": ("src.scripts.evaluate_on_testset", "evaluate classification quality on the testset"),
+    "debug-sku": ("src.scripts.debug_sku_by_id", "classify one SKU and print the raw LLM response"),
+    "load-categories": ("src.scripts.load_categories", "load the category tree from xlsx"),
+    "import-feed": ("src.scripts.import_product_feed", "import a 1C/ASNA product feed"),
+    "migrate": ("src.scripts.migrate_product_links_columns", "add missing columns and service tables"),
+    "rescore": ("src.scripts.rescore_from_archive", "re-apply post-processing to archived responses"),
+    "dump-archive": ("src.scripts.dump_llm_archive", "dump archived prompt/response pairs"),
+    "bench": ("src.scripts.run_benchmarks", "offline benchmarks with baseline check"),
+    "synthetic": ("src.scripts.generate_synthetic_data", "generate a scratch database with a synthetic catalogue"),
+}
+
+PROG = "farmacat"
+
+
+def _usage() -> str:
+    width = max(len(name) for name in COMMANDS)
+    lines = [f"usage: {PROG} <command> [args]", "", "commands:"]
+    lines += [f"  {name.ljust(width)}  {help_text}" for name, (_, help_text) in COMMANDS.items()]
+    lines += ["", f"run '{PROG} <command> --help' for command arguments"]
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(_usage())
+        return 0 if argv else 2
+
+    command, rest = argv[0], argv[1:]
+    if command not in COMMANDS:
+        print(f"{PROG}: unknown command {command!r}\n\n{_usage()}", file=sys.stderr)
+        return 2
+
+    module_name, _ = COMMANDS[command]
+    # prog для argparse команды: в --help видно "farmacat batch", а не имя модуля
+    sys.argv = [f"{PROG} {command}", *rest]
+    module = importlib.import_module(module_name)
+    return module.main(rest) or 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
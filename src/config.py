@@ -1,12 +1,30 @@
 # src/config.py
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import os
-from typing import Optional
+from typing import Dict, Optional
 
-from dotenv import load_dotenv
+_env_loaded = False
 
-# Загружаем .env
-load_dotenv()
+
+def load_env() -> None:
+    """
+    Загружает .env в окружение (один раз). Вызывается лениво при первом
+    чтении переменной через getenv, а не при импорте конфига: короткие
+    команды, которым окружение не нужно, не платят за python-dotenv.
+    """
+    global _env_loaded
+    if _env_loaded:
+        return
+    _env_loaded = True
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+
+def getenv(name: str, default: Optional[str] = None) -> Optional[str]:
+    """os.getenv с предварительной загрузкой .env."""
+    load_env()
+    return os.getenv(name, default)
 
 
 @dataclass
@@ -28,9 +46,25 @@ class LLMApiConfig:
     base_url: str = "https://api.deepseek.com/v1"
     api_key_env_var: str = "DEEPSEEK_API_KEY"
     timeout_seconds: float = 30.0
-    retry: RetryConfig = RetryConfig()
+    retry: RetryConfig = field(default_factory=RetryConfig)
     model: str = "deepseek-chat"
     endpoint: str = "/chat/completions"
+    # Пул соединений общего httpx.AsyncClient (keep-alive между запросами)
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    # Схема ответа: "full" — развёрнутый JSON, "compact" — короткие ключи и код причины
+    # (src/classifier/response_schema.py); меньше выходных токенов — быстрее и дешевле вызов
+    response_schema: str = "full"
+    # Лимит выходных токенов (None — без лимита, в compact-режиме — compact_max_tokens)
+    max_tokens: Optional[int] = None
+    compact_max_tokens: int = 160
+    # Пайплайн: "single" — один вызов с деревом категорий; "split" — сначала короткий вызов
+    # без дерева (МНН, форма, возраст, OTC), код подбирается локально по МНН-кластеру,
+    # второй вызов с деревом — только если локально код не выбран
+    pipeline: str = "single"
+    extract_max_tokens: int = 96
+    # Во втором вызове split-пайплайна — только строки найденного МНН-кластера (если есть)
+    split_shortlist: bool = True
 
 
 @dataclass
@@ -39,12 +73,160 @@ class ClassifierConfig:
     confidence_threshold: float = 0.75
     # Порог, ниже которого вообще не присваиваем категорию
     hard_reject_threshold: float = 0.4
+    # Потолок confidence, если в МНН-кластере найденного МНН несколько кодов
+    multi_cluster_confidence_cap: float = 0.6
+    # Признаки из названия SKU (src/classifier/attributes.py): подсказка в промпте
+    # и сужение кандидатов внутри МНН-кластера
+    use_sku_attributes: bool = True
+    # Выбор кода внутри МНН-кластера по правилам строк дерева (src/classifier/cluster_resolver.py);
+    # на ревью — только если правила не разделяют коды
+    resolve_clusters_locally: bool = True
+
+
+@dataclass
+class DatabaseConfig:
+    """
+    Настройки доступа к БД.
+
+    URL берётся из url, иначе из переменной окружения url_env_var,
+    иначе используется локальный SQLite default_url.
+    Для серверных СУБД (PostgreSQL) движок создаётся с пулом соединений,
+    параметры пула тоже можно переопределить через окружение (FARMACAT_DB_POOL_SIZE и т.п.).
+
+    Для SQLite включаем WAL (читатели не блокируют писателя), ждём снятия
+    блокировки busy_timeout_ms и дополнительно повторяем операцию
+    при «database is locked».
+    """
+    url: Optional[str] = None
+    url_env_var: str = "FARMACAT_DATABASE_URL"
+    default_url: str = "sqlite:///pharmacy_analyzer/data/linkages.db"
+    echo: bool = False
+
+    # Пул соединений (для SQLite не используется)
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30.0
+    pool_recycle: int = 1800  # секунды; защищает от разрыва «простаивающих» соединений
+    pool_pre_ping: bool = True
+
+    # Пакетная запись: размер чанка и порог, с которого в PostgreSQL используем COPY
+    bulk_chunk_size: int = 1000
+    pg_copy_threshold: int = 5000
+
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"  # при WAL NORMAL безопасен и заметно быстрее FULL
+    busy_timeout_ms: int = 5000
+    # Ретраи операций при конкуренции за блокировку
+    lock_retry_attempts: int = 5
+    lock_retry_backoff: float = 0.2  # секунды, умножается на номер попытки
+    # Потоки для чтения; запись всегда идёт через один выделенный поток
+    read_workers: int = 2
+
+
+@dataclass
+class QueueConfig:
+    """
+    Настройки персистентной очереди классификации (таблица classification_jobs).
+    """
+    chunk_size: int = 50  # сколько задач воркер забирает за один claim
+    lease_seconds: int = 300  # срок аренды; просроченные задачи может забрать другой воркер
+    heartbeat_interval: float = 60.0  # как часто продлевать аренду во время обработки
+    max_attempts: int = 5  # после стольких неудач задача уходит в dead
+    retry_delay_seconds: float = 30.0  # пауза перед повторной выдачей упавшей задачи
+    poll_interval: float = 5.0  # пауза, если очередь пуста
+    concurrency: int = 4  # параллельных запросов к LLM внутри одного воркера
+
+
+@dataclass
+class ArchiveConfig:
+    """
+    Архив сырых ответов LLM и промптов (src/io/response_archive.py).
+    """
+    enabled: bool = True
+    directory: str = "pharmacy_analyzer/data/llm_archive"
+    codec: str = "gzip"  # "gzip" | "zstd" (нужен пакет zstandard)
+    flush_every: int = 32  # записей в одном сжатом блоке
+    segment_max_bytes: int = 64 * 1024 * 1024
+
+
+@dataclass
+class CategorySnapshotConfig:
+    """
+    Скомпилированный снапшот дерева категорий (src/classifier/category_snapshot.py).
+    """
+    enabled: bool = True
+    path: str = "pharmacy_analyzer/data/category_snapshot.json"
+
+
+@dataclass
+class ValidationConfig:
+    """
+    Локальная проверка и починка ответов LLM (src/classifier/validation.py).
+    """
+    enabled: bool = True
+    followup: bool = True  # уточняющий вызов, если локально починить не удалось
+    similarity_cutoff: float = 0.85  # порог difflib для подтягивания кода/МНН
+    max_candidates: int = 15  # сколько допустимых кодов перечислять в уточнении
+
+
+@dataclass
+class PrefilterConfig:
+    """
+    Локальный предфильтр нелекарственных товаров и мусорных строк (src/classifier/prefilter.py).
+    """
+    enabled: bool = True
+    # JSON {группа: {"label", "code", "keywords"}}; None — встроенные списки DEFAULT_GROUPS
+    keywords_path: Optional[str] = None
+    local_confidence: float = 0.85  # confidence, если код группы поставлен локально
+
+
+@dataclass
+class ServerConfig:
+    """
+    Онлайн-сервер классификации для ERP (src/server/, python -m src serve).
+    """
+    host: str = "127.0.0.1"
+    port: int = 8080
+    request_timeout_seconds: float = 20.0  # потолок ожидания ответа на один запрос
+    max_batch: int = 50  # SKU в одном POST /classify/batch
+    max_body_bytes: int = 1024 * 1024
+    keepalive_timeout_seconds: float = 15.0  # сколько держать простаивающее соединение
+    cache_ttl_seconds: float = 3600.0  # кэш результатов по нормализованному названию SKU
+    cache_max_entries: int = 50_000
+    default_priority: str = "interactive"  # полоса планировщика LLM, если в запросе нет "priority"
+    snapshot_refresh_seconds: float = 60.0  # проверка, не изменилось ли дерево категорий (0 — не проверять)
+
+
+@dataclass
+class SchedulerConfig:
+    """
+    Планировщик вызовов LLM с полосами приоритета (src/llm_client/scheduler.py).
+    """
+    enabled: bool = True
+    max_concurrency: int = 16  # одновременных вызовов LLM на процесс (все полосы)
+    requests_per_minute: Optional[int] = None  # бюджет HTTP-запросов к API, включая ретраи (None — без лимита)
+    # Вес полосы во взвешенной справедливой очереди: доля стартов при конкуренции
+    weights: Dict[str, float] = field(default_factory=lambda: {"interactive": 4.0, "batch": 1.0})
+    # Доля параллелизма и бюджета запросов, которую другие полосы не занимают никогда
+    reserved: Dict[str, float] = field(default_factory=lambda: {"interactive": 0.25})
+    default_lane: str = "batch"  # полоса вызова вне llm_lane(...)
+    # При requests_per_minute бюджет и резерв делятся между всеми процессами с общей БД
+    # (сервер, run_batch_classification, run_queue_worker) — src/io/rate_budget.py
+    shared_budget: bool = True
 
 
 @dataclass
 class AppConfig:
-    llm: LLMApiConfig = LLMApiConfig()
-    classifier: ClassifierConfig = ClassifierConfig()
+    llm: LLMApiConfig = field(default_factory=LLMApiConfig)
+    classifier: ClassifierConfig = field(default_factory=ClassifierConfig)
+    db: DatabaseConfig = field(default_factory=DatabaseConfig)
+    queue: QueueConfig = field(default_factory=QueueConfig)
+    archive: ArchiveConfig = field(default_factory=ArchiveConfig)
+    snapshot: CategorySnapshotConfig = field(default_factory=CategorySnapshotConfig)
+    validation: ValidationConfig = field(default_factory=ValidationConfig)
+    prefilter: PrefilterConfig = field(default_factory=PrefilterConfig)
+    server: ServerConfig = field(default_factory=ServerConfig)
+    scheduler: SchedulerConfig = field(default_factory=SchedulerConfig)
 
 
 # Глобальный объект конфига, который можно импортировать как `from src.config import config`
@@ -31,6 +31,8 @@ class Category:
     inn_cluster: Optional[str] = None
     dosage_form: Optional[str] = None
     age_segment: Optional[str] = None
+    administration_route: Optional[str] = None
+    comment: Optional[str] = None  # «Комментарий / правила включения» — правила выбора внутри кластера
 
 
 @dataclass
@@ -51,3 +53,5 @@ class ClassificationResult:
     reason: str  # Краткое текстовое обоснование (почему выбрана категория/флаг review)
 
     raw_llm_response: Optional[dict] = None  # Для отладки и аудита
+    llm_latency_seconds: Optional[float] = None  # Время вызова LLM (HTTP + ретраи + парсинг)
+    llm_usage: Optional[dict] = None  # usage из ответа провайдера (prompt/completion tokens)
@@ -0,0 +1,132 @@
+# src/evaluation/metrics.py
+"""
+Метрики качества классификации, посчитанные векторно в pandas/NumPy.
+
+Вход — DataFrame результатов по SKU (см. src/evaluation/runner.py) с колонками
+true_code, pred_code, true_inn, pred_inn, needs_review, latency_seconds,
+prompt_tokens, completion_tokens, total_tokens, error.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.evaluation.sampling import wilson_interval
+
+NO_PREDICTION = "<none>"
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def normalize_text(series: pd.Series) -> pd.Series:
+    """trim + lower + схлопывание пробелов; None/NaN -> ""."""
+    return (
+        series.where(series.notna(), "")
+        .astype(str)
+        .str.strip()
+        .str.lower()
+        .str.split()
+        .str.join(" ")
+    )
+
+
+def _codes(series: pd.Series) -> pd.Series:
+    return series.where(series.notna(), "").astype(str).str.strip()
+
+
+def _flags(series: pd.Series) -> pd.Series:
+    return series.where(series.notna(), False).map(bool)
+
+
+def category_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Precision / recall / F1 / support по каждому коду категории.
+    Учитываются строки с известным true_code; пустой прогноз — отдельная метка <none>.
+    """
+    labelled = df[_codes(df["true_code"]) != ""]
+    true = _codes(labelled["true_code"])
+    pred = _codes(labelled["pred_code"]).replace("", NO_PREDICTION)
+
+    support = true.value_counts()
+    predicted = pred.value_counts()
+    tp = true[true == pred].value_counts()
+
+    labels = support.index.union(predicted.index.drop(NO_PREDICTION, errors="ignore"))
+    out = pd.DataFrame(
+        {
+            "tp": tp.reindex(labels, fill_value=0),
+            "support": support.reindex(labels, fill_value=0),
+            "predicted": predicted.reindex(labels, fill_value=0),
+        }
+    )
+    out["precision"] = np.where(out["predicted"] > 0, out["tp"] / out["predicted"].clip(lower=1), 0.0)
+    out["recall"] = np.where(out["support"] > 0, out["tp"] / out["support"].clip(lower=1), 0.0)
+    denom = out["precision"] + out["recall"]
+    out["f1"] = np.where(denom > 0, 2 * out["precision"] * out["recall"] / denom.where(denom > 0, 1.0), 0.0)
+    out.index.name = "category_code"
+    return out.sort_values(["support", "f1"], ascending=[False, True])
+
+
+def confusion_matrix(df: pd.DataFrame) -> pd.DataFrame:
+    """Матрица ошибок: строки — истинный код, колонки — предсказанный (<none> — нет ответа)."""
+    labelled = df[_codes(df["true_code"]) != ""]
+    return pd.crosstab(
+        _codes(labelled["true_code"]).rename("true_code"),
+        _codes(labelled["pred_code"]).replace("", NO_PREDICTION).rename("pred_code"),
+    )
+
+
+def percentiles(series: pd.Series, qs: Sequence[int] = PERCENTILES) -> Dict[str, Any]:
+    """mean и перцентили по непустым значениям (пусто — None)."""
+    values = pd.to_numeric(series, errors="coerce").dropna().to_numpy(dtype=float)
+    if values.size == 0:
+        return {"count": 0, "mean": None, **{f"p{q}": None for q in qs}}
+    points = np.percentile(values, qs)
+    return {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        **{f"p{q}": float(v) for q, v in zip(qs, points)},
+    }
+
+
+def summary_metrics(
+    df: pd.DataFrame,
+    per_category: pd.DataFrame | None = None,
+    confidence: float = 0.95,
+) -> Dict[str, Any]:
+    """
+    Сводные метрики прогона: accuracy по коду (с интервалом Уилсона), macro/weighted F1,
+    точность МНН, доля needs_review, перцентили латентности и токенов.
+    """
+    per_category = per_category if per_category is not None else category_metrics(df)
+    ok = df[df["error"].isna()] if "error" in df else df
+
+    true = _codes(ok["true_code"])
+    labelled = true != ""
+    correct = (true == _codes(ok["pred_code"])) & labelled
+
+    true_inn = normalize_text(ok["true_inn"])
+    inn_known = true_inn != ""
+    inn_correct = (true_inn == normalize_text(ok["pred_inn"])) & inn_known
+
+    weights = per_category["support"]
+    return {
+        "total": int(len(df)),
+        "classified": int(len(ok)),
+        "errors": int(len(df) - len(ok)),
+        "accuracy": float(correct.sum() / labelled.sum()) if labelled.any() else 0.0,
+        "accuracy_ci": list(wilson_interval(int(correct.sum()), int(labelled.sum()), confidence)),
+        "confidence_level": confidence,
+        "macro_f1": float(per_category["f1"].mean()) if len(per_category) else 0.0,
+        "weighted_f1": float((per_category["f1"] * weights).sum() / weights.sum()) if weights.sum() else 0.0,
+        "inn_accuracy": float(inn_correct.sum() / inn_known.sum()) if inn_known.any() else 0.0,
+        "review_rate": float(_flags(ok["needs_review"]).mean()) if len(ok) else 0.0,
+        "latency_seconds": percentiles(ok["latency_seconds"]),
+        "prompt_tokens": percentiles(ok["prompt_tokens"]),
+        "completion_tokens": percentiles(ok["completion_tokens"]),
+        "total_tokens": percentiles(ok["total_tokens"]),
+        "cached": int(_flags(ok["cached"]).sum()) if "cached" in ok else 0,
+        "prefiltered": int((ok["prefiltered"].fillna("") != "").sum()) if "prefiltered" in ok else 0,
+    }
@@ -0,0 +1,40 @@
+# src/evaluation/report.py
+"""
+Сохранение отчёта оценки: сводка в JSON и таблицы в CSV.
+
+    <output_dir>/summary.json           сводные метрики и параметры прогона
+    <output_dir>/per_sku.csv            результат по каждому SKU
+    <output_dir>/per_category.csv       precision/recall/F1 по кодам
+    <output_dir>/confusion_matrix.csv   матрица ошибок
+    <output_dir>/<name>.csv             дополнительные таблицы (например, per_stratum)
+
+CSV пишутся в utf-8-sig, чтобы Excel корректно открывал кириллицу.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from src.io.file_io import write_json_atomic
+
+
+def write_report(
+    output_dir: str | Path,
+    summary: Dict[str, Any],
+    per_sku: pd.DataFrame,
+    per_category: pd.DataFrame,
+    confusion: pd.DataFrame,
+    extra_tables: Optional[Dict[str, pd.DataFrame]] = None,
+) -> Path:
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    write_json_atomic(output_dir / "summary.json", summary)
+    per_sku.to_csv(output_dir / "per_sku.csv", index=False, encoding="utf-8-sig")
+    per_category.to_csv(output_dir / "per_category.csv", encoding="utf-8-sig")
+    confusion.to_csv(output_dir / "confusion_matrix.csv", encoding="utf-8-sig")
+    for name, table in (extra_tables or {}).items():
+        table.to_csv(output_dir / f"{name}.csv", encoding="utf-8-sig")
+    return output_dir
@@ -0,0 +1,197 @@
+# src/evaluation/runner.py
+"""
+Конкурентный прогон ClassifierService по тестовой выборке.
+
+SKU подаются в ClassifierService.classify_many: одновременно в полёте
+не больше concurrency запросов к LLM, а вход читается лениво. Ошибка
+на одном SKU не прерывает прогон — она попадает в колонку error.
+
+evaluate_sequential — стратифицированный режим с остановкой по ширине
+доверительного интервала (src/evaluation/sampling.py).
+"""
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from src.classifier.classifier_service import ClassificationOutcome, ClassifierService
+from src.classifier.prefilter import prefilter_kind
+from src.data_models import SKU
+from src.evaluation.sampling import StratifiedEstimate, StratifiedSampler, neyman_std, stratified_estimate
+
+logger = logging.getLogger(__name__)
+
+RESULT_COLUMNS = [
+    "sku_name",
+    "true_code",
+    "pred_code",
+    "true_inn",
+    "pred_inn",
+    "needs_review",
+    "confidence",
+    "reason",
+    "latency_seconds",
+    "wall_seconds",
+    "prompt_tokens",
+    "completion_tokens",
+    "total_tokens",
+    "cached",
+    "prefiltered",
+    "error",
+]
+
+
+def _text(value: Any) -> str:
+    return "" if value is None else str(value).strip()
+
+
+def _usage_value(usage: Optional[dict], key: str) -> Optional[int]:
+    if not isinstance(usage, dict) or usage.get(key) is None:
+        return None
+    try:
+        return int(usage[key])
+    except (TypeError, ValueError):
+        return None
+
+
+def _sample_sku(row: Dict[str, Any]) -> SKU:
+    return SKU(
+        name=_text(row.get("Название")),
+        manufacturer=_text(row.get("Производитель")) or None,
+        alt_name=_text(row.get("Название АСНА")) or None,
+    )
+
+
+def _outcome_row(row: Dict[str, Any], outcome: ClassificationOutcome) -> Dict[str, Any]:
+    out: Dict[str, Any] = {
+        "sku_name": outcome.sku.name,
+        "true_code": _text(row.get("Код категории")),
+        "true_inn": _text(row.get("МНН")),
+        "wall_seconds": outcome.elapsed_seconds,
+    }
+    if outcome.error is not None:
+        # Ошибка SKU идёт в отчёт, прогон продолжается
+        out["error"] = f"{type(outcome.error).__name__}: {outcome.error}"
+        return out
+
+    result = outcome.result
+    usage = result.llm_usage
+    prefiltered = prefilter_kind(result)
+    out.update(
+        pred_code=_text(result.category_code),
+        pred_inn=_text(result.inn),
+        needs_review=bool(result.needs_review),
+        confidence=result.confidence,
+        reason=result.reason or "",
+        latency_seconds=result.llm_latency_seconds,
+        prompt_tokens=_usage_value(usage, "prompt_tokens"),
+        completion_tokens=_usage_value(usage, "completion_tokens"),
+        total_tokens=_usage_value(usage, "total_tokens"),
+        # Без вызова LLM: предфильтр (см. prefilter_kind) или ответ из кэша ProviderLLMClient
+        prefiltered=prefiltered or "",
+        cached=result.llm_latency_seconds is None and prefiltered is None,
+    )
+    return out
+
+
+async def evaluate_samples(
+    service: ClassifierService,
+    samples: pd.DataFrame,
+    concurrency: int = 8,
+    progress_every: int = 25,
+) -> pd.DataFrame:
+    """
+    Классифицирует все строки samples (колонки TestButch.xlsx) с ограничением
+    параллелизма (ClassifierService.classify_many) и возвращает DataFrame
+    с RESULT_COLUMNS в исходном порядке.
+    """
+    records = samples.to_dict(orient="records")
+    results: List[Optional[Dict[str, Any]]] = [None] * len(records)
+    started = time.perf_counter()
+    done = 0
+
+    skus = (_sample_sku(row) for row in records)
+    async for outcome in service.classify_many(skus, concurrency=concurrency):
+        results[outcome.index] = _outcome_row(records[outcome.index], outcome)
+        done += 1
+        if progress_every and done % progress_every == 0:
+            elapsed = time.perf_counter() - started
+            logger.info("Evaluated %s/%s SKUs (%.1f SKU/s)", done, len(records), done / elapsed if elapsed else 0.0)
+
+    return pd.DataFrame([r for r in results if r is not None], columns=RESULT_COLUMNS)
+
+
+def labelled_mask(samples: pd.DataFrame) -> pd.Series:
+    """Строки тестовой выборки с заполненным "Код категории" (только они участвуют в точности)."""
+    return samples["Код категории"].map(_text) != ""
+
+
+def correct_flags(per_sku: pd.DataFrame) -> pd.Series:
+    """
+    Исход для оценки точности: код совпал и ошибки не было (ошибка = промах).
+    Строки без эталонного кода верными не считаются — как в summary_metrics.
+    """
+    labelled = per_sku["true_code"] != ""
+    return labelled & (per_sku["true_code"] == per_sku["pred_code"]) & per_sku["error"].isna()
+
+
+async def evaluate_sequential(
+    service: ClassifierService,
+    samples: pd.DataFrame,
+    strata: pd.Series,
+    target_width: float = 0.1,
+    batch_size: int = 20,
+    max_samples: Optional[int] = None,
+    concurrency: int = 8,
+    confidence: float = 0.95,
+    seed: int = 24,
+) -> Tuple[pd.DataFrame, StratifiedEstimate, List[Dict[str, Any]]]:
+    """
+    Последовательная стратифицированная оценка: добирает SKU раундами по
+    batch_size, пока ширина доверительного интервала точности больше
+    target_width (или пока не исчерпаны max_samples / выборка).
+
+    Строки без эталонного кода отбрасываются до стратификации: они не входят
+    ни в выборку, ни в размеры страт (summary_metrics их тоже не учитывает).
+
+    Возвращает результаты по SKU (с колонкой stratum), итоговую оценку и историю раундов.
+    """
+    labelled = labelled_mask(samples)
+    samples = samples[labelled]
+    strata = strata.loc[samples.index]
+    sampler = StratifiedSampler(strata, seed=seed)
+    limit = min(max_samples or len(samples), len(samples))
+    frames: List[pd.DataFrame] = []
+    history: List[Dict[str, Any]] = []
+    estimate: Optional[StratifiedEstimate] = None
+    std: Optional[Dict[str, float]] = None
+    evaluated = 0
+
+    while evaluated < limit and sampler.remaining:
+        batch = sampler.next_batch(min(batch_size, limit - evaluated), std)
+        if not batch:
+            break
+        part = await evaluate_samples(service, samples.loc[batch], concurrency=concurrency, progress_every=0)
+        part["stratum"] = strata.loc[batch].to_numpy()
+        frames.append(part)
+        evaluated += len(part)
+
+        per_sku = pd.concat(frames, ignore_index=True)
+        correct = correct_flags(per_sku)
+        estimate = stratified_estimate(sampler.population, per_sku["stratum"], correct, confidence)
+        std = neyman_std(per_sku["stratum"], correct)
+        history.append({"round": len(history) + 1, **estimate.to_dict()})
+        logger.info(
+            "Round %s: n=%s accuracy=%.3f [%.3f; %.3f] width=%.3f (target %.3f)",
+            len(history), estimate.n, estimate.estimate, estimate.low, estimate.high, estimate.width, target_width,
+        )
+        if estimate.width <= target_width:
+            break
+
+    per_sku = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=[*RESULT_COLUMNS, "stratum"])
+    if estimate is None:
+        estimate = stratified_estimate(sampler.population, per_sku["stratum"], correct_flags(per_sku), confidence)
+    return per_sku, estimate, history
@@ -0,0 +1,204 @@
+# src/evaluation/sampling.py
+"""
+Стратифицированная выборка из тестового набора и доверительные интервалы точности.
+
+- Страты — код категории, направление или МНН-кластер (два последних берутся
+  из дерева категорий по истинному коду).
+- Точность оценивается стратифицированно: p = Σ W_h·p_h, где W_h — доля страты
+  во всём тестовом наборе, а дисперсия — Σ W_h²·p̃_h(1-p̃_h)/n_h с поправкой на
+  конечность страты. p̃_h = (x+1)/(n+2) (сглаживание Агрести–Коула), чтобы страты
+  из 1–2 SKU с p_h = 0 или 1 не давали нулевую дисперсию.
+- Последовательный режим добирает SKU раундами: первый раунд распределяется
+  пропорционально размеру страт, следующие — по Нейману (n_h ∝ N_h·σ_h), и
+  останавливается, как только ширина интервала не больше целевой.
+
+Так нужная точность оценки достигается меньшим числом вызовов LLM, чем при
+полном прогоне или простой случайной выборке.
+"""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import Dict, List, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.data_models import Category
+
+UNKNOWN_STRATUM = "<unknown>"
+
+STRATIFY_CHOICES = ("category", "direction", "inn_cluster")
+
+
+def z_value(confidence: float) -> float:
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def wilson_interval(successes: int, n: int, confidence: float = 0.95) -> tuple[float, float]:
+    """Интервал Уилсона для доли; при n=0 — (0, 1)."""
+    if n <= 0:
+        return 0.0, 1.0
+    z = z_value(confidence)
+    p = successes / n
+    denom = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def stratum_labels(df: pd.DataFrame, by: str, categories: Optional[List[Category]] = None) -> pd.Series:
+    """
+    Метка страты для каждой строки тестового набора (колонки TestButch.xlsx).
+    by: "category" | "direction" | "inn_cluster".
+    """
+    codes = df["Код категории"].where(df["Код категории"].notna(), "").astype(str).str.strip()
+    if by == "category":
+        labels = codes
+    elif by in ("direction", "inn_cluster"):
+        attr = {cat.code: getattr(cat, by) for cat in categories or []}
+        labels = codes.map(attr)
+    else:
+        raise ValueError(f"Unknown stratification {by!r}, expected one of {STRATIFY_CHOICES}")
+    labels = labels.where(labels.notna(), "").astype(str).str.strip()
+    return labels.where(labels != "", UNKNOWN_STRATUM).rename("stratum")
+
+
+@dataclass
+class StratifiedEstimate:
+    estimate: float
+    low: float
+    high: float
+    n: int
+    strata_sampled: int
+    strata_total: int
+
+    @property
+    def width(self) -> float:
+        return self.high - self.low
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "estimate": self.estimate,
+            "low": self.low,
+            "high": self.high,
+            "width": self.width,
+            "n": self.n,
+            "strata_sampled": self.strata_sampled,
+            "strata_total": self.strata_total,
+        }
+
+
+def stratified_estimate(
+    population: Mapping[str, int],
+    strata: pd.Series,
+    correct: pd.Series,
+    confidence: float = 0.95,
+) -> StratifiedEstimate:
+    """
+    Стратифицированная оценка доли correct с нормальным интервалом.
+
+    population — размеры страт во всём наборе (N_h); strata/correct — метки и
+    исходы по уже оценённым SKU. Не попавшие в выборку страты считаются по
+    сглаженной оценке p̃ = 1/2 с максимальной дисперсией — интервал честно
+    остаётся широким, пока они не покрыты.
+    """
+    sizes = pd.Series(population, dtype=float)
+    total = sizes.sum()
+    grouped = pd.DataFrame({"stratum": strata.values, "correct": correct.astype(float).values}).groupby("stratum")["correct"]
+    x = grouped.sum().reindex(sizes.index, fill_value=0.0)
+    n = grouped.count().reindex(sizes.index, fill_value=0).astype(float)
+
+    weights = sizes / total
+    sampled = n > 0
+    p = np.where(sampled, x / n.where(sampled, 1.0), 0.5)
+    p_smooth = (x + 1) / (n + 2)
+    fpc = np.where(sizes > 1, (sizes - n).clip(lower=0) / (sizes - 1).where(sizes > 1, 1.0), 0.0)
+    # Непокрытая страта: вклад как у одного наблюдения с p̃ = 1/2
+    var_h = np.where(sampled, p_smooth * (1 - p_smooth) / n.where(sampled, 1.0) * fpc, 0.25)
+
+    estimate = float((weights * p).sum())
+    half = z_value(confidence) * math.sqrt(float((weights ** 2 * var_h).sum()))
+    return StratifiedEstimate(
+        estimate=estimate,
+        low=max(0.0, estimate - half),
+        high=min(1.0, estimate + half),
+        n=int(n.sum()),
+        strata_sampled=int(sampled.sum()),
+        strata_total=int(len(sizes)),
+    )
+
+
+class StratifiedSampler:
+    """
+    Выборка без возвращения по стратам. Порядок внутри страты перемешивается
+    один раз (seed), так что повторный прогон с тем же seed берёт те же SKU.
+    """
+
+    def __init__(self, strata: pd.Series, seed: int = 24) -> None:
+        rng = np.random.default_rng(seed)
+        self._queues: Dict[str, List] = {
+            name: list(rng.permutation(group.index.to_numpy()))
+            for name, group in strata.groupby(strata, sort=True)
+        }
+        self.population: Dict[str, int] = {name: len(q) for name, q in self._queues.items()}
+
+    @property
+    def remaining(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _allocate(self, size: int, scores: pd.Series) -> Dict[str, int]:
+        """Делит size по стратам пропорционально scores с учётом остатка в стратах."""
+        left = pd.Series({name: len(q) for name, q in self._queues.items()}, dtype=float)
+        scores = scores.reindex(left.index, fill_value=0.0).where(left > 0, 0.0)
+        allocation = pd.Series(0, index=left.index, dtype=int)
+        size = min(size, int(left.sum()))
+        while size > 0 and scores.sum() > 0:
+            share = scores / scores.sum() * size
+            # Наибольшие остатки: целые части + по одному тем, у кого дробная часть больше
+            base = np.floor(share).astype(int)
+            extra = size - int(base.sum())
+            order = (share - base).sort_values(ascending=False).index[:extra]
+            base.loc[order] += 1
+            take = np.minimum(base, left - allocation).astype(int)
+            if take.sum() == 0:
+                break
+            allocation += take
+            size -= int(take.sum())
+            scores = scores.where(allocation < left, 0.0)
+        return {name: int(k) for name, k in allocation.items() if k > 0}
+
+    def next_batch(self, size: int, std_estimates: Optional[Mapping[str, float]] = None) -> List:
+        """
+        Индексы следующей порции. Без std_estimates — пропорционально N_h,
+        с ними — по Нейману (N_h·σ_h).
+        """
+        sizes = pd.Series(self.population, dtype=float)
+        if std_estimates is None:
+            scores = sizes
+        else:
+            scores = sizes * pd.Series(std_estimates, dtype=float).reindex(sizes.index, fill_value=0.5)
+        batch: List = []
+        for name, k in self._allocate(size, scores).items():
+            queue = self._queues[name]
+            batch.extend(queue[:k])
+            del queue[:k]
+        return batch
+
+
+def neyman_std(strata: pd.Series, correct: pd.Series) -> Dict[str, float]:
+    """σ_h по сглаженной оценке доли для каждой уже затронутой страты."""
+    grouped = pd.DataFrame({"stratum": strata.values, "correct": correct.astype(float).values}).groupby("stratum")["correct"]
+    p = (grouped.sum() + 1) / (grouped.count() + 2)
+    return np.sqrt(p * (1 - p)).to_dict()
+
+
+def per_stratum_table(population: Mapping[str, int], strata: pd.Series, correct: pd.Series) -> pd.DataFrame:
+    """Размер страты, сколько оценено и точность в ней — для отчёта."""
+    grouped = pd.DataFrame({"stratum": strata.values, "correct": correct.astype(float).values}).groupby("stratum")["correct"]
+    out = pd.DataFrame({"population": pd.Series(population, dtype=int)})
+    out["sampled"] = grouped.count().reindex(out.index, fill_value=0).astype(int)
+    out["accuracy"] = grouped.mean().reindex(out.index)
+    out.index.name = "stratum"
+    return out.sort_values("population", ascending=False)
@@ -0,0 +1,148 @@
+# src/io/async_db.py
+"""
+Неблокирующий доступ к БД для asyncio-пайплайна.
+
+SQLAlchemy у нас синхронный, поэтому любая операция с БД, вызванная прямо
+из корутины, останавливает event loop и все HTTP-запросы к LLM.
+AsyncDB выносит работу с сессиями в потоки:
+- запись — в один выделенный поток (писатели в SQLite всё равно
+  сериализуются, а так они не конкурируют друг с другом за блокировку);
+- чтение — в небольшой пул потоков (при WAL читатели не мешают писателю).
+
+Пример:
+
+    async with AsyncDB() as db:
+        categories = await db.read(get_all_categories)
+        await db.write(save_classification_result, pl.id, result)
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from src.config import DatabaseConfig, config
+from src.io import db_io
+from src.observability.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_LOCK_MESSAGES = ("database is locked", "database is busy", "database table is locked")
+
+
+def is_lock_error(exc: BaseException) -> bool:
+    """
+    True, если ошибка вызвана конкуренцией за блокировку SQLite
+    (busy_timeout истёк, а другой писатель ещё держит БД).
+    """
+    if not isinstance(exc, OperationalError):
+        return False
+    message = str(getattr(exc, "orig", exc)).lower()
+    return any(m in message for m in _LOCK_MESSAGES)
+
+
+class AsyncDB:
+    """
+    Async-обёртка над синхронными функциями вида fn(session, *args, **kwargs).
+
+    Каждый вызов выполняется в отдельной сессии (get_session: commit при успехе,
+    rollback при ошибке). При «database is locked» операция целиком повторяется
+    с backoff, поэтому fn должна быть идемпотентной в рамках одной транзакции.
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[sessionmaker] = None,
+        db_config: Optional[DatabaseConfig] = None,
+    ) -> None:
+        self._session_factory = session_factory
+        self._conf = db_config or config.db
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._readers = ThreadPoolExecutor(
+            max_workers=max(1, self._conf.read_workers),
+            thread_name_prefix="db-reader",
+        )
+        self._closed = False
+
+    async def read(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Выполняет fn(session, ...) в пуле читателей."""
+        return await self._submit(self._readers, fn, args, kwargs, "db_read")
+
+    async def write(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Выполняет fn(session, ...) в потоке-писателе (операции записи идут строго по очереди)."""
+        return await self._submit(self._writer, fn, args, kwargs, "db_write")
+
+    async def _submit(
+        self,
+        executor: ThreadPoolExecutor,
+        fn: Callable[..., T],
+        args: tuple,
+        kwargs: dict,
+        stage: str,
+    ) -> T:
+        if self._closed:
+            raise RuntimeError("AsyncDB is closed")
+        loop = asyncio.get_running_loop()
+        # Ожидание свободного потока и само выполнение меряем раздельно:
+        # очередь к писателю — отдельная причина задержек
+        timing: dict = {}
+
+        def call() -> T:
+            timing["started"] = time.perf_counter()
+            return self._run_with_retries(fn, args, kwargs)
+
+        submitted = time.perf_counter()
+        try:
+            return await loop.run_in_executor(executor, call)
+        finally:
+            finished = time.perf_counter()
+            started = timing.get("started", finished)
+            operation = getattr(fn, "__name__", None)
+            metrics.observe("db_queue_wait", started - submitted, operation=operation)
+            metrics.observe(stage, finished - started, operation=operation)
+
+    def _run_with_retries(self, fn: Callable[..., T], args: tuple, kwargs: dict) -> T:
+        attempt = 0
+        while True:
+            try:
+                with db_io.get_session(self._session_factory) as session:
+                    return fn(session, *args, **kwargs)
+            except OperationalError as exc:
+                if not is_lock_error(exc) or attempt >= self._conf.lock_retry_attempts:
+                    raise
+                attempt += 1
+                delay = self._conf.lock_retry_backoff * attempt
+                logger.warning(
+                    "Database is locked, retrying %s in %.2fs (attempt %s/%s)",
+                    getattr(fn, "__name__", fn),
+                    delay,
+                    attempt,
+                    self._conf.lock_retry_attempts,
+                )
+                time.sleep(delay)
+
+    def close(self) -> None:
+        """Дожидается завершения поставленных операций и останавливает потоки."""
+        if self._closed:
+            return
+        self._closed = True
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+
+    async def aclose(self) -> None:
+        # shutdown(wait=True) блокирует, поэтому тоже уводим его из event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    async def __aenter__(self) -> "AsyncDB":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
+
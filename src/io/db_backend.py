@@ -0,0 +1,276 @@
+# src/io/db_backend.py
+"""
+Создание движка БД и диалект-зависимая пакетная запись.
+
+- resolve_database_url / create_db_engine: URL и пул соединений из config.db
+  и переменных окружения; SQLite получает WAL и busy_timeout, серверные СУБД —
+  пул QueuePool с pre_ping и recycle.
+- bulk_upsert: INSERT ... ON CONFLICT для SQLite и PostgreSQL
+  (для больших пачек в PostgreSQL — COPY во временную таблицу + ON CONFLICT);
+  для прочих диалектов — SELECT существующих ключей + INSERT/UPDATE.
+- bulk_update_by_pk: пакетный UPDATE по первичному ключу (executemany);
+  строки с отсутствующими в таблице ключами пропускаются.
+"""
+from __future__ import annotations
+
+import csv
+import io
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import Table, and_, bindparam, create_engine, event, inspect, select, tuple_, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from src.config import DatabaseConfig, config, getenv
+
+
+def _env_int(name: str, default: int) -> int:
+    value = getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return int(value)
+    except ValueError as exc:
+        raise ValueError(f"Env var {name} must be an integer, got {value!r}") from exc
+
+
+def resolve_database_url(db_conf: Optional[DatabaseConfig] = None) -> str:
+    """
+    Возвращает URL БД: config.db.url -> $FARMACAT_DATABASE_URL -> default_url.
+    """
+    db_conf = db_conf or config.db
+    return db_conf.url or getenv(db_conf.url_env_var) or db_conf.default_url
+
+
+def configure_sqlite_engine(engine_: Engine, db_conf: Optional[DatabaseConfig] = None) -> Engine:
+    """
+    Включает для SQLite-движка WAL, busy_timeout и режим synchronous из config.db.
+
+    Прагмы выставляются на каждое новое соединение пула (journal_mode=WAL
+    сохраняется в файле БД, остальные действуют только в рамках соединения).
+    Для других СУБД ничего не делает.
+    """
+    if engine_.dialect.name != "sqlite":
+        return engine_
+
+    db_conf = db_conf or config.db
+
+    @event.listens_for(engine_, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:  # noqa: ARG001
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA busy_timeout={int(db_conf.busy_timeout_ms)}")
+            cursor.execute(f"PRAGMA journal_mode={db_conf.sqlite_journal_mode}")
+            cursor.execute(f"PRAGMA synchronous={db_conf.sqlite_synchronous}")
+        finally:
+            cursor.close()
+
+    return engine_
+
+
+def create_db_engine(url: Optional[str] = None, db_conf: Optional[DatabaseConfig] = None) -> Engine:
+    """
+    Создаёт движок SQLAlchemy по URL из конфига/окружения.
+    """
+    db_conf = db_conf or config.db
+    url = url or resolve_database_url(db_conf)
+
+    if url.startswith("sqlite"):
+        # Соединения SQLite используются из потоков AsyncDB, поэтому
+        # check_same_thread выключен; сериализацию записи обеспечивает AsyncDB.
+        engine_ = create_engine(
+            url,
+            echo=db_conf.echo,
+            future=True,
+            connect_args={
+                "timeout": db_conf.busy_timeout_ms / 1000,
+                "check_same_thread": False,
+            },
+        )
+        return configure_sqlite_engine(engine_, db_conf)
+
+    return create_engine(
+        url,
+        echo=db_conf.echo,
+        future=True,
+        pool_size=_env_int("FARMACAT_DB_POOL_SIZE", db_conf.pool_size),
+        max_overflow=_env_int("FARMACAT_DB_MAX_OVERFLOW", db_conf.max_overflow),
+        pool_timeout=db_conf.pool_timeout,
+        pool_recycle=_env_int("FARMACAT_DB_POOL_RECYCLE", db_conf.pool_recycle),
+        pool_pre_ping=db_conf.pool_pre_ping,
+    )
+
+
+# Маркер NULL для COPY FROM ... (FORMAT csv): отличает NULL от пустой строки
+_COPY_NULL = r"\N"
+
+
+def _chunks(rows: Sequence[Dict[str, Any]], size: int) -> Iterable[Sequence[Dict[str, Any]]]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def bulk_upsert(
+    session: Session,
+    table: Table,
+    rows: Iterable[Dict[str, Any]],
+    conflict_columns: Sequence[str],
+    update_columns: Optional[Sequence[str]] = None,
+    chunk_size: Optional[int] = None,
+) -> int:
+    """
+    Пакетный upsert строк в table.
+
+    conflict_columns — уникальный ключ (PK или unique index);
+    update_columns — что обновлять при конфликте (None/пусто — DO NOTHING).
+    Все строки должны иметь одинаковый набор ключей.
+    Возвращает число переданных строк.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+
+    db_conf = config.db
+    chunk_size = chunk_size or db_conf.bulk_chunk_size
+    update_columns = list(update_columns or [])
+    dialect = session.get_bind().dialect.name
+
+    if dialect == "postgresql" and len(rows) >= db_conf.pg_copy_threshold:
+        _copy_upsert_postgres(session, table, rows, conflict_columns, update_columns)
+        return len(rows)
+
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+        for chunk in _chunks(rows, chunk_size):
+            stmt = dialect_insert(table)
+            if update_columns:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=list(conflict_columns),
+                    set_={col: stmt.excluded[col] for col in update_columns},
+                )
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=list(conflict_columns))
+            session.execute(stmt, list(chunk))
+        return len(rows)
+
+    _generic_upsert(session, table, rows, conflict_columns, update_columns, chunk_size)
+    return len(rows)
+
+
+def _generic_upsert(
+    session: Session,
+    table: Table,
+    rows: List[Dict[str, Any]],
+    conflict_columns: Sequence[str],
+    update_columns: List[str],
+    chunk_size: int,
+) -> None:
+    """
+    Запасной путь для диалектов без ON CONFLICT: ищем существующие ключи
+    и делим пачку на INSERT и UPDATE.
+    """
+    key_cols = [table.c[c] for c in conflict_columns]
+    for chunk in _chunks(rows, chunk_size):
+        keys = [tuple(r[c] for c in conflict_columns) for r in chunk]
+        if len(key_cols) == 1:
+            where = key_cols[0].in_([k[0] for k in keys])
+        else:
+            where = tuple_(*key_cols).in_(keys)
+        existing = {tuple(r) for r in session.execute(select(*key_cols).where(where))}
+
+        to_insert = [r for r, k in zip(chunk, keys) if k not in existing]
+        if to_insert:
+            session.execute(table.insert(), to_insert)
+        if not update_columns:
+            continue
+        for row, key in zip(chunk, keys):
+            if key in existing:
+                session.execute(
+                    update(table)
+                    .where(and_(*(col == val for col, val in zip(key_cols, key))))
+                    .values({c: row[c] for c in update_columns})
+                )
+
+
+def _copy_upsert_postgres(
+    session: Session,
+    table: Table,
+    rows: List[Dict[str, Any]],
+    conflict_columns: Sequence[str],
+    update_columns: List[str],
+) -> None:
+    """
+    Upsert больших пачек в PostgreSQL: COPY во временную таблицу
+    и один INSERT ... SELECT ... ON CONFLICT. Поддерживает psycopg2 и psycopg 3.
+    """
+    columns = list(rows[0].keys())
+    quoted_cols = ", ".join(f'"{c}"' for c in columns)
+    tmp_name = f"tmp_upsert_{table.name}"
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # Явный маркер NULL: иначе пустые строки тоже загрузились бы как NULL,
+        # а путь через ON CONFLICT их различает
+        writer.writerow([_COPY_NULL if row[c] is None else row[c] for c in columns])
+    buffer.seek(0)
+
+    connection = session.connection()
+    connection.exec_driver_sql(
+        f'CREATE TEMP TABLE IF NOT EXISTS "{tmp_name}" '
+        f'(LIKE "{table.name}" INCLUDING DEFAULTS) ON COMMIT DROP'
+    )
+    connection.exec_driver_sql(f'TRUNCATE "{tmp_name}"')
+
+    copy_sql = f"COPY \"{tmp_name}\" ({quoted_cols}) FROM STDIN WITH (FORMAT csv, NULL '{_COPY_NULL}')"
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        if hasattr(cursor, "copy_expert"):  # psycopg2
+            cursor.copy_expert(copy_sql, buffer)
+        else:  # psycopg 3
+            with cursor.copy(copy_sql) as copy:
+                copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+
+    conflict = ", ".join(f'"{c}"' for c in conflict_columns)
+    if update_columns:
+        assignments = ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in update_columns)
+        on_conflict = f"ON CONFLICT ({conflict}) DO UPDATE SET {assignments}"
+    else:
+        on_conflict = f"ON CONFLICT ({conflict}) DO NOTHING"
+    connection.exec_driver_sql(
+        f'INSERT INTO "{table.name}" ({quoted_cols}) '
+        f'SELECT {quoted_cols} FROM "{tmp_name}" {on_conflict}'
+    )
+
+
+def bulk_update_by_pk(
+    session: Session,
+    model: Any,
+    rows: Iterable[Dict[str, Any]],
+    chunk_size: Optional[int] = None,
+) -> int:
+    """
+    Пакетный UPDATE ORM-модели по первичному ключу.
+    Каждая строка должна содержать PK и обновляемые поля.
+
+    Core-UPDATE ... WHERE pk = :_pk через executemany: строки с несуществующим
+    PK просто ничего не обновляют (ORM bulk UPDATE в этом случае падает
+    со StaleDataError и откатывает всю пачку).
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    chunk_size = chunk_size or config.db.bulk_chunk_size
+    table = model.__table__
+    (pk,) = inspect(model).primary_key
+    statement = update(table).where(pk == bindparam("_pk"))
+    for chunk in _chunks(rows, chunk_size):
+        params = [{"_pk": row[pk.key], **{k: v for k, v in row.items() if k != pk.key}} for row in chunk]
+        session.execute(statement, params)
+    return len(rows)
@@ -1,22 +1,54 @@
 from __future__ import annotations
 
-import pandas as pd
-
+import hashlib
+import json
 from contextlib import contextmanager
-from typing import Iterator, List
+from typing import Iterator, List, Optional
 
-from sqlalchemy import Boolean, Column, DateTime, Integer, String, Float, create_engine, Text
+from sqlalchemy import Boolean, Column, DateTime, Integer, MetaData, String, Float, Text, delete
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
 
+from src.config import config
 from src.data_models import SKU, ClassificationResult
+from src.io.xlsx_stream import _normalize_column_name, chunked, iter_xlsx_rows  # noqa: F401 (реэкспорт)
+from src.io.db_backend import bulk_update_by_pk, configure_sqlite_engine, create_db_engine, resolve_database_url
 
 from typing import List
 from src.data_models import Category
 
-DATABASE_URL = "sqlite:///pharmacy_analyzer/data/linkages.db"
+# Движок создаётся при первом обращении, а не при импорте: команды, которым
+# БД не нужна (или нужна другая, через FARMACAT_DATABASE_URL), не открывают
+# рабочую SQLite и не поднимают пул. URL и пул — из config.db / окружения.
+_engine: Optional[Engine] = None
+_session_factory: Optional[sessionmaker] = None
+
+
+def get_engine() -> Engine:
+    global _engine
+    if _engine is None:
+        _engine = create_db_engine(resolve_database_url())
+    return _engine
+
 
-engine = create_engine(DATABASE_URL, echo=False, future=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
+def get_session_factory() -> sessionmaker:
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = sessionmaker(
+            bind=get_engine(), autoflush=False, autocommit=False, expire_on_commit=False
+        )
+    return _session_factory
+
+
+def __getattr__(name: str):
+    # Совместимость со старыми импортами: db_io.engine / SessionLocal / DATABASE_URL
+    if name == "engine":
+        return get_engine()
+    if name == "SessionLocal":
+        return get_session_factory()
+    if name == "DATABASE_URL":
+        return resolve_database_url()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 Base = declarative_base()
 
@@ -45,6 +77,10 @@ class ProductLink(Base):
     needs_review = Column(Boolean, nullable=True)
     classification_reason = Column(String, nullable=True)
 
+    # Поля импорта фидов 1С/АСНА (src/io/product_feed.py)
+    needs_reclassification = Column(Boolean, nullable=True, default=False)  # изменились имя/производитель
+    last_seen_at = Column(DateTime, nullable=True)  # время последнего импорта, в котором встречалась строка
+
 class CategoryDB(Base):
     __tablename__ = "categories"
 
@@ -61,9 +97,80 @@ class CategoryDB(Base):
     differentiation = Column(String, nullable=True)  # TEXT
     comment = Column(Text, nullable=True)  # TEXT
 
+
+class ClassificationJob(Base):
+    """
+    Задача персистентной очереди классификации: одна строка на product_link.
+
+    Статусы: pending -> leased -> done | pending (повтор) | dead.
+    Логика выдачи/аренды — в src/io/job_queue.py.
+    """
+    __tablename__ = "classification_jobs"
+
+    product_link_id = Column(Integer, primary_key=True)
+    status = Column(String, nullable=False, default="pending", index=True)
+    lease_owner = Column(String, nullable=True)
+    # Для leased — срок аренды, для pending — «не выдавать раньше» (задержка повтора)
+    lease_expires_at = Column(DateTime, nullable=True, index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+
+
+class LLMRateKey(Base):
+    """
+    Строка-замок общего бюджета запросов к API: одна на ключ API (хэш).
+    Логика — в src/io/rate_budget.py.
+    """
+    __tablename__ = "llm_rate_keys"
+
+    key_hash = Column(String, primary_key=True)
+    updated_at = Column(DateTime, nullable=True)
+
+
+class LLMRateEvent(Base):
+    """
+    HTTP-запрос к API LLM в окне бюджета requests_per_minute (любого процесса).
+    """
+    __tablename__ = "llm_rate_events"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    key_hash = Column(String, nullable=False, index=True)
+    lane = Column(String, nullable=False)
+    requested_at = Column(DateTime, nullable=False, index=True)
+
+
+class AppMeta(Base):
+    """
+    Служебные пары ключ-значение (версии данных и т.п.).
+    """
+    __tablename__ = "app_meta"
+
+    key = Column(String, primary_key=True)
+    value = Column(Text, nullable=True)
+
+
+# Версия дерева категорий: sha256 загруженных строк, пишется load_categories_from_xlsx.
+# По ней снапшот дерева (src/classifier/category_snapshot.py) понимает, что устарел.
+CATEGORIES_VERSION_KEY = "categories_version"
+
+
+def create_app_meta_table(engine_: Engine | None = None) -> None:
+    AppMeta.__table__.create(engine_ or get_engine(), checkfirst=True)
+
+
+def get_meta(session: Session, key: str) -> Optional[str]:
+    row = session.get(AppMeta, key)
+    return row.value if row is not None else None
+
+
+def set_meta(session: Session, key: str, value: Optional[str]) -> None:
+    session.merge(AppMeta(key=key, value=value))
+
+
 @contextmanager
-def get_session() -> Iterator[Session]:
-    session: Session = SessionLocal()
+def get_session(session_factory: sessionmaker | None = None) -> Iterator[Session]:
+    session: Session = (session_factory or get_session_factory())()
     try:
         yield session
         session.commit()
@@ -107,6 +214,21 @@ def product_link_to_sku(pl: ProductLink) -> SKU:
     )
 
 
+def _classification_fields(result: ClassificationResult) -> dict:
+    return {
+        "category_code": result.category_code,
+        "category_path": result.category_path,
+        "inn": result.inn,
+        "dosage_form": result.dosage_form,
+        "age_restriction": result.age_restriction,
+        "otc": result.otc,
+        "confidence": result.confidence,
+        "needs_review": result.needs_review,
+        "classification_reason": result.reason,
+        "needs_reclassification": False,
+    }
+
+
 def save_classification_result(session: Session, product_link_id: int, result: ClassificationResult) -> None:
     """
     Сохраняет результат классификации в запись product_links.
@@ -124,6 +246,19 @@ def save_classification_result(session: Session, product_link_id: int, result: C
     pl.confidence = result.confidence
     pl.needs_review = result.needs_review
     pl.classification_reason = result.reason
+    pl.needs_reclassification = False
+
+
+def save_classification_results(
+    session: Session,
+    items: List[tuple[int, ClassificationResult]],
+) -> int:
+    """
+    Пакетно сохраняет результаты классификации: один executemany UPDATE по id
+    вместо загрузки каждой записи через ORM. Несуществующие id пропускаются БД.
+    """
+    rows = [{"id": product_link_id, **_classification_fields(result)} for product_link_id, result in items]
+    return bulk_update_by_pk(session, ProductLink, rows)
 
 
 def get_active_product_links(session: Session, limit: int = 100) -> List[ProductLink]:
@@ -137,56 +272,117 @@ def get_active_product_links(session: Session, limit: int = 100) -> List[Product
         .all()
     )
 
-def _normalize_column_name(name: str) -> str:
+def get_product_links_for_reclassification(session: Session, limit: int = 100) -> List[ProductLink]:
     """
-    Нормализует название колонки: заменяет Unicode-дефисы (U+2011, U+2010 и т.п.)
-    на обычный ASCII-дефис (U+002D). Excel часто использует non-breaking hyphen.
+    Активные product_links, у которых после импорта фида изменились имя или производитель.
     """
-    for char in ("\u2011", "\u2010", "\u2212", "\uFE58", "\u2013"):
-        name = name.replace(char, "-")
-    return name
+    return (
+        session.query(ProductLink)
+        .filter(ProductLink.is_active.is_(True), ProductLink.needs_reclassification.is_(True))
+        .limit(limit)
+        .all()
+    )
 
 
-def load_categories_from_xlsx(xlsx_path: str, sheet_name: str = 0) -> None:
+def get_product_links_by_ids(session: Session, ids: List[int]) -> List[ProductLink]:
+    """
+    Возвращает product_links по списку id (порядок не гарантируется).
+    """
+    if not ids:
+        return []
+    return session.query(ProductLink).filter(ProductLink.id.in_(ids)).all()
+
+
+# Маппинг колонок xlsx классификатора -> поля CategoryDB.
+# TODO: скорректировать названия колонок под реальный файл.
+CATEGORY_COLUMN_MAPPING = {
+    "Код категории": "code",
+    "Уровень иерархии": "level",
+    "Направление": "direction",
+    "Потребность / Нозология": "need",
+    "Категория": "category",
+    "МНН-кластер": "inn_cluster",
+    "Тип препарата / товара": "product_type",
+    "Возрастной сегмент": "age_segment",
+    "Способ введения": "administration_route",
+    "Степень дифференциации категории": "differentiation",
+    "Комментарий / правила включения": "comment",
+}
+
+
+def load_categories_from_xlsx(
+    xlsx_path: str,
+    sheet_name: str | int = 0,
+    engine_: Engine | None = None,
+    chunk_size: int | None = None,
+) -> int:
     """
     Загружает классификатор категорий из xlsx в таблицу categories.
 
-    Ожидается, что в xlsx есть колонки с именами, соответствующими русским заголовкам.
-    Маппинг можно будет скорректировать, когда приедет финальный файл.
-    """
-    df = pd.read_excel(xlsx_path, sheet_name=sheet_name)
-
-    # Нормализуем названия колонок (Excel может использовать U+2011 вместо U+002D)
-    df.columns = [_normalize_column_name(str(c)) for c in df.columns]
-
-    # Простейший маппинг колонок xlsx -> поля модели.
-    # TODO: скорректировать названия колонок под реальный файл.
-    column_mapping = {
-        "Код категории": "code",
-        "Уровень иерархии": "level",
-        "Направление": "direction",
-        "Потребность / Нозология": "need",
-        "Категория": "category",
-        "МНН-кластер": "inn_cluster",
-        "Тип препарата / товара": "product_type",
-        "Возрастной сегмент": "age_segment",
-        "Способ введения": "administration_route",
-        "Степень дифференциации категории": "differentiation",
-        "Комментарий / правила включения": "comment",
-    }
+    - Лист читается потоково (openpyxl read_only), названия колонок нормализуются
+      (Excel может использовать U+2011 вместо U+002D).
+    - Строки вставляются чанками во временную таблицу со схемой CategoryDB
+      (с первичным ключом code); пустые и повторяющиеся коды — ошибка.
+    - В конце в той же транзакции старая таблица удаляется, а временная
+      переименовывается в categories: читатели видят либо старое дерево,
+      либо новое целиком. При ошибке старое дерево остаётся нетронутым.
 
-    # Переименуем только те колонки, которые реально есть в файле
-    existing_mapping = {
-        src: dst for src, dst in column_mapping.items() if src in df.columns
-    }
-    df = df.rename(columns=existing_mapping)
+    - В той же транзакции в app_meta записывается версия дерева
+      (CATEGORIES_VERSION_KEY): по ней перестраивается снапшот категорий.
+
+    Возвращает число загруженных категорий.
+    """
+    engine_ = engine_ or get_engine()
+    chunk_size = chunk_size or config.db.bulk_chunk_size
+
+    rows = iter_xlsx_rows(
+        xlsx_path,
+        sheet_name=sheet_name,
+        column_mapping=CATEGORY_COLUMN_MAPPING,
+        required=["Код категории"],
+    )
+
+    target = CategoryDB.__table__
+    staging = target.to_metadata(MetaData(), name=f"{target.name}__staging")
+
+    # Старый staging от прерванной загрузки удаляем заранее
+    staging.drop(engine_, checkfirst=True)
+    staging.create(engine_)
+
+    seen_codes: set[str] = set()
+    loaded = 0
+    version = hashlib.sha256()
+    try:
+        with engine_.begin() as conn:
+            for chunk in chunked(rows, chunk_size):
+                for offset, row in enumerate(chunk):
+                    code = row.get("code")
+                    if not code:
+                        raise ValueError(f"Empty category code in record {loaded + offset + 1} of {xlsx_path}")
+                    if code in seen_codes:
+                        raise ValueError(f"Duplicate category code {code!r} in {xlsx_path}")
+                    seen_codes.add(code)
+                    version.update(json.dumps(row, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+                conn.execute(staging.insert(), chunk)
+                loaded += len(chunk)
+
+            if not loaded:
+                raise ValueError(f"No categories found in {xlsx_path}")
+
+            # Атомарная подмена: DROP + RENAME в одной транзакции
+            target.drop(conn, checkfirst=True)
+            conn.exec_driver_sql(f"ALTER TABLE {staging.name} RENAME TO {target.name}")
+
+            meta = AppMeta.__table__
+            meta.create(conn, checkfirst=True)
+            conn.execute(delete(meta).where(meta.c.key == CATEGORIES_VERSION_KEY))
+            conn.execute(meta.insert().values(key=CATEGORIES_VERSION_KEY, value=version.hexdigest()))
+    except Exception:
+        staging.drop(engine_, checkfirst=True)
+        raise
 
-    # Оставим только те целевые колонки, которые реально получились
-    available_targets = [dst for dst in existing_mapping.values() if dst in df.columns]
-    df = df[available_targets]
+    return loaded
 
-    # Запишем в БД (если таблица уже есть, заменим)
-    df.to_sql("categories", con=engine, if_exists="replace", index=False)
 
 def category_db_to_domain(cat_db: CategoryDB) -> Category:
     """
@@ -201,6 +397,8 @@ def category_db_to_domain(cat_db: CategoryDB) -> Category:
         inn_cluster=getattr(cat_db, "inn_cluster", None),
         dosage_form=cat_db.product_type,
         age_segment=cat_db.age_segment,
+        administration_route=cat_db.administration_route,
+        comment=cat_db.comment,
     )
 
 
@@ -0,0 +1,81 @@
+# src/io/file_io.py
+"""
+Файловые утилиты: атомарная запись JSON и простой JSON-кэш ответов LLM.
+
+Кэш нужен для повторных прогонов оценки (evaluate_on_testset --use-cache):
+ключ — отпечаток запроса (request_fingerprint: модель + system + user промпт),
+поэтому при изменении промпта или дерева категорий кэш сам перестаёт совпадать.
+"""
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+def write_json_atomic(path: str | Path, data: Any) -> None:
+    """Пишет JSON во временный файл рядом и подменяет им path (os.replace)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, ensure_ascii=False, indent=2, default=str)
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+
+class JsonFileCache:
+    """
+    Кэш «ключ -> JSON-значение» в одном файле.
+
+    Файл читается целиком при создании, изменения копятся в памяти и
+    записываются save() (или при выходе из контекстного менеджера).
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self._path = Path(path)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._data: Dict[str, Any] = {}
+        if self._path.exists():
+            with open(self._path, encoding="utf-8") as fh:
+                self._data = json.load(fh)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._dirty = True
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            write_json_atomic(self._path, self._data)
+            self._dirty = False
+
+    def __enter__(self) -> "JsonFileCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.save()
@@ -0,0 +1,351 @@
+# src/io/job_queue.py
+"""
+Персистентная очередь классификации на аренде (lease) задач.
+
+Несколько процессов (на одной машине или на разных, с общей БД) разбирают
+таблицу classification_jobs:
+- claim_jobs атомарно переводит пачку pending-задач в leased за одним владельцем;
+- пока пачка обрабатывается, воркер продлевает аренду (heartbeat_jobs);
+- complete_job / fail_job / release_jobs завершают задачу, отправляют её
+  на повтор или возвращают в очередь;
+- задачи, которые упали max_attempts раз (или чья аренда истекла столько раз),
+  уходят в dead и больше не выдаются.
+
+Все функции синхронные и принимают Session — из asyncio их вызывают
+через AsyncDB.write.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, case, func, literal, or_, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from src.io import db_io
+from src.io.db_backend import bulk_upsert
+from src.io.db_io import ClassificationJob, ProductLink
+
+JOB_PENDING = "pending"
+JOB_LEASED = "leased"
+JOB_DONE = "done"
+JOB_DEAD = "dead"
+
+# Чтобы огромные трейсбеки не раздували таблицу
+MAX_ERROR_LENGTH = 2000
+
+
+def _utcnow() -> datetime:
+    # В БД храним «наивное» UTC-время, как и в остальных колонках DateTime
+    return datetime.utcnow()
+
+
+def create_job_queue_table(engine_: Optional[Engine] = None) -> None:
+    """
+    Создаёт таблицу classification_jobs, если её ещё нет.
+    """
+    ClassificationJob.__table__.create(bind=engine_ or db_io.get_engine(), checkfirst=True)
+
+
+def enqueue_jobs(session: Session, product_link_ids: Iterable[int]) -> int:
+    """
+    Ставит в очередь указанные product_links одним пакетным
+    INSERT ... ON CONFLICT DO NOTHING: уже существующие задачи не трогает.
+    Возвращает число переданных (уникальных) id.
+    """
+    now = _utcnow()
+    rows = [
+        {"product_link_id": i, "status": JOB_PENDING, "attempts": 0, "updated_at": now}
+        for i in dict.fromkeys(int(i) for i in product_link_ids)
+    ]
+    return bulk_upsert(session, ClassificationJob.__table__, rows, conflict_columns=["product_link_id"])
+
+
+def enqueue_active_product_links(session: Session) -> int:
+    """
+    Ставит в очередь все активные product_links, для которых задачи ещё нет.
+    Выполняется одним INSERT ... SELECT на стороне БД.
+    """
+    already_queued = select(ClassificationJob.product_link_id).where(
+        ClassificationJob.product_link_id == ProductLink.id
+    )
+    source = select(
+        ProductLink.id,
+        literal(JOB_PENDING),
+        literal(0),
+        literal(_utcnow()),
+    ).where(ProductLink.is_active.is_(True), ~already_queued.exists())
+
+    result = session.execute(
+        ClassificationJob.__table__.insert().from_select(
+            ["product_link_id", "status", "attempts", "updated_at"], source
+        )
+    )
+    return result.rowcount or 0
+
+
+def enqueue_reclassification(session: Session) -> int:
+    """
+    Ставит в очередь активные product_links с needs_reclassification=True
+    (их помечает импорт фида, src/io/product_feed.py).
+
+    Завершённые и мёртвые задачи по таким записям возвращаются в pending,
+    недостающие создаются INSERT ... SELECT. Задачи в pending/leased не трогаем:
+    воркер и так прочитает актуальные поля product_links.
+    """
+    now = _utcnow()
+    flagged = select(ProductLink.id).where(
+        ProductLink.is_active.is_(True), ProductLink.needs_reclassification.is_(True)
+    )
+    reset = session.execute(
+        update(ClassificationJob)
+        .where(
+            ClassificationJob.product_link_id.in_(flagged),
+            ClassificationJob.status.in_([JOB_DONE, JOB_DEAD]),
+        )
+        .values(status=JOB_PENDING, attempts=0, lease_owner=None, lease_expires_at=None,
+                last_error=None, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+
+    already_queued = select(ClassificationJob.product_link_id).where(
+        ClassificationJob.product_link_id == ProductLink.id
+    )
+    source = select(
+        ProductLink.id,
+        literal(JOB_PENDING),
+        literal(0),
+        literal(now),
+    ).where(
+        ProductLink.is_active.is_(True),
+        ProductLink.needs_reclassification.is_(True),
+        ~already_queued.exists(),
+    )
+    inserted = session.execute(
+        ClassificationJob.__table__.insert().from_select(
+            ["product_link_id", "status", "attempts", "updated_at"], source
+        )
+    )
+    return (reset.rowcount or 0) + (inserted.rowcount or 0)
+
+
+def _reap_expired_leases(session: Session, now: datetime, max_attempts: int) -> None:
+    """
+    Возвращает в очередь задачи с истёкшей арендой (воркер умер или завис).
+    Если попытки исчерпаны — задача уходит в dead.
+    """
+    expired = and_(
+        ClassificationJob.status == JOB_LEASED,
+        ClassificationJob.lease_expires_at < now,
+    )
+    session.execute(
+        update(ClassificationJob)
+        .where(expired, ClassificationJob.attempts >= max_attempts)
+        .values(
+            status=JOB_DEAD,
+            lease_owner=None,
+            last_error=func.coalesce(ClassificationJob.last_error, "lease expired"),
+            updated_at=now,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    session.execute(
+        update(ClassificationJob)
+        .where(expired)
+        .values(status=JOB_PENDING, lease_owner=None, lease_expires_at=None, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def claim_jobs(
+    session: Session,
+    owner: str,
+    limit: int,
+    lease_seconds: float,
+    max_attempts: int,
+    now: Optional[datetime] = None,
+) -> List[int]:
+    """
+    Атомарно забирает до limit задач в аренду за owner и возвращает их product_link_id.
+
+    Выдача — один UPDATE ... WHERE product_link_id IN (SELECT ... LIMIT n):
+    в SQLite он выполняется под блокировкой записи, в PostgreSQL условие
+    status='pending' перепроверяется для уже заблокированных строк, так что
+    одну задачу не получат два воркера. Свои строки находим по точному
+    значению lease_expires_at этого claim.
+    """
+    now = now or _utcnow()
+    expires_at = now + timedelta(seconds=lease_seconds)
+
+    _reap_expired_leases(session, now, max_attempts)
+
+    claimable = and_(
+        ClassificationJob.status == JOB_PENDING,
+        or_(
+            ClassificationJob.lease_expires_at.is_(None),
+            ClassificationJob.lease_expires_at <= now,
+        ),
+    )
+    candidates = (
+        select(ClassificationJob.product_link_id)
+        .where(claimable)
+        .order_by(ClassificationJob.product_link_id)
+        .limit(limit)
+        .scalar_subquery()
+    )
+    session.execute(
+        update(ClassificationJob)
+        .where(ClassificationJob.product_link_id.in_(candidates), claimable)
+        .values(
+            status=JOB_LEASED,
+            lease_owner=owner,
+            lease_expires_at=expires_at,
+            attempts=ClassificationJob.attempts + 1,
+            updated_at=now,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return list(
+        session.scalars(
+            select(ClassificationJob.product_link_id)
+            .where(
+                ClassificationJob.status == JOB_LEASED,
+                ClassificationJob.lease_owner == owner,
+                ClassificationJob.lease_expires_at == expires_at,
+            )
+            .order_by(ClassificationJob.product_link_id)
+        )
+    )
+
+
+def get_job_attempts(session: Session, ids: Iterable[int]) -> Dict[int, int]:
+    """
+    Номер текущей попытки по задачам (для тегов метрик воркера).
+    """
+    rows = session.execute(
+        select(ClassificationJob.product_link_id, ClassificationJob.attempts)
+        .where(ClassificationJob.product_link_id.in_(list(ids)))
+    ).all()
+    return {product_link_id: attempts for product_link_id, attempts in rows}
+
+
+def _owned(owner: str, ids: Iterable[int]):
+    return and_(
+        ClassificationJob.product_link_id.in_(list(ids)),
+        ClassificationJob.status == JOB_LEASED,
+        ClassificationJob.lease_owner == owner,
+    )
+
+
+def heartbeat_jobs(session: Session, owner: str, ids: Iterable[int], lease_seconds: float) -> int:
+    """
+    Продлевает аренду задач, которые всё ещё принадлежат owner.
+    Возвращает число продлённых задач (меньше ожидаемого — аренду перехватили).
+    """
+    now = _utcnow()
+    result = session.execute(
+        update(ClassificationJob)
+        .where(_owned(owner, ids))
+        .values(lease_expires_at=now + timedelta(seconds=lease_seconds), updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount or 0
+
+
+def complete_job(session: Session, owner: str, product_link_id: int) -> bool:
+    """
+    Помечает задачу выполненной. False — аренда уже потеряна (задачу забрал другой воркер).
+    """
+    result = session.execute(
+        update(ClassificationJob)
+        .where(_owned(owner, [product_link_id]))
+        .values(
+            status=JOB_DONE,
+            lease_owner=None,
+            lease_expires_at=None,
+            last_error=None,
+            updated_at=_utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return bool(result.rowcount)
+
+
+def fail_job(
+    session: Session,
+    owner: str,
+    product_link_id: int,
+    error: str,
+    max_attempts: int,
+    retry_delay_seconds: float = 0.0,
+) -> Optional[str]:
+    """
+    Фиксирует неудачу: задача возвращается в pending (не раньше чем через
+    retry_delay_seconds) либо, если попытки исчерпаны, уходит в dead.
+    Возвращает новый статус или None, если аренда уже потеряна.
+    """
+    job: ClassificationJob | None = session.get(ClassificationJob, product_link_id)
+    if job is None or job.status != JOB_LEASED or job.lease_owner != owner:
+        return None
+
+    now = _utcnow()
+    job.last_error = (error or "")[:MAX_ERROR_LENGTH]
+    job.lease_owner = None
+    job.updated_at = now
+    if job.attempts >= max_attempts:
+        job.status = JOB_DEAD
+        job.lease_expires_at = None
+    else:
+        job.status = JOB_PENDING
+        job.lease_expires_at = now + timedelta(seconds=retry_delay_seconds)
+    return job.status
+
+
+def release_jobs(session: Session, owner: str, ids: Iterable[int]) -> int:
+    """
+    Возвращает необработанные задачи в очередь (штатная остановка воркера).
+    Попытка при этом не засчитывается.
+    """
+    result = session.execute(
+        update(ClassificationJob)
+        .where(_owned(owner, ids))
+        .values(
+            status=JOB_PENDING,
+            lease_owner=None,
+            lease_expires_at=None,
+            attempts=case(
+                (ClassificationJob.attempts > 0, ClassificationJob.attempts - 1),
+                else_=0,
+            ),
+            updated_at=_utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount or 0
+
+
+def requeue_dead_jobs(session: Session) -> int:
+    """
+    Возвращает dead-задачи в очередь с обнулённым счётчиком попыток
+    (например, после исправления промпта или дерева категорий).
+    """
+    result = session.execute(
+        update(ClassificationJob)
+        .where(ClassificationJob.status == JOB_DEAD)
+        .values(status=JOB_PENDING, attempts=0, lease_expires_at=None, updated_at=_utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount or 0
+
+
+def get_queue_stats(session: Session) -> Dict[str, int]:
+    """
+    Количество задач по статусам.
+    """
+    rows = session.execute(
+        select(ClassificationJob.status, func.count()).group_by(ClassificationJob.status)
+    ).all()
+    stats = {JOB_PENDING: 0, JOB_LEASED: 0, JOB_DONE: 0, JOB_DEAD: 0}
+    stats.update({status: count for status, count in rows})
+    return stats
@@ -0,0 +1,318 @@
+# src/io/product_feed.py
+"""
+Дельта-импорт выгрузок 1С/АСНА (CSV или xlsx) в product_links.
+
+- Файл читается потоково и обрабатывается чанками.
+- Строка фида сопоставляется с существующей записью по code_1c,
+  а если кода 1С нет (или он не найден) — по code_asna.
+- Новые строки вставляются пачкой, изменённые обновляются пачкой,
+  у неизменённых только отмечается last_seen_at.
+- needs_reclassification ставится только если реально изменились
+  name_1c / manufacturer_1c / name_asna (без учёта регистра и пробелов):
+  перестановка колонок или лишние пробелы в выгрузке не порождают работы для LLM.
+  Сравниваются и обновляются только поля, колонки которых есть в заголовке фида:
+  выгрузка только из АСНА не затирает имя и производителя 1С.
+- Для полного фида (full=True) активные записи, которых нет в фиде,
+  деактивируются.
+
+Весь импорт выполняется в одной транзакции: читатели видят либо старое
+состояние, либо результат импорта целиком.
+"""
+from __future__ import annotations
+
+import csv
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import AbstractSet, Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+from src.config import config
+from src.io.db_io import ProductLink
+from src.io.xlsx_stream import _normalize_column_name, cell_to_text, chunked, iter_xlsx_rows
+
+# Заголовки выгрузок -> поля ProductLink (поддерживаем и имена полей как есть)
+FEED_COLUMN_MAPPING = {
+    "Код 1С": "code_1c",
+    "Код АСНА": "code_asna",
+    "Наименование 1С": "name_1c",
+    "Наименование": "name_1c",
+    "Производитель": "manufacturer_1c",
+    "Производитель 1С": "manufacturer_1c",
+    "Наименование АСНА": "name_asna",
+    "code_1c": "code_1c",
+    "code_asna": "code_asna",
+    "name_1c": "name_1c",
+    "manufacturer_1c": "manufacturer_1c",
+    "name_asna": "name_asna",
+}
+
+TRACKED_FIELDS = ("name_1c", "manufacturer_1c", "name_asna")
+
+
+@dataclass
+class FeedImportStats:
+    total: int = 0  # строк в фиде
+    inserted: int = 0
+    changed: int = 0  # изменились отслеживаемые поля -> needs_reclassification
+    unchanged: int = 0
+    reactivated: int = 0
+    deactivated: int = 0
+    rejected: int = 0  # нет ни одного кода
+    duplicates: int = 0  # повтор ключа во всём фиде (берётся последняя строка)
+
+
+def _parse_code(value: Any) -> Optional[int]:
+    text = cell_to_text(value)
+    if text is None:
+        return None
+    try:
+        return int(float(text.replace(" ", "").replace(",", ".")))
+    except ValueError:
+        return None
+
+
+def _norm_text(value: Optional[str]) -> str:
+    """Сравнение имён: без регистра, лишних пробелов и мусора вроде "nan"."""
+    text = cell_to_text(value)
+    return " ".join(text.casefold().split()) if text else ""
+
+
+def _iter_csv_rows(path: str, delimiter: Optional[str]) -> Iterator[Dict[str, Optional[str]]]:
+    with open(path, newline="", encoding="utf-8-sig") as fh:
+        if delimiter is None:
+            sample = fh.read(64 * 1024)
+            fh.seek(0)
+            try:
+                delimiter = csv.Sniffer().sniff(sample, delimiters=";,\t|").delimiter
+            except csv.Error:
+                delimiter = ";"  # 1С по умолчанию выгружает через точку с запятой
+        reader = csv.reader(fh, delimiter=delimiter)
+        header = next(reader, None)
+        if header is None:
+            return
+        names = [_normalize_column_name(h).strip() for h in header]
+        positions = [(i, FEED_COLUMN_MAPPING[n]) for i, n in enumerate(names) if n in FEED_COLUMN_MAPPING]
+        for row in reader:
+            record = {target: cell_to_text(row[i]) if i < len(row) else None for i, target in positions}
+            if any(v is not None for v in record.values()):
+                yield record
+
+
+def iter_feed_rows(
+    path: str,
+    sheet_name: str | int = 0,
+    delimiter: Optional[str] = None,
+) -> Iterator[Dict[str, Optional[str]]]:
+    """
+    Потоково читает фид (CSV или xlsx) и отдаёт словари с полями ProductLink.
+    """
+    if Path(path).suffix.lower() in (".xlsx", ".xlsm"):
+        return iter_xlsx_rows(path, sheet_name=sheet_name, column_mapping=FEED_COLUMN_MAPPING)
+    return _iter_csv_rows(path, delimiter)
+
+
+def _feed_key(row: Dict[str, Any]) -> Optional[Tuple[str, int]]:
+    if row["code_1c"] is not None:
+        return ("1c", row["code_1c"])
+    if row["code_asna"] is not None:
+        return ("asna", row["code_asna"])
+    return None
+
+
+def _load_existing(session: Session, rows: List[Dict[str, Any]]) -> Dict[Tuple[str, int], Dict[str, Any]]:
+    """
+    Существующие записи для чанка: сначала по code_1c, затем для оставшихся — по code_asna.
+    """
+    columns = (
+        ProductLink.id,
+        ProductLink.code_1c,
+        ProductLink.code_asna,
+        ProductLink.name_1c,
+        ProductLink.manufacturer_1c,
+        ProductLink.name_asna,
+        ProductLink.is_active,
+    )
+    found: Dict[Tuple[str, int], Dict[str, Any]] = {}
+
+    codes_1c = [r["code_1c"] for r in rows if r["code_1c"] is not None]
+    by_1c: Dict[int, Dict[str, Any]] = {}
+    if codes_1c:
+        for rec in session.execute(select(*columns).where(ProductLink.code_1c.in_(codes_1c))).mappings():
+            # При дублях code_1c в БД берём запись с наименьшим id — стабильно между импортами
+            prev = by_1c.get(rec["code_1c"])
+            if prev is None or rec["id"] < prev["id"]:
+                by_1c[rec["code_1c"]] = dict(rec)
+
+    unmatched_asna = [
+        r["code_asna"] for r in rows
+        if r["code_asna"] is not None and (r["code_1c"] is None or r["code_1c"] not in by_1c)
+    ]
+    by_asna: Dict[int, Dict[str, Any]] = {}
+    if unmatched_asna:
+        for rec in session.execute(select(*columns).where(ProductLink.code_asna.in_(unmatched_asna))).mappings():
+            prev = by_asna.get(rec["code_asna"])
+            if prev is None or rec["id"] < prev["id"]:
+                by_asna[rec["code_asna"]] = dict(rec)
+
+    for row in rows:
+        key = _feed_key(row)
+        if row["code_1c"] is not None and row["code_1c"] in by_1c:
+            found[key] = by_1c[row["code_1c"]]
+        elif row["code_asna"] is not None and row["code_asna"] in by_asna:
+            found[key] = by_asna[row["code_asna"]]
+    return found
+
+
+def _import_chunk(
+    session: Session,
+    rows: List[Dict[str, Any]],
+    now: datetime,
+    stats: FeedImportStats,
+    repeated: AbstractSet[Tuple[str, int]] = frozenset(),
+) -> None:
+    """
+    Применяет чанк без повторов ключа. repeated — ключи, уже встречавшиеся
+    в предыдущих чанках: строка применяется (последняя побеждает), но в
+    changed / unchanged / reactivated второй раз не считается.
+    """
+    existing = _load_existing(session, rows)
+    ignored = FeedImportStats()  # счётчики для ключей из repeated: они уже учтены
+
+    inserts: List[Dict[str, Any]] = []
+    updates: List[Dict[str, Any]] = []
+    seen_ids: List[int] = []
+
+    for row in rows:
+        current = existing.get(_feed_key(row))
+        counts = ignored if _feed_key(row) in repeated else stats
+        # Отслеживаемые поля, колонки которых есть в фиде (остальные не трогаем)
+        fields = [f for f in TRACKED_FIELDS if f in row]
+        if current is None:
+            inserts.append(
+                {
+                    **{f: None for f in TRACKED_FIELDS},
+                    **row,
+                    # name_1c NOT NULL: для строк только из АСНА кладём пустую строку,
+                    # product_link_to_sku тогда возьмёт name_asna
+                    "name_1c": row.get("name_1c") or "",
+                    "created_at": now,
+                    "updated_at": now,
+                    "is_active": True,
+                    "needs_reclassification": True,
+                    "last_seen_at": now,
+                }
+            )
+            continue
+
+        changed = any(_norm_text(row[f]) != _norm_text(current[f]) for f in fields)
+        codes_changed = (
+            (row["code_1c"] is not None and row["code_1c"] != current["code_1c"])
+            or (row["code_asna"] is not None and row["code_asna"] != current["code_asna"])
+        )
+        reactivated = not current["is_active"]
+
+        if changed or codes_changed or reactivated:
+            values: Dict[str, Any] = {
+                "id": current["id"],
+                "code_1c": row["code_1c"] if row["code_1c"] is not None else current["code_1c"],
+                "code_asna": row["code_asna"] if row["code_asna"] is not None else current["code_asna"],
+                "is_active": True,
+                "updated_at": now,
+                "last_seen_at": now,
+            }
+            if changed:
+                values.update({f: row[f] for f in fields}, needs_reclassification=True)
+                if "name_1c" in values:
+                    values["name_1c"] = values["name_1c"] or ""
+                counts.changed += 1
+            else:
+                counts.unchanged += 1
+            if reactivated:
+                counts.reactivated += 1
+            updates.append(values)
+        else:
+            seen_ids.append(current["id"])
+            counts.unchanged += 1
+
+    if inserts:
+        session.execute(ProductLink.__table__.insert(), inserts)
+        stats.inserted += len(inserts)
+
+    # executemany UPDATE по id: строки с изменёнными именами и без — разные наборы колонок
+    groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+    for values in updates:
+        groups.setdefault(tuple(sorted(values)), []).append(values)
+    for group in groups.values():
+        session.execute(update(ProductLink), group)
+
+    if seen_ids:
+        session.execute(
+            update(ProductLink)
+            .where(ProductLink.id.in_(seen_ids))
+            .values(last_seen_at=now)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def import_product_feed(
+    session: Session,
+    path: str,
+    full: bool = False,
+    sheet_name: str | int = 0,
+    delimiter: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> FeedImportStats:
+    """
+    Импортирует фид в product_links (в рамках переданной сессии/транзакции).
+
+    full=True — фид полный: активные записи, которые в нём не встретились,
+    помечаются is_active=False.
+    """
+    now = now or datetime.utcnow()
+    chunk_size = chunk_size or config.db.bulk_chunk_size
+    stats = FeedImportStats()
+
+    def parsed_rows() -> Iterator[Dict[str, Any]]:
+        for raw in iter_feed_rows(path, sheet_name=sheet_name, delimiter=delimiter):
+            stats.total += 1
+            row = {
+                "code_1c": _parse_code(raw.get("code_1c")),
+                "code_asna": _parse_code(raw.get("code_asna")),
+            }
+            # Ключи записи — колонки заголовка: отсутствующая колонка не равна пустой ячейке
+            row.update({f: cell_to_text(raw[f]) for f in TRACKED_FIELDS if f in raw})
+            if _feed_key(row) is None:
+                stats.rejected += 1
+                continue
+            yield row
+
+    # Ключи всех уже применённых строк: повтор из следующего чанка — тоже дубликат
+    seen_keys: Set[Tuple[str, int]] = set()
+    for chunk in chunked(parsed_rows(), chunk_size):
+        # Повторы ключа внутри чанка: последняя строка побеждает
+        deduped: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        for row in chunk:
+            deduped[_feed_key(row)] = row
+        repeated = seen_keys.intersection(deduped)
+        stats.duplicates += len(chunk) - len(deduped) + len(repeated)
+        seen_keys.update(deduped)
+        _import_chunk(session, list(deduped.values()), now, stats, repeated)
+        session.flush()
+
+    if full:
+        result = session.execute(
+            update(ProductLink)
+            .where(
+                ProductLink.is_active.is_(True),
+                or_(ProductLink.last_seen_at.is_(None), ProductLink.last_seen_at < now),
+            )
+            .values(is_active=False, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        stats.deactivated = result.rowcount or 0
+
+    return stats
@@ -0,0 +1,147 @@
+# src/io/rate_budget.py
+"""
+Общий между процессами бюджет запросов к API LLM (config.scheduler.requests_per_minute).
+
+LLMScheduler делит бюджет только внутри процесса, а ночная пачка
+(run_batch_classification, run_queue_worker) и онлайн-сервер — разные
+процессы с одним ключом API. Поэтому каждый HTTP-запрос дополнительно
+отмечается в таблице llm_rate_events общей БД:
+
+- take_rate_token в одной транзакции блокирует строку ключа (llm_rate_keys),
+  считает запросы всех процессов за последнюю минуту и, если бюджет за вычетом
+  неиспользованных резервов других полос позволяет, записывает запрос;
+  иначе возвращает, сколько ждать до освобождения окна;
+- ключ API хранится только как хэш; записи старше окна удаляются по ходу.
+
+Время — datetime.utcnow() процесса: часы машин с общей БД должны быть синхронизированы.
+Функции синхронные и принимают Session — из asyncio их вызывает SharedRateBudget
+через AsyncDB.write.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Mapping, Optional
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from src.config import SchedulerConfig, config, getenv
+from src.io.async_db import AsyncDB
+from src.io.db_backend import bulk_upsert
+from src.io.db_io import LLMRateEvent, LLMRateKey
+from src.observability.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 60.0
+# Пауза перед повторной попыткой взять токен: не чаще и не реже этих границ
+MIN_POLL_SECONDS = 0.05
+MAX_POLL_SECONDS = 1.0
+
+
+def budget_key(api_key: str) -> str:
+    """Ключ бюджета: хэш ключа API (сам ключ в БД не пишем)."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def ensure_rate_budget_tables(session: Session) -> None:
+    """Создаёт llm_rate_keys / llm_rate_events, если их ещё нет."""
+    for model in (LLMRateKey, LLMRateEvent):
+        model.__table__.create(session.connection(), checkfirst=True)
+
+
+def take_rate_token(
+    session: Session,
+    key: str,
+    lane: str,
+    limit: int,
+    reserved: Optional[Mapping[str, int]] = None,
+    window_seconds: float = WINDOW_SECONDS,
+    now: Optional[datetime] = None,
+) -> Optional[float]:
+    """
+    Пытается записать HTTP-запрос полосы lane в общий бюджет ключа key.
+
+    reserved — сколько запросов в минуту закреплено за полосами: чужой
+    неиспользованный резерв полосе lane недоступен. None — запрос записан,
+    иначе число секунд, через которое освободится место в окне.
+    """
+    now = now or datetime.utcnow()
+    horizon = now - timedelta(seconds=window_seconds)
+
+    # Сначала запись: в SQLite она берёт блокировку БД, в PostgreSQL UPDATE
+    # блокирует строку ключа — подсчёт и вставка ниже идут без гонки процессов
+    bulk_upsert(session, LLMRateKey.__table__, [{"key_hash": key, "updated_at": now}], ["key_hash"])
+    session.execute(update(LLMRateKey).where(LLMRateKey.key_hash == key).values(updated_at=now))
+    session.execute(
+        delete(LLMRateEvent)
+        .where(LLMRateEvent.key_hash == key, LLMRateEvent.requested_at <= horizon)
+        .execution_options(synchronize_session=False)
+    )
+
+    recent: Dict[str, int] = dict(
+        session.execute(
+            select(LLMRateEvent.lane, func.count())
+            .where(LLMRateEvent.key_hash == key)
+            .group_by(LLMRateEvent.lane)
+        ).all()
+    )
+    unused = sum(max(0, share - recent.get(other, 0)) for other, share in (reserved or {}).items() if other != lane)
+    if sum(recent.values()) + unused < limit:
+        session.add(LLMRateEvent(key_hash=key, lane=lane, requested_at=now))
+        return None
+
+    oldest = session.scalar(select(func.min(LLMRateEvent.requested_at)).where(LLMRateEvent.key_hash == key))
+    if oldest is None:  # всё окно — чужой резерв: ждём, пока его начнут использовать или минута пройдёт
+        return window_seconds
+    return max(0.0, (oldest - horizon).total_seconds())
+
+
+class SharedRateBudget:
+    """
+    Async-обёртка над take_rate_token для LLMScheduler(shared_budget=...):
+    acquire(lane) ждёт, пока общий бюджет ключа API позволит ещё один запрос.
+    """
+
+    def __init__(self, db: AsyncDB, key: str, scheduler_config: Optional[SchedulerConfig] = None) -> None:
+        conf = scheduler_config or config.scheduler
+        if not conf.requests_per_minute:
+            raise ValueError("SharedRateBudget requires scheduler requests_per_minute")
+        self.db = db
+        self.key = key
+        self.limit = conf.requests_per_minute
+        self.reserved = {lane: math.ceil(share * self.limit) for lane, share in conf.reserved.items()}
+        self._ready = False
+
+    @classmethod
+    def from_config(
+        cls, db: Optional[AsyncDB], scheduler_config: Optional[SchedulerConfig] = None
+    ) -> Optional["SharedRateBudget"]:
+        """Общий бюджет, если он включён, задан requests_per_minute и есть ключ API; иначе None."""
+        conf = scheduler_config or config.scheduler
+        api_key = getenv(config.llm.api_key_env_var, "")
+        if db is None or not conf.shared_budget or not conf.requests_per_minute or not api_key:
+            return None
+        return cls(db, budget_key(api_key), conf)
+
+    async def acquire(self, lane: str) -> None:
+        started = time.perf_counter()
+        try:
+            if not self._ready:
+                await self.db.write(ensure_rate_budget_tables)
+                self._ready = True
+            while True:
+                wait = await self.db.write(take_rate_token, self.key, lane, self.limit, self.reserved)
+                if wait is None:
+                    return
+                await asyncio.sleep(min(max(wait, MIN_POLL_SECONDS), MAX_POLL_SECONDS))
+        except Exception:  # noqa: BLE001 — без общей БД остаётся бюджет процесса и ретраи на 429
+            metrics.inc("llm_shared_budget_errors_total")
+            logger.exception("Shared LLM rate budget unavailable, falling back to the per-process limit")
+        finally:
+            metrics.observe("llm_queue_wait", time.perf_counter() - started, lane=lane, resource="shared_rate")
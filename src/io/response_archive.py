@@ -0,0 +1,357 @@
+# src/io/response_archive.py
+"""
+Append-only архив пар «промпт → ответ LLM» для аудита и повторной оценки (replay).
+
+Формат на диске (каталог config.archive.directory):
+
+    seg-<время>-<pid>-<rand>.jsonl.gz        записи, пачками по flush_every в отдельных gzip-членах
+    seg-<время>-<pid>-<rand>.blobs.jsonl.gz  тексты промптов без повторов (по sha256)
+    seg-<время>-<pid>-<rand>.idx.jsonl       индекс: product_link_id -> смещение gzip-члена
+
+- Каждый процесс пишет только в свои сегменты, поэтому блокировки между
+  воркерами не нужны, а уже записанные файлы никогда не переписываются.
+- Промпт почти целиком одинаков для всех SKU (дерево категорий, few-shot),
+  поэтому в записи хранится ссылка на «шаблон» user-промпта, где имя SKU и
+  подсказка признаков из названия (prompt_hint) заменены плейсхолдерами; сам
+  шаблон пишется в blobs один раз на сегмент. В памяти держатся только тексты
+  текущего сегмента.
+- Кодек — gzip (stdlib) или zstd, если установлен пакет zstandard.
+  Оба формата допускают конкатенацию независимых членов/фреймов, так что
+  запись по индексу читается без распаковки всего сегмента.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+import zlib
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from src.config import ArchiveConfig, config
+
+logger = logging.getLogger(__name__)
+
+SKU_PLACEHOLDER = "\u0000SKU\u0000"
+HINT_PLACEHOLDER = "\u0000HINT\u0000"
+
+
+@dataclass
+class ArchiveRecord:
+    """
+    Одна пара «запрос → ответ» LLM.
+    """
+    sku_name: str
+    model: str
+    fingerprint: str  # sha256(model + промпты): одинаковые запросы дают одинаковый отпечаток
+    response: Optional[Dict[str, Any]]  # распарсенный JSON из content (None, если не распарсился)
+    product_link_id: Optional[int] = None
+    # "classify" — ответ с кодом категории; "extract" — первый вызов split-пайплайна
+    # (МНН без дерева, кода в ответе нет: код выбирается локально, см. rescoring)
+    kind: str = "classify"
+    system_prompt: Optional[str] = None
+    user_prompt: Optional[str] = None
+    prompt_hint: Optional[str] = None  # часть user-промпта, своя у каждого SKU (признаки из названия)
+    raw_content: Optional[str] = None  # сохраняется, только если JSON не распарсился
+    error: Optional[str] = None
+    usage: Optional[Dict[str, Any]] = None
+    started_at: str = field(default_factory=lambda: datetime.utcnow().isoformat(timespec="milliseconds"))
+    duration_seconds: Optional[float] = None
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def request_fingerprint(model: str, system_prompt: str, user_prompt: str) -> str:
+    """Отпечаток запроса: совпадает для идентичных model + промптов."""
+    return _sha256("␞".join((model, system_prompt, user_prompt)))
+
+
+# ---------- Кодеки ----------
+
+class _GzipCodec:
+    suffix = ".gz"
+
+    def compress(self, data: bytes) -> bytes:
+        return gzip.compress(data, compresslevel=6)
+
+    def open_stream(self, path: Path) -> BinaryIO:
+        # gzip.open читает подряд все члены multi-member файла
+        return gzip.open(path, "rb")
+
+    def read_member(self, fh: BinaryIO) -> bytes:
+        decomp = zlib.decompressobj(wbits=31)
+        out = []
+        while not decomp.eof:
+            chunk = fh.read(64 * 1024)
+            if not chunk:
+                break
+            out.append(decomp.decompress(chunk))
+        return b"".join(out)
+
+
+class _ZstdCodec:
+    suffix = ".zst"
+
+    def __init__(self) -> None:
+        import zstandard  # опциональная зависимость
+
+        self._zstd = zstandard
+
+    def compress(self, data: bytes) -> bytes:
+        return self._zstd.ZstdCompressor(level=10).compress(data)
+
+    def open_stream(self, path: Path) -> BinaryIO:
+        return self._zstd.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True)
+
+    def read_member(self, fh: BinaryIO) -> bytes:
+        decomp = self._zstd.ZstdDecompressor().decompressobj()
+        out = []
+        while not decomp.eof:
+            chunk = fh.read(64 * 1024)
+            if not chunk:
+                break
+            out.append(decomp.decompress(chunk))
+        return b"".join(out)
+
+
+def _make_codec(name: str):
+    if name == "zstd":
+        try:
+            return _ZstdCodec()
+        except ImportError:
+            logger.warning("zstandard is not installed, falling back to gzip for the LLM archive")
+    return _GzipCodec()
+
+
+def _codec_for_path(path: Path):
+    return _ZstdCodec() if path.name.endswith(".zst") else _GzipCodec()
+
+
+# ---------- Архив ----------
+
+class ResponseArchive:
+    """
+    Писатель и читатель архива. Один экземпляр пишет в собственный сегмент;
+    читать можно все сегменты каталога (включая чужие).
+    """
+
+    def __init__(self, directory: str | Path, archive_config: Optional[ArchiveConfig] = None) -> None:
+        self._conf = archive_config or config.archive
+        self._dir = Path(directory)
+        self._codec = _make_codec(self._conf.codec)
+        self._lock = threading.Lock()
+        # (product_link_id, fingerprint, json, ссылки на blobs)
+        self._pending: List[Tuple[Optional[int], str, str, Tuple[str, ...]]] = []
+        self._segment: Optional[Path] = None
+        self._blob_texts: Dict[str, str] = {}  # тексты промптов текущего сегмента (шаблонов немного)
+        self._written_blobs: set[str] = set()  # уже записанные в blobs текущего сегмента
+        self._closed = False
+
+    @classmethod
+    def from_config(cls, archive_config: Optional[ArchiveConfig] = None) -> Optional["ResponseArchive"]:
+        """Архив из config.archive или None, если архивирование выключено."""
+        conf = archive_config or config.archive
+        if not conf.enabled:
+            return None
+        return cls(conf.directory, conf)
+
+    # ----- запись -----
+
+    def append(self, record: ArchiveRecord) -> None:
+        """
+        Добавляет запись в буфер; на диск буфер уходит каждые flush_every записей.
+        Тексты промптов заменяются ссылками на blobs.
+        """
+        data = asdict(record)
+        system_prompt = data.pop("system_prompt")
+        user_prompt = data.pop("user_prompt")
+        if not record.prompt_hint:
+            data.pop("prompt_hint")
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("ResponseArchive is closed")
+            if system_prompt is not None:
+                data["system_prompt_ref"] = self._remember_blob(system_prompt)
+            if user_prompt is not None:
+                template = user_prompt.replace(record.sku_name, SKU_PLACEHOLDER) if record.sku_name else user_prompt
+                if record.prompt_hint:
+                    template = template.replace(record.prompt_hint, HINT_PLACEHOLDER)
+                data["user_prompt_ref"] = self._remember_blob(template)
+
+            line = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+            refs = tuple(data[k] for k in ("system_prompt_ref", "user_prompt_ref") if k in data)
+            self._pending.append((record.product_link_id, record.fingerprint, line, refs))
+            if len(self._pending) >= self._conf.flush_every:
+                self._flush_locked()
+
+    def _remember_blob(self, text: str) -> str:
+        ref = _sha256(text)
+        self._blob_texts.setdefault(ref, text)
+        return ref
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _segment_path(self) -> Path:
+        if self._segment is None or (
+            self._segment.exists() and self._segment.stat().st_size >= self._conf.segment_max_bytes
+        ):
+            self._dir.mkdir(parents=True, exist_ok=True)
+            stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+            name = f"seg-{stamp}-{os.getpid()}-{uuid.uuid4().hex[:6]}.jsonl{self._codec.suffix}"
+            self._segment = self._dir / name
+            # blobs у каждого сегмента свои: сегмент самодостаточен. Тексты прежнего
+            # сегмента больше не нужны, кроме тех, на которые ссылаются записи в буфере
+            self._blob_texts = {ref: self._blob_texts[ref] for *_, refs in self._pending for ref in refs}
+            self._written_blobs = set()
+        return self._segment
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+
+        segment = self._segment_path()
+        new_blobs = {ref: text for ref, text in self._blob_texts.items() if ref not in self._written_blobs}
+        if new_blobs:
+            blob_lines = "".join(
+                json.dumps({"ref": ref, "text": text}, ensure_ascii=False) + "\n"
+                for ref, text in new_blobs.items()
+            )
+            with open(_blobs_path(segment), "ab") as fh:
+                fh.write(self._codec.compress(blob_lines.encode("utf-8")))
+            self._written_blobs.update(new_blobs)
+
+        payload = "".join(line + "\n" for _, _, line, _ in self._pending).encode("utf-8")
+        with open(segment, "ab") as fh:
+            offset = fh.tell()
+            fh.write(self._codec.compress(payload))
+
+        # Индекс пишем после данных: ссылка никогда не указывает на недописанный член
+        with open(_index_path(segment), "a", encoding="utf-8") as fh:
+            for ordinal, (product_link_id, fingerprint, _, _) in enumerate(self._pending):
+                fh.write(
+                    json.dumps(
+                        {"product_link_id": product_link_id, "offset": offset, "n": ordinal, "fp": fingerprint}
+                    )
+                    + "\n"
+                )
+        self._pending = []
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._flush_locked()
+            self._closed = True
+
+    def __enter__(self) -> "ResponseArchive":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    # ----- чтение -----
+
+    def segments(self) -> List[Path]:
+        if not self._dir.exists():
+            return []
+        return sorted(
+            p for p in self._dir.iterdir()
+            if p.name.startswith("seg-")
+            and ".blobs." not in p.name
+            and (p.name.endswith(".jsonl.gz") or p.name.endswith(".jsonl.zst"))
+        )
+
+    def iter_records(self, with_prompts: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Потоково читает все записи архива в порядке сегментов.
+        with_prompts=True восстанавливает system_prompt/user_prompt из blobs.
+        """
+        for segment in self.segments():
+            blobs = _load_blobs(segment) if with_prompts else None
+            codec = _codec_for_path(segment)
+            with codec.open_stream(segment) as stream:
+                for raw_line in stream:
+                    if raw_line.strip():
+                        yield _decode_record(raw_line, blobs)
+
+    def get_records(self, product_link_id: int, with_prompts: bool = False) -> List[Dict[str, Any]]:
+        """
+        Все записи для product_link_id (от старых к новым), через индекс:
+        распаковываются только нужные gzip-члены.
+        """
+        found: List[Dict[str, Any]] = []
+        for segment in self.segments():
+            locations = [
+                (entry["offset"], entry["n"])
+                for entry in _iter_index(segment)
+                if entry["product_link_id"] == product_link_id
+            ]
+            if not locations:
+                continue
+            blobs = _load_blobs(segment) if with_prompts else None
+            codec = _codec_for_path(segment)
+            members: Dict[int, List[bytes]] = {}
+            with open(segment, "rb") as fh:
+                for offset, ordinal in locations:
+                    if offset not in members:
+                        fh.seek(offset)
+                        members[offset] = codec.read_member(fh).splitlines()
+                    found.append(_decode_record(members[offset][ordinal], blobs))
+        return found
+
+
+def _blobs_path(segment: Path) -> Path:
+    return segment.with_name(segment.name.replace(".jsonl", ".blobs.jsonl", 1))
+
+
+def _index_path(segment: Path) -> Path:
+    base = segment.name.split(".jsonl", 1)[0]
+    return segment.with_name(f"{base}.idx.jsonl")
+
+
+def _iter_index(segment: Path) -> Iterator[Dict[str, Any]]:
+    path = _index_path(segment)
+    if not path.exists():
+        return
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _load_blobs(segment: Path) -> Dict[str, str]:
+    path = _blobs_path(segment)
+    if not path.exists():
+        return {}
+    blobs: Dict[str, str] = {}
+    with _codec_for_path(segment).open_stream(path) as stream:
+        for line in stream:
+            if line.strip():
+                item = json.loads(line)
+                blobs[item["ref"]] = item["text"]
+    return blobs
+
+
+def _decode_record(raw_line: bytes, blobs: Optional[Dict[str, str]]) -> Dict[str, Any]:
+    record = json.loads(raw_line)
+    if blobs is not None:
+        system_ref = record.pop("system_prompt_ref", None)
+        user_ref = record.pop("user_prompt_ref", None)
+        record["system_prompt"] = blobs.get(system_ref) if system_ref else None
+        template = blobs.get(user_ref) if user_ref else None
+        if template is not None:
+            template = template.replace(SKU_PLACEHOLDER, record.get("sku_name") or "")
+            template = template.replace(HINT_PLACEHOLDER, record.get("prompt_hint") or "")
+        record["user_prompt"] = template
+    return record
@@ -0,0 +1,105 @@
+# src/io/xlsx_stream.py
+"""
+Потоковое чтение xlsx через openpyxl в режиме read_only.
+
+В отличие от pd.read_excel, лист не загружается целиком: строки читаются
+по одной, заголовки нормализуются (_normalize_column_name), колонки
+переименовываются по маппингу и проверяется наличие обязательных.
+Память ограничена размером одной строки (плюс чанк у вызывающего кода).
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Union
+
+
+def _normalize_column_name(name: str) -> str:
+    """
+    Нормализует название колонки: заменяет Unicode-дефисы (U+2011, U+2010 и т.п.)
+    на обычный ASCII-дефис (U+002D). Excel часто использует non-breaking hyphen.
+    """
+    for char in ("\u2011", "\u2010", "\u2212", "\uFE58", "\u2013"):
+        name = name.replace(char, "-")
+    return name
+
+
+def cell_to_text(value: Any) -> Optional[str]:
+    """
+    Значение ячейки -> строка для TEXT-колонок.
+    Пустые строки и «nan» -> None, целые float (1.0) -> "1".
+    """
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return None
+        if value.is_integer():
+            value = int(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    text = str(value).strip()
+    if not text or text.lower() == "nan":
+        return None
+    return text
+
+
+def iter_xlsx_rows(
+    path: str,
+    sheet_name: Union[str, int] = 0,
+    column_mapping: Optional[Mapping[str, str]] = None,
+    required: Sequence[str] = (),
+) -> Iterator[Dict[str, Optional[str]]]:
+    """
+    Построчно читает лист xlsx и отдаёт словари {колонка: текст}.
+
+    - Заголовок — первая непустая строка; названия нормализуются.
+    - column_mapping: {заголовок в файле: имя поля}; колонки вне маппинга
+      отбрасываются. Без маппинга ключами служат нормализованные заголовки.
+    - required: заголовки (до маппинга), без которых файл считается невалидным.
+    - Полностью пустые строки пропускаются.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+        rows = sheet.iter_rows(values_only=True)
+
+        header: Optional[List[str]] = None
+        for row in rows:
+            if any(cell is not None and str(cell).strip() for cell in row):
+                header = [_normalize_column_name(str(c)).strip() if c is not None else "" for c in row]
+                break
+        if header is None:
+            raise ValueError(f"Sheet {sheet_name!r} in {path} is empty")
+
+        missing = [c for c in required if c not in header]
+        if missing:
+            raise ValueError(f"Missing columns in {path}: {missing}")
+
+        if column_mapping is None:
+            positions = [(i, name) for i, name in enumerate(header) if name]
+        else:
+            positions = [(i, column_mapping[name]) for i, name in enumerate(header) if name in column_mapping]
+
+        for row in rows:
+            record = {
+                target: cell_to_text(row[i]) if i < len(row) else None
+                for i, target in positions
+            }
+            if any(v is not None for v in record.values()):
+                yield record
+    finally:
+        workbook.close()
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Режет поток на списки по size элементов."""
+    chunk: List[Any] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -2,17 +2,74 @@
 from __future__ import annotations
 
 import asyncio
-import os
+import logging
 import json
-from typing import Any, Dict
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional
 
-import httpx
-
-from src.config import config
+from src.config import config, getenv
 from src.config import LLMApiConfig
 from src.data_models import SKU, ClassificationResult, Category
 from src.llm_client.base import LLMClient, LLMError, LLMRetryableError
-from src.classifier.prompt_builder import PromptBuilder
+from src.classifier.prompt_builder import EXTRACT_SYSTEM_INSTRUCTIONS, PromptBuilder
+from src.classifier.attributes import attribute_extractor
+from src.classifier.category_index import CategoryIndex
+from src.classifier.cluster_resolver import ClusterResolution, ClusterResolver
+from src.classifier.response_schema import decode_compact
+from src.classifier.validation import (
+    ResponseValidator,
+    ValidationReport,
+    coerce_fields,
+    followup_prompt,
+    merge_followup,
+    parse_llm_json,
+)
+from src.io.file_io import JsonFileCache
+from src.io.response_archive import ArchiveRecord, ResponseArchive, request_fingerprint
+from src.observability.metrics import metrics
+
+if TYPE_CHECKING:
+    # httpx (~0.1 с на импорт) грузится при первом запросе, а не при импорте модуля
+    import httpx
+
+    from src.classifier.category_snapshot import CategorySnapshot
+    from src.llm_client.scheduler import LLMScheduler
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LLMCallResult:
+    """
+    Результат одного вызова LLM: распарсенный JSON и служебные метрики вызова.
+    """
+    parsed: Dict[str, Any]
+    usage: Optional[Dict[str, Any]]
+    duration_seconds: Optional[float]  # None — ответ взят из кэша
+    fingerprint: str
+    cached: bool = False
+
+
+def _product_link_id(sku: SKU) -> Optional[int]:
+    try:
+        return int(sku.external_id) if sku.external_id is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _merge_usage(first: Optional[Dict[str, Any]], second: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Суммирует числовые поля usage двух вызовов (основного и уточняющего)."""
+    if not first or not second:
+        return first or second
+    merged = dict(first)
+    for key, value in second.items():
+        if isinstance(value, (int, float)) and isinstance(merged.get(key), (int, float)):
+            merged[key] = merged[key] + value
+        else:
+            merged.setdefault(key, value)
+    return merged
 
 
 class ProviderLLMClient(LLMClient):
@@ -20,30 +77,136 @@ class ProviderLLMClient(LLMClient):
     Реализация LLMClient через HTTP API провайдера.
     """
 
-    def __init__(self, categories: list[Category] | None = None) -> None:
+    def __init__(
+        self,
+        categories: list[Category] | None = None,
+        archive: ResponseArchive | None = None,
+        categories_block: str | None = None,
+        http_client: httpx.AsyncClient | None = None,
+        response_cache: JsonFileCache | None = None,
+        validator: ResponseValidator | None = None,
+        category_index: CategoryIndex | None = None,
+        scheduler: "LLMScheduler | None" = None,
+    ) -> None:
         self._base_url = config.llm.base_url
-        self._api_key = os.getenv(config.llm.api_key_env_var, "")
+        self._api_key = getenv(config.llm.api_key_env_var, "")
         if not self._api_key:
             # Важно: не падаем молча, а даём явную ошибку конфигурации
              raise LLMError(f"Missing API key in env var {config.llm.api_key_env_var}")
 
         self._timeout = config.llm.timeout_seconds
         self._retry_conf = config.llm.retry
-        self._prompt_builder = PromptBuilder()
+        # Компактная схема: короткие ключи и код причины вместо длинного reason
+        self._compact = config.llm.response_schema == "compact"
+        self._max_tokens = config.llm.max_tokens or (config.llm.compact_max_tokens if self._compact else None)
+        self._prompt_builder = PromptBuilder(compact=self._compact)
         self._categories: list[Category] = categories or []
+        # category_path берётся из дерева по коду, а не генерируется моделью
+        self._category_index = category_index if category_index is not None else CategoryIndex(self._categories)
+        # Блок категорий одинаков для всех SKU: рендерим один раз (или берём из снапшота)
+        self._categories_block = (
+            categories_block
+            if categories_block is not None
+            else self._prompt_builder.build_categories_block(self._categories)
+        )
+        # Архив промптов и сырых ответов для аудита/replay (None — не сохраняем)
+        self._archive = archive
+        # Кэш ответов по отпечатку запроса (для повторных оценок; None — всегда ходим в API)
+        self._response_cache = response_cache
+        # Локальная проверка/починка ответов по дереву (None — только json.loads, как раньше)
+        if validator is None and config.validation.enabled:
+            validator = ResponseValidator(self._categories, self._category_index.inn_index)
+        self._validator = validator
+        # Split-пайплайн: короткий вызов без дерева + выбор кода по МНН-кластеру
+        self._split = config.llm.pipeline == "split"
+        self._resolver = ClusterResolver(self._category_index) if self._split else None
+        # Планировщик LLM: токен бюджета запросов в минуту на каждую HTTP-попытку (None — без лимита)
+        self._scheduler = scheduler
+
+        # Один AsyncClient на клиента: keep-alive и пул соединений вместо
+        # нового TCP/TLS-рукопожатия на каждый запрос. Внешний клиент не закрываем.
+        self._http_client = http_client
+        self._owns_http_client = http_client is None
+        self._http_client_loop: asyncio.AbstractEventLoop | None = None
+
+    @classmethod
+    def from_snapshot(
+        cls,
+        snapshot: "CategorySnapshot",
+        archive: ResponseArchive | None = None,
+        http_client: httpx.AsyncClient | None = None,
+        scheduler: "LLMScheduler | None" = None,
+    ) -> "ProviderLLMClient":
+        """
+        Клиент на готовом снапшоте дерева категорий (без повторного рендеринга блока).
+        http_client — общий пул соединений (например, у сервера при смене снапшота);
+        scheduler — общий планировщик с бюджетом запросов.
+        """
+        return cls(
+            categories=snapshot.categories,
+            archive=archive,
+            http_client=http_client,
+            categories_block=snapshot.categories_block,
+            validator=ResponseValidator.from_snapshot(snapshot) if config.validation.enabled else None,
+            category_index=snapshot.index,
+            scheduler=scheduler,
+        )
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """
+        Общий AsyncClient с пулом соединений. Собственный клиент пересоздаётся,
+        если вызов идёт из другого event loop (например, несколько asyncio.run подряд).
+        """
+        if not self._owns_http_client:
+            return self._http_client  # type: ignore[return-value]
+
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        if self._http_client is None or self._http_client.is_closed or self._http_client_loop is not loop:
+            self._http_client = httpx.AsyncClient(
+                timeout=self._timeout,
+                limits=httpx.Limits(
+                    max_connections=config.llm.max_connections,
+                    max_keepalive_connections=config.llm.max_keepalive_connections,
+                ),
+            )
+            self._http_client_loop = loop
+        return self._http_client
+
+    async def aclose(self) -> None:
+        """Закрывает собственный HTTP-клиент (переданный снаружи не трогаем)."""
+        if self._owns_http_client and self._http_client is not None and not self._http_client.is_closed:
+            await self._http_client.aclose()
+        if self._owns_http_client:
+            self._http_client = None
+
+    async def __aenter__(self) -> "ProviderLLMClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
 
     async def _post_with_retries(self, endpoint: str, json: Dict[str, Any]) -> httpx.Response:
         """
         Базовый метод отправки POST-запросов с ретраями по 5xx/429/timeout.
         """
+        import httpx
+
         url = f"{self._base_url.rstrip('/')}/{endpoint.lstrip('/')}"
         attempt = 0
         last_exc: Exception | None = None
 
         while attempt <= self._retry_conf.max_retries:
             try:
-                async with httpx.AsyncClient(timeout=self._timeout) as client:
+                client = self._get_http_client()
+                if self._scheduler is not None:
+                    # Бюджет провайдера считается по запросам: ретраи и второй вызов — тоже
+                    await self._scheduler.request()
+                # Каждая HTTP-попытка — отдельное наблюдение этапа http
+                with metrics.timer("http", http_attempt=attempt + 1):
                     response = await client.post(url, json=json, headers=self._build_headers())
+                metrics.inc(f"http_status_{response.status_code // 100}xx_total")
 
                 # Повторяем при 5xx/429, если разрешено конфигом
                 if response.status_code >= 500 and self._retry_conf.retry_on_5xx:
@@ -80,7 +243,9 @@ class ProviderLLMClient(LLMClient):
     async def _sleep_backoff(self, attempt: int) -> None:
         # Простейший линейный/экспоненциальный backoff
         delay = self._retry_conf.backoff_factor * attempt
-        await asyncio.sleep(delay)
+        metrics.inc("http_retries_total")
+        with metrics.timer("retry_sleep", http_attempt=attempt):
+            await asyncio.sleep(delay)
 
     def _build_headers(self) -> Dict[str, str]:
         # TODO: адаптировать под конкретного провайдера (Bearer, ключ в заголовке и т.п.)
@@ -90,18 +255,59 @@ class ProviderLLMClient(LLMClient):
         }
 
     async def classify_sku_raw(self, sku_name: str) -> Dict[str, Any]:
-        sku = SKU(name=sku_name)
-        categories = self._categories
-        user_prompt = self._prompt_builder.build_user_prompt(sku, categories)
+        call = await self._call_llm(SKU(name=sku_name))
+        return call.parsed
 
+    async def _call_llm(self, sku: SKU, categories: list[Category] | None = None) -> LLMCallResult:
+        """
+        Один вызов LLM для SKU: промпт -> HTTP с ретраями -> JSON из content.
+        categories — поднабор дерева для промпта (None — всё дерево, блок из кэша клиента).
+        Если подключён архив, пара «промпт -> ответ» (и ошибка, если была) сохраняется в него.
+        """
+        system_prompt = getattr(
+            self._prompt_builder,
+            "PROMPT_SYSTEM_INSTRUCTIONS",
+            "",
+        )
+        with metrics.timer("prompt_build"):
+            hint = attribute_extractor.extract(sku.name).prompt_hint() if config.classifier.use_sku_attributes else None
+            if categories is None:
+                user_prompt = self._prompt_builder.build_user_prompt(sku, self._categories, self._categories_block, hint)
+            else:
+                user_prompt = self._prompt_builder.build_user_prompt(sku, categories, None, hint)
+        return await self._complete(
+            sku, system_prompt, user_prompt, self._max_tokens, self._parse_classification, prompt_hint=hint
+        )
+
+    async def _call_extract(self, sku: SKU) -> LLMCallResult:
+        """Первый вызов split-пайплайна: МНН, форма, возраст, OTC без дерева категорий."""
+        with metrics.timer("prompt_build"):
+            hint = attribute_extractor.extract(sku.name).prompt_hint() if config.classifier.use_sku_attributes else None
+            user_prompt = self._prompt_builder.build_extract_prompt(sku, hint)
+        return await self._complete(
+            sku, EXTRACT_SYSTEM_INSTRUCTIONS, user_prompt, config.llm.extract_max_tokens, self._parse_extraction,
+            prompt_hint=hint, kind="extract",
+        )
+
+    async def _complete(
+        self,
+        sku: SKU,
+        system_prompt: str,
+        user_prompt: str,
+        max_tokens: Optional[int],
+        parse: Callable[[Dict[str, Any], str, Optional[Dict[str, Any]]], Awaitable[tuple[Dict[str, Any], Optional[Dict[str, Any]]]]],
+        prompt_hint: Optional[str] = None,
+        kind: str = "classify",
+    ) -> LLMCallResult:
+        """
+        Общая часть вызова: payload, кэш ответов, HTTP, разбор (parse), архив.
+        prompt_hint — подсказка признаков, вставленная в user_prompt (архив выносит её из шаблона).
+        kind — тип вызова для архива: "classify" (ответ с кодом) или "extract" (split без дерева).
+        """
         messages = [
             {
                 "role": "system",
-                "content": getattr(
-                    self._prompt_builder,
-                    "PROMPT_SYSTEM_INSTRUCTIONS",
-                    "",
-                ),
+                "content": system_prompt,
             },
             {"role": "user", "content": user_prompt},
         ]
@@ -113,7 +319,91 @@ class ProviderLLMClient(LLMClient):
             "stream": False,
             "response_format": {"type": "json_object"},
         }
+        if max_tokens:
+            payload["max_tokens"] = max_tokens
+
+        fingerprint = request_fingerprint(config.llm.model, system_prompt, user_prompt)
+
+        if self._response_cache is not None:
+            cached = self._response_cache.get(fingerprint)
+            if cached is not None:
+                metrics.inc("llm_cache_hits_total")
+                return LLMCallResult(
+                    parsed=cached["response"],
+                    usage=cached.get("usage"),
+                    duration_seconds=None,
+                    fingerprint=fingerprint,
+                    cached=True,
+                )
+
+        record = ArchiveRecord(
+            sku_name=sku.name,
+            model=config.llm.model,
+            fingerprint=fingerprint,
+            response=None,
+            product_link_id=_product_link_id(sku),
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            prompt_hint=prompt_hint,
+            kind=kind,
+        )
+        started = time.perf_counter()
+        content: str | None = None
 
+        try:
+            content, usage = await self._request_content(payload)
+            parsed, usage = await parse(payload, content, usage)
+        except LLMError as exc:
+            record.error = f"{type(exc).__name__}: {exc}"
+            record.raw_content = content
+            record.duration_seconds = time.perf_counter() - started
+            self._archive_record(record)
+            raise
+
+        duration = time.perf_counter() - started
+        record.response = parsed
+        if parsed.get("_validation", {}).get("fixes"):
+            # Ответ чинили локально: сохраняем и исходный текст модели
+            record.raw_content = content
+        record.usage = usage
+        record.duration_seconds = duration
+        self._archive_record(record)
+        if self._response_cache is not None:
+            self._response_cache.set(fingerprint, {"sku_name": sku.name, "response": parsed, "usage": usage})
+
+        return LLMCallResult(parsed=parsed, usage=usage, duration_seconds=duration, fingerprint=fingerprint)
+
+    async def _parse_classification(
+        self, payload: Dict[str, Any], content: str, usage: Optional[Dict[str, Any]]
+    ) -> tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """Ответ с выбором категории: json.loads или проверка по дереву с уточнением."""
+        if self._validator is not None:
+            return await self._validate_with_followup(payload, content, usage)
+        with metrics.timer("json_parse"):
+            try:
+                parsed = json.loads(content)
+            except (TypeError, json.JSONDecodeError) as exc:
+                raise LLMError("Failed to extract JSON from LLM response") from exc
+            if self._compact and isinstance(parsed, dict):
+                parsed = decode_compact(parsed)
+        return parsed, usage
+
+    async def _parse_extraction(
+        self, payload: Dict[str, Any], content: str, usage: Optional[Dict[str, Any]]
+    ) -> tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """Ответ первого вызова split-пайплайна: починка JSON и типов полей, без проверки кода."""
+        with metrics.timer("json_parse"):
+            try:
+                parsed, fixes = parse_llm_json(content)
+            except ValueError as exc:
+                raise LLMError("Failed to extract JSON from LLM response") from exc
+            parsed, coerced = coerce_fields(parsed)
+        if fixes or coerced:
+            parsed["_validation"] = {"fixes": fixes + coerced, "problems": []}
+        return parsed, usage
+
+    async def _request_content(self, payload: Dict[str, Any]) -> tuple[str, Optional[Dict[str, Any]]]:
+        """HTTP-вызов chat completions: (choices[0].message.content, usage)."""
         response = await self._post_with_retries(
             endpoint=config.llm.endpoint,
             json=payload,
@@ -124,18 +414,68 @@ class ProviderLLMClient(LLMClient):
                 f"LLM API returned HTTP {response.status_code}: {response.text}"
             )
 
-        try:
-            data = response.json()
-        except ValueError as exc:
-            raise LLMError("Failed to parse LLM response as JSON") from exc
+        with metrics.timer("json_parse"):
+            try:
+                data = response.json()
+            except ValueError as exc:
+                raise LLMError("Failed to parse LLM response as JSON") from exc
 
+            try:
+                content = data["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError) as exc:
+                raise LLMError("Failed to extract JSON from LLM response") from exc
+        usage = data.get("usage") if isinstance(data, dict) else None
+        return content, usage
+
+    async def _validate_with_followup(
+        self, payload: Dict[str, Any], content: str, usage: Optional[Dict[str, Any]]
+    ) -> tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """
+        Локальная починка ответа; если её не хватило (невалидный JSON, код вне
+        дерева или вне кластера МНН) — один уточняющий вызов в том же диалоге.
+        Итог проверки сохраняется в ответе под ключом "_validation".
+        """
+        assert self._validator is not None
+        with metrics.timer("validate"):
+            report = self._validator.validate_content(content, decode=decode_compact if self._compact else None)
+
+        if report.needs_followup and config.validation.followup:
+            metrics.inc("llm_followups_total")
+            followup_payload = {
+                **payload,
+                "messages": payload["messages"] + [
+                    {"role": "assistant", "content": content},
+                    {"role": "user", "content": followup_prompt(report)},
+                ],
+            }
+            second_content, second_usage = await self._request_content(followup_payload)
+            with metrics.timer("validate"):
+                second = self._validator.validate_content(
+                    second_content, decode=decode_compact if self._compact else None
+                )
+                report = merge_followup(report, second)
+            usage = _merge_usage(usage, second_usage)
+
+        if not report.data:
+            raise LLMError("Failed to extract JSON from LLM response")
+        if report.needs_followup:
+            # Ни починка, ни уточнение не помогли: оставляем ответ, но на ревью
+            report.data["needs_review_hint"] = True
+        if report.fixes:
+            metrics.inc("llm_repaired_total")
+        if report.problems:
+            metrics.inc("llm_validation_problems_total")
+        if report.fixes or report.problems:
+            report.data["_validation"] = report.to_dict()
+        return report.data, usage
+
+    def _archive_record(self, record: ArchiveRecord) -> None:
+        if self._archive is None:
+            return
         try:
-            content = data["choices"][0]["message"]["content"]
-            parsed = json.loads(content)
-        except (KeyError, TypeError, json.JSONDecodeError) as exc:
-            raise LLMError("Failed to extract JSON from LLM response") from exc
-
-        return parsed
+            self._archive.append(record)
+        except Exception:  # noqa: BLE001 — сбой аудита не должен ронять классификацию
+            logger.exception("Failed to archive LLM response for SKU '%s'", record.sku_name)
 
     async def classify_sku(self, sku: SKU) -> ClassificationResult:
         """
@@ -146,15 +486,29 @@ class ProviderLLMClient(LLMClient):
         2) Аккуратно извлекает поля из raw-ответа и нормализует confidence.
         3) Собирает доменный объект ClassificationResult, который дальше
            будет обрабатываться ClassifierService.
+
+        При config.llm.pipeline = "split" — см. _classify_split.
         """
         # 1. Запрашиваем у модели структурированный JSON по названию SKU.
-        #    Метод classify_sku_raw уже:
+        #    Метод _call_llm (общий с classify_sku_raw) уже:
         #    - формирует messages и payload;
         #    - делает HTTP-запрос с ретраями;
         #    - достаёт choices[0].message.content;
-        #    - парсит JSON-строку в dict
-        raw: Dict[str, Any] = await self.classify_sku_raw(sku.name)
-
+        #    - парсит JSON-строку в dict;
+        #    - сохраняет пару «промпт -> ответ» в архив (с product_link_id из sku.external_id)
+        if self._split:
+            return await self._classify_split(sku)
+        call = await self._call_llm(sku)
+        return self._to_result(sku, call.parsed, call.usage, call.duration_seconds)
+
+    def _to_result(
+        self,
+        sku: SKU,
+        raw: Dict[str, Any],
+        usage: Optional[Dict[str, Any]],
+        duration_seconds: Optional[float],
+    ) -> ClassificationResult:
+        """Доменный ClassificationResult из разобранного ответа модели."""
         # 2. Извлекаем confidence и приводим к float с защитой от мусора.
         raw_confidence = raw.get("confidence", 0.0)
 
@@ -173,7 +527,7 @@ class ProviderLLMClient(LLMClient):
         result = ClassificationResult(
             sku_name=sku.name,
             category_code=raw.get("category_code"),
-            category_path=raw.get("category_path"),
+            category_path=self._category_index.path(raw.get("category_code")) or raw.get("category_path"),
             inn=raw.get("inn"),
             dosage_form=raw.get("dosage_form"),
             age_restriction=raw.get("age_restriction"),
@@ -185,6 +539,49 @@ class ProviderLLMClient(LLMClient):
             reason=raw.get("reason", "") or "",
             # Сохраняем исходный dict на случай отладки и анализа качества.
             raw_llm_response=raw,
+            llm_latency_seconds=duration_seconds,
+            llm_usage=usage,
         )
 
         return result
+
+    # ---------- split-пайплайн ----------
+
+    async def _classify_split(self, sku: SKU) -> ClassificationResult:
+        """
+        Split-пайплайн: первый вызов без дерева категорий извлекает МНН, форму,
+        возраст и OTC; код выбирается локально по МНН-кластеру (ClusterResolver).
+        Второй вызов с деревом — только если кластер не найден или правила строк
+        не выбирают код; при split_shortlist в нём лишь строки найденного кластера.
+        """
+        assert self._resolver is not None
+        first = await self._call_extract(sku)
+        extracted = first.parsed
+        inn = extracted.get("inn")
+        resolution: Optional[ClusterResolution] = None
+        if inn:
+            with metrics.timer("post_process"):
+                # Признаки — только из названия, как в ClassifierService: решения совпадают
+                resolution = self._resolver.resolve(inn, attribute_extractor.extract(sku.name))
+
+        if resolution is not None and resolution.resolved:
+            metrics.inc("split_local_total")
+            raw = {
+                **extracted,
+                "category_code": resolution.code,
+                "needs_review_hint": False,
+                "reason": resolution.local_reason(inn),
+                "_pipeline": "split_local",
+            }
+            return self._to_result(sku, raw, first.usage, first.duration_seconds)
+
+        metrics.inc("split_fallback_total")
+        shortlist = None
+        if config.llm.split_shortlist and resolution is not None and resolution.candidates:
+            shortlist = [cat for cat in self._category_index.cluster(inn) if cat.code in resolution.candidates]
+        second = await self._call_llm(sku, shortlist)
+        raw = {**second.parsed, "_pipeline": "split_shortlist" if shortlist else "split_full"}
+        duration = None
+        if first.duration_seconds is not None and second.duration_seconds is not None:
+            duration = first.duration_seconds + second.duration_seconds
+        return self._to_result(sku, raw, _merge_usage(first.usage, second.usage), duration)
@@ -0,0 +1,380 @@
+# src/llm_client/scheduler.py
+"""
+Планировщик вызовов LLM с полосами приоритета.
+
+Онлайн-запросы (сервер для ERP) и пакетная классификация делят один ключ API:
+без планировщика большая ночная пачка занимает все слоты, и интерактивный
+запрос ждёт её хвост. LLMScheduler раздаёт два ресурса:
+
+- слоты параллелизма (max_concurrency) — один на классификацию SKU
+  (ScheduledLLMClient: split-пайплайн и уточняющий вопрос — в том же слоте);
+- токены бюджета requests_per_minute — один на каждый HTTP-запрос к API,
+  включая ретраи и второй вызов (ProviderLLMClient(scheduler=...) берёт токен
+  перед каждой попыткой).
+
+Для обоих ресурсов:
+- полосы (lanes) — "interactive", "batch" и любые из config.scheduler.weights;
+  полоса вызова берётся из контекста (with llm_lane("interactive"): ...) и
+  наследуется порождёнными задачами;
+- взвешенная справедливая очередь: свободный слот (токен) получает полоса с
+  наименьшим виртуальным временем; выдача прибавляет ей 1/вес, поэтому при
+  конкуренции полосы получают ресурс пропорционально весам;
+- резерв: доля параллелизма и бюджета (reserved), которую другие полосы не
+  занимают, пока полоса её не использует. Сама полоса может занять и больше —
+  всё, что свободно;
+- ожидания привязаны к билету полосы (LaneTicket): ещё не начавшийся вызов можно
+  перевести в полосу выше (promote) — так singleflight в онлайн-сервере не
+  оставляет интерактивный запрос в очереди пачки.
+
+Метрики: gauge llm_lane_queue_depth_<lane> (ждут слот), llm_lane_rate_waiting_<lane>
+(ждут токен бюджета), llm_lane_active_<lane>; этап llm_queue_wait с тегами lane и
+resource; счётчики llm_lane_started_<lane>_total и llm_lane_requests_<lane>_total.
+
+Слоты и очередность — внутри процесса. Бюджет запросов при shared_budget
+(src/io/rate_budget.py) делится ещё и между процессами с общей БД и одним ключом
+API: после выдачи токена в процессе request() записывает запрос в общий бюджет,
+где действуют тот же лимит и резервы полос. Так ночная пачка из
+run_batch_classification / run_queue_worker (полоса "batch") не выбирает бюджет,
+закреплённый за онлайн-сервером. build_scheduler собирает планировщик процесса.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+from src.config import SchedulerConfig, config
+from src.data_models import SKU, ClassificationResult
+from src.llm_client.base import LLMClient
+from src.io.async_db import AsyncDB
+from src.io.rate_budget import SharedRateBudget
+from src.observability.metrics import metrics
+
+RATE_WINDOW_SECONDS = 60.0
+
+# Ресурсы планировщика
+SLOTS = "slots"
+RATE = "rate"
+
+
+class LaneTicket:
+    """
+    Полоса вызовов LLM в контексте (см. llm_lane). Планировщик привязывает к билету
+    ожидания слотов и токенов, поэтому полосу ещё ждущего вызова можно поднять.
+    """
+
+    def __init__(self, lane: Optional[str]) -> None:
+        self.lane = lane
+        self._scheduler: Optional["LLMScheduler"] = None
+        self._waiting: List[Tuple[str, asyncio.Future]] = []  # (ресурс, ожидание)
+
+    def _weight(self, lane: Optional[str]) -> float:
+        if self._scheduler is not None:
+            return self._scheduler.weight(lane)
+        return config.scheduler.weights.get(lane or config.scheduler.default_lane, 0.0)
+
+    def promote(self, lane: str) -> bool:
+        """
+        Перевести билет в полосу lane, если у неё больший вес; ожидания в очередях
+        переезжают в её очередь. True — полоса поднята.
+        """
+        if self._weight(lane) <= self._weight(self.lane):
+            return False
+        self.lane = lane
+        if self._scheduler is not None:
+            for resource, fut in list(self._waiting):
+                self._scheduler._move(resource, fut, lane)
+        return True
+
+
+_ticket: contextvars.ContextVar[Optional[LaneTicket]] = contextvars.ContextVar("farmacat_llm_lane", default=None)
+
+
+@contextmanager
+def llm_lane(lane: Union[str, LaneTicket, None]) -> Iterator[LaneTicket]:
+    """Полоса планировщика для всех вызовов LLM внутри блока (и в порождённых задачах)."""
+    ticket = lane if isinstance(lane, LaneTicket) else LaneTicket(lane)
+    token = _ticket.set(ticket)
+    try:
+        yield ticket
+    finally:
+        _ticket.reset(token)
+
+
+def current_ticket() -> Optional[LaneTicket]:
+    return _ticket.get()
+
+
+def current_lane() -> Optional[str]:
+    ticket = _ticket.get()
+    return ticket.lane if ticket is not None else None
+
+
+@dataclass
+class _Queue:
+    """Очередь полосы к одному ресурсу."""
+    waiters: Deque[asyncio.Future] = field(default_factory=deque)
+    vtime: float = 0.0  # виртуальное время WFQ
+
+    def depth(self) -> int:
+        return sum(1 for fut in self.waiters if not fut.done())
+
+
+@dataclass
+class _LaneState:
+    weight: float
+    reserved_slots: int
+    reserved_rate: int
+    queues: Dict[str, _Queue] = field(default_factory=lambda: {SLOTS: _Queue(), RATE: _Queue()})
+    active: int = 0
+    recent: int = 0  # HTTP-запросов в текущем окне бюджета
+
+
+class LLMScheduler:
+    """Слоты и токены бюджета вызовов LLM по полосам: WFQ по весам + резерв."""
+
+    def __init__(
+        self,
+        scheduler_config: Optional[SchedulerConfig] = None,
+        clock: Callable[[], float] = time.monotonic,
+        shared_budget: Optional[SharedRateBudget] = None,
+    ) -> None:
+        conf = scheduler_config or config.scheduler
+        self.shared_budget = shared_budget
+        self.max_concurrency = max(1, conf.max_concurrency)
+        self.requests_per_minute = conf.requests_per_minute
+        self.default_lane = conf.default_lane
+        self._clock = clock
+        rpm = self.requests_per_minute or 0
+        self._lanes: Dict[str, _LaneState] = {
+            name: _LaneState(
+                weight=max(weight, 1e-9),
+                reserved_slots=math.ceil(conf.reserved.get(name, 0.0) * self.max_concurrency),
+                reserved_rate=math.ceil(conf.reserved.get(name, 0.0) * rpm),
+            )
+            for name, weight in conf.weights.items()
+        }
+        self._lanes.setdefault(self.default_lane, _LaneState(weight=1.0, reserved_slots=0, reserved_rate=0))
+        self._active = 0
+        self._vclock = {SLOTS: 0.0, RATE: 0.0}
+        self._window: Deque[Tuple[float, str]] = deque()  # (время запроса, полоса) за последнюю минуту
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        for name in self._lanes:
+            self._publish(name)
+
+    @property
+    def lanes(self) -> Tuple[str, ...]:
+        return tuple(self._lanes)
+
+    def weight(self, lane: Optional[str]) -> float:
+        return self._lanes[self._lane_name(lane)].weight
+
+    def queue_depth(self, lane: str, resource: str = SLOTS) -> int:
+        return self._lanes[lane].queues[resource].depth()
+
+    def active(self, lane: str) -> int:
+        return self._lanes[lane].active
+
+    def _lane_name(self, lane: Optional[str]) -> str:
+        name = lane or self.default_lane
+        return name if name in self._lanes else self.default_lane
+
+    # ---------- ожидание ресурса ----------
+
+    @asynccontextmanager
+    async def slot(self, lane: Optional[str] = None) -> AsyncIterator[str]:
+        """Занять слот параллелизма (полоса — lane или из контекста llm_lane) на время блока."""
+        name = await self._acquire(SLOTS, lane)
+        try:
+            yield name
+        finally:
+            self._release(name)
+
+    async def request(self, lane: Optional[str] = None) -> str:
+        """
+        Токен бюджета requests_per_minute на один HTTP-запрос к API; без лимита — сразу.
+        С shared_budget запрос затем ждёт места в общем бюджете всех процессов.
+        """
+        if not self.requests_per_minute:
+            name = self._lane_name(lane or current_lane())
+            metrics.inc(f"llm_lane_requests_{name}_total")
+            return name
+        name = await self._acquire(RATE, lane)
+        if self.shared_budget is not None:
+            await self.shared_budget.acquire(name)
+        return name
+
+    async def _acquire(self, resource: str, lane: Optional[str]) -> str:
+        ticket = current_ticket() if lane is None else None
+        name = self._lane_name(lane or (ticket.lane if ticket is not None else None))
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._enqueue(resource, name, fut)
+        if ticket is not None:
+            ticket._scheduler = self
+            ticket._waiting.append((resource, fut))
+        started = time.perf_counter()
+        try:
+            self._dispatch()
+            name = await fut  # полоса, в которой выдан ресурс (после promote — новая)
+        except BaseException:
+            if fut.done() and not fut.cancelled():
+                name = fut.result()
+                if resource == SLOTS:
+                    self._release(name)  # слот уже выдан, но ждавший ушёл
+            else:
+                fut.cancel()
+                self._publish_all()
+            raise
+        finally:
+            if ticket is not None:
+                ticket._waiting.remove((resource, fut))
+            metrics.observe("llm_queue_wait", time.perf_counter() - started, lane=name, resource=resource)
+        return name
+
+    def _enqueue(self, resource: str, name: str, fut: asyncio.Future) -> None:
+        queue = self._lanes[name].queues[resource]
+        if not queue.depth():
+            # Полоса была пуста: не даём ей «накопить» приоритет за время простоя
+            queue.vtime = max(queue.vtime, self._vclock[resource])
+        queue.waiters.append(fut)
+        self._publish(name)
+
+    def _move(self, resource: str, fut: asyncio.Future, lane: str) -> None:
+        """Перенести ещё не обслуженное ожидание в очередь другой полосы (LaneTicket.promote)."""
+        if fut.done():
+            return
+        for state in self._lanes.values():
+            if fut in state.queues[resource].waiters:
+                state.queues[resource].waiters.remove(fut)
+                break
+        self._enqueue(resource, self._lane_name(lane), fut)
+        self._publish_all()
+        self._dispatch()
+
+    def _release(self, name: str) -> None:
+        self._active -= 1
+        self._lanes[name].active -= 1
+        self._publish(name)
+        self._dispatch()
+
+    def _publish(self, name: str) -> None:
+        state = self._lanes[name]
+        metrics.set_gauge(f"llm_lane_queue_depth_{name}", state.queues[SLOTS].depth())
+        metrics.set_gauge(f"llm_lane_rate_waiting_{name}", state.queues[RATE].depth())
+        metrics.set_gauge(f"llm_lane_active_{name}", state.active)
+
+    def _publish_all(self) -> None:
+        for name in self._lanes:
+            self._publish(name)
+
+    # ---------- раздача ----------
+
+    def _expire_window(self) -> None:
+        horizon = self._clock() - RATE_WINDOW_SECONDS
+        while self._window and self._window[0][0] <= horizon:
+            _, name = self._window.popleft()
+            self._lanes[name].recent -= 1
+
+    def _can_start(self, name: str) -> bool:
+        """Свободные слоты за вычетом неиспользованных резервов других полос."""
+        reserved = sum(max(0, s.reserved_slots - s.active) for other, s in self._lanes.items() if other != name)
+        return self._active + reserved < self.max_concurrency
+
+    def _can_request(self, name: str) -> bool:
+        """Свободный бюджет минуты за вычетом неиспользованных резервов других полос."""
+        assert self.requests_per_minute
+        reserved = sum(max(0, s.reserved_rate - s.recent) for other, s in self._lanes.items() if other != name)
+        return len(self._window) + reserved < self.requests_per_minute
+
+    def _dispatch(self) -> None:
+        self._grant(SLOTS, self._can_start)
+        if self.requests_per_minute:
+            self._expire_window()
+            self._grant(RATE, self._can_request)
+            self._schedule_wakeup()
+
+    def _grant(self, resource: str, admissible: Callable[[str], bool]) -> None:
+        """Раздать свободный ресурс: каждый раз — полосе с наименьшим виртуальным временем."""
+        while True:
+            ready = []
+            for name, state in self._lanes.items():
+                queue = state.queues[resource]
+                while queue.waiters and queue.waiters[0].done():
+                    queue.waiters.popleft()  # отменённые ожидания
+                if queue.waiters and admissible(name):
+                    ready.append((queue.vtime, name))
+            if not ready:
+                return
+            _, name = min(ready)
+            state = self._lanes[name]
+            queue = state.queues[resource]
+            queue.waiters.popleft().set_result(name)
+            self._vclock[resource] = queue.vtime
+            queue.vtime += 1.0 / state.weight
+            if resource == SLOTS:
+                state.active += 1
+                self._active += 1
+                metrics.inc(f"llm_lane_started_{name}_total")
+            else:
+                self._window.append((self._clock(), name))
+                state.recent += 1
+                metrics.inc(f"llm_lane_requests_{name}_total")
+            self._publish(name)
+
+    def _schedule_wakeup(self) -> None:
+        """Если ждут токен бюджета — проснуться, когда окно освободится."""
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        if not self._window or not any(s.queues[RATE].depth() for s in self._lanes.values()):
+            return
+        delay = max(0.0, self._window[0][0] + RATE_WINDOW_SECONDS - self._clock())
+
+        def wake() -> None:
+            self._wakeup = None
+            self._dispatch()
+
+        self._wakeup = asyncio.get_running_loop().call_later(delay, wake)
+
+
+def build_scheduler(
+    db: Optional[AsyncDB] = None, scheduler_config: Optional[SchedulerConfig] = None
+) -> Optional[LLMScheduler]:
+    """
+    Планировщик процесса по config.scheduler (None — выключен). С db и
+    requests_per_minute бюджет запросов общий с другими процессами (shared_budget).
+    """
+    conf = scheduler_config or config.scheduler
+    if not conf.enabled:
+        return None
+    return LLMScheduler(conf, shared_budget=SharedRateBudget.from_config(db, conf))
+
+
+class ScheduledLLMClient(LLMClient):
+    """
+    LLM-клиент за планировщиком: каждый classify_sku занимает слот полосы
+    (split-пайплайн и уточняющий вопрос держат один слот). Бюджет запросов
+    списывается по HTTP-запросам внутри inner — см. ProviderLLMClient(scheduler=...).
+    Остальное — от inner.
+    """
+
+    def __init__(self, inner: LLMClient, scheduler: LLMScheduler) -> None:
+        self.inner = inner
+        self.scheduler = scheduler
+
+    async def classify_sku_raw(self, sku_name: str) -> Dict[str, Any]:
+        async with self.scheduler.slot():
+            return await self.inner.classify_sku_raw(sku_name)
+
+    async def classify_sku(self, sku: SKU) -> ClassificationResult:
+        async with self.scheduler.slot():
+            return await self.inner.classify_sku(sku)
+
+    def __getattr__(self, name: str) -> Any:
+        # aclose, __aenter__-совместимые методы и прочее — у обёрнутого клиента
+        return getattr(self.inner, name)
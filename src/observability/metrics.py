@@ -0,0 +1,284 @@
+# src/observability/metrics.py
+"""
+Поэтапные замеры времени пайплайна классификации.
+
+Этапы (STAGES):
+    db_read        чтение из БД (выполнение в потоке AsyncDB)
+    db_write       запись в БД
+    db_queue_wait  ожидание свободного потока AsyncDB
+    sku_build      product_link -> SKU
+    queue_wait     ожидание слота параллелизма (семафор воркера)
+    prompt_build   сборка промпта
+    http           один HTTP-запрос к провайдеру (каждая попытка отдельно)
+    retry_sleep    пауза backoff между попытками
+    json_parse     разбор ответа провайдера и JSON из content
+    llm_queue_wait ожидание слота или токена бюджета планировщика LLM (src/llm_client/scheduler.py), теги lane, resource
+    validate       локальная проверка/починка ответа по дереву категорий
+    post_process   пороги и multi-cluster safety в ClassifierService
+
+Каждое наблюдение попадает в гистограмму этапа (бакеты как у Prometheus) и,
+пока не превышен лимит, в список записей с тегами из контекста
+(product_link_id, attempt — см. tagged()). Теги живут в contextvars, поэтому
+корректно разделяются между конкурентными корутинами.
+
+Кроме гистограмм и счётчиков есть gauge — текущее значение (например,
+глубина очереди полосы планировщика LLM).
+
+Экспорт: Prometheus textfile (для node_exporter --collector.textfile) или JSON
+со сводкой перцентилей и записями.
+"""
+from __future__ import annotations
+
+import bisect
+import contextvars
+import itertools
+import math
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+
+from src.io.file_io import write_json_atomic
+
+STAGES = (
+    "db_read",
+    "db_write",
+    "db_queue_wait",
+    "sku_build",
+    "queue_wait",
+    "prompt_build",
+    "http",
+    "retry_sleep",
+    "json_parse",
+    "llm_queue_wait",
+    "validate",
+    "post_process",
+)
+
+# Секунды; от долей миллисекунды (сборка промпта) до минут (медленный ответ LLM)
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+_tags: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("farmacat_metric_tags", default={})
+
+
+@contextmanager
+def tagged(**tags: Any) -> Iterator[None]:
+    """Добавляет теги ко всем наблюдениям внутри блока (и в порождённых задачах)."""
+    token = _tags.set({**_tags.get(), **tags})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+
+def current_tags() -> Dict[str, Any]:
+    return dict(_tags.get())
+
+
+@dataclass
+class Histogram:
+    buckets: tuple = DEFAULT_BUCKETS
+    counts: List[int] = field(default_factory=list)
+    total: float = 0.0
+    count: int = 0
+
+    def __post_init__(self) -> None:
+        if not self.counts:
+            self.counts = [0] * (len(self.buckets) + 1)  # последний — +Inf
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self) -> List[int]:
+        return list(itertools.accumulate(self.counts))
+
+
+class MetricsRegistry:
+    """
+    Гистограммы по этапам, счётчики и (ограниченный) список записей.
+    Потокобезопасен: наблюдения могут приходить из потоков AsyncDB.
+    """
+
+    def __init__(self, max_records: int = 200_000) -> None:
+        self._lock = threading.Lock()
+        self.max_records = max_records
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms: Dict[str, Histogram] = {}
+            self.counters: Dict[str, float] = {}
+            self.gauges: Dict[str, float] = {}
+            self.records: List[Dict[str, Any]] = []
+            self.dropped_records = 0
+            self.started_at = time.time()
+
+    def observe(self, stage: str, seconds: float, **extra: Any) -> None:
+        tags = _tags.get()
+        with self._lock:
+            hist = self.histograms.get(stage)
+            if hist is None:
+                hist = self.histograms[stage] = Histogram()
+            hist.observe(seconds)
+            if len(self.records) < self.max_records:
+                self.records.append({"stage": stage, "seconds": seconds, **tags, **extra})
+            else:
+                self.dropped_records += 1
+
+    def inc(self, name: str, value: float = 1.0) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0.0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self.gauges[name] = value
+
+    @contextmanager
+    def timer(self, stage: str, **extra: Any) -> Iterator[None]:
+        """Замер блока (в т.ч. с await внутри) как наблюдение этапа stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started, **extra)
+
+    # ---------- экспорт ----------
+
+    def stage_summary(self) -> Dict[str, Dict[str, Any]]:
+        """count/sum/mean и p50/p90/p99 по этапам (перцентили — по сохранённым записям)."""
+        # numpy нужен только при выгрузке: модуль импортируется горячими путями воркера
+        import numpy as np
+
+        with self._lock:
+            by_stage: Dict[str, List[float]] = {}
+            for record in self.records:
+                by_stage.setdefault(record["stage"], []).append(record["seconds"])
+            histograms = {name: (h.count, h.total) for name, h in self.histograms.items()}
+
+        summary: Dict[str, Dict[str, Any]] = {}
+        for stage, (count, total) in histograms.items():
+            values = np.asarray(by_stage.get(stage, []), dtype=float)
+            item: Dict[str, Any] = {"count": count, "sum": total, "mean": total / count if count else 0.0}
+            if values.size:
+                p50, p90, p99 = np.percentile(values, [50, 90, 99])
+                item.update(p50=float(p50), p90=float(p90), p99=float(p99), max=float(values.max()))
+            summary[stage] = item
+        return summary
+
+    def to_prometheus(self, prefix: str = "farmacat") -> str:
+        lines = [
+            f"# HELP {prefix}_stage_seconds Time spent per pipeline stage.",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        with self._lock:
+            for stage in sorted(self.histograms):
+                hist = self.histograms[stage]
+                cumulative = hist.cumulative()
+                for bound, value in zip(hist.buckets, cumulative):
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {value}')
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {cumulative[-1]}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {hist.total:.6f}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {hist.count}')
+            for name in sorted(self.counters):
+                lines.append(f"# TYPE {prefix}_{name} counter")
+                lines.append(f"{prefix}_{name} {self.counters[name]:g}")
+            for name in sorted(self.gauges):
+                lines.append(f"# TYPE {prefix}_{name} gauge")
+                lines.append(f"{prefix}_{name} {self.gauges[name]:g}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self, with_records: bool = True) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "started_at": self.started_at,
+            "exported_at": time.time(),
+            "stages": self.stage_summary(),
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "dropped_records": self.dropped_records,
+        }
+        if with_records:
+            with self._lock:
+                data["records"] = list(self.records)
+        return data
+
+    def export(self, path: str | Path) -> None:
+        """*.prom / *.txt — Prometheus textfile, иначе JSON. Запись атомарная."""
+        path = Path(path)
+        if path.suffix in (".prom", ".txt"):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.name + ".tmp")
+            tmp.write_text(self.to_prometheus(), encoding="utf-8")
+            tmp.replace(path)
+        else:
+            write_json_atomic(path, self.to_dict())
+
+
+# Общий реестр процесса: инструментированный код пишет сюда
+metrics = MetricsRegistry()
+
+
+def _format_duration(seconds: float) -> str:
+    if not math.isfinite(seconds):
+        return "--:--"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes:02d}:{secs:02d}"
+
+
+class ProgressReporter:
+    """
+    Строка прогресса с пропускной способностью и ETA.
+    В терминале перерисовывается на месте, в логе/файле — печатается раз в interval секунд.
+    """
+
+    def __init__(self, total: int, interval: float = 2.0, stream: Optional[TextIO] = None, label: str = "SKU") -> None:
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.interval = interval
+        self.label = label
+        self._stream = stream or sys.stderr
+        self._tty = bool(getattr(self._stream, "isatty", lambda: False)())
+        self._started = time.perf_counter()
+        self._last_print = 0.0
+
+    def update(self, n: int = 1, failed: bool = False) -> None:
+        self.done += n
+        if failed:
+            self.failed += n
+        now = time.perf_counter()
+        if self.done >= self.total or now - self._last_print >= self.interval:
+            self._last_print = now
+            self._write(self.line(now))
+
+    def line(self, now: Optional[float] = None) -> str:
+        elapsed = (now or time.perf_counter()) - self._started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate > 0 else float("inf")
+        share = self.done / self.total if self.total else 1.0
+        return (
+            f"[{self.done}/{self.total}] {share:6.1%}  {rate:.2f} {self.label}/s  "
+            f"failed {self.failed}  elapsed {_format_duration(elapsed)}  ETA {_format_duration(eta)}"
+        )
+
+    def _write(self, text: str) -> None:
+        if self._tty:
+            end = "\n" if self.done >= self.total else ""
+            self._stream.write("\r" + text + end)
+        else:
+            self._stream.write(text + "\n")
+        self._stream.flush()
+
+    def close(self) -> None:
+        if self._tty and self.done < self.total:
+            self._stream.write("\n")
+            self._stream.flush()
@@ -0,0 +1,305 @@
+# src/observability/profiling.py
+"""
+Встроенный режим профилирования для скриптов (--profile).
+
+Всё пишется в каталог прогона profiles/<скрипт>-<время>/:
+    collapsed.txt        сэмплированные стеки в collapsed-формате
+                         (flamegraph.pl, speedscope, inferno) — режим sample
+    profile.pstats       cProfile (snakeviz, python -m pstats) — режим cprofile
+    profile.txt          топ функций по cumulative time — режим cprofile
+    memory/NNN.txt       снимки tracemalloc: топ аллокаций и прирост с первого снимка
+    dumps/<время>.txt    состояние asyncio-задач и стеки потоков по SIGUSR1
+    run.json             параметры прогона, длительность, пик памяти
+
+Сэмплер — фоновый поток, который раз в sample_interval снимает стеки всех
+потоков (sys._current_frames), поэтому видны и потоки AsyncDB; время стеночное:
+ожидание в select/блокировке тоже попадает в профиль. cProfile точнее по числу
+вызовов, но видит только главный поток и заметно замедляет горячие участки.
+
+Дамп по запросу: kill -USR1 <pid>. Обработчик сигнала лишь планирует дамп
+в event loop (call_soon_threadsafe), поэтому задачи снимаются в согласованном
+состоянии. На платформах без SIGUSR1 дамп недоступен.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import cProfile
+import faulthandler
+import logging
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, ContextManager, Dict, Optional
+
+from src.io.file_io import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("sample", "cprofile")
+DEFAULT_PROFILE_DIR = "profiles"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Периодически снимает стеки всех потоков и считает одинаковые стеки.
+    Корень стека — имя потока, чтобы главный поток и потоки БД не смешивались.
+    """
+
+    def __init__(self, interval: float = 0.01, max_depth: int = 128) -> None:
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                labels = []
+                while frame is not None and len(labels) < self.max_depth:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def write_collapsed(self, path: Path) -> None:
+        with open(path, "w", encoding="utf-8") as fh:
+            for stack, count in self.stacks.most_common():
+                fh.write(f"{stack} {count}\n")
+
+
+class MemorySnapshotter:
+    """
+    Снимки tracemalloc раз в interval секунд (и по запросу): топ аллокаций
+    по строкам кода и прирост относительно первого снимка — видно, что растёт.
+    """
+
+    def __init__(self, directory: Path, interval: float = 60.0, top: int = 25, frames: int = 1) -> None:
+        self.directory = directory
+        self.interval = interval
+        self.top = top
+        self.frames = frames
+        self.count = 0
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tracemalloc.start(self.frames)
+        self._thread = threading.Thread(target=self._run, name="memory-snapshotter", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.snapshot()
+        tracemalloc.stop()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.snapshot()
+
+    def snapshot(self) -> Optional[Path]:
+        if not tracemalloc.is_tracing():
+            return None
+        with self._lock:
+            snap = tracemalloc.take_snapshot().filter_traces(
+                (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen *>"))
+            )
+            current, peak = tracemalloc.get_traced_memory()
+            self.count += 1
+            path = self.directory / f"{self.count:03d}.txt"
+            with open(path, "w", encoding="utf-8") as fh:
+                fh.write(f"# {datetime.now().isoformat(timespec='seconds')}\n")
+                fh.write(f"# traced current {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB\n\n")
+                fh.write(f"Top {self.top} allocations by line:\n")
+                for stat in snap.statistics("lineno")[: self.top]:
+                    fh.write(f"{stat}\n")
+                if self._baseline is not None:
+                    fh.write(f"\nTop {self.top} growth since first snapshot:\n")
+                    for stat in snap.compare_to(self._baseline, "lineno")[: self.top]:
+                        fh.write(f"{stat}\n")
+            if self._baseline is None:
+                self._baseline = snap
+        return path
+
+    @staticmethod
+    def peak_bytes() -> int:
+        return tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+
+
+def dump_asyncio_tasks(fh, loop: asyncio.AbstractEventLoop) -> int:
+    """Пишет в fh все задачи loop со стеками корутин. Возвращает число задач."""
+    tasks = asyncio.all_tasks(loop)
+    fh.write(f"asyncio tasks: {len(tasks)}\n\n")
+    for task in sorted(tasks, key=lambda t: t.get_name()):
+        state = "cancelling" if task.cancelling() else ("done" if task.done() else "pending")
+        fh.write(f"--- {task.get_name()} [{state}] {task.get_coro()!r}\n")
+        task.print_stack(limit=20, file=fh)
+        fh.write("\n")
+    return len(tasks)
+
+
+class Profiler:
+    """
+    Профилирование одного прогона скрипта.
+
+        with Profiler(run_dir, mode="sample"):
+            asyncio.run(main())
+    """
+
+    def __init__(
+        self,
+        run_dir: str | Path,
+        mode: str = "sample",
+        sample_interval: float = 0.01,
+        memory_interval: float = 60.0,
+        memory_top: int = 25,
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {mode!r}, expected one of {PROFILE_MODES}")
+        self.run_dir = Path(run_dir)
+        self.mode = mode
+        self.meta = meta or {}
+        self._sampler = StackSampler(sample_interval) if mode == "sample" else None
+        self._cprofile = cProfile.Profile() if mode == "cprofile" else None
+        self._memory = MemorySnapshotter(self.run_dir / "memory", interval=memory_interval, top=memory_top)
+        self._previous_handler: Any = None
+        self._started = 0.0
+
+    # ---------- дамп по сигналу ----------
+
+    def dump_state(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> Path:
+        """Задачи asyncio (если loop передан), стеки потоков и снимок памяти."""
+        dumps = self.run_dir / "dumps"
+        dumps.mkdir(parents=True, exist_ok=True)
+        path = dumps / f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.txt"
+        with open(path, "w", encoding="utf-8") as fh:
+            if loop is not None:
+                dump_asyncio_tasks(fh, loop)
+            fh.write("threads:\n")
+            fh.flush()
+            faulthandler.dump_traceback(file=fh, all_threads=True)
+        self._memory.snapshot()
+        logger.info("State dump written to %s", path)
+        return path
+
+    def _on_signal(self, signum, frame) -> None:
+        # Работающий loop главного потока (если есть): дамп задач делаем внутри него
+        loop = asyncio._get_running_loop()
+        if loop is not None:
+            loop.call_soon_threadsafe(self.dump_state, loop)
+        else:
+            self.dump_state()
+
+    # ---------- жизненный цикл ----------
+
+    def start(self) -> "Profiler":
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        self._memory.start()
+        if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+            self._previous_handler = signal.signal(signal.SIGUSR1, self._on_signal)
+        self._started = time.perf_counter()
+        if self._sampler is not None:
+            self._sampler.start()
+        if self._cprofile is not None:
+            self._cprofile.enable()
+        logger.info("Profiling (%s) into %s; state dump: kill -USR1 %s", self.mode, self.run_dir, os.getpid())
+        return self
+
+    def stop(self) -> None:
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        elapsed = time.perf_counter() - self._started
+        if self._previous_handler is not None:
+            signal.signal(signal.SIGUSR1, self._previous_handler)
+            self._previous_handler = None
+        peak = self._memory.peak_bytes()
+        self._memory.stop()
+
+        if self._sampler is not None:
+            self._sampler.write_collapsed(self.run_dir / "collapsed.txt")
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(str(self.run_dir / "profile.pstats"))
+            with open(self.run_dir / "profile.txt", "w", encoding="utf-8") as fh:
+                pstats.Stats(self._cprofile, stream=fh).sort_stats("cumulative").print_stats(60)
+
+        write_json_atomic(
+            self.run_dir / "run.json",
+            {
+                **self.meta,
+                "mode": self.mode,
+                "pid": os.getpid(),
+                "wall_seconds": elapsed,
+                "samples": self._sampler.samples if self._sampler is not None else None,
+                "sample_interval": self._sampler.interval if self._sampler is not None else None,
+                "memory_snapshots": self._memory.count,
+                "traced_peak_bytes": peak,
+            },
+        )
+        logger.info("Profile written to %s", self.run_dir)
+
+    def __enter__(self) -> "Profiler":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    """Общие флаги профилирования для скриптов."""
+    group = parser.add_argument_group("profiling")
+    group.add_argument("--profile", action="store_true", help="profile the run (output in --profile-dir)")
+    group.add_argument("--profile-mode", choices=PROFILE_MODES, default="sample", help="sampled stacks or cProfile")
+    group.add_argument("--profile-dir", default=DEFAULT_PROFILE_DIR, help="parent directory for run directories")
+    group.add_argument("--profile-interval", type=float, default=0.01, help="stack sampling interval, seconds")
+    group.add_argument("--memory-interval", type=float, default=60.0, help="tracemalloc snapshot interval, seconds")
+
+
+def profile_from_args(args: argparse.Namespace, name: str) -> ContextManager[Any]:
+    """Profiler по флагам add_profile_arguments либо пустой контекст без --profile."""
+    if not getattr(args, "profile", False):
+        return contextlib.nullcontext()
+    run_dir = Path(args.profile_dir) / f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    return Profiler(
+        run_dir,
+        mode=args.profile_mode,
+        sample_interval=args.profile_interval,
+        memory_interval=args.memory_interval,
+        meta={"script": name, "argv": sys.argv[1:]},
+    )
@@ -1,29 +1,74 @@
 # src/scripts/debug_sku_by_id.py
+"""
+Отладка классификации одного SKU: сырой ответ LLM (и, по желанию, промпт).
+
+Запуск:
+    python -m src.scripts.debug_sku_by_id 8
+    python -m src.scripts.debug_sku_by_id --name "Нурофен таб. 200мг №10" --show-prompt
+    python -m src.scripts.debug_sku_by_id          # первый активный product_link
+"""
+from __future__ import annotations
+
+import argparse
 import asyncio
+import json
+from typing import Optional
 
-from src.io.db_io import get_session, ProductLink, product_link_to_sku
-from src.llm_client.provider_client import ProviderLLMClient
-from src.io.db_io import get_all_categories
+from src.data_models import SKU
+from src.io.db_io import ProductLink, get_active_product_links, get_session, product_link_to_sku
+from src.classifier.category_snapshot import load_category_snapshot
 
 
-async def debug_sku_by_id(product_link_id: int) -> None:
-    # 1. Берём запись из БД и строим SKU
+async def debug_sku_by_id(
+    product_link_id: Optional[int] = None,
+    name: Optional[str] = None,
+    show_prompt: bool = False,
+) -> None:
+    from src.llm_client.provider_client import ProviderLLMClient
+
+    # 1. Берём запись из БД (или имя из аргументов) и строим SKU
     with get_session() as session:
-        pl = session.get(ProductLink, product_link_id)
-        if pl is None:
-            print(f"ProductLink id={product_link_id} not found")
-            return
+        snapshot = load_category_snapshot(session)
+        if name is not None:
+            sku = SKU(name=name)
+        elif product_link_id is not None:
+            pl = session.get(ProductLink, product_link_id)
+            if pl is None:
+                print(f"ProductLink id={product_link_id} not found")
+                return
+            sku = product_link_to_sku(pl)
+        else:
+            product_links = get_active_product_links(session, limit=1)
+            if not product_links:
+                print("No active product_links")
+                return
+            sku = product_link_to_sku(product_links[0])
+            product_link_id = product_links[0].id
+
+    if show_prompt:
+        from src.classifier.prompt_builder import PromptBuilder
 
-        categories = get_all_categories(session)
-        sku = product_link_to_sku(pl)
+        print(PromptBuilder().build_user_prompt(sku, snapshot.categories, snapshot.categories_block))
+        print("=" * 80)
 
     # 2. Классифицируем через DeepSeek
-    client = ProviderLLMClient(categories=categories)
-    raw = await client.classify_sku_raw(sku.name)
+    async with ProviderLLMClient.from_snapshot(snapshot) as client:
+        raw = await client.classify_sku_raw(sku.name)
 
     print(f"SKU (id={product_link_id}):", sku.name)
-    print("RAW:", raw)
+    print("RAW:", json.dumps(raw, ensure_ascii=False, indent=2))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Classify one SKU and print the raw LLM response")
+    parser.add_argument("id", type=int, nargs="?", help="product_link id (default: first active)")
+    parser.add_argument("--name", help="classify this SKU name instead of a product_link")
+    parser.add_argument("--show-prompt", action="store_true", help="print the user prompt")
+    args = parser.parse_args(argv)
+
+    asyncio.run(debug_sku_by_id(args.id, name=args.name, show_prompt=args.show_prompt))
+    return 0
 
 
 if __name__ == "__main__":
-    asyncio.run(debug_sku_by_id(8))
+    raise SystemExit(main())
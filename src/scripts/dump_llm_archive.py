@@ -0,0 +1,39 @@
+# src/scripts/dump_llm_archive.py
+"""
+Просмотр архива промптов и ответов LLM (аудит).
+
+Запуск:
+    python -m src.scripts.dump_llm_archive --product-link-id 8 --with-prompts
+    python -m src.scripts.dump_llm_archive --limit 20          # первые записи всего архива
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+
+from src.config import config
+from src.io.response_archive import ResponseArchive
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Dump archived LLM prompt/response pairs")
+    parser.add_argument("--dir", default=config.archive.directory, help="archive directory")
+    parser.add_argument("--product-link-id", type=int, default=None)
+    parser.add_argument("--with-prompts", action="store_true", help="restore full prompt texts")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    archive = ResponseArchive(args.dir)
+    if args.product_link_id is not None:
+        records = iter(archive.get_records(args.product_link_id, with_prompts=args.with_prompts))
+    else:
+        records = archive.iter_records(with_prompts=args.with_prompts)
+
+    for record in itertools.islice(records, args.limit):
+        print(json.dumps(record, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,154 +1,259 @@
 # src/scripts/evaluate_on_testset.py
+"""
+Оценка качества классификации на TestButch.xlsx.
+
+Запуск:
+    python -m src.scripts.evaluate_on_testset --limit 50
+    python -m src.scripts.evaluate_on_testset --all --concurrency 16 --use-cache
+    python -m src.scripts.evaluate_on_testset --all --output-dir reports/eval-prompt-v2
+    python -m src.scripts.evaluate_on_testset --stratify direction --target-width 0.08
+    python -m src.scripts.evaluate_on_testset --all --profile --profile-mode cprofile
+
+SKU классифицируются конкурентно (--concurrency запросов в полёте, общий пул
+HTTP-соединений), метрики считаются векторно (src/evaluation/metrics.py),
+отчёт пишется в JSON/CSV (src/evaluation/report.py). С --use-cache ответы LLM
+берутся из JSON-кэша по отпечатку промпта: повторный прогон с тем же промптом
+не делает вызовов API.
+
+С --stratify выборка стратифицируется (категория / направление / МНН-кластер)
+и добирается раундами, пока ширина доверительного интервала точности не станет
+не больше --target-width (src/evaluation/sampling.py); --limit тогда — потолок.
+
+С --profile прогон профилируется (src/observability/profiling.py) в каталог profiles/.
+"""
+import argparse
 import asyncio
-from typing import List, Tuple
+import logging
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
 
 import pandas as pd
 
-from src.data_models import SKU, ClassificationResult, Category
 from src.llm_client.provider_client import ProviderLLMClient
 from src.classifier.classifier_service import ClassifierService
-from src.io.db_io import get_session, get_all_categories
+from src.classifier.category_snapshot import load_category_snapshot
+from src.evaluation.metrics import category_metrics, confusion_matrix, summary_metrics
+from src.evaluation.report import write_report
+from src.evaluation.runner import correct_flags, evaluate_samples, evaluate_sequential, labelled_mask
+from src.evaluation.sampling import STRATIFY_CHOICES, per_stratum_table, stratum_labels
+from src.io.db_io import get_session
+from src.io.file_io import JsonFileCache
+from src.io.xlsx_stream import iter_xlsx_rows
+from src.observability.profiling import add_profile_arguments, profile_from_args
 
 
+logger = logging.getLogger(__name__)
+
 TESTSET_PATH = "TestButch.xlsx"
+DEFAULT_OUTPUT_DIR = "reports/evaluation"
+DEFAULT_CACHE_PATH = "pharmacy_analyzer/data/llm_response_cache.json"
+
+
+TESTSET_COLUMNS = [
+    "Название",
+    "Производитель",
+    "Название АСНА",
+    "МНН",
+    "Код категории",
+]
 
 
 def load_testset(path: str = TESTSET_PATH) -> pd.DataFrame:
-    df = pd.read_excel(path)
-
-    required_cols = [
-        "Название",
-        "Производитель",
-        "Название АСНА",
-        "МНН",
-        "Код категории",
-    ]
-    missing = [c for c in required_cols if c not in df.columns]
-    if missing:
-        raise ValueError(f"Missing columns in testset: {missing}")
+    """
+    Читает тестовую выборку потоково (openpyxl read_only) с проверкой колонок.
+    Пустые ячейки -> пустая строка, чтобы str(...) не давал "nan".
+    """
+    mapping = {c: c for c in TESTSET_COLUMNS}
+    try:
+        records = list(iter_xlsx_rows(path, column_mapping=mapping, required=TESTSET_COLUMNS))
+    except ValueError as exc:
+        raise ValueError(f"Invalid testset {path}: {exc}") from exc
 
-    # Убираем полностью пустые SKU (без названия)
-    df = df[~df["Название"].isna()]
+    df = pd.DataFrame.from_records(records, columns=TESTSET_COLUMNS).fillna("")
 
-    # Нормализуем NaN -> пустая строка, чтобы str(...) не давал "nan"
-    for col in ["Название", "Производитель", "Название АСНА", "МНН", "Код категории"]:
-        df[col] = df[col].fillna("")
+    # Убираем полностью пустые SKU (без названия)
+    df = df[df["Название"] != ""].reset_index(drop=True)
 
     return df
 
 
-async def evaluate_on_testset(limit: int = 50) -> None:
+async def evaluate_on_testset(
+    limit: Optional[int] = 50,
+    concurrency: int = 8,
+    output_dir: Optional[str] = DEFAULT_OUTPUT_DIR,
+    cache_path: Optional[str] = None,
+    testset_path: str = TESTSET_PATH,
+    seed: int = 24,
+    stratify: Optional[str] = None,
+    target_width: float = 0.1,
+    batch_size: int = 20,
+    confidence: float = 0.95,
+) -> Dict[str, Any]:
     """
-    Оценивает качество классификации на TestButch.xlsx.
+    Оценивает качество классификации на тестовой выборке.
 
-    Считает:
-    - accuracy по category_code;
-    - долю needs_review=True;
-    - долю точных совпадений МНН (после нормализации строки);
-    - выводит примеры расхождений.
+    limit=None — вся выборка, иначе случайные limit строк (seed фиксирован для
+    сравнимости прогонов). С stratify — последовательная стратифицированная
+    оценка, limit — максимум SKU. Возвращает сводку метрик; при output_dir пишет отчёт.
     """
-    df = load_testset()
-
-    # Ограничиваем выборку для первых прогонов (случайная выборка)
-    n = min(limit, len(df))
-    df = df.sample(n=n, random_state=24).reset_index(drop=True)
+    df = load_testset(testset_path)
+    if stratify is None and limit is not None and limit < len(df):
+        df = df.sample(n=limit, random_state=seed).reset_index(drop=True)
 
-    # Загружаем дерево категорий
+    # Загружаем дерево категорий (скомпилированный снапшот)
     with get_session() as session:
-        categories: List[Category] = get_all_categories(session)
-
-    client = ProviderLLMClient(categories=categories)
-    service = ClassifierService(llm_client=client, categories=categories)
-
-    total = 0
-    correct_cat = 0
-    needs_review_count = 0
-
-    inn_match = 0
-    total_with_true_inn = 0
-
-    # (true_code, pred_code, true_inn, pred_inn, sku_name, reason)
-    results: List[Tuple[str, str, str, str, str, str]] = []
-
-    def norm(s: str) -> str:
-        """Простая нормализация строк: trim, lower, схлопнуть пробелы."""
-        return " ".join(str(s).strip().lower().split())
-
-    for idx, (_, row) in enumerate(df.iterrows(), start=1):
-
-        name = str(row["Название"]).strip()
-        if not name:
-            # пропускаем строки без названия на всякий случай
-            continue
-
-        print(f"Processing sample {idx}/{len(df)}...")
-        sku = SKU(
-            name=name,
-            manufacturer=str(row.get("Производитель") or ""),
-            alt_name=str(row.get("Название АСНА") or ""),
+        snapshot = load_category_snapshot(session)
+
+    cache = JsonFileCache(cache_path) if cache_path else None
+    started = time.perf_counter()
+    async with ProviderLLMClient(
+        categories=snapshot.categories,
+        categories_block=snapshot.categories_block,
+        response_cache=cache,
+    ) as client:
+        service = ClassifierService.from_snapshot(client, snapshot)
+        try:
+            if stratify is None:
+                logger.info("Evaluating %s SKUs with concurrency=%s", len(df), concurrency)
+                per_sku = await evaluate_samples(service, df, concurrency=concurrency)
+            else:
+                # Без эталонного кода строку нельзя оценить — в страты и их размеры она не входит
+                df = df[labelled_mask(df)]
+                strata = stratum_labels(df, stratify, snapshot.categories)
+                logger.info(
+                    "Sequential evaluation stratified by %s: %s strata, target CI width %.3f",
+                    stratify, strata.nunique(), target_width,
+                )
+                per_sku, estimate, rounds = await evaluate_sequential(
+                    service,
+                    df,
+                    strata,
+                    target_width=target_width,
+                    batch_size=batch_size,
+                    max_samples=limit,
+                    concurrency=concurrency,
+                    confidence=confidence,
+                    seed=seed,
+                )
+        finally:
+            if cache is not None:
+                cache.save()
+    elapsed = time.perf_counter() - started
+
+    per_category = category_metrics(per_sku)
+    per_category.insert(0, "category_path", per_category.index.map(snapshot.index.path))
+    summary = summary_metrics(per_sku, per_category, confidence=confidence)
+    extra_tables: Dict[str, pd.DataFrame] = {}
+    if stratify is not None:
+        population = strata.value_counts().to_dict()
+        summary["stratified"] = {
+            "by": stratify,
+            "target_width": target_width,
+            "batch_size": batch_size,
+            "testset_size": len(df),
+            **estimate.to_dict(),
+            "rounds": rounds,
+        }
+        extra_tables["per_stratum"] = per_stratum_table(population, per_sku["stratum"], correct_flags(per_sku))
+    summary.update(
+        wall_seconds=elapsed,
+        skus_per_second=len(per_sku) / elapsed if elapsed else 0.0,
+        concurrency=concurrency,
+        testset=testset_path,
+        sample_limit=limit,
+        seed=seed,
+        categories_hash=snapshot.content_hash,
+        created_at=datetime.utcnow().isoformat(),
+    )
+    if cache is not None:
+        summary["cache"] = {"path": cache_path, "hits": cache.hits, "misses": cache.misses}
+
+    _print_summary(summary, per_sku)
+    if output_dir:
+        path = write_report(output_dir, summary, per_sku, per_category, confusion_matrix(per_sku), extra_tables)
+        print(f"\nReport written to {Path(path).resolve()}")
+    return summary
+
+
+def _print_summary(summary: Dict[str, Any], per_sku: pd.DataFrame) -> None:
+    latency = summary["latency_seconds"]
+    tokens = summary["total_tokens"]
+    print(
+        f"Total samples: {summary['total']} (errors: {summary['errors']}, cached: {summary['cached']}, "
+        f"prefiltered: {summary['prefiltered']})"
+    )
+    low, high = summary["accuracy_ci"]
+    print(f"Accuracy by category_code: {summary['accuracy']:.3f} (Wilson {summary['confidence_level']:.0%} CI {low:.3f}-{high:.3f})")
+    if "stratified" in summary:
+        strat = summary["stratified"]
+        print(
+            f"Stratified accuracy ({strat['by']}): {strat['estimate']:.3f} "
+            f"[{strat['low']:.3f}; {strat['high']:.3f}], width {strat['width']:.3f}, "
+            f"{strat['n']}/{strat['testset_size']} SKUs in {len(strat['rounds'])} rounds"
         )
-        true_code = str(row.get("Код категории") or "").strip()
-        true_inn_raw = row.get("МНН") or ""
-        true_inn = norm(true_inn_raw)
-
-        result: ClassificationResult = await service.classify_product(sku)
-
-        total += 1
-
-        # Метрика по категории
-        pred_code = (result.category_code or "").strip()
-        if true_code and pred_code and pred_code == true_code:
-            correct_cat += 1
-
-        # Метрика по needs_review
-        if result.needs_review:
-            needs_review_count += 1
-
-        # Метрика по МНН
-        pred_inn = norm(result.inn or "")
-        if true_inn:
-            total_with_true_inn += 1
-            if pred_inn and pred_inn == true_inn:
-                inn_match += 1
-
-        results.append(
-            (
-                true_code,
-                pred_code,
-                true_inn,
-                pred_inn,
-                sku.name,
-                result.reason or "",
-            )
-        )
-
-    accuracy_cat = correct_cat / total if total else 0.0
-    review_rate = needs_review_count / total if total else 0.0
-    inn_accuracy = inn_match / total_with_true_inn if total_with_true_inn else 0.0
-
-    print(f"Total samples: {total}")
-    print(f"Accuracy by category_code: {accuracy_cat:.3f}")
-    print(f"Share with needs_review=True: {review_rate:.3f}")
-    print(f"INN exact match (normalized, where true INN present): {inn_accuracy:.3f}")
+    print(f"Macro F1: {summary['macro_f1']:.3f} | weighted F1: {summary['weighted_f1']:.3f}")
+    print(f"Share with needs_review=True: {summary['review_rate']:.3f}")
+    print(f"INN exact match (normalized, where true INN present): {summary['inn_accuracy']:.3f}")
+    if latency["count"]:
+        print(f"LLM latency p50/p95/p99: {latency['p50']:.2f}s / {latency['p95']:.2f}s / {latency['p99']:.2f}s")
+    if tokens["count"]:
+        print(f"Tokens per SKU p50/p95: {tokens['p50']:.0f} / {tokens['p95']:.0f}")
+    print(f"Wall time: {summary['wall_seconds']:.1f}s ({summary['skus_per_second']:.2f} SKU/s)")
 
     # Вывод нескольких расхождений по категории
+    mismatches = per_sku[per_sku["error"].isna() & (per_sku["true_code"] != per_sku["pred_code"])]
     print("\nExamples of mismatches (up to 10):")
-    shown = 0
-    for true_code, pred_code, true_inn, pred_inn, sku_name, reason in results:
-        if true_code != pred_code and shown < 10:
-            print("-" * 80)
-            print(f"SKU: {sku_name}")
-            print(f"TRUE code: {true_code} | PRED code: {pred_code}")
-            print(f"TRUE INN: {true_inn} | PRED INN: {pred_inn}")
-            print(f"Reason: {reason}")
-            shown += 1
-        if shown >= 10:
-            break
-
-
-
-def main() -> int:
-    asyncio.run(evaluate_on_testset(limit=10))
+    for row in mismatches.head(10).itertuples(index=False):
+        print("-" * 80)
+        print(f"SKU: {row.sku_name}")
+        print(f"TRUE code: {row.true_code} | PRED code: {row.pred_code}")
+        print(f"TRUE INN: {row.true_inn} | PRED INN: {row.pred_inn}")
+        print(f"Reason: {row.reason}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Evaluate classification quality on the testset")
+    scope = parser.add_mutually_exclusive_group()
+    scope.add_argument(
+        "--limit", type=int, default=None,
+        help="random sample size (default: 50); with --stratify: max SKUs (default: no cap)",
+    )
+    scope.add_argument("--all", action="store_true", help="evaluate the whole testset")
+    parser.add_argument("--concurrency", type=int, default=8, help="LLM requests in flight")
+    parser.add_argument("--testset", default=TESTSET_PATH)
+    parser.add_argument("--seed", type=int, default=24)
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help="where to write JSON/CSV report")
+    parser.add_argument("--no-report", action="store_true", help="do not write report files")
+    parser.add_argument("--use-cache", action="store_true", help="reuse cached LLM responses for identical prompts")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH)
+    parser.add_argument("--stratify", choices=STRATIFY_CHOICES, help="sequential stratified evaluation")
+    parser.add_argument("--target-width", type=float, default=0.1, help="stop when the accuracy CI is this narrow")
+    parser.add_argument("--batch-size", type=int, default=20, help="SKUs per sequential round")
+    parser.add_argument("--confidence", type=float, default=0.95, help="confidence level of intervals")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    limit = args.limit
+    if limit is None and not args.all and not args.stratify:
+        limit = 50
+    with profile_from_args(args, "evaluate_on_testset"):
+        asyncio.run(
+            evaluate_on_testset(
+                limit=limit,
+                concurrency=args.concurrency,
+                output_dir=None if args.no_report else args.output_dir,
+                cache_path=args.cache_path if args.use_cache else None,
+                testset_path=args.testset,
+                seed=args.seed,
+                stratify=args.stratify,
+                target_width=args.target_width,
+                batch_size=args.batch_size,
+                confidence=args.confidence,
+            )
+        )
     return 0
 
 
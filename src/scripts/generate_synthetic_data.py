@@ -0,0 +1,98 @@
+# src/scripts/generate_synthetic_data.py
+"""
+Заполняет scratch-БД синтетическим каталогом и деревом категорий для нагрузочных прогонов.
+
+Запуск:
+    python -m src.scripts.generate_synthetic_data scratch.db --products 2000000 --categories 5000
+    python -m src.scripts.generate_synthetic_data scratch.db --products 100000 --feed-csv feed.csv
+
+Потом любой скрипт можно направить на эту БД:
+    FARMACAT_DATABASE_URL=sqlite:///scratch.db python -m src.scripts.run_queue_worker --stats
+
+Рабочую БД (config.db / FARMACAT_DATABASE_URL) скрипт не трогает.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+
+from src.benchmarks.synthetic import iter_product_rows, populate_database, write_feed_csv
+from src.config import DatabaseConfig
+from src.io.db_backend import configure_sqlite_engine, resolve_database_url
+
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Fill a scratch SQLite DB with synthetic products and categories")
+    parser.add_argument("db", help="path to the scratch SQLite file")
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--categories", type=int, default=3000)
+    parser.add_argument("--cluster-size", type=int, default=3, help="codes per INN cluster")
+    parser.add_argument("--duplicate-rate", type=float, default=0.05)
+    parser.add_argument("--garbage-rate", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    parser.add_argument("--force", action="store_true", help="overwrite an existing file")
+    parser.add_argument("--feed-csv", help="also write a 1C/ASNA feed CSV with the same rows")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    path = Path(args.db).resolve()
+
+    production = make_url(resolve_database_url())
+    if production.get_backend_name() == "sqlite" and production.database:
+        if Path(production.database).resolve() == path:
+            parser.error(f"{path} is the working database; choose a scratch file")
+
+    if path.exists():
+        if not args.force:
+            parser.error(f"{path} exists; pass --force to overwrite")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(f"{path}{suffix}"):
+                os.unlink(f"{path}{suffix}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Scratch-БД не нужна устойчивость к сбою питания: synchronous=OFF ускоряет заливку в разы
+    engine = configure_sqlite_engine(
+        create_engine(f"sqlite:///{path}", future=True),
+        DatabaseConfig(sqlite_synchronous="OFF"),
+    )
+    started = time.perf_counter()
+
+    def progress(done: int, total: int) -> None:
+        if done % (args.chunk_size * 10) == 0 or done == total:
+            elapsed = time.perf_counter() - started
+            logger.info("%s/%s product_links (%.0f rows/s)", done, total, done / elapsed if elapsed else 0.0)
+
+    stats = populate_database(
+        engine,
+        products=args.products,
+        categories=args.categories,
+        cluster_size=args.cluster_size,
+        seed=args.seed,
+        chunk_size=args.chunk_size,
+        duplicate_rate=args.duplicate_rate,
+        garbage_rate=args.garbage_rate,
+        progress=progress,
+    )
+    engine.dispose()
+    logger.info("Scratch DB %s ready in %.1fs: %s", path, time.perf_counter() - started, stats)
+
+    if args.feed_csv:
+        rows = iter_product_rows(
+            args.products, seed=args.seed, duplicate_rate=args.duplicate_rate, garbage_rate=args.garbage_rate
+        )
+        logger.info("Feed CSV %s: %s rows", args.feed_csv, write_feed_csv(args.feed_csv, rows))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
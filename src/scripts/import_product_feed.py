@@ -0,0 +1,59 @@
+# src/scripts/import_product_feed.py
+"""
+Импорт выгрузки 1С/АСНА (CSV или xlsx) в product_links.
+
+Запуск:
+    python -m src.scripts.import_product_feed feed.csv                  # дельта-фид
+    python -m src.scripts.import_product_feed feed.xlsx --full          # полный фид: отсутствующие -> is_active=False
+    python -m src.scripts.import_product_feed feed.csv --enqueue        # + поставить изменённые SKU в очередь
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import time
+from dataclasses import asdict
+
+from src.config import config
+from src.io.db_io import get_session
+from src.io.job_queue import create_job_queue_table, enqueue_reclassification
+from src.io.product_feed import import_product_feed
+
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Import a 1C/ASNA product feed into product_links")
+    parser.add_argument("path", help="CSV or xlsx file")
+    parser.add_argument("--full", action="store_true", help="feed is complete: deactivate rows missing from it")
+    parser.add_argument("--sheet", default=0, help="xlsx sheet name or index")
+    parser.add_argument("--delimiter", default=None, help="CSV delimiter (auto-detected by default)")
+    parser.add_argument("--chunk-size", type=int, default=config.db.bulk_chunk_size)
+    parser.add_argument("--enqueue", action="store_true", help="enqueue rows flagged for reclassification")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    sheet = int(args.sheet) if isinstance(args.sheet, str) and args.sheet.isdigit() else args.sheet
+    started = time.perf_counter()
+
+    with get_session() as session:
+        stats = import_product_feed(
+            session,
+            args.path,
+            full=args.full,
+            sheet_name=sheet,
+            delimiter=args.delimiter,
+            chunk_size=args.chunk_size,
+        )
+    logger.info("Feed imported in %.2fs: %s", time.perf_counter() - started, asdict(stats))
+
+    if args.enqueue:
+        create_job_queue_table()
+        with get_session() as session:
+            logger.info("Enqueued for reclassification: %s", enqueue_reclassification(session))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,50 @@
+# src/scripts/load_categories.py
+"""
+Загрузка дерева категорий из xlsx в таблицу categories.
+
+Запуск:
+    python -m src.scripts.load_categories categories.xlsx
+    python -m src.scripts.load_categories categories.xlsx --sheet "Дерево" --no-snapshot
+
+Дерево подменяется атомарно (load_categories_from_xlsx), версия пишется в app_meta;
+затем сразу перестраивается снапшот, чтобы воркеры не делали этого при старте.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import time
+
+from src.config import config
+
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Load the category tree from xlsx into the categories table")
+    parser.add_argument("path", help="xlsx file with the category tree")
+    parser.add_argument("--sheet", default=0, help="sheet name or index")
+    parser.add_argument("--chunk-size", type=int, default=config.db.bulk_chunk_size)
+    parser.add_argument("--no-snapshot", action="store_true", help="do not rebuild the category snapshot")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    sheet = int(args.sheet) if isinstance(args.sheet, str) and args.sheet.isdigit() else args.sheet
+
+    from src.io.db_io import get_session, load_categories_from_xlsx
+
+    started = time.perf_counter()
+    loaded = load_categories_from_xlsx(args.path, sheet_name=sheet, chunk_size=args.chunk_size)
+    logger.info("Loaded %s categories in %.2fs", loaded, time.perf_counter() - started)
+
+    if not args.no_snapshot and config.snapshot.enabled:
+        from src.classifier.category_snapshot import rebuild_snapshot
+
+        with get_session() as session:
+            rebuild_snapshot(session)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
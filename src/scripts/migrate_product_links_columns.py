@@ -2,68 +2,84 @@
 """
 Миграция БД: добавление колонок в product_links и categories.
 Запуск: python -m src.scripts.migrate_product_links_columns
+
+Работает с любой БД из config.db / FARMACAT_DATABASE_URL (SQLite, PostgreSQL):
+типы колонок берутся из ORM-моделей и компилируются под диалект.
 """
 from __future__ import annotations
 
-import sqlite3
-from pathlib import Path
+import argparse
 
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
 
-DB_PATH = Path("pharmacy_analyzer/data/linkages.db")
+from src.io.db_io import CategoryDB, ProductLink, create_app_meta_table, get_engine
+from src.io.job_queue import create_job_queue_table
 
 
-def column_exists(cursor: sqlite3.Cursor, table: str, column: str) -> bool:
-    cursor.execute(f"PRAGMA table_info({table});")
-    cols = [row[1] for row in cursor.fetchall()]
+def column_exists(engine_: Engine, table: str, column: str) -> bool:
+    cols = [c["name"] for c in inspect(engine_).get_columns(table)]
     return column in cols
 
 
-def table_exists(cursor: sqlite3.Cursor, table: str) -> bool:
-    cursor.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
-        (table,),
-    )
-    return cursor.fetchone() is not None
+def table_exists(engine_: Engine, table: str) -> bool:
+    return inspect(engine_).has_table(table)
+
+
+def add_column_if_missing(engine_: Engine, model, column_name: str) -> None:
+    table = model.__tablename__
+    if column_exists(engine_, table, column_name):
+        print(f"{table}: column {column_name} already exists")
+        return
+
+    column = model.__table__.c[column_name]
+    coltype = column.type.compile(dialect=engine_.dialect)
+    print(f"{table}: adding column {column_name} ({coltype})")
+    with engine_.begin() as conn:
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column_name} {coltype}")
 
 
-def main() -> None:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+def main(argv: list[str] | None = None) -> int:
+    argparse.ArgumentParser(description="Add missing columns and service tables to the database").parse_args(argv)
+    engine = get_engine()
 
     # --- product_links ---
     product_links_columns = [
-        ("category_code", "TEXT"),
-        ("category_path", "TEXT"),
-        ("inn", "TEXT"),
-        ("dosage_form", "TEXT"),
-        ("age_restriction", "TEXT"),
-        ("otc", "INTEGER"),
-        ("confidence", "REAL"),
-        ("needs_review", "INTEGER"),
-        ("classification_reason", "TEXT"),
+        "category_code",
+        "category_path",
+        "inn",
+        "dosage_form",
+        "age_restriction",
+        "otc",
+        "confidence",
+        "needs_review",
+        "classification_reason",
+        "needs_reclassification",
+        "last_seen_at",
     ]
 
-    for name, coltype in product_links_columns:
-        if not column_exists(cur, "product_links", name):
-            print(f"product_links: adding column {name} ({coltype})")
-            cur.execute(f"ALTER TABLE product_links ADD COLUMN {name} {coltype};")
-        else:
-            print(f"product_links: column {name} already exists")
+    for name in product_links_columns:
+        add_column_if_missing(engine, ProductLink, name)
 
     # --- categories: inn_cluster ---
-    if table_exists(cur, "categories"):
-        if not column_exists(cur, "categories", "inn_cluster"):
-            print("categories: adding column inn_cluster (TEXT)")
-            cur.execute("ALTER TABLE categories ADD COLUMN inn_cluster TEXT;")
-        else:
-            print("categories: column inn_cluster already exists")
+    if table_exists(engine, "categories"):
+        add_column_if_missing(engine, CategoryDB, "inn_cluster")
     else:
         print("categories: table does not exist, skipping (will be created by load_categories_from_xlsx)")
 
-    conn.commit()
-    conn.close()
+    # --- classification_jobs: персистентная очередь (src/io/job_queue.py) ---
+    if not table_exists(engine, "classification_jobs"):
+        print("classification_jobs: creating table")
+    else:
+        print("classification_jobs: table already exists")
+    create_job_queue_table(engine)
+
+    # --- app_meta: версия дерева категорий для снапшота ---
+    create_app_meta_table(engine)
+
     print("Migration finished.")
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
@@ -0,0 +1,80 @@
+# src/scripts/rescore_from_archive.py
+"""
+Пересчёт needs_review / confidence в product_links по архиву ответов LLM
+с текущими порогами config.classifier и текущим деревом категорий.
+Новых вызовов LLM не делает.
+
+Запуск:
+    python -m src.scripts.rescore_from_archive --dry-run
+    python -m src.scripts.rescore_from_archive
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import time
+
+from sqlalchemy import select
+
+from src.classifier.category_snapshot import load_category_snapshot
+from src.classifier.rescoring import frame_to_update_rows, rescore_frame, responses_to_frame
+from src.config import config
+from src.io.db_backend import bulk_update_by_pk
+from src.io.db_io import ProductLink, get_session
+from src.io.response_archive import ResponseArchive
+
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Re-score stored LLM responses without API calls")
+    parser.add_argument("--dir", default=config.archive.directory, help="archive directory")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+
+    df = responses_to_frame(ResponseArchive(args.dir).iter_records())
+    logger.info("Loaded %s archived responses in %.2fs", len(df), time.perf_counter() - started)
+    if df.empty:
+        return 0
+
+    with get_session() as session:
+        categories = load_category_snapshot(session).categories
+        rescored = rescore_frame(df, categories)
+
+        # Сравниваем с тем, что сейчас лежит в БД
+        ids = rescored["id"].tolist()
+        current = {}
+        for start in range(0, len(ids), config.db.bulk_chunk_size):
+            chunk = ids[start:start + config.db.bulk_chunk_size]
+            rows = session.execute(
+                select(ProductLink.id, ProductLink.needs_review).where(ProductLink.id.in_(chunk))
+            )
+            current.update({row.id: row.needs_review for row in rows})
+
+        rescored = rescored[rescored["id"].isin(current.keys())]
+        before = rescored["id"].map(current)
+        changed = int((before.fillna(False).astype(bool) != rescored["needs_review"]).sum())
+        logger.info(
+            "Re-scored %s rows: needs_review=%s (was %s), changed flags: %s",
+            len(rescored),
+            int(rescored["needs_review"].sum()),
+            int(before.fillna(False).astype(bool).sum()),
+            changed,
+        )
+
+        if args.dry_run:
+            session.rollback()
+        else:
+            bulk_update_by_pk(session, ProductLink, frame_to_update_rows(rescored))
+            logger.info("Updated product_links")
+
+    logger.info("Done in %.2fs", time.perf_counter() - started)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,45 +1,75 @@
 # src/scripts/run_batch_classification.py
+"""
+Batch-классификация активных product_links (последовательно или с --concurrency).
+
+Запуск:
+    python -m src.scripts.run_batch_classification --limit 100
+    python -m src.scripts.run_batch_classification --limit 500 --metrics-out reports/batch_metrics.prom
+    python -m src.scripts.run_batch_classification --limit 500 --profile
+
+В stderr выводится строка прогресса (SKU/s и ETA). С --metrics-out поэтапные
+замеры (src/observability/metrics.py) сохраняются в Prometheus textfile
+(*.prom) или JSON с записями по каждому product_link. С --profile прогон
+профилируется (src/observability/profiling.py) в каталог profiles/.
+"""
 from __future__ import annotations
 
+import argparse
 import asyncio
 import logging
-from typing import List
+from typing import List, Optional
 
 from src.data_models import SKU, ClassificationResult, Category
 from src.llm_client.provider_client import ProviderLLMClient
-from src.classifier.classifier_service import ClassifierService
+from src.llm_client.scheduler import build_scheduler, llm_lane
+from src.classifier.classifier_service import ClassificationOutcome, ClassifierService
+from src.classifier.category_snapshot import load_category_snapshot
+from src.io.async_db import AsyncDB
+from src.io.response_archive import ResponseArchive
 from src.io.db_io import (
-    get_session,
     get_active_product_links,
     product_link_to_sku,
     save_classification_result,
-    get_all_categories,
 )
 from src.llm_client.base import LLMError, LLMRetryableError
+from src.observability.metrics import ProgressReporter, metrics, tagged
+from src.observability.profiling import add_profile_arguments, profile_from_args
 
 
 logger = logging.getLogger(__name__)
 
 
-async def classify_batch(limit: int = 10) -> None:
+async def classify_batch(
+    limit: int = 10,
+    metrics_out: Optional[str] = None,
+    progress: bool = True,
+    concurrency: int = 1,
+) -> None:
     """
-    Последовательная batch-классификация product_links из БД.
+    Batch-классификация product_links из БД (по умолчанию последовательная,
+    concurrency > 1 — столько вызовов LLM одновременно, через classify_many).
 
     Делает:
     - загрузку категорий;
     - инициализацию LLM-клиента и классификатора;
     - обработку product_links с обработкой ошибок;
-    - краткий итоговый отчёт.
+    - краткий итоговый отчёт (и, при metrics_out, выгрузку поэтапных замеров).
     """
     logging.basicConfig(level=logging.INFO)
 
-    # get_session здесь синхронный контекстный менеджер, поэтому просто "with"
-    with get_session() as session:
-        categories: List[Category] = get_all_categories(session)
-        product_links = get_active_product_links(session, limit=limit)
+    # Вся работа с БД идёт через AsyncDB: сессии живут в отдельных потоках,
+    # и event loop не блокируется на диске, пока идут запросы к LLM.
+    async with AsyncDB() as db:
+        # Дерево категорий — из снапшота (перестраивается, только если дерево в БД изменилось)
+        snapshot = await db.read(load_category_snapshot)
+        product_links = await db.read(get_active_product_links, limit=limit)
 
-        llm_client = ProviderLLMClient(categories=categories)
-        service = ClassifierService(llm_client=llm_client, categories=categories)
+        archive = ResponseArchive.from_config()
+        # Бюджет запросов к API общий с онлайн-сервером: пачка идёт в полосе "batch"
+        # и не занимает резерв интерактивных запросов (config.scheduler)
+        scheduler = build_scheduler(db)
+        llm_client = ProviderLLMClient.from_snapshot(snapshot, archive=archive, scheduler=scheduler)
+        service = ClassifierService.from_snapshot(llm_client, snapshot)
 
         total = len(product_links)
         classified_ok = 0
@@ -49,60 +79,120 @@ async def classify_batch(limit: int = 10) -> None:
         other_errors = 0
 
         logger.info("Starting batch classification: %s items", total)
-
-        for pl in product_links:
-            sku: SKU = product_link_to_sku(pl)
-
-            try:
-                result: ClassificationResult = await service.classify_product(sku)
-                #save_classification_result(session, pl, result)
-                save_classification_result(session, pl.id, result)
-
-                classified_ok += 1
-                if result.needs_review:
-                    needs_review_count += 1
-
-            except LLMRetryableError as e:
-                llm_retryable_errors += 1
-                logger.warning(
-                    "LLMRetryableError for SKU '%s' (product_link_id=%s): %s",
-                    sku.name,
-                    getattr(pl, "id", None),
-                    e,
-                )
-                # SKU считается неуспешно обработанным, но цикл продолжается
-
-            except LLMError as e:
-                llm_errors += 1
-                logger.error(
-                    "LLMError for SKU '%s' (product_link_id=%s): %s",
-                    sku.name,
-                    getattr(pl, "id", None),
-                    e,
-                )
-
-            except Exception as e:
-                other_errors += 1
-                logger.exception(
-                    "Unexpected error for SKU '%s' (product_link_id=%s): %s",
-                    sku.name,
-                    getattr(pl, "id", None),
-                    e,
-                )
-        # После обработки всех записей фиксируем изменения
-        session.commit()
-
-        logger.info("Batch classification finished.")
-        logger.info("Total product_links: %s", total)
-        logger.info("Successfully classified: %s", classified_ok)
-        logger.info("Marked as needs_review: %s", needs_review_count)
-        logger.info("LLM errors: %s", llm_errors)
-        logger.info("LLM retryable errors: %s", llm_retryable_errors)
-        logger.info("Other errors: %s", other_errors)
-
-
-def main() -> int:
-    asyncio.run(classify_batch(limit=20))
+        reporter = ProgressReporter(total) if progress else None
+
+        def build_sku(pl) -> SKU:
+            with metrics.timer("sku_build", product_link_id=pl.id):
+                return product_link_to_sku(pl)
+
+        try:
+            # SKU строятся лениво, по мере освобождения слотов classify_many;
+            # замеры LLM-этапов помечаются product_link_id из sku.external_id.
+            # Тега attempt здесь нет: повторов у пакетного прогона нет (он — у очереди)
+            with llm_lane("batch"):
+                skus = (build_sku(pl) for pl in product_links)
+                async for item in service.classify_many(skus, concurrency=concurrency):
+                    pl = product_links[item.index]
+                    with tagged(product_link_id=pl.id):
+                        outcome = await _record_outcome(db, pl, item)
+                    if outcome == "error":
+                        other_errors += 1
+                    elif outcome == "retryable":
+                        llm_retryable_errors += 1
+                    elif outcome == "llm_error":
+                        llm_errors += 1
+                    else:
+                        classified_ok += 1
+                        if outcome == "needs_review":
+                            needs_review_count += 1
+                    if reporter is not None:
+                        reporter.update(failed=outcome in ("error", "retryable", "llm_error"))
+        finally:
+            if reporter is not None:
+                reporter.close()
+            await llm_client.aclose()
+            if archive is not None:
+                archive.close()
+
+    logger.info("Batch classification finished.")
+    logger.info("Total product_links: %s", total)
+    logger.info("Successfully classified: %s", classified_ok)
+    logger.info("Marked as needs_review: %s", needs_review_count)
+    logger.info("LLM errors: %s", llm_errors)
+    logger.info("LLM retryable errors: %s", llm_retryable_errors)
+    logger.info("Other errors: %s", other_errors)
+
+    for stage, item in sorted(metrics.stage_summary().items()):
+        logger.info(
+            "Stage %-14s count=%-6s mean=%.4fs p90=%.4fs",
+            stage, item["count"], item["mean"], item.get("p90", 0.0),
+        )
+    if metrics_out:
+        metrics.export(metrics_out)
+        logger.info("Stage metrics written to %s", metrics_out)
+
+
+async def _record_outcome(db: AsyncDB, pl, item: ClassificationOutcome) -> str:
+    """
+    Сохраняет результат одного product_link (или логирует ошибку).
+    Возвращает "ok"/"needs_review", "retryable"/"llm_error" для ошибок LLM, "error" — прочая ошибка.
+    """
+    sku = item.sku
+    try:
+        if item.error is not None:
+            raise item.error
+        result: ClassificationResult = item.result
+        # Каждый результат фиксируется своей короткой транзакцией в потоке-писателе
+        await db.write(save_classification_result, pl.id, result)
+        return "needs_review" if result.needs_review else "ok"
+
+    except LLMRetryableError as e:
+        logger.warning(
+            "LLMRetryableError for SKU '%s' (product_link_id=%s): %s",
+            sku.name,
+            getattr(pl, "id", None),
+            e,
+        )
+        # SKU считается неуспешно обработанным, но цикл продолжается
+        return "retryable"
+
+    except LLMError as e:
+        logger.error(
+            "LLMError for SKU '%s' (product_link_id=%s): %s",
+            sku.name,
+            getattr(pl, "id", None),
+            e,
+        )
+        return "llm_error"
+
+    except Exception as e:
+        logger.exception(
+            "Unexpected error for SKU '%s' (product_link_id=%s): %s",
+            sku.name,
+            getattr(pl, "id", None),
+            e,
+        )
+        return "error"
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Sequential batch classification of active product_links")
+    parser.add_argument("--limit", type=int, default=20, help="how many product_links to classify")
+    parser.add_argument("--metrics-out", help="write per-stage metrics (*.prom — Prometheus textfile, else JSON)")
+    parser.add_argument("--concurrency", type=int, default=1, help="LLM calls in flight (1 = sequential)")
+    parser.add_argument("--no-progress", action="store_true", help="do not print the progress line")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    with profile_from_args(args, "run_batch_classification"):
+        asyncio.run(
+            classify_batch(
+                limit=args.limit,
+                metrics_out=args.metrics_out,
+                progress=not args.no_progress,
+                concurrency=args.concurrency,
+            )
+        )
     return 0
 
 
@@ -0,0 +1,74 @@
+# src/scripts/run_benchmarks.py
+"""
+Офлайн-бенчмарки горячих путей с проверкой регрессий относительно baseline.
+
+Запуск:
+    python -m src.scripts.run_benchmarks --quick                                   # быстрый прогон
+    python -m src.scripts.run_benchmarks --output bench.json --update-baseline     # зафиксировать baseline
+    python -m src.scripts.run_benchmarks --baseline benchmarks/baseline.json       # код возврата 1 при регрессии
+
+Регрессия — падение ops/sec больше чем на --tolerance относительно baseline.
+Baseline стоит снимать на той же машине, где идёт сравнение.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import shutil
+from pathlib import Path
+
+from src.benchmarks.harness import compare_to_baseline, load_baseline, save_results
+from src.benchmarks.suite import BENCHMARKS, BenchProfile, run_suite
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASELINE = "benchmarks/baseline.json"
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run offline benchmarks for classification hot paths")
+    parser.add_argument("--quick", action="store_true", help="small sizes for a fast sanity run")
+    parser.add_argument("--only", nargs="*", choices=sorted(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--latency", type=float, default=None, help="mock LLM latency in seconds")
+    parser.add_argument("--output", default="benchmarks/latest.json", help="where to write results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed ops/sec drop (fraction)")
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the new baseline")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # иначе строка лога на каждый mock-запрос
+    profile = BenchProfile.quick() if args.quick else BenchProfile()
+    if args.latency is not None:
+        profile.latency = args.latency
+
+    results = run_suite(profile, args.only)
+    save_results(args.output, results)
+
+    baseline_path = Path(args.baseline)
+    baseline = load_baseline(baseline_path) if baseline_path.exists() else {}
+    report = compare_to_baseline(results, baseline, args.tolerance)
+
+    print(f"{'benchmark':60} {'ops/sec':>12} {'baseline':>12} {'change':>8}")
+    for item in report.items:
+        base = f"{item.baseline:12.1f}" if item.baseline else f"{'-':>12}"
+        change = f"{item.change:+8.1%}" if item.change is not None else f"{'-':>8}"
+        flag = "  REGRESSION" if item.regression else ""
+        print(f"{item.key:60} {item.current:12.1f} {base} {change}{flag}")
+    print(f"\nResults written to {args.output}")
+
+    if args.update_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(args.output, baseline_path)
+        print(f"Baseline updated: {baseline_path}")
+        return 0
+
+    if report.regressions:
+        print(f"{len(report.regressions)} regression(s) beyond {args.tolerance:.0%} tolerance")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,275 @@
+# src/scripts/run_queue_worker.py
+"""
+Воркер персистентной очереди классификации.
+
+Можно запускать сколько угодно процессов одновременно (на одной машине или
+на нескольких с общей БД) — задачи делятся через аренду в classification_jobs.
+
+Запуск:
+    python -m src.scripts.run_queue_worker --enqueue-active          # поставить активные SKU в очередь
+    python -m src.scripts.run_queue_worker --enqueue-changed         # SKU, изменённые импортом фида
+    python -m src.scripts.run_queue_worker --exit-when-idle          # разбирать очередь до пустой
+    python -m src.scripts.run_queue_worker --stats                   # статистика по статусам
+    python -m src.scripts.run_queue_worker --metrics-out /var/lib/node_exporter/farmacat.prom
+
+С --metrics-out поэтапные замеры (src/observability/metrics.py) перезаписываются
+после каждой пачки: *.prom — Prometheus textfile, иначе JSON.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Dict, List, Optional, Set
+
+from src.config import QueueConfig, config
+from src.data_models import ClassificationResult, Category
+from src.llm_client.provider_client import ProviderLLMClient
+from src.llm_client.scheduler import build_scheduler, llm_lane
+from src.observability.metrics import metrics, tagged
+from src.classifier.classifier_service import ClassifierService
+from src.classifier.category_snapshot import load_category_snapshot
+from src.io.async_db import AsyncDB
+from src.io.response_archive import ResponseArchive
+from src.io.db_io import (
+    ProductLink,
+    get_product_links_by_ids,
+    product_link_to_sku,
+    save_classification_result,
+)
+from src.io.job_queue import (
+    claim_jobs,
+    complete_job,
+    create_job_queue_table,
+    enqueue_active_product_links,
+    enqueue_reclassification,
+    fail_job,
+    get_job_attempts,
+    get_queue_stats,
+    heartbeat_jobs,
+    release_jobs,
+    requeue_dead_jobs,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def make_worker_id() -> str:
+    """Уникальный владелец аренды: хост, pid и случайный хвост."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _save_and_complete(session, owner: str, product_link_id: int, result: ClassificationResult) -> bool:
+    """
+    Сохраняет результат и закрывает задачу в одной транзакции.
+    Если аренду успели перехватить, результат всё равно сохраняется — он не хуже повторного.
+    """
+    save_classification_result(session, product_link_id, result)
+    return complete_job(session, owner, product_link_id)
+
+
+async def _heartbeat_loop(db: AsyncDB, owner: str, running: Set[int], queue_conf: QueueConfig) -> None:
+    """
+    Продлевает аренду задач пачки, которые ещё в работе (running пополняет
+    и очищает _process_chunk). Ошибка записи не останавливает цикл: иначе
+    аренда истечёт посреди пачки и задачи заберёт другой воркер.
+    """
+    while True:
+        await asyncio.sleep(queue_conf.heartbeat_interval)
+        ids = list(running)
+        if not ids:
+            continue
+        try:
+            extended = await db.write(heartbeat_jobs, owner, ids, queue_conf.lease_seconds)
+        except Exception:  # noqa: BLE001 — повторим на следующем такте
+            logger.exception("Worker %s failed to extend leases on %s jobs", owner, len(ids))
+            continue
+        # Задачи, закрытые во время продления, аренды уже не имеют — это не потеря
+        expected = len(running.intersection(ids))
+        if extended < expected:
+            logger.warning("Worker %s lost lease on %s of %s jobs", owner, expected - extended, expected)
+
+
+async def _process_chunk(
+    db: AsyncDB,
+    service: ClassifierService,
+    owner: str,
+    ids: List[int],
+    queue_conf: QueueConfig,
+    running: Optional[Set[int]] = None,
+) -> dict:
+    """
+    Классифицирует пачку захваченных задач. Закрытые задачи (done / retry / dead)
+    убираются из running, чтобы heartbeat продлевал только оставшиеся.
+    """
+    running = set(ids) if running is None else running
+    counters = {"done": 0, "retry": 0, "dead": 0}
+    product_links: List[ProductLink] = await db.read(get_product_links_by_ids, ids)
+    attempts: Dict[int, int] = await db.read(get_job_attempts, ids)
+    found = {pl.id for pl in product_links}
+
+    # Записи, удалённые из product_links, сразу отправляем в dead
+    for missing_id in set(ids) - found:
+        await db.write(fail_job, owner, missing_id, "product_link not found", 0)
+        running.discard(missing_id)
+        counters["dead"] += 1
+
+    semaphore = asyncio.Semaphore(max(1, queue_conf.concurrency))
+
+    async def handle(pl: ProductLink) -> None:
+        # Замеры помечаются product_link_id и номером попытки задачи в очереди
+        with tagged(product_link_id=pl.id, attempt=attempts.get(pl.id)):
+            with metrics.timer("sku_build"):
+                sku = product_link_to_sku(pl)
+            waiting_since = time.perf_counter()
+            async with semaphore:
+                metrics.observe("queue_wait", time.perf_counter() - waiting_since)
+                try:
+                    result = await service.classify_product(sku)
+                except Exception as exc:  # noqa: BLE001 — любая ошибка SKU уходит в last_error
+                    logger.warning(
+                        "Classification failed for SKU '%s' (product_link_id=%s): %s", sku.name, pl.id, exc
+                    )
+                    status = await db.write(
+                        fail_job,
+                        owner,
+                        pl.id,
+                        f"{type(exc).__name__}: {exc}",
+                        queue_conf.max_attempts,
+                        queue_conf.retry_delay_seconds,
+                    )
+                    running.discard(pl.id)
+                    counters["dead" if status == "dead" else "retry"] += 1
+                    return
+            await db.write(_save_and_complete, owner, pl.id, result)
+            running.discard(pl.id)
+            counters["done"] += 1
+
+    await asyncio.gather(*(handle(pl) for pl in product_links))
+    return counters
+
+
+async def run_worker(
+    queue_conf: QueueConfig,
+    exit_when_idle: bool = False,
+    worker_id: str | None = None,
+    metrics_out: Optional[str] = None,
+) -> None:
+    """
+    Основной цикл воркера: claim пачки -> обработка с heartbeat -> следующий claim.
+    При остановке (Ctrl+C / отмена) незавершённые задачи возвращаются в очередь.
+    """
+    owner = worker_id or make_worker_id()
+    create_job_queue_table()
+
+    async with AsyncDB() as db:
+        # Все воркеры стартуют с одного снапшота дерева (одинаковые промпты и индекс МНН)
+        snapshot = await db.read(load_category_snapshot)
+        archive = ResponseArchive.from_config()
+        # Бюджет запросов к API общий с онлайн-сервером и другими воркерами (полоса "batch")
+        scheduler = build_scheduler(db)
+        llm_client = ProviderLLMClient.from_snapshot(snapshot, archive=archive, scheduler=scheduler)
+        service = ClassifierService.from_snapshot(llm_client, snapshot)
+
+        logger.info("Queue worker %s started (categories snapshot %s)", owner, snapshot.content_hash[:12])
+        totals = {"done": 0, "retry": 0, "dead": 0}
+
+        try:
+            while True:
+                ids = await db.write(
+                    claim_jobs, owner, queue_conf.chunk_size, queue_conf.lease_seconds, queue_conf.max_attempts
+                )
+                if not ids:
+                    if exit_when_idle:
+                        break
+                    await asyncio.sleep(queue_conf.poll_interval)
+                    continue
+
+                running = set(ids)
+                heartbeat = asyncio.create_task(_heartbeat_loop(db, owner, running, queue_conf))
+                try:
+                    with llm_lane("batch"):
+                        counters = await _process_chunk(db, service, owner, ids, queue_conf, running)
+                finally:
+                    heartbeat.cancel()
+                    # Всё, что не успели закрыть (отмена, падение), возвращаем в очередь
+                    released = await asyncio.shield(db.write(release_jobs, owner, ids))
+                    if released:
+                        logger.info("Released %s unfinished jobs", released)
+
+                for key, value in counters.items():
+                    totals[key] += value
+                logger.info(
+                    "Chunk of %s finished: done=%s retry=%s dead=%s",
+                    len(ids), counters["done"], counters["retry"], counters["dead"],
+                )
+                if metrics_out:
+                    metrics.export(metrics_out)
+        finally:
+            await llm_client.aclose()
+            if archive is not None:
+                archive.close()
+
+        logger.info(
+            "Queue worker %s finished: done=%s retry=%s dead=%s",
+            owner, totals["done"], totals["retry"], totals["dead"],
+        )
+
+
+async def _run_admin(args: argparse.Namespace) -> None:
+    create_job_queue_table()
+    async with AsyncDB() as db:
+        if args.requeue_dead:
+            logger.info("Requeued dead jobs: %s", await db.write(requeue_dead_jobs))
+        if args.enqueue_active:
+            logger.info("Enqueued product_links: %s", await db.write(enqueue_active_product_links))
+        if args.enqueue_changed:
+            logger.info("Enqueued for reclassification: %s", await db.write(enqueue_reclassification))
+        logger.info("Queue stats: %s", await db.read(get_queue_stats))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Worker for the persistent classification queue")
+    parser.add_argument("--enqueue-active", action="store_true", help="enqueue all active product_links and exit")
+    parser.add_argument(
+        "--enqueue-changed", action="store_true", help="enqueue product_links flagged by the feed importer and exit"
+    )
+    parser.add_argument("--requeue-dead", action="store_true", help="move dead jobs back to pending and exit")
+    parser.add_argument("--stats", action="store_true", help="print queue stats and exit")
+    parser.add_argument("--exit-when-idle", action="store_true", help="stop when no jobs are claimable")
+    parser.add_argument("--chunk-size", type=int, default=config.queue.chunk_size)
+    parser.add_argument("--concurrency", type=int, default=config.queue.concurrency)
+    parser.add_argument("--lease-seconds", type=int, default=config.queue.lease_seconds)
+    parser.add_argument("--max-attempts", type=int, default=config.queue.max_attempts)
+    parser.add_argument("--metrics-out", help="per-stage metrics file rewritten after each chunk (*.prom or JSON)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.enqueue_active or args.enqueue_changed or args.requeue_dead or args.stats:
+        asyncio.run(_run_admin(args))
+        return 0
+
+    queue_conf = QueueConfig(
+        chunk_size=args.chunk_size,
+        lease_seconds=args.lease_seconds,
+        heartbeat_interval=min(config.queue.heartbeat_interval, args.lease_seconds / 3),
+        max_attempts=args.max_attempts,
+        retry_delay_seconds=config.queue.retry_delay_seconds,
+        poll_interval=config.queue.poll_interval,
+        concurrency=args.concurrency,
+    )
+    try:
+        asyncio.run(run_worker(queue_conf, exit_when_idle=args.exit_when_idle, metrics_out=args.metrics_out))
+    except KeyboardInterrupt:
+        logger.info("Interrupted")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
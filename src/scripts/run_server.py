@@ -0,0 +1,114 @@
+# src/scripts/run_server.py
+"""
+Онлайн-сервер классификации для ERP (src/server/http_server.py).
+
+Запуск:
+    python -m src serve                          # host/port из config.server
+    python -m src serve --host 0.0.0.0 --port 8080
+    curl -s localhost:8080/classify -d '{"name": "НУРОФЕН ТАБЛ. 200МГ №10"}'
+
+Один процесс держит горячий снапшот дерева категорий и один httpx.AsyncClient
+с пулом соединений. Раз в snapshot_refresh_seconds снапшот перечитывается;
+если дерево изменилось, сервис подменяется на лету (кэш результатов сбрасывается).
+Вызовы LLM идут через общий для всех сервисов планировщик с полосами приоритета
+(config.scheduler): онлайн-запросы ERP — "interactive", пачки с "priority": "batch".
+Бюджет запросов к API делится с run_batch_classification и run_queue_worker через БД.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+from dataclasses import replace
+from typing import Any, Dict
+
+from src.classifier.category_snapshot import CategorySnapshot, load_category_snapshot
+from src.classifier.classifier_service import ClassifierService
+from src.config import config
+from src.io.async_db import AsyncDB
+from src.io.response_archive import ResponseArchive
+from src.llm_client.base import LLMClient
+from src.llm_client.provider_client import ProviderLLMClient
+from src.llm_client.scheduler import ScheduledLLMClient, build_scheduler
+from src.server.http_server import ClassificationServer
+from src.server.online import OnlineClassifier
+
+logger = logging.getLogger(__name__)
+
+
+async def serve(host: str, port: int) -> None:
+    import httpx
+
+    logging.basicConfig(level=logging.INFO)
+    server_config = replace(config.server, host=host, port=port)
+    http_client = httpx.AsyncClient(
+        timeout=config.llm.timeout_seconds,
+        limits=httpx.Limits(
+            max_connections=config.llm.max_connections,
+            max_keepalive_connections=config.llm.max_keepalive_connections,
+        ),
+    )
+    archive = ResponseArchive.from_config()
+
+    async with AsyncDB() as db:
+        # Бюджет запросов общий с пакетными процессами (config.scheduler.shared_budget)
+        scheduler = build_scheduler(db)
+
+        def build_service(snapshot: CategorySnapshot) -> ClassifierService:
+            llm_client: LLMClient = ProviderLLMClient.from_snapshot(
+                snapshot, archive=archive, http_client=http_client, scheduler=scheduler
+            )
+            if scheduler is not None:
+                llm_client = ScheduledLLMClient(llm_client, scheduler)
+            return ClassifierService.from_snapshot(llm_client, snapshot)
+
+        state: Dict[str, Any] = {"snapshot": await db.read(load_category_snapshot)}
+        online = OnlineClassifier(build_service(state["snapshot"]), server_config)
+
+        def health() -> Dict[str, Any]:
+            snapshot = state["snapshot"]
+            return {"categories": len(snapshot.categories), "snapshot": snapshot.content_hash[:12]}
+
+        async def refresh_snapshot() -> None:
+            while True:
+                await asyncio.sleep(server_config.snapshot_refresh_seconds)
+                try:
+                    snapshot = await db.read(load_category_snapshot)
+                except Exception:  # noqa: BLE001 — сервер продолжает на прежнем дереве
+                    logger.exception("Failed to refresh category snapshot")
+                    continue
+                if snapshot.content_hash != state["snapshot"].content_hash:
+                    logger.info("Category tree changed: snapshot %s", snapshot.content_hash[:12])
+                    state["snapshot"] = snapshot
+                    online.swap_service(build_service(snapshot))
+
+        server = ClassificationServer(online, server_config, health=health)
+        await server.start()
+        refresher = (
+            asyncio.ensure_future(refresh_snapshot()) if server_config.snapshot_refresh_seconds > 0 else None
+        )
+        try:
+            await server.serve_forever()
+        finally:
+            if refresher is not None:
+                refresher.cancel()
+            await server.close()
+            await http_client.aclose()
+            if archive is not None:
+                archive.close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Online classification HTTP server")
+    parser.add_argument("--host", default=config.server.host)
+    parser.add_argument("--port", type=int, default=config.server.port)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
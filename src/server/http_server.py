@@ -0,0 +1,264 @@
+# src/server/http_server.py
+"""
+HTTP/JSON-сервер онлайн-классификации на asyncio.start_server (без внешних зависимостей).
+
+Маршруты:
+    POST /classify        {"name": "...", "manufacturer": "...", "external_id": "...", "timeout": 5,
+                           "priority": "interactive" | "batch"}
+                          -> {"result": {...}, "source": "llm" | "cache" | "coalesced", "elapsed_seconds": ...}
+    POST /classify/batch  {"items": [{"name": ...}, ...], "timeout": 10, "priority": "batch"}
+                          -> {"results": [{"result": ..., "source": ...} | {"error": ..., "status": 504}, ...]}
+    GET  /health          -> {"status": "ok", ...} (размер дерева, кэша, вызовов в полёте)
+    GET  /metrics         -> Prometheus text (src/observability/metrics.py)
+
+Коды ошибок: 400 — неверный запрос, 404/405 — маршрут, 413 — слишком большое
+тело или пачка, 502 — ошибка LLM, 504 — не уложились в таймаут.
+HTTP/1.1 keep-alive поддерживается: ERP может держать одно соединение.
+
+"priority" — полоса планировщика LLM (src/llm_client/scheduler.py); по умолчанию
+config.server.default_priority. Допустимы полосы из config.scheduler.weights.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from dataclasses import asdict
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from src.config import ServerConfig, config
+from src.data_models import SKU, ClassificationResult
+from src.llm_client.base import LLMError
+from src.llm_client.scheduler import llm_lane
+from src.observability.metrics import metrics
+from src.server.online import OnlineClassifier, OnlineResult
+
+logger = logging.getLogger(__name__)
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error", 502: "Bad Gateway", 504: "Gateway Timeout",
+}
+# Служебные поля результата, которые ERP не нужны
+_HIDDEN_FIELDS = ("raw_llm_response", "llm_usage")
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def result_to_dict(result: ClassificationResult) -> Dict[str, Any]:
+    data = asdict(result)
+    for name in _HIDDEN_FIELDS:
+        data.pop(name, None)
+    return data
+
+
+def _online_to_dict(item: OnlineResult) -> Dict[str, Any]:
+    return {"result": result_to_dict(item.result), "source": item.source, "elapsed_seconds": round(item.elapsed_seconds, 4)}
+
+
+def _error_status(exc: BaseException) -> Tuple[int, str]:
+    if isinstance(exc, asyncio.TimeoutError):
+        return 504, "classification timed out"
+    if isinstance(exc, LLMError):
+        return 502, f"LLM error: {exc}"
+    return 500, f"{type(exc).__name__}: {exc}"
+
+
+def _sku_from_item(item: Any) -> SKU:
+    if not isinstance(item, dict) or not isinstance(item.get("name"), str) or not item["name"].strip():
+        raise HttpError(400, "each item needs a non-empty string 'name'")
+    external_id = item.get("external_id")
+    return SKU(
+        name=item["name"],
+        external_id=str(external_id) if external_id is not None else None,
+        manufacturer=item.get("manufacturer"),
+        alt_name=item.get("alt_name"),
+    )
+
+
+class ClassificationServer:
+    """
+    Долгоживущий сервер: один OnlineClassifier (общий LLM-клиент с пулом
+    соединений, горячий снапшот дерева, кэш и singleflight) на все соединения.
+    """
+
+    def __init__(
+        self,
+        online: OnlineClassifier,
+        server_config: Optional[ServerConfig] = None,
+        health: Optional[Callable[[], Dict[str, Any]]] = None,
+        lanes: Optional[Sequence[str]] = None,
+    ) -> None:
+        self.online = online
+        self._conf = server_config or config.server
+        self._lanes = tuple(lanes or config.scheduler.weights)
+        self._health = health
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def port(self) -> int:
+        """Фактический порт (при port=0 — выбранный системой)."""
+        assert self._server is not None and self._server.sockets
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, self._conf.host, self._conf.port)
+        logger.info("Classification server listening on %s:%s", self._conf.host, self.port)
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        assert self._server is not None
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.online.drain()
+
+    # ---------- HTTP ----------
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), self._conf.keepalive_timeout_seconds)
+                except HttpError as exc:
+                    await self._write(writer, exc.status, {"error": str(exc)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                status, payload = await self._dispatch(method, path, body)
+                await self._write(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "malformed request line") from None
+        headers: Dict[str, str] = {}
+        while True:
+            header = await reader.readline()
+            if header in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = header.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length") or 0)
+        if length > self._conf.max_body_bytes:
+            raise HttpError(413, "request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    async def _write(self, writer: asyncio.StreamWriter, status: int, payload: Any, keep_alive: bool) -> None:
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+        head = (
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    # ---------- маршруты ----------
+
+    async def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, Any]:
+        routes = {
+            "/classify": ("POST", self._classify),
+            "/classify/batch": ("POST", self._classify_batch),
+            "/health": ("GET", self._health_route),
+            "/metrics": ("GET", self._metrics_route),
+        }
+        route = routes.get(path.rstrip("/") or "/")
+        if route is None:
+            return 404, {"error": f"unknown path {path}"}
+        expected, handler = route
+        if method != expected:
+            return 405, {"error": f"use {expected} for {path}"}
+        try:
+            data = json.loads(body) if body else {}
+            if not isinstance(data, dict):
+                raise HttpError(400, "JSON object expected")
+            return await handler(data)
+        except json.JSONDecodeError:
+            return 400, {"error": "invalid JSON"}
+        except HttpError as exc:
+            return exc.status, {"error": str(exc)}
+        except Exception as exc:  # noqa: BLE001 — ошибка запроса не роняет сервер
+            status, message = _error_status(exc)
+            if status == 500:
+                logger.exception("Request %s %s failed", method, path)
+            return status, {"error": message}
+
+    def _timeout(self, data: Dict[str, Any]) -> float:
+        """Таймаут запроса: из тела, но не больше серверного потолка."""
+        limit = self._conf.request_timeout_seconds
+        try:
+            requested = float(data.get("timeout") or limit)
+        except (TypeError, ValueError):
+            raise HttpError(400, "'timeout' must be a number") from None
+        return min(max(requested, 0.001), limit)
+
+    def _lane(self, data: Dict[str, Any]) -> str:
+        lane = data.get("priority") or self._conf.default_priority
+        if lane not in self._lanes:
+            raise HttpError(400, f"'priority' must be one of {', '.join(self._lanes)}")
+        return lane
+
+    async def _classify(self, data: Dict[str, Any]) -> Tuple[int, Any]:
+        sku, timeout = _sku_from_item(data), self._timeout(data)
+        with llm_lane(self._lane(data)):
+            item = await self.online.classify(sku, timeout)
+        return 200, _online_to_dict(item)
+
+    async def _classify_batch(self, data: Dict[str, Any]) -> Tuple[int, Any]:
+        items = data.get("items")
+        if not isinstance(items, list) or not items:
+            raise HttpError(400, "'items' must be a non-empty list")
+        if len(items) > self._conf.max_batch:
+            raise HttpError(413, f"at most {self._conf.max_batch} items per batch")
+        skus = [_sku_from_item(item) for item in items]
+        timeout = self._timeout(data)
+        with llm_lane(self._lane(data)):
+            outcomes = await self.online.classify_batch(skus, timeout)
+        results = []
+        for outcome in outcomes:
+            if isinstance(outcome, OnlineResult):
+                results.append(_online_to_dict(outcome))
+            else:
+                status, message = _error_status(outcome)
+                results.append({"error": message, "status": status})
+        return 200, {"results": results}
+
+    async def _health_route(self, data: Dict[str, Any]) -> Tuple[int, Any]:
+        payload = {"status": "ok", "cache_size": self.online.cache_size, "inflight": self.online.inflight}
+        if self._health is not None:
+            payload.update(self._health())
+        return 200, payload
+
+    async def _metrics_route(self, data: Dict[str, Any]) -> Tuple[int, Any]:
+        return 200, metrics.to_prometheus()
@@ -0,0 +1,158 @@
+# src/server/online.py
+"""
+Онлайн-классификация одного SKU или небольшой пачки поверх ClassifierService.
+
+Для сервера (src/server/http_server.py), которому нужен ответ за секунды:
+- кэш результатов по нормализованному названию SKU (normalize_sku_name) с TTL;
+- singleflight: одинаковые запросы, пришедшие, пока первый ещё в полёте,
+  ждут один общий вызов LLM, а не делают свои;
+- таймаут на запрос: истёкший таймаут отпускает только этого клиента, общий
+  вызов продолжается (asyncio.shield) и по завершении попадает в кэш —
+  повторный запрос того же SKU получит готовый ответ.
+
+Параллелизм вызовов LLM и приоритет ограничивает планировщик
+(src/llm_client/scheduler.py): общий вызов идёт в полосе того запроса, который
+его начал (llm_lane в контексте classify). Если к нему присоединяется запрос
+полосы выше (interactive к вызову пачки), вызов, ещё ждущий слот, переезжает
+в его полосу (LaneTicket.promote).
+
+Ошибки не кэшируются: следующий запрос попробует снова.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from src.classifier.attributes import normalize_sku_name
+from src.classifier.classifier_service import ClassifierService
+from src.config import ServerConfig, config
+from src.data_models import SKU, ClassificationResult
+from src.llm_client.scheduler import LaneTicket, current_lane, llm_lane
+from src.observability.metrics import metrics
+
+
+@dataclass
+class OnlineResult:
+    """Результат для одного запроса: source — "llm" | "cache" | "coalesced"."""
+    result: ClassificationResult
+    source: str
+    elapsed_seconds: float
+
+
+class OnlineClassifier:
+    """
+    Обёртка ClassifierService с кэшем, singleflight и таймаутами.
+    Сервис можно заменить на лету (swap_service) — например, при обновлении дерева.
+    """
+
+    def __init__(
+        self,
+        service: ClassifierService,
+        server_config: Optional[ServerConfig] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        conf = server_config or config.server
+        self._service = service
+        self.timeout_seconds = conf.request_timeout_seconds
+        self._ttl = conf.cache_ttl_seconds
+        self._max_entries = conf.cache_max_entries
+        self._clock = clock
+        self._cache: "OrderedDict[str, Tuple[float, ClassificationResult]]" = OrderedDict()
+        self._inflight: Dict[str, Tuple[asyncio.Task, LaneTicket]] = {}
+
+    @staticmethod
+    def key(sku: SKU) -> str:
+        return normalize_sku_name(sku.name)
+
+    @property
+    def cache_size(self) -> int:
+        return len(self._cache)
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    def swap_service(self, service: ClassifierService) -> None:
+        """Новый сервис (новое дерево): кэш сбрасывается, вызовы в полёте доживают на старом."""
+        self._service = service
+        self._cache.clear()
+
+    def _cached(self, key: str) -> Optional[ClassificationResult]:
+        item = self._cache.get(key)
+        if item is None:
+            return None
+        expires_at, result = item
+        if expires_at <= self._clock():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return result
+
+    def _store(self, key: str, result: ClassificationResult) -> None:
+        self._cache[key] = (self._clock() + self._ttl, result)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._max_entries:
+            self._cache.popitem(last=False)
+
+    async def _run(self, key: str, sku: SKU, service: ClassifierService, ticket: LaneTicket) -> ClassificationResult:
+        try:
+            with llm_lane(ticket):
+                result = await service.classify_product(sku)
+            if service is self._service:  # после swap_service результат старого дерева не кэшируем
+                self._store(key, result)
+            return result
+        finally:
+            entry = self._inflight.get(key)
+            if entry is not None and entry[0] is asyncio.current_task():
+                del self._inflight[key]
+
+    async def classify(self, sku: SKU, timeout: Optional[float] = None) -> OnlineResult:
+        """
+        Результат для SKU: из кэша, общего вызова в полёте или нового вызова.
+        asyncio.TimeoutError — не уложились в timeout (по умолчанию — из конфига).
+        """
+        started = self._clock()
+        metrics.inc("online_requests_total")
+        key = self.key(sku)
+
+        cached = self._cached(key)
+        if cached is not None:
+            metrics.inc("online_cache_hits_total")
+            return OnlineResult(replace(cached, sku_name=sku.name), "cache", self._clock() - started)
+
+        entry = self._inflight.get(key)
+        source = "coalesced"
+        lane = current_lane()
+        if entry is None:
+            ticket = LaneTicket(lane)
+            task = asyncio.ensure_future(self._run(key, sku, self._service, ticket))
+            # Ошибку забираем сами: все ждавшие могли уже уйти по таймауту
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = (task, ticket)
+            source = "llm"
+        else:
+            task, ticket = entry
+            metrics.inc("online_coalesced_total")
+            if lane is not None and ticket.promote(lane):
+                metrics.inc("online_promoted_total")
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), timeout or self.timeout_seconds)
+        except asyncio.TimeoutError:
+            metrics.inc("online_timeouts_total")
+            raise
+        return OnlineResult(replace(result, sku_name=sku.name), source, self._clock() - started)
+
+    async def classify_batch(
+        self, skus: Sequence[SKU], timeout: Optional[float] = None
+    ) -> List[Union[OnlineResult, BaseException]]:
+        """Пачка SKU параллельно (дубли внутри пачки схлопываются); ошибка — на месте результата."""
+        return await asyncio.gather(*(self.classify(sku, timeout) for sku in skus), return_exceptions=True)
+
+    async def drain(self) -> None:
+        """Дождаться вызовов в полёте (при остановке сервера)."""
+        if self._inflight:
+            await asyncio.gather(*(task for task, _ in list(self._inflight.values())), return_exceptions=True)
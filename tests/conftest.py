@@ -0,0 +1,26 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.io.db_backend import configure_sqlite_engine
+from src.io.db_io import Base, ProductLink
+
+
+@pytest.fixture
+def db_engine(tmp_path):
+    """Отдельная SQLite-БД во временной папке со всеми таблицами из ORM."""
+    engine = configure_sqlite_engine(
+        create_engine(f"sqlite:///{tmp_path / 'test.db'}", future=True)
+    )
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(db_engine):
+    factory = sessionmaker(bind=db_engine, autoflush=False, autocommit=False, expire_on_commit=False)
+    with factory() as session:
+        session.add_all([ProductLink(id=i, name_1c=f"SKU {i}", is_active=True) for i in range(1, 6)])
+        session.commit()
+    return factory
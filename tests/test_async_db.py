@@ -0,0 +1,65 @@
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from src.config import DatabaseConfig
+from src.data_models import ClassificationResult
+from src.io.async_db import AsyncDB, is_lock_error
+from src.io.db_io import ProductLink, save_classification_result
+
+
+def _result(name: str) -> ClassificationResult:
+    return ClassificationResult(
+        sku_name=name,
+        category_code="A01",
+        category_path=None,
+        inn="ибупрофен",
+        dosage_form=None,
+        age_restriction=None,
+        otc=True,
+        confidence=0.9,
+        needs_review=False,
+        reason="ok",
+    )
+
+
+def test_sqlite_engine_uses_wal_and_busy_timeout(session_factory):
+    with session_factory() as session:
+        assert session.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert session.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+
+
+def test_async_db_writes_do_not_block_and_persist(session_factory):
+    async def run():
+        async with AsyncDB(session_factory=session_factory) as db:
+            await asyncio.gather(
+                *(db.write(save_classification_result, i, _result(f"SKU {i}")) for i in range(1, 6))
+            )
+            return await db.read(lambda s: [pl.category_code for pl in s.query(ProductLink).all()])
+
+    codes = asyncio.run(run())
+    assert codes == ["A01"] * 5
+
+
+def test_async_db_retries_on_lock(session_factory):
+    calls = {"n": 0}
+
+    def flaky(session):
+        calls["n"] += 1
+        if calls["n"] < 3:
+            raise OperationalError("UPDATE ...", {}, Exception("database is locked"))
+        return "done"
+
+    async def run():
+        db_config = DatabaseConfig(lock_retry_backoff=0.0)
+        async with AsyncDB(session_factory=session_factory, db_config=db_config) as db:
+            return await db.write(flaky)
+
+    assert asyncio.run(run()) == "done"
+    assert calls["n"] == 3
+
+
+def test_is_lock_error_ignores_other_errors():
+    assert not is_lock_error(OperationalError("SELECT", {}, Exception("no such table: x")))
+    assert not is_lock_error(ValueError("database is locked"))
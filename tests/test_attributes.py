@@ -0,0 +1,58 @@
+# tests/test_attributes.py
+import pytest
+
+from src.classifier.attributes import AttributeExtractor, normalize_sku_name
+from src.classifier.prompt_builder import PromptBuilder
+from src.data_models import SKU
+
+NAMES = [
+    "ВАЛТРЕКС ТАБЛ. П/ПЛЕН/ОБ. 500МГ №10",
+    "НУРОФЕН ДЛЯ ДЕТЕЙ СУСП. 100МГ/5МЛ 100МЛ",
+    "ВИФЕРОН СУПП. РЕКТ. 150000МЕ №10",
+    "ИНСУЛИН Р-Р 100 ЕД/МЛ 10МЛ",
+    "Називин капли 0,01% 5мл детск.",
+    "ВИТАМИН D3 2000 МЕ КАПС. N60",
+    "АСПИРИН 10 шт",
+    "ТАБЛЕТНИЦА",
+    "ASPIRIN 500МГ ТАБ. №20",
+    "Spasmalgon 10 табл",
+    "ПАРАЦЕТАМОЛ 20 таблеток",
+    None,
+]
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        (NAMES[0], {"dosage": "500 мг", "form": "tablets", "pack_count": 10, "age": None}),
+        (NAMES[1], {"dosage": "100 мг", "form": "suspension", "pack_count": None, "age": "children"}),
+        (NAMES[2], {"dosage": "150000 ме", "form": "suppositories", "route": "rectal", "pack_count": 10}),
+        (NAMES[3], {"dosage": "100 ед/мл", "form": "solution", "route": None}),
+        (NAMES[4], {"dosage": "0,01 %", "form": "drops", "age": "children"}),
+        (NAMES[5], {"form": "capsules", "pack_count": 60}),
+        (NAMES[6], {"dosage": None, "form": None, "pack_count": 10}),
+        (NAMES[7], {"dosage": None, "form": None, "pack_count": None, "age": None}),
+        # латинская n внутри слова — не номер упаковки
+        (NAMES[8], {"dosage": "500 мг", "form": "tablets", "pack_count": 20}),
+        (NAMES[9], {"form": "tablets", "pack_count": None}),
+        (NAMES[10], {"form": "tablets", "pack_count": None}),
+    ],
+)
+def test_extract(name, expected):
+    attrs = AttributeExtractor().extract(name).to_dict()
+    assert {key: attrs[key] for key in expected} == expected
+
+
+def test_extract_many_matches_scalar_and_caches():
+    extractor = AttributeExtractor()
+    many = extractor.extract_many(NAMES + [NAMES[0].lower()])
+    assert many == [AttributeExtractor().extract(name) for name in NAMES + [NAMES[0]]]
+    assert len(extractor) == len(NAMES) - 1  # None не кэшируется, дубликат по нормализованному имени — одна запись
+    assert normalize_sku_name("  Ёжик   ТАБЛ. ") == "ежик табл."
+
+
+def test_prompt_hint():
+    attrs = AttributeExtractor().extract(NAMES[0])
+    prompt = PromptBuilder().build_user_prompt(SKU(name=NAMES[0]), [], "", attrs.prompt_hint())
+    assert "Признаки из названия" in prompt and "дозировка 500 мг; форма: таблетки; в упаковке 10 шт." in prompt
+    assert "Признаки из названия" not in PromptBuilder().build_user_prompt(SKU(name="X"), [], "")
@@ -0,0 +1,66 @@
+import json
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.benchmarks.harness import BenchResult, compare_to_baseline, load_baseline, save_results
+from src.benchmarks.suite import BenchProfile, run_suite
+from src.benchmarks.synthetic import iter_product_rows, make_categories, populate_database, write_feed_csv
+from src.classifier.inn_index import build_inn_index
+from src.io.db_io import ProductLink, get_all_categories, product_link_to_sku
+
+
+def test_synthetic_tree_has_multi_code_clusters():
+    categories = make_categories(200, cluster_size=3)
+    assert len(categories) == 200
+    assert len({c.code for c in categories}) == 200
+    assert any(len(cats) == 3 for cats in build_inn_index(categories).values())
+
+
+def test_baseline_comparison_flags_regressions(tmp_path):
+    fast = BenchResult("prompt_build", {"tree": 100}, ops=100, timings=[0.5, 1.0])
+    slow = BenchResult("inn_lookup", {"tree": 100}, ops=100, timings=[2.0])
+    path = tmp_path / "baseline.json"
+    save_results(path, [fast, slow])
+    assert load_baseline(path) == {"prompt_build[tree=100]": 200.0, "inn_lookup[tree=100]": 50.0}
+
+    current = [
+        BenchResult("prompt_build", {"tree": 100}, ops=100, timings=[0.55]),  # -9%: в допуске
+        BenchResult("inn_lookup", {"tree": 100}, ops=100, timings=[4.0]),  # -50%: регрессия
+        BenchResult("new_bench", {}, ops=1, timings=[1.0]),  # нет в baseline
+    ]
+    report = compare_to_baseline(current, load_baseline(path), tolerance=0.2)
+    assert [c.key for c in report.regressions] == ["inn_lookup[tree=100]"]
+    assert report.items[2].baseline is None and not report.items[2].regression
+
+
+def test_quick_suite_runs_offline(tmp_path):
+    profile = BenchProfile(tree_sizes=[30], concurrency=[4], skus=8, db_rows=20, latency=0.0, repeat=1)
+    results = run_suite(profile, only=["classify_sku_parse", "e2e_batch", "db"])
+    assert {r.name for r in results} == {"classify_sku_parse", "classify_sku_split", "e2e_batch", "db_write", "db_read"}
+    assert all(r.ops_per_sec > 0 for r in results)
+
+    save_results(tmp_path / "run.json", results)
+    data = json.loads((tmp_path / "run.json").read_text(encoding="utf-8"))
+    assert data["results"][0]["key"] == "classify_sku_parse[tree=30]"
+
+
+def test_populate_scratch_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'scratch.db'}", future=True)
+    stats = populate_database(engine, products=3000, categories=120, chunk_size=700, seed=3, garbage_rate=0.05)
+    assert stats.products == 3000 and stats.duplicates > 0 and stats.garbage_names > 0
+
+    factory = sessionmaker(bind=engine)
+    with factory() as session:
+        assert session.query(ProductLink).count() == 3000
+        categories = get_all_categories(session)
+        assert len(categories) == 120
+        assert max(len(c) for c in build_inn_index(categories).values()) == 3
+        # Мусорное name_1c не мешает построить SKU: берётся наименование АСНА
+        garbage = session.query(ProductLink).filter(ProductLink.name_1c == "nan").first()
+        assert product_link_to_sku(garbage).name == garbage.name_asna
+    engine.dispose()
+
+    feed = tmp_path / "feed.csv"
+    assert write_feed_csv(str(feed), iter_product_rows(50, seed=3)) == 50
+    assert feed.read_text(encoding="utf-8-sig").splitlines()[0] == "Код 1С;Код АСНА;Наименование 1С;Производитель;Наименование АСНА"
@@ -0,0 +1,67 @@
+# tests/test_category_index.py
+import asyncio
+from unittest.mock import AsyncMock
+
+from src.classifier.category_index import CategoryIndex
+from src.classifier.category_snapshot import build_snapshot
+from src.classifier.classifier_service import ClassifierService
+from src.data_models import SKU, Category, ClassificationResult
+from src.llm_client.base import LLMClient
+
+CATEGORIES = [
+    Category(code="A39_01", direction="ОРВИ", need="Герпес", group="Противовирусные", inn_cluster="Валацикловир/Valaciclovir"),
+    Category(code="A39_02", direction="ОРВИ", need="Герпес", group="Противовирусные", inn_cluster="Валацикловир"),
+    Category(code="A40", direction="ОРВИ", need="Грипп", group="Противовирусные", inn_cluster="Осельтамивир"),
+    Category(code="B01", direction="Боль", need="Головная боль"),
+]
+
+
+def test_lookup_paths_and_hierarchy():
+    index = CategoryIndex(CATEGORIES)
+
+    assert len(index) == 4 and "A40" in index and "ZZZ" not in index
+    assert index.get("B01") is CATEGORIES[3] and index.get(None) is None
+    assert index.path("A39_02") == "ОРВИ > Герпес > Противовирусные"
+    assert index.path("B01") == "Боль > Головная боль"  # пустой уровень пропущен
+    assert index.path("ZZZ") is None
+
+    assert list(index.root.children) == ["ОРВИ", "Боль"]
+    assert index.parent("A40").path == ("ОРВИ", "Грипп", "Противовирусные")
+    assert index.node("ОРВИ", "Герпес").depth == 2
+    assert index.node("ОРВИ", "Насморк") is None
+    assert [c.code for c in index.siblings("A39_01")] == ["A39_02"]
+    assert [c.code for c in index.subtree("ОРВИ")] == ["A39_01", "A39_02", "A40"]
+    assert [c.code for c in index.subtree()] == ["A39_01", "A39_02", "A40", "B01"]
+
+
+def test_clusters():
+    index = CategoryIndex(CATEGORIES)
+
+    assert [c.code for c in index.cluster(" VALACICLOVIR ")] == ["A39_01"]
+    assert [c.code for c in index.cluster("валацикловир")] == ["A39_01", "A39_02"]
+    assert index.cluster(None) == []
+    assert [c.code for c in index.cluster_siblings("A39_02")] == ["A39_01"]
+    assert index.cluster_siblings("B01") == []
+
+
+def test_snapshot_index_is_shared_and_service_fills_path():
+    snapshot = build_snapshot(CATEGORIES)
+    assert snapshot.index is snapshot.index
+    assert "index" not in snapshot.to_dict()
+
+    class Client(LLMClient):
+        async def classify_sku_raw(self, sku_name: str):
+            raise NotImplementedError
+
+        async def classify_sku(self, sku: SKU) -> ClassificationResult:
+            raise NotImplementedError
+
+    client = Client()
+    client.classify_sku = AsyncMock(return_value=ClassificationResult(
+        sku_name="ОСЕЛЬТАМИВИР", category_code="A40", category_path=None, inn="осельтамивир",
+        dosage_form=None, age_restriction=None, otc=None, confidence=0.9, needs_review=False, reason="",
+    ))
+    service = ClassifierService.from_snapshot(client, snapshot)
+    result = asyncio.run(service.classify_product(SKU(name="ОСЕЛЬТАМИВИР")))
+    assert result.category_path == "ОРВИ > Грипп > Противовирусные"
+    assert result.needs_review is False  # в кластере один код
@@ -0,0 +1,60 @@
+from openpyxl import Workbook
+
+from src.classifier.category_snapshot import build_snapshot, load_category_snapshot, read_snapshot
+from src.classifier.inn_index import build_inn_index
+from src.classifier.prompt_builder import PromptBuilder
+from src.data_models import SKU, Category
+from src.io.db_io import load_categories_from_xlsx
+
+
+def _write_tree(path, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Код категории", "Направление", "МНН-кластер"])
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+    return str(path)
+
+
+def test_snapshot_matches_runtime_structures():
+    categories = [
+        Category(code="A39_01", direction="ОРВИ", inn_cluster="Валацикловир/Valaciclovir"),
+        Category(code="A39_02", direction="ОРВИ", inn_cluster="Валацикловир"),
+        Category(code="B01", direction="Боль"),
+    ]
+    snapshot = build_snapshot(categories)
+
+    assert snapshot.inn_index == {"валацикловир": ["A39_01", "A39_02"], "valaciclovir": ["A39_01"]}
+    assert snapshot.inn_index_categories() == build_inn_index(categories)
+    assert snapshot.categories_block == PromptBuilder().build_categories_block(categories)
+    assert snapshot.token_estimate > 0
+
+    sku = SKU(name="ВАЛТРЕКС")
+    builder = PromptBuilder()
+    assert builder.build_user_prompt(sku, [], snapshot.categories_block) == builder.build_user_prompt(sku, categories)
+    assert build_snapshot(list(categories)).content_hash == snapshot.content_hash
+
+
+def test_snapshot_is_reused_until_tree_changes(tmp_path, db_engine, session_factory):
+    path = tmp_path / "snapshot.json"
+    load_categories_from_xlsx(_write_tree(tmp_path / "v1.xlsx", [["A01", "Боль", "Ибупрофен"]]), engine_=db_engine)
+
+    with session_factory.begin() as session:
+        first = load_category_snapshot(session, path)
+    assert [c.code for c in first.categories] == ["A01"]
+    assert read_snapshot(path).content_hash == first.content_hash
+
+    with session_factory.begin() as session:
+        again = load_category_snapshot(session, path)
+    assert again.created_at == first.created_at  # прочитан с диска, не перестроен
+
+    load_categories_from_xlsx(
+        _write_tree(tmp_path / "v2.xlsx", [["A01", "Боль", "Ибупрофен"], ["A02", "Боль", "Ибупрофен"]]),
+        engine_=db_engine,
+    )
+    with session_factory.begin() as session:
+        rebuilt = load_category_snapshot(session, path)
+    assert [c.code for c in rebuilt.categories] == ["A01", "A02"]
+    assert rebuilt.source_version != first.source_version
+    assert rebuilt.inn_index == {"ибупрофен": ["A01", "A02"]}
@@ -40,3 +40,81 @@ def test_classifier_marks_needs_review_for_low_confidence():
 
     assert result.needs_review is True
     assert result.confidence == 0.3
+
+
+class DelayedLLMClient(LLMClient):
+    """Ответ через delay секунд (из имени SKU "name:delay"); имя "fail:*" — ошибка."""
+
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def classify_sku_raw(self, sku_name: str):
+        raise NotImplementedError
+
+    async def classify_sku(self, sku: SKU) -> ClassificationResult:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            name, delay = sku.name.split(":")
+            await asyncio.sleep(float(delay))
+            if name == "fail":
+                raise RuntimeError("boom")
+            return ClassificationResult(
+                sku_name=sku.name, category_code="CAT001", category_path=None, inn=None,
+                dosage_form=None, age_restriction=None, otc=None,
+                confidence=0.9, needs_review=False, reason="ok",
+            )
+        finally:
+            self.in_flight -= 1
+
+
+def _collect(service, skus, **kwargs):
+    async def run():
+        return [item async for item in service.classify_many(skus, **kwargs)]
+
+    return asyncio.run(run())
+
+
+def test_classify_many_streams_with_bounded_concurrency_and_errors():
+    client = DelayedLLMClient()
+    service = ClassifierService(llm_client=client, categories=[])
+    skus = [SKU(name=n) for n in ("a:0.03", "b:0.01", "fail:0.0", "c:0.02", "d:0.0")]
+
+    by_completion = _collect(service, skus, concurrency=2)
+    assert client.max_in_flight == 2
+    assert sorted(o.index for o in by_completion) == [0, 1, 2, 3, 4]
+    assert [o.index for o in by_completion] != [0, 1, 2, 3, 4]
+    failed = [o for o in by_completion if not o.ok]
+    assert [o.index for o in failed] == [2] and isinstance(failed[0].error, RuntimeError)
+    # Постобработка применена: confidence 0.9 выше порогов -> без ревью
+    assert all(o.result.needs_review is False for o in by_completion if o.ok)
+
+    ordered = _collect(service, skus, concurrency=3, ordered=True)
+    assert [o.index for o in ordered] == [0, 1, 2, 3, 4]
+
+
+def test_classify_many_reads_async_source_lazily_and_cancels_on_break():
+    client = DelayedLLMClient()
+    service = ClassifierService(llm_client=client, categories=[])
+    pulled = []
+
+    async def source():
+        for i in range(100):
+            pulled.append(i)
+            yield SKU(name=f"s{i}:0.01")
+
+    async def run():
+        stream = service.classify_many(source(), concurrency=4)
+        first = []
+        async for item in stream:
+            first.append(item)
+            if len(first) == 3:
+                break
+        await stream.aclose()
+        return first
+
+    first = asyncio.run(run())
+    assert len(first) == 3
+    assert len(pulled) < 10  # вход не вычитан целиком
+    assert client.in_flight == 0  # незавершённые вызовы отменены
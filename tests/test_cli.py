@@ -0,0 +1,31 @@
+import subprocess
+import sys
+
+from src.cli import COMMANDS, main
+
+
+def test_cli_lists_commands(capsys):
+    assert main(["--help"]) == 0
+    out = capsys.readouterr().out
+    assert all(name in out for name in ("batch", "eval", "debug-sku", "load-categories", "migrate"))
+    assert main(["no-such-command"]) == 2
+
+
+def test_cli_commands_point_to_scripts_with_main():
+    import importlib
+
+    for module_name, _ in COMMANDS.values():
+        assert callable(importlib.import_module(module_name).main)
+
+
+def test_imports_stay_lazy():
+    # В отдельном процессе: pytest-плагины уже импортировали httpx в этот
+    code = (
+        "import sys\n"
+        "import src.cli, src.io.db_io, src.io.async_db, src.llm_client.provider_client\n"
+        "import src.classifier.classifier_service\n"
+        "heavy = [m for m in ('httpx', 'pandas', 'numpy', 'openpyxl', 'dotenv') if m in sys.modules]\n"
+        "assert not heavy, heavy\n"
+        "assert src.io.db_io._engine is None\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,99 @@
+# tests/test_cluster_resolver.py
+import asyncio
+from unittest.mock import AsyncMock
+
+from src.classifier.attributes import AttributeExtractor
+from src.classifier.category_index import CategoryIndex
+from src.classifier.classifier_service import ClassifierService
+from src.classifier.cluster_resolver import CategoryRule, ClusterResolver
+from src.data_models import SKU, Category, ClassificationResult
+from src.llm_client.base import LLMClient
+
+VALACICLOVIR = [
+    Category(code="A39_01", inn_cluster="Валацикловир", dosage_form="Раствор для инфузий", age_segment="Взрослые"),
+    Category(code="A39_02", inn_cluster="Валацикловир", dosage_form="Таблетки", age_segment="Взрослые"),
+    Category(code="A39_03", inn_cluster="Валацикловир", dosage_form="Таблетки", age_segment="Дети"),
+]
+RIMANTADINE = [
+    Category(code="A15_01", inn_cluster="Римантадин", comment="Таблетки до 50 мг, профилактика и лечение гриппа"),
+    Category(code="A15_02", inn_cluster="Римантадин", comment="Сироп для детей с 1 года", administration_route="Внутрь"),
+]
+ACICLOVIR = [
+    Category(code="A40_01", inn_cluster="Ацикловир", administration_route="Наружно"),
+    Category(code="A40_02", inn_cluster="Ацикловир", dosage_form="Таблетки"),
+]
+INDEX = CategoryIndex(VALACICLOVIR + RIMANTADINE + ACICLOVIR)
+extract = AttributeExtractor().extract
+
+
+def test_category_rule_from_fields_and_comment():
+    rule = CategoryRule.from_category(RIMANTADINE[0])
+    assert rule.form == "tablets" and rule.route is None
+    assert [(d.op, d.value, d.unit) for d in rule.doses] == [("до", 50.0, "мг")]
+    assert CategoryRule.from_category(RIMANTADINE[1]).age == "children"
+    assert CategoryRule.from_category(ACICLOVIR[0]).route == "topical"
+
+
+def test_resolve():
+    resolver = ClusterResolver(INDEX)
+
+    kids = resolver.resolve("Валацикловир", extract("ВАЛАЦИКЛОВИР ДЕТСКИЙ ТАБЛ. 250МГ"))
+    assert kids.code == "A39_03" and "возраст дети" in kids.matched
+
+    # Таблетки без возраста: A39_02 и A39_03 не разделить
+    tablets = resolver.resolve("Валацикловир", extract("ВАЛТРЕКС ТАБЛ. 500МГ №10"))
+    assert not tablets.resolved and tablets.candidates == ("A39_02", "A39_03")
+
+    assert resolver.resolve("Римантадин", extract("РЕМАНТАДИН ТАБЛ. 50МГ №20")).code == "A15_01"
+    assert resolver.resolve("римантадин", extract("ОРВИРЕМ СИРОП Д/ДЕТЕЙ 0,2% 100МЛ")).code == "A15_02"
+    # Доза выше порога из комментария исключает A15_01, форма — A15_02
+    assert not resolver.resolve("Римантадин", extract("РИМАНТАДИН ТАБЛ. 100МГ №20")).resolved
+
+    # Способ введения следует из формы: мазь — наружно, подходит только A40_01
+    assert resolver.resolve("Ацикловир", extract("АЦИКЛОВИР МАЗЬ 5% 10Г")).code == "A40_01"
+    # Нет признаков — нет выбора
+    assert not resolver.resolve("Ацикловир", extract("АЦИКЛОВИР")).resolved
+
+
+def test_all_rows_contradict_escalates():
+    resolver = ClusterResolver(INDEX)
+    resolution = resolver.resolve("Валацикловир", extract("ВАЛАЦИКЛОВИР СПРЕЙ"))
+    assert not resolution.resolved and resolution.candidates == ("A39_01", "A39_02", "A39_03")
+
+
+def test_resolution_cache_is_bounded():
+    resolver = ClusterResolver(INDEX, max_entries=2)
+    for name in ("РЕМАНТАДИН ТАБЛ. 50МГ", "ОРВИРЕМ СИРОП Д/ДЕТЕЙ", "АЦИКЛОВИР МАЗЬ 5%"):
+        resolver.resolve("Римантадин", extract(name))
+    assert len(resolver) == 2
+    assert resolver.resolve("Римантадин", extract("РЕМАНТАДИН ТАБЛ. 50МГ")).code == "A15_01"
+
+
+def _classify(name, code, categories=VALACICLOVIR):
+    class Client(LLMClient):
+        async def classify_sku_raw(self, sku_name: str):
+            raise NotImplementedError
+
+        async def classify_sku(self, sku: SKU) -> ClassificationResult:
+            raise NotImplementedError
+
+    client = Client()
+    client.classify_sku = AsyncMock(return_value=ClassificationResult(
+        sku_name=name, category_code=code, category_path=None, inn=categories[0].inn_cluster, dosage_form=None,
+        age_restriction=None, otc=False, confidence=0.9, needs_review=False, reason="ok",
+    ))
+    service = ClassifierService(llm_client=client, categories=categories)
+    return asyncio.run(service.classify_product(SKU(name=name)))
+
+
+def test_service_resolves_overrides_and_escalates():
+    resolved = _classify("ВАЛАЦИКЛОВИР ДЕТСКИЙ ТАБЛ. 250МГ", "A39_03")
+    assert resolved.needs_review is False and resolved.confidence == 0.9 and resolved.reason == "ok"
+
+    # Модель выбрала строку, противоречащую названию: код заменён, причина в reason
+    overridden = _classify("ВАЛАЦИКЛОВИР ДЕТСКИЙ ТАБЛ. 250МГ", "A39_02")
+    assert overridden.category_code == "A39_03" and overridden.needs_review is False
+    assert "выбран внутри МНН-кластера" in overridden.reason
+
+    ambiguous = _classify("ВАЛТРЕКС ТАБЛ. 500МГ №10", "A39_02")
+    assert ambiguous.needs_review is True and ambiguous.confidence == 0.6
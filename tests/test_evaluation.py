@@ -0,0 +1,187 @@
+import asyncio
+import json
+
+import pandas as pd
+import pytest
+from pytest_httpx import HTTPXMock
+
+from src.classifier.category_index import CategoryIndex
+from src.classifier.classifier_service import ClassifierService
+from src.classifier.prefilter import Prefilter
+from src.data_models import SKU, ClassificationResult
+from src.evaluation.metrics import category_metrics, confusion_matrix, summary_metrics
+from src.evaluation.runner import correct_flags, evaluate_samples, evaluate_sequential
+from src.evaluation.sampling import StratifiedSampler, stratified_estimate, stratum_labels, wilson_interval
+from src.io.file_io import JsonFileCache
+from src.llm_client.base import LLMClient, LLMError
+from src.llm_client.provider_client import ProviderLLMClient
+
+
+def _frame(rows):
+    columns = ["true_code", "pred_code", "true_inn", "pred_inn", "needs_review", "latency_seconds",
+               "prompt_tokens", "completion_tokens", "total_tokens", "cached", "error"]
+    return pd.DataFrame([dict(zip(columns, r)) for r in rows], columns=columns)
+
+
+def test_metrics_per_category_and_summary():
+    df = _frame(
+        [
+            ("A", "A", "Ибупрофен", " ибупрофен ", False, 1.0, 100, 10, 110, False, None),
+            ("A", "B", "Ибупрофен", "парацетамол", True, 2.0, 100, 10, 110, False, None),
+            ("B", "B", "", "x", True, 3.0, 100, 10, 110, False, None),
+            ("B", None, "Аспирин", None, None, None, None, None, None, None, "LLMError: boom"),
+        ]
+    )
+    per_category = category_metrics(df)
+    assert per_category.loc["A", ["tp", "support", "predicted"]].tolist() == [1, 2, 1]
+    assert per_category.loc["A", "precision"] == 1.0 and per_category.loc["A", "recall"] == 0.5
+    assert per_category.loc["B", "precision"] == 0.5 and per_category.loc["B", "recall"] == 0.5
+    assert per_category.loc["A", "f1"] == pytest.approx(2 / 3)
+
+    matrix = confusion_matrix(df)
+    assert matrix.loc["A", "B"] == 1 and matrix.loc["B", "<none>"] == 1
+
+    summary = summary_metrics(df, per_category)
+    assert (summary["total"], summary["classified"], summary["errors"]) == (4, 3, 1)
+    assert summary["accuracy"] == pytest.approx(2 / 3)
+    assert summary["inn_accuracy"] == 0.5
+    assert summary["review_rate"] == pytest.approx(2 / 3)
+    assert summary["latency_seconds"]["p50"] == 2.0
+    assert summary["total_tokens"]["count"] == 3
+
+
+class _SlowLLMClient(LLMClient):
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def classify_sku_raw(self, sku_name):
+        raise NotImplementedError
+
+    async def classify_sku(self, sku: SKU) -> ClassificationResult:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if sku.name == "BROKEN":
+            raise LLMError("bad response")
+        return ClassificationResult(
+            sku_name=sku.name, category_code=sku.name, category_path=None, inn=None, dosage_form=None,
+            age_restriction=None, otc=None, confidence=0.9, needs_review=False, reason="",
+            llm_latency_seconds=0.01, llm_usage={"prompt_tokens": 5, "completion_tokens": 1, "total_tokens": 6},
+        )
+
+
+def test_evaluate_samples_bounds_concurrency_and_keeps_order():
+    llm = _SlowLLMClient()
+    service = ClassifierService(llm_client=llm, categories=[])
+    names = [f"C{i}" for i in range(12)] + ["BROKEN"]
+    samples = pd.DataFrame({"Название": names, "Код категории": names, "МНН": "", "Производитель": "", "Название АСНА": ""})
+
+    per_sku = asyncio.run(evaluate_samples(service, samples, concurrency=4))
+
+    assert llm.max_in_flight == 4
+    assert per_sku["sku_name"].tolist() == names
+    assert per_sku["error"].notna().tolist() == [False] * 12 + [True]
+    assert per_sku["total_tokens"].iloc[0] == 6
+
+
+def test_prefiltered_rows_reported_separately_from_cache():
+    llm = _SlowLLMClient()
+    service = ClassifierService(llm_client=llm, categories=[], prefilter=Prefilter(CategoryIndex([])))
+    names = ["C1", "nan", "ШАМПУНЬ ALERANA 250МЛ"]
+    samples = pd.DataFrame({"Название": names, "Код категории": "C1", "МНН": "", "Производитель": "", "Название АСНА": ""})
+
+    per_sku = asyncio.run(evaluate_samples(service, samples))
+    assert per_sku["prefiltered"].tolist() == ["", "junk", "non_drug"]
+    assert per_sku["cached"].tolist() == [False, False, False]
+    summary = summary_metrics(per_sku, category_metrics(per_sku))
+    assert (summary["prefiltered"], summary["cached"]) == (2, 0)
+
+
+def test_provider_client_reuses_http_client_and_cache(httpx_mock: HTTPXMock, tmp_path, monkeypatch):
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test-key")
+    httpx_mock.add_response(
+        status_code=200,
+        json={"choices": [{"message": {"content": json.dumps({"category_code": "A01", "confidence": 0.9})}}],
+              "usage": {"total_tokens": 42}},
+    )
+    cache_path = tmp_path / "cache.json"
+
+    async def run():
+        with JsonFileCache(cache_path) as cache:
+            client = ProviderLLMClient(response_cache=cache)
+            first = await client.classify_sku(SKU(name="НУРОФЕН"))
+            pool = client._get_http_client()
+            second = await client.classify_sku(SKU(name="НУРОФЕН"))
+            assert client._get_http_client() is pool
+            await client.aclose()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.llm_latency_seconds is not None and second.llm_latency_seconds is None
+    assert second.category_code == "A01" and second.llm_usage == {"total_tokens": 42}
+    assert len(httpx_mock.get_requests()) == 1
+
+    # Кэш переживает процесс: новый клиент не делает запросов
+    client = ProviderLLMClient(response_cache=JsonFileCache(cache_path))
+    assert asyncio.run(client.classify_sku_raw("НУРОФЕН")) == {"category_code": "A01", "confidence": 0.9}
+
+
+def test_wilson_interval_and_stratified_estimate():
+    low, high = wilson_interval(9, 10)
+    assert 0.59 < low < 0.6 and 0.98 < high < 0.99
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+
+    population = {"A": 100, "B": 100}
+    strata = pd.Series(["A"] * 20 + ["B"] * 20)
+    correct = pd.Series([True] * 20 + [True] * 10 + [False] * 10)
+    est = stratified_estimate(population, strata, correct)
+    assert est.estimate == pytest.approx(0.75)
+    assert est.low < 0.75 < est.high and est.strata_sampled == 2
+
+    # Непокрытая страта расширяет интервал
+    wider = stratified_estimate({**population, "C": 100}, strata, correct)
+    assert wider.width > est.width
+
+
+def test_sequential_evaluation_stops_at_target_width():
+    names = [f"A{i}" for i in range(150)] + [f"B{i}" for i in range(150)]
+    samples = pd.DataFrame({"Название": names, "Код категории": [n[0] for n in names], "МНН": ""})
+    strata = stratum_labels(samples, "category")
+    sampler = StratifiedSampler(strata, seed=1)
+    first = sampler.next_batch(10)
+    assert sorted(strata.loc[first].value_counts().tolist()) == [5, 5]
+
+    class _AlwaysRight(_SlowLLMClient):
+        async def classify_sku(self, sku):
+            result = await super().classify_sku(sku)
+            result.category_code = sku.name[0]
+            return result
+
+    service = ClassifierService(llm_client=_AlwaysRight(), categories=[])
+    per_sku, estimate, rounds = asyncio.run(
+        evaluate_sequential(service, samples, strata, target_width=0.1, batch_size=20, concurrency=8)
+    )
+    assert estimate.width <= 0.1 and estimate.estimate == 1.0
+    assert len(per_sku) < len(samples)  # остановились раньше полного прогона
+    assert len(rounds) == len(per_sku) // 20
+    assert set(per_sku["stratum"]) == {"A", "B"}
+
+
+def test_sequential_evaluation_ignores_unlabelled_rows():
+    samples = pd.DataFrame({"Название": ["A1", "A2", "U1", "U2"], "Код категории": ["A", "A", "", ""], "МНН": ""})
+    strata = stratum_labels(samples, "category")
+
+    class _NoPrediction(_SlowLLMClient):
+        async def classify_sku(self, sku):
+            result = await super().classify_sku(sku)
+            result.category_code = ""
+            return result
+
+    service = ClassifierService(llm_client=_NoPrediction(), categories=[])
+    per_sku, estimate, _ = asyncio.run(evaluate_sequential(service, samples, strata, batch_size=4))
+    # Пустой прогноз при пустом эталоне — не попадание: строки без кода не оцениваются
+    assert sorted(per_sku["sku_name"]) == ["A1", "A2"]
+    assert estimate.estimate == 0.0
+    assert not correct_flags(pd.DataFrame({"true_code": [""], "pred_code": [""], "error": [None]})).any()
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from src.config import QueueConfig
+
+from src.io.db_io import ClassificationJob
+from src.io.job_queue import (
+    JOB_DEAD,
+    JOB_DONE,
+    JOB_LEASED,
+    JOB_PENDING,
+    claim_jobs,
+    complete_job,
+    enqueue_active_product_links,
+    enqueue_jobs,
+    fail_job,
+    get_queue_stats,
+    heartbeat_jobs,
+    release_jobs,
+)
+from src.scripts.run_queue_worker import _heartbeat_loop
+
+
+def test_enqueue_active_is_idempotent(session_factory):
+    with session_factory.begin() as session:
+        assert enqueue_active_product_links(session) == 5
+    with session_factory.begin() as session:
+        assert enqueue_active_product_links(session) == 0
+        enqueue_jobs(session, [1, 2, 42, 42])
+        assert get_queue_stats(session)[JOB_PENDING] == 6
+
+
+def test_claims_do_not_overlap_between_workers(session_factory):
+    with session_factory.begin() as session:
+        enqueue_active_product_links(session)
+
+    with session_factory.begin() as session:
+        first = claim_jobs(session, "w1", limit=3, lease_seconds=60, max_attempts=3)
+    with session_factory.begin() as session:
+        second = claim_jobs(session, "w2", limit=3, lease_seconds=60, max_attempts=3)
+
+    assert first == [1, 2, 3]
+    assert second == [4, 5]
+
+    with session_factory.begin() as session:
+        assert complete_job(session, "w1", 1) is True
+        # Чужую задачу закрыть нельзя
+        assert complete_job(session, "w1", 4) is False
+        assert heartbeat_jobs(session, "w2", second, lease_seconds=60) == 2
+        assert release_jobs(session, "w1", first) == 2
+        stats = get_queue_stats(session)
+
+    assert stats == {JOB_PENDING: 2, JOB_LEASED: 2, JOB_DONE: 1, JOB_DEAD: 0}
+    with session_factory() as session:
+        assert session.get(ClassificationJob, 2).attempts == 0
+
+
+def test_expired_lease_is_reclaimed_and_then_dead_lettered(session_factory):
+    with session_factory.begin() as session:
+        enqueue_jobs(session, [1])
+
+    now = datetime(2026, 1, 1, 12, 0, 0)
+    with session_factory.begin() as session:
+        assert claim_jobs(session, "w1", 10, 30, max_attempts=2, now=now) == [1]
+    # Воркер w1 «умер»: после истечения аренды задачу забирает w2
+    later = now + timedelta(seconds=31)
+    with session_factory.begin() as session:
+        assert claim_jobs(session, "w2", 10, 30, max_attempts=2, now=later) == [1]
+    # Вторая аренда тоже истекла, попытки исчерпаны — задача в dead
+    with session_factory.begin() as session:
+        assert claim_jobs(session, "w3", 10, 30, max_attempts=2, now=later + timedelta(seconds=31)) == []
+        job = session.get(ClassificationJob, 1)
+        assert job.status == JOB_DEAD
+        assert job.last_error == "lease expired"
+
+
+def test_failures_retry_with_delay_then_dead(session_factory):
+    with session_factory.begin() as session:
+        enqueue_jobs(session, [3])
+
+    with session_factory.begin() as session:
+        claim_jobs(session, "w1", 1, 60, max_attempts=2)
+        assert fail_job(session, "w1", 3, "boom", max_attempts=2, retry_delay_seconds=3600) == JOB_PENDING
+    with session_factory.begin() as session:
+        # Задержка повтора ещё не прошла
+        assert claim_jobs(session, "w1", 1, 60, max_attempts=2) == []
+        session.get(ClassificationJob, 3).lease_expires_at = None
+    with session_factory.begin() as session:
+        assert claim_jobs(session, "w1", 1, 60, max_attempts=2) == [3]
+        assert fail_job(session, "w1", 3, "boom again", max_attempts=2) == JOB_DEAD
+        job = session.get(ClassificationJob, 3)
+        assert job.attempts == 2
+        assert job.last_error == "boom again"
+
+
+def test_heartbeat_extends_only_running_jobs_and_survives_errors(caplog):
+    calls = []
+
+    class FlakyDB:
+        async def write(self, fn, owner, ids, lease_seconds):
+            calls.append(sorted(ids))
+            if len(calls) == 1:
+                raise RuntimeError("database is locked")
+            return len(ids)
+
+    async def run():
+        running = {1, 2, 3}
+        heartbeat = asyncio.ensure_future(_heartbeat_loop(FlakyDB(), "w1", running, QueueConfig(heartbeat_interval=0)))
+        await asyncio.sleep(0.01)
+        running.difference_update({1, 2})  # задачи 1 и 2 закрыты — продлевать нечего
+        await asyncio.sleep(0.01)
+        heartbeat.cancel()
+        return heartbeat
+
+    with caplog.at_level(logging.WARNING, logger="src.scripts.run_queue_worker"):
+        heartbeat = asyncio.run(run())
+    assert heartbeat.cancelled()  # ошибка записи не убила цикл
+    assert calls[0] == [1, 2, 3] and calls[-1] == [3]
+    assert "failed to extend" in caplog.text and "lost lease" not in caplog.text
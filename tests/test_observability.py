@@ -0,0 +1,128 @@
+import asyncio
+import io
+import json
+
+import httpx
+
+from src.benchmarks.mock_llm import make_mock_transport
+from src.benchmarks.synthetic import make_categories
+from src.data_models import SKU
+from src.io.async_db import AsyncDB
+from src.llm_client.provider_client import ProviderLLMClient
+from src.observability.metrics import MetricsRegistry, ProgressReporter, metrics, tagged
+
+
+def test_histogram_and_prometheus_export(tmp_path):
+    registry = MetricsRegistry()
+    with tagged(product_link_id=7, attempt=2):
+        registry.observe("http", 0.2)
+        registry.observe("http", 3.0, http_attempt=2)
+    registry.observe("db_write", 0.004)
+    registry.inc("http_retries_total")
+
+    assert registry.records[1] == {"stage": "http", "seconds": 3.0, "product_link_id": 7, "attempt": 2, "http_attempt": 2}
+    assert "product_link_id" not in registry.records[2]
+
+    text = registry.to_prometheus()
+    assert 'farmacat_stage_seconds_bucket{stage="http",le="0.25"} 1' in text
+    assert 'farmacat_stage_seconds_bucket{stage="http",le="+Inf"} 2' in text
+    assert 'farmacat_stage_seconds_count{stage="db_write"} 1' in text
+    assert "farmacat_http_retries_total 1" in text
+
+    registry.export(tmp_path / "m.prom")
+    registry.export(tmp_path / "m.json")
+    assert (tmp_path / "m.prom").read_text(encoding="utf-8") == text
+    data = json.loads((tmp_path / "m.json").read_text(encoding="utf-8"))
+    assert data["stages"]["http"]["count"] == 2 and len(data["records"]) == 3
+
+
+def test_tags_are_isolated_between_tasks():
+    registry = MetricsRegistry()
+
+    async def work(i: int) -> None:
+        with tagged(product_link_id=i):
+            await asyncio.sleep(0.001 * (3 - i))
+            registry.observe("sku_build", 0.0)
+
+    async def run():
+        await asyncio.gather(*(work(i) for i in range(3)))
+
+    asyncio.run(run())
+    assert sorted(r["product_link_id"] for r in registry.records) == [0, 1, 2]
+
+
+def test_pipeline_stages_are_recorded(session_factory):
+    categories = make_categories(20)
+    metrics.reset()
+
+    async def run():
+        http = httpx.AsyncClient(transport=make_mock_transport(categories))
+        client = ProviderLLMClient(categories=categories, http_client=http)
+        async with AsyncDB(session_factory=session_factory) as db:
+            with tagged(product_link_id=1, attempt=1):
+                await client.classify_sku(SKU(name="Ибупрофен 200мг №10", external_id="1"))
+                await db.read(lambda s: None)
+        await http.aclose()
+
+    asyncio.run(run())
+    stages = {r["stage"] for r in metrics.records}
+    assert {"prompt_build", "http", "json_parse", "db_read", "db_queue_wait"} <= stages
+    assert all(r["product_link_id"] == 1 and r["attempt"] == 1 for r in metrics.records)
+    metrics.reset()
+
+
+def test_progress_line_reports_throughput_and_eta():
+    stream = io.StringIO()
+    reporter = ProgressReporter(total=4, interval=0.0, stream=stream)
+    reporter.update()
+    reporter.update(failed=True)
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 2
+    assert lines[-1].startswith("[2/4]") and "SKU/s" in lines[-1] and "failed 1" in lines[-1] and "ETA" in lines[-1]
+
+
+def _busy(n: int) -> int:
+    return sum(i * i for i in range(n))
+
+
+def test_profiler_sample_mode_writes_run_directory(tmp_path):
+    import os
+    import signal
+
+    from src.observability.profiling import Profiler
+
+    async def workload():
+        async def idle():
+            await asyncio.sleep(10)
+
+        waiter = asyncio.create_task(idle(), name="idle-waiter")
+        for _ in range(20):
+            _busy(20_000)
+            await asyncio.sleep(0)
+        if hasattr(signal, "SIGUSR1"):
+            os.kill(os.getpid(), signal.SIGUSR1)
+            await asyncio.sleep(0.05)  # дамп выполняется в loop через call_soon_threadsafe
+        waiter.cancel()
+
+    run_dir = tmp_path / "run"
+    with Profiler(run_dir, mode="sample", sample_interval=0.001, memory_interval=3600):
+        asyncio.run(workload())
+
+    collapsed = (run_dir / "collapsed.txt").read_text(encoding="utf-8").splitlines()
+    assert collapsed and all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed)
+    assert any(line.startswith("MainThread;") and "_busy" in line for line in collapsed)
+    assert list((run_dir / "memory").glob("*.txt"))
+    run = json.loads((run_dir / "run.json").read_text(encoding="utf-8"))
+    assert run["mode"] == "sample" and run["samples"] > 0
+    if hasattr(signal, "SIGUSR1"):
+        dump = next((run_dir / "dumps").glob("*.txt")).read_text(encoding="utf-8")
+        assert "idle-waiter" in dump and "threads:" in dump
+
+
+def test_profiler_cprofile_mode(tmp_path):
+    from src.observability.profiling import Profiler
+
+    with Profiler(tmp_path, mode="cprofile", memory_interval=3600):
+        _busy(10_000)
+    assert (tmp_path / "profile.pstats").exists()
+    assert "_busy" in (tmp_path / "profile.txt").read_text(encoding="utf-8")
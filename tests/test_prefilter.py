@@ -0,0 +1,80 @@
+# tests/test_prefilter.py
+import asyncio
+import json
+from unittest.mock import AsyncMock
+
+from src.classifier.category_index import CategoryIndex
+from src.classifier.classifier_service import ClassifierService
+from src.classifier.prefilter import KeywordAutomaton, Prefilter, PrefilterGroup, load_groups
+from src.config import PrefilterConfig
+from src.data_models import SKU, Category, ClassificationResult
+from tests.test_classifier_service import DummyLLMClient
+
+CATEGORIES = [
+    Category(code="A40_01", inn_cluster="Ацикловир"),
+    Category(code="A16_01", inn_cluster="Диклофенак"),
+    Category(code="NF_01", direction="Медизделия", need="Диагностика", group="Термометры"),
+]
+INDEX = CategoryIndex(CATEGORIES)
+
+
+def test_automaton_finds_overlapping_keywords_at_word_start():
+    automaton = KeywordAutomaton()
+    for word in ("he", "she", "his", "hers"):
+        automaton.add(word, word)
+    assert [(s, e, w) for s, e, w in automaton.search("a she hers")] == [(2, 5, "she"), (6, 8, "he"), (6, 10, "hers")]
+    assert list(automaton.search("ushers")) == []  # внутри слова не считается
+
+
+def test_check():
+    prefilter = Prefilter(INDEX)
+    for junk in (None, "nan", " NaN ", "UNKNOWN_SKU", "12345 / 0"):
+        assert prefilter.check(junk).kind == "junk"
+
+    shampoo = prefilter.check("ШАМПУНЬ ALERANA 250МЛ")
+    assert (shampoo.kind, shampoo.group, shampoo.code, shampoo.keywords) == ("non_drug", "cosmetics", None, ("шампун",))
+    assert prefilter.check("НУТРИЛОН 1 СМЕСЬ МОЛОЧНАЯ 400Г").group == "baby_food"
+
+    # МНН из дерева или дозировка лекарства — в LLM, даже при «нелекарственном» слове
+    assert prefilter.check("АЦИКЛОВИР КРЕМ ДЛЯ ГУБ 5% 2Г") is None
+    assert prefilter.check("ВОЛЬТАРЕН ЛЕЙКОПЛАСТЫРЬ 15МГ") is None
+    assert prefilter.check("НУРОФЕН ТАБЛ. 200МГ") is None
+
+
+def test_groups_from_json_with_tree_code(tmp_path):
+    path = tmp_path / "keywords.json"
+    path.write_text(json.dumps({
+        "thermometers": {"label": "термометры", "code": "NF_01", "keywords": ["термометр"]},
+        "missing": {"keywords": ["тонометр"], "code": "NO_SUCH_CODE"},
+    }, ensure_ascii=False), encoding="utf-8")
+    assert load_groups(str(path))["missing"] == PrefilterGroup("missing", ("тонометр",), "NO_SUCH_CODE")
+
+    prefilter = Prefilter.from_config(INDEX, PrefilterConfig(keywords_path=str(path), local_confidence=0.9))
+    assert prefilter.check("ТЕРМОМЕТР ЦИФРОВОЙ").code == "NF_01"
+    assert prefilter.check("ТОНОМЕТР OMRON").code is None  # кода нет в дереве — на ревью
+
+
+def test_service_skips_llm_for_prefiltered_rows():
+    client = DummyLLMClient()
+    client.classify_sku = AsyncMock(return_value=ClassificationResult(
+        sku_name="x", category_code="A40_01", category_path=None, inn="ацикловир", dosage_form=None,
+        age_restriction=None, otc=None, confidence=0.9, needs_review=False, reason="ok",
+    ))
+    groups = {"thermometers": PrefilterGroup("термометры", ("термометр",), "NF_01")}
+    service = ClassifierService(client, CATEGORIES, prefilter=Prefilter(INDEX, groups))
+
+    thermometer = asyncio.run(service.classify_product(SKU(name="ТЕРМОМЕТР ЦИФРОВОЙ")))
+    assert thermometer.category_code == "NF_01" and thermometer.needs_review is False
+    assert thermometer.category_path == "Медизделия > Диагностика > Термометры"
+    client.classify_sku.assert_not_awaited()
+
+    async def run():
+        skus = [SKU(name="nan"), SKU(name="АЦИКЛОВИР ТАБЛ. 200МГ"), SKU(name="ТЕРМОМЕТР")]
+        return [o async for o in service.classify_many(skus, ordered=True)]
+
+    junk, drug, device = asyncio.run(run())
+    assert junk.result.needs_review is True and junk.result.category_code is None
+    assert junk.result.reason.startswith("Карантин")
+    assert drug.result.category_code == "A40_01"
+    assert device.result.category_code == "NF_01"
+    assert client.classify_sku.await_count == 1
@@ -0,0 +1,136 @@
+from openpyxl import Workbook
+from sqlalchemy import select
+
+from src.io.db_io import ClassificationJob, ProductLink
+from src.io.job_queue import JOB_DONE, JOB_PENDING, enqueue_reclassification
+from src.io.product_feed import import_product_feed
+
+
+def _write_csv(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8-sig")
+    return str(path)
+
+
+def _links(session):
+    return {pl.code_1c: pl for pl in session.scalars(select(ProductLink).where(ProductLink.code_1c.is_not(None)))}
+
+
+def test_delta_import_flags_only_real_changes(session_factory, tmp_path):
+    first = _write_csv(
+        tmp_path / "feed1.csv",
+        [
+            "Код 1С;Код АСНА;Наименование 1С;Производитель",
+            "100;9100;Нурофен таб. 200мг №10;Рекитт",
+            "200;9200;Арбидол капс. 100мг №20;Фармстандарт",
+        ],
+    )
+    with session_factory.begin() as session:
+        stats = import_product_feed(session, first)
+    assert (stats.total, stats.inserted, stats.changed) == (2, 2, 0)
+
+    with session_factory.begin() as session:
+        for pl in _links(session).values():
+            assert pl.needs_reclassification and pl.created_at and pl.last_seen_at
+            pl.needs_reclassification = False
+
+    # Колонки в другом порядке, лишние пробелы и регистр — не изменение; у 200 новый производитель
+    second = _write_csv(
+        tmp_path / "feed2.csv",
+        [
+            "Производитель;Наименование 1С;Код 1С",
+            "РЕКИТТ;  Нурофен  таб. 200мг №10 ;100",
+            "Отисифарм;Арбидол капс. 100мг №20;200",
+            "Ингавирин;;",
+        ],
+    )
+    with session_factory.begin() as session:
+        stats = import_product_feed(session, second)
+    assert (stats.inserted, stats.changed, stats.unchanged, stats.rejected) == (0, 1, 1, 1)
+
+    with session_factory() as session:
+        links = _links(session)
+        assert not links[100].needs_reclassification
+        assert links[100].code_asna == 9100
+        assert links[200].needs_reclassification
+        assert links[200].manufacturer_1c == "Отисифарм"
+
+
+def test_partial_feed_updates_only_its_columns(session_factory, tmp_path):
+    full = _write_csv(
+        tmp_path / "feed1.csv",
+        ["Код 1С;Код АСНА;Наименование 1С;Производитель", "100;9100;Нурофен таб. 200мг №10;Рекитт"],
+    )
+    with session_factory.begin() as session:
+        import_product_feed(session, full)
+        _links(session)[100].needs_reclassification = False
+
+    # Выгрузка только из АСНА: имя и производитель 1С не затираются, имя АСНА — новое
+    asna_only = _write_csv(tmp_path / "feed2.csv", ["Код АСНА;Наименование АСНА", "9100;НУРОФЕН ТАБ 200МГ N10"])
+    with session_factory.begin() as session:
+        stats = import_product_feed(session, asna_only)
+    assert (stats.changed, stats.unchanged) == (1, 0)
+    with session_factory.begin() as session:
+        link = _links(session)[100]
+        assert (link.name_1c, link.manufacturer_1c) == ("Нурофен таб. 200мг №10", "Рекитт")
+        assert link.name_asna == "НУРОФЕН ТАБ 200МГ N10" and link.needs_reclassification
+        link.needs_reclassification = False
+
+    # Тот же фид повторно — изменений нет, переклассификация не нужна
+    with session_factory.begin() as session:
+        stats = import_product_feed(session, asna_only)
+    assert (stats.changed, stats.unchanged) == (0, 1)
+    with session_factory() as session:
+        assert not _links(session)[100].needs_reclassification
+
+
+def test_duplicates_counted_across_chunks(session_factory, tmp_path):
+    feed = _write_csv(
+        tmp_path / "feed.csv",
+        [
+            "Код 1С;Наименование 1С",
+            "100;Нурофен таб. 200мг №10",
+            "200;Арбидол капс. 100мг №20",
+            "100;Нурофен Экспресс капс. 200мг №16",  # повтор ключа в следующем чанке
+        ],
+    )
+    with session_factory.begin() as session:
+        stats = import_product_feed(session, feed, chunk_size=2)
+    # Повтор не считается вторым изменением; последняя строка побеждает, как внутри чанка
+    assert (stats.total, stats.inserted, stats.changed, stats.unchanged, stats.duplicates) == (3, 2, 0, 0, 1)
+    with session_factory() as session:
+        assert _links(session)[100].name_1c == "Нурофен Экспресс капс. 200мг №16"
+
+
+def test_full_feed_deactivates_missing_and_matches_by_asna(session_factory, tmp_path):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["Код АСНА", "Наименование АСНА"])
+    sheet.append([555, "Цитрамон П таб. №10"])
+    path = tmp_path / "feed.xlsx"
+    workbook.save(path)
+
+    with session_factory.begin() as session:
+        stats = import_product_feed(session, str(path), full=True)
+    # 5 записей из фикстуры в фиде отсутствуют
+    assert (stats.inserted, stats.deactivated) == (1, 5)
+
+    with session_factory.begin() as session:
+        stats = import_product_feed(session, str(path), full=True)
+        assert (stats.inserted, stats.unchanged, stats.deactivated) == (0, 1, 0)
+        active = session.scalars(select(ProductLink).where(ProductLink.is_active.is_(True))).all()
+        assert [(pl.code_asna, pl.name_asna) for pl in active] == [(555, "Цитрамон П таб. №10")]
+
+
+def test_enqueue_reclassification_resets_done_jobs(session_factory, tmp_path):
+    feed = _write_csv(tmp_path / "feed.csv", ["code_1c,name_1c", "1,Новый SKU"])
+    with session_factory.begin() as session:
+        session.get(ProductLink, 1).code_1c = 1
+        session.add(ClassificationJob(product_link_id=1, status=JOB_DONE, attempts=1))
+    with session_factory.begin() as session:
+        import_product_feed(session, feed)
+
+    with session_factory.begin() as session:
+        assert enqueue_reclassification(session) == 1
+    with session_factory() as session:
+        jobs = session.scalars(select(ClassificationJob)).all()
+        assert [(j.product_link_id, j.status, j.attempts) for j in jobs] == [(1, JOB_PENDING, 0)]
@@ -0,0 +1,60 @@
+# tests/test_prompt_builder.py
+import asyncio
+import json
+
+import httpx
+
+from src.benchmarks.mock_llm import make_mock_transport
+from src.classifier.category_index import category_path_for
+from src.classifier.prompt_builder import PROMPT_OUTPUT_FORMAT, PromptBuilder
+from src.classifier.response_schema import COMPACT_OUTPUT_FORMAT, decode_compact
+from src.config import config
+from src.data_models import SKU, Category
+from src.llm_client.provider_client import ProviderLLMClient
+
+CATEGORIES = [
+    Category(code="A01", direction="ЛС", need="Боль", group="НПВС", inn_cluster="Ибупрофен"),
+]
+
+
+def test_compact_prompt_uses_compact_schema():
+    full = PromptBuilder().build_user_prompt(SKU(name="НУРОФЕН"), CATEGORIES)
+    compact = PromptBuilder(compact=True).build_user_prompt(SKU(name="НУРОФЕН"), CATEGORIES)
+
+    assert PROMPT_OUTPUT_FORMAT in full and COMPACT_OUTPUT_FORMAT not in full
+    assert COMPACT_OUTPUT_FORMAT in compact and PROMPT_OUTPUT_FORMAT not in compact
+    assert len(compact) < len(full)
+    assert compact.endswith("НУРОФЕН")
+
+
+def test_decode_compact():
+    data = decode_compact({"c": "A01", "i": "ибупрофен", "p": 0.6, "r": True, "w": "cluster_ambiguous", "n": "A01 и A02"})
+    assert data["category_code"] == "A01" and data["confidence"] == 0.6 and data["needs_review_hint"] is True
+    assert data["reason_code"] == "cluster_ambiguous"
+    assert data["reason"].endswith(": A01 и A02") and "несколько подходящих кодов" in data["reason"]
+    # Ответ по полной схеме проходит без изменений
+    assert decode_compact({"category_code": "A01", "reason": "r"}) == {"category_code": "A01", "reason": "r"}
+    assert category_path_for(CATEGORIES[0]) == "ЛС > Боль > НПВС"
+
+
+def test_provider_compact_mode(monkeypatch):
+    monkeypatch.setenv(config.llm.api_key_env_var, "test-key")
+    monkeypatch.setattr(config.llm, "response_schema", "compact")
+    sent = []
+    transport = make_mock_transport(CATEGORIES)
+
+    async def handler(request):
+        sent.append(json.loads(request.content))
+        return await transport.handle_async_request(request)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            client = ProviderLLMClient(categories=CATEGORIES, http_client=http)
+            return await client.classify_sku(SKU(name="НУРОФЕН"))
+
+    result = asyncio.run(run())
+    assert sent[0]["max_tokens"] == config.llm.compact_max_tokens
+    assert result.category_code == "A01"
+    assert result.category_path == "ЛС > Боль > НПВС"  # из дерева, а не от модели
+    assert result.reason.startswith("МНН, форма и показания")
+    assert result.llm_usage["completion_tokens"] < 60
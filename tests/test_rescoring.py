@@ -0,0 +1,106 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pandas as pd
+
+from src.classifier.classifier_service import ClassifierService
+from src.classifier.rescoring import rescore_frame, responses_to_frame
+from src.config import ClassifierConfig
+from src.data_models import SKU, Category, ClassificationResult
+from tests.test_classifier_service import DummyLLMClient
+
+CATEGORIES = [
+    Category(code="A15_01", inn_cluster="Римантадин/Rimantadine"),
+    Category(code="A15_02", inn_cluster="Римантадин/Rimantadine"),
+    Category(code="C03_02", inn_cluster="Пантопразол"),
+]
+
+RESPONSES = [
+    {"inn": "Rimantadine", "category_code": "A15_01", "confidence": 0.9, "needs_review_hint": False, "reason": "r1"},
+    {"inn": "пантопразол", "category_code": "C03_02", "confidence": "0.8", "needs_review_hint": False, "reason": ""},
+    {"inn": None, "category_code": None, "confidence": "мусор", "needs_review_hint": None, "reason": None},
+    {"inn": "пантопразол", "category_code": "C03_02", "confidence": 0.7, "needs_review_hint": True, "reason": "x"},
+]
+
+
+def _records():
+    for i, response in enumerate(RESPONSES, start=1):
+        yield {"product_link_id": i, "sku_name": f"SKU {i}", "started_at": "2026-01-01T00:00:00", "response": response}
+    # Более старый ответ для id=1 и запись без product_link_id игнорируются
+    yield {"product_link_id": 1, "sku_name": "SKU 1", "started_at": "2025-01-01T00:00:00", "response": {}}
+    yield {"product_link_id": None, "sku_name": "eval", "response": RESPONSES[0]}
+
+
+def _service_result(raw: dict) -> ClassificationResult:
+    """Прогон того же ответа через ClassifierService для сравнения."""
+    try:
+        confidence = max(0.0, min(float(raw.get("confidence", 0.0)), 1.0))
+    except (TypeError, ValueError):
+        confidence = 0.0
+    client = DummyLLMClient()
+    client.classify_sku = AsyncMock(
+        return_value=ClassificationResult(
+            sku_name="x",
+            category_code=raw.get("category_code"),
+            category_path=None,
+            inn=raw.get("inn"),
+            dosage_form=None,
+            age_restriction=None,
+            otc=None,
+            confidence=confidence,
+            needs_review=bool(raw.get("needs_review_hint", False)),
+            reason=raw.get("reason", "") or "",
+        )
+    )
+    service = ClassifierService(llm_client=client, categories=CATEGORIES)
+    return asyncio.run(service.classify_product(SKU(name="x")))
+
+
+def test_rescore_matches_classifier_service():
+    df = responses_to_frame(_records())
+    assert df["product_link_id"].tolist() == [1, 2, 3, 4]
+
+    rescored = rescore_frame(df, CATEGORIES).set_index("id")
+    for i, raw in enumerate(RESPONSES, start=1):
+        expected = _service_result(raw)
+        row = rescored.loc[i]
+        assert bool(row["needs_review"]) == expected.needs_review
+        assert row["confidence"] == expected.confidence
+        assert row["classification_reason"] == expected.reason
+
+
+def test_rescore_uses_new_thresholds():
+    df = responses_to_frame(_records())
+    relaxed = ClassifierConfig(confidence_threshold=0.5, hard_reject_threshold=0.1, multi_cluster_confidence_cap=0.8)
+    rescored = rescore_frame(df, CATEGORIES, relaxed).set_index("id")
+
+    assert not rescored.loc[2, "needs_review"]
+    assert rescored.loc[1, "confidence"] == 0.8
+    assert rescored.loc[1, "needs_review"]
+    assert rescored.loc[3, "needs_review"]
+
+
+def test_rescore_empty_tree_is_plain_thresholds():
+    df = pd.DataFrame(
+        {"product_link_id": [1], "inn": ["x"], "confidence": [0.9], "needs_review_hint": [False], "reason": ["ok"],
+         "category_code": ["A"], "category_path": [None], "dosage_form": [None], "age_restriction": [None], "otc": [None]}
+    )
+    rescored = rescore_frame(df, [])
+    assert not rescored.loc[0, "needs_review"]
+    assert rescored.loc[0, "classification_reason"] == "ok"
+
+
+def test_rescore_resolves_cluster_by_sku_name():
+    categories = [
+        Category(code="A15_01", inn_cluster="Римантадин", dosage_form="Таблетки"),
+        Category(code="A15_02", inn_cluster="Римантадин", dosage_form="Сироп"),
+    ]
+    df = responses_to_frame(
+        {"product_link_id": i, "sku_name": name, "started_at": "", "response": dict(RESPONSES[0], inn="Римантадин")}
+        for i, name in enumerate(["ОРВИРЕМ СИРОП 0,2% 100МЛ", "РИМАНТАДИН"], start=1)
+    )
+    rescored = rescore_frame(df, categories).set_index("id")
+
+    assert rescored.loc[1, "category_code"] == "A15_02" and not rescored.loc[1, "needs_review"]
+    assert rescored.loc[1, "confidence"] == 0.9 and "выбран внутри МНН-кластера" in rescored.loc[1, "classification_reason"]
+    assert rescored.loc[2, "category_code"] == "A15_01" and rescored.loc[2, "needs_review"]
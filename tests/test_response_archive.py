@@ -0,0 +1,114 @@
+import json
+
+import pytest
+from pytest_httpx import HTTPXMock
+
+from src.config import ArchiveConfig, config
+from src.data_models import SKU
+from src.io.response_archive import ArchiveRecord, ResponseArchive
+from src.llm_client.base import LLMError
+from src.llm_client.provider_client import ProviderLLMClient
+
+
+def _record(i: int, prompt_tail: str = "") -> ArchiveRecord:
+    name = f"SKU {i}"
+    return ArchiveRecord(
+        sku_name=name,
+        model="deepseek-chat",
+        fingerprint=f"fp{i}",
+        response={"category_code": f"A{i:02d}", "confidence": 0.5},
+        product_link_id=i % 3,
+        system_prompt="system",
+        user_prompt=f"Большое дерево категорий... Товар: {name}{prompt_tail}",
+        duration_seconds=0.1,
+    )
+
+
+def test_archive_round_trip_and_index(tmp_path):
+    conf = ArchiveConfig(directory=str(tmp_path), flush_every=4)
+    with ResponseArchive(tmp_path, conf) as archive:
+        for i in range(10):
+            archive.append(_record(i))
+
+    reader = ResponseArchive(tmp_path, conf)
+    records = list(reader.iter_records())
+    assert [r["sku_name"] for r in records] == [f"SKU {i}" for i in range(10)]
+    assert "user_prompt" not in records[0]
+
+    by_id = reader.get_records(1, with_prompts=True)
+    assert [r["sku_name"] for r in by_id] == ["SKU 1", "SKU 4", "SKU 7"]
+    assert by_id[1]["user_prompt"] == "Большое дерево категорий... Товар: SKU 4"
+    assert by_id[1]["system_prompt"] == "system"
+    assert by_id[1]["response"]["category_code"] == "A04"
+
+    # Одинаковый шаблон промпта хранится один раз
+    blobs = [p for p in tmp_path.iterdir() if ".blobs." in p.name]
+    assert len(blobs) == 1
+
+
+def test_archive_segment_rotation_keeps_segments_self_contained(tmp_path):
+    conf = ArchiveConfig(directory=str(tmp_path), flush_every=1, segment_max_bytes=1)
+    with ResponseArchive(tmp_path, conf) as archive:
+        for i in range(3):
+            archive.append(_record(i))
+
+    reader = ResponseArchive(tmp_path, conf)
+    assert len(reader.segments()) == 3
+    restored = list(reader.iter_records(with_prompts=True))
+    assert [r["user_prompt"].endswith(f"SKU {i}") for i, r in enumerate(restored)] == [True] * 3
+
+
+def test_archive_keeps_one_template_for_per_sku_hints(tmp_path):
+    conf = ArchiveConfig(directory=str(tmp_path), flush_every=2, segment_max_bytes=1)
+    archive = ResponseArchive(tmp_path, conf)
+    for i in range(6):
+        record = _record(i, prompt_tail=f"\nПризнаки: дозировка {i}00 мг")
+        record.prompt_hint = f"дозировка {i}00 мг"
+        archive.append(record)
+        assert len(archive._blob_texts) == 2  # system + один шаблон, тексты прошлых сегментов не копятся
+    archive.close()
+
+    restored = list(ResponseArchive(tmp_path, conf).iter_records(with_prompts=True))
+    assert restored[3]["user_prompt"] == "Большое дерево категорий... Товар: SKU 3\nПризнаки: дозировка 300 мг"
+    assert restored[3]["prompt_hint"] == "дозировка 300 мг"
+
+
+def _llm_url() -> str:
+    return f"{config.llm.base_url.rstrip('/')}/{config.llm.endpoint.lstrip('/')}"
+
+
+@pytest.mark.asyncio
+async def test_provider_client_archives_calls(httpx_mock: HTTPXMock, tmp_path):
+    payload = {"category_code": "A01", "inn": "ибупрофен", "confidence": 0.9, "reason": "ok"}
+    httpx_mock.add_response(
+        method="POST",
+        url=_llm_url(),
+        json={
+            "choices": [{"message": {"content": json.dumps(payload)}}],
+            "usage": {"prompt_tokens": 1000, "completion_tokens": 50},
+        },
+    )
+    httpx_mock.add_response(
+        method="POST",
+        url=_llm_url(),
+        json={"choices": [{"message": {"content": "{broken"}}]},
+    )
+
+    archive = ResponseArchive(tmp_path, ArchiveConfig(directory=str(tmp_path)))
+    client = ProviderLLMClient(categories=[], archive=archive)
+
+    result = await client.classify_sku(SKU(name="Нурофен", external_id="42"))
+    assert result.llm_usage == {"prompt_tokens": 1000, "completion_tokens": 50}
+    assert result.llm_latency_seconds is not None
+
+    with pytest.raises(LLMError):
+        await client.classify_sku(SKU(name="Мусор", external_id="43"))
+    archive.close()
+
+    ok = archive.get_records(42, with_prompts=True)
+    assert ok[0]["response"] == payload
+    assert "Нурофен" in ok[0]["user_prompt"]
+    failed = archive.get_records(43)
+    assert failed[0]["response"] is None
+    assert failed[0]["raw_content"] == "{broken"
+    assert failed[0]["error"].startswith("LLMError")
@@ -0,0 +1,210 @@
+# tests/test_scheduler.py
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import httpx
+
+from src.config import SchedulerConfig, config
+from src.data_models import SKU, ClassificationResult
+from src.io.async_db import AsyncDB
+from src.io.rate_budget import SharedRateBudget, take_rate_token
+from src.llm_client.provider_client import ProviderLLMClient
+from src.llm_client.scheduler import LLMScheduler, ScheduledLLMClient, current_lane, llm_lane
+from src.observability.metrics import metrics
+from tests.test_classifier_service import DummyLLMClient
+
+
+def _scheduler(**overrides) -> LLMScheduler:
+    return LLMScheduler(SchedulerConfig(**{"max_concurrency": 4, **overrides}))
+
+
+async def _hold(scheduler: LLMScheduler, lane, release: asyncio.Event, started: list) -> None:
+    async with scheduler.slot(lane) as granted:
+        started.append(granted)
+        await release.wait()
+
+
+def test_reserved_share_keeps_interactive_slot_free():
+    async def run():
+        scheduler = _scheduler()
+        release, started = asyncio.Event(), []
+        tasks = [asyncio.ensure_future(_hold(scheduler, "batch", release, started)) for _ in range(6)]
+        await asyncio.sleep(0)
+        batch_only = (scheduler.active("batch"), scheduler.queue_depth("batch"))
+        gauge = metrics.gauges["llm_lane_queue_depth_batch"]
+
+        tasks.append(asyncio.ensure_future(_hold(scheduler, "interactive", release, started)))
+        await asyncio.sleep(0)
+        interactive = scheduler.active("interactive")
+        release.set()
+        await asyncio.gather(*tasks)
+        return batch_only, gauge, interactive, scheduler
+
+    batch_only, gauge, interactive, scheduler = asyncio.run(run())
+    assert batch_only == (3, 3)  # 4 слота, один — резерв interactive
+    assert gauge == 3
+    assert interactive == 1  # без ожидания, хотя пачка стоит в очереди
+    assert (scheduler.active("batch"), scheduler.queue_depth("batch")) == (0, 0)
+
+
+def test_weighted_fair_order_prefers_interactive():
+    async def run():
+        scheduler = _scheduler(max_concurrency=1, reserved={})
+        release, started = asyncio.Event(), []
+        holder = asyncio.ensure_future(_hold(scheduler, "batch", release, started))
+        await asyncio.sleep(0)
+        waiting = [asyncio.ensure_future(_hold(scheduler, lane, release, started))
+                   for lane in ["batch"] * 5 + ["interactive"] * 5]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(holder, *waiting)
+        return started
+
+    started = asyncio.run(run())
+    # Освободившиеся слоты — интерактивным первыми (вес 4:1), пачка не голодает
+    assert started[:7] == ["batch", "interactive", "interactive", "interactive", "interactive", "batch", "interactive"]
+    assert started.count("batch") == 6
+
+
+def test_rate_budget_is_charged_per_request_and_reserves_share_for_interactive():
+    now = [0.0]
+
+    async def run():
+        scheduler = LLMScheduler(
+            SchedulerConfig(max_concurrency=4, requests_per_minute=4, reserved={"interactive": 0.25}),
+            clock=lambda: now[0],
+        )
+        granted = []
+
+        async def call(lane):
+            granted.append(await scheduler.request(lane))
+
+        # Слот один, но каждый HTTP-запрос внутри вызова (ретраи, второй вызов) списывает бюджет
+        async with scheduler.slot("batch"):
+            batch = [asyncio.ensure_future(call("batch")) for _ in range(5)]
+            await asyncio.sleep(0)
+            before = (list(granted), metrics.gauges["llm_lane_rate_waiting_batch"])
+            interactive = asyncio.ensure_future(call("interactive"))
+            await asyncio.sleep(0)
+            after = list(granted)
+
+        now[0] = 61.0  # окно бюджета прошло
+        await call("interactive")
+        await asyncio.gather(interactive, *batch)
+        return before, after, granted
+
+    before, after, granted = asyncio.run(run())
+    assert before == (["batch"] * 3, 2)  # четвёртый запрос минуты — резерв interactive
+    assert after == ["batch"] * 3 + ["interactive"]
+    assert granted.count("batch") == 5
+
+
+def test_promote_moves_queued_call_to_higher_lane():
+    async def run():
+        scheduler = _scheduler(max_concurrency=1, reserved={})
+        release, started = asyncio.Event(), []
+        holder = asyncio.ensure_future(_hold(scheduler, "batch", release, started))
+        await asyncio.sleep(0)
+        queued = [asyncio.ensure_future(_hold(scheduler, "batch", release, started)) for _ in range(3)]
+        with llm_lane("batch") as ticket:
+            promoted = asyncio.ensure_future(_hold(scheduler, None, release, started))
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth("batch") == 4
+        assert ticket.promote("interactive") and not ticket.promote("batch")  # только вверх
+        assert (scheduler.queue_depth("batch"), scheduler.queue_depth("interactive")) == (3, 1)
+        release.set()
+        await asyncio.gather(holder, promoted, *queued)
+        return started
+
+    assert asyncio.run(run())[:2] == ["batch", "interactive"]
+
+
+def test_scheduled_client_uses_lane_from_context():
+    lanes = []
+
+    class RecordingClient(DummyLLMClient):
+        async def classify_sku(self, sku: SKU) -> ClassificationResult:
+            lanes.append(current_lane())
+            return ClassificationResult(
+                sku_name=sku.name, category_code="A01", category_path=None, inn=None, dosage_form=None,
+                age_restriction=None, otc=None, confidence=0.9, needs_review=False, reason="ok",
+            )
+
+    client = ScheduledLLMClient(RecordingClient(), _scheduler())
+    metrics.reset()
+
+    async def run():
+        await client.classify_sku(SKU(name="A"))
+        with llm_lane("interactive"):
+            await asyncio.ensure_future(client.classify_sku(SKU(name="B")))  # задача наследует полосу
+        with llm_lane("nightly"):  # неизвестная полоса — полоса по умолчанию
+            await client.classify_sku(SKU(name="C"))
+
+    asyncio.run(run())
+    assert lanes == [None, "interactive", "nightly"]
+    assert metrics.counters["llm_lane_started_batch_total"] == 2
+    assert metrics.counters["llm_lane_started_interactive_total"] == 1
+    assert metrics.histograms["llm_queue_wait"].count == 3
+
+
+def test_provider_charges_budget_per_http_attempt(monkeypatch):
+    monkeypatch.setenv(config.llm.api_key_env_var, "test-key")
+    monkeypatch.setattr(config.llm.retry, "backoff_factor", 0.0)
+    statuses = [500, 200]
+
+    def handler(request):
+        status = statuses.pop(0)
+        content = json.dumps({"category_code": "A01", "confidence": 0.9}) if status == 200 else ""
+        return httpx.Response(status, json={"choices": [{"message": {"content": content}}]})
+
+    scheduler = LLMScheduler(SchedulerConfig(requests_per_minute=100))
+    metrics.reset()
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            provider = ProviderLLMClient(http_client=http, scheduler=scheduler)
+            client = ScheduledLLMClient(provider, scheduler)
+            with llm_lane("interactive"):
+                return await client.classify_sku(SKU(name="НУРОФЕН"))
+
+    assert asyncio.run(run()).category_code == "A01"
+    assert metrics.counters["llm_lane_started_interactive_total"] == 1  # один слот на SKU
+    assert metrics.counters["llm_lane_requests_interactive_total"] == 2  # ретрай — тоже запрос к API
+
+
+def test_shared_budget_counts_requests_of_all_processes(session_factory):
+    start = datetime(2026, 1, 1)
+
+    def take(lane, seconds=0.0):
+        with session_factory.begin() as session:
+            return take_rate_token(session, "k", lane, 4, {"interactive": 1}, now=start + timedelta(seconds=seconds))
+
+    # Пачки разных процессов вместе выбирают бюджет до резерва interactive
+    assert [take("batch", i) for i in range(4)] == [None, None, None, 57.0]
+    assert take("interactive", 10) is None
+    assert take("interactive", 11) == 49.0  # минута исчерпана целиком
+    assert take("batch", 60.5) is None  # первый запрос вышел из окна
+    with session_factory.begin() as session:
+        assert take_rate_token(session, "other-key", "batch", 4, {"interactive": 1}, now=start) is None
+
+
+def test_batch_process_leaves_reserve_to_server_process(session_factory, monkeypatch):
+    monkeypatch.setenv(config.llm.api_key_env_var, "shared-key")
+    conf = SchedulerConfig(requests_per_minute=4, reserved={"interactive": 0.25})
+
+    async def run():
+        async with AsyncDB(session_factory=session_factory) as db:
+            # Два процесса с одним ключом API: у каждого свой планировщик, бюджет общий
+            batch = LLMScheduler(conf, shared_budget=SharedRateBudget.from_config(db, conf))
+            server = LLMScheduler(conf, shared_budget=SharedRateBudget.from_config(db, conf))
+            for _ in range(3):
+                await batch.request("batch")
+            blocked = asyncio.ensure_future(batch.request("batch"))
+            await asyncio.sleep(0.1)
+            waiting = not blocked.done()
+            await asyncio.wait_for(server.request("interactive"), timeout=1)
+            blocked.cancel()
+            return waiting
+
+    assert asyncio.run(run())  # четвёртый запрос пачки ждёт, онлайн-запрос — нет
@@ -0,0 +1,134 @@
+# tests/test_server.py
+import asyncio
+
+import httpx
+import pytest
+
+from src.classifier.classifier_service import ClassifierService
+from src.config import SchedulerConfig, ServerConfig
+from src.data_models import SKU, Category, ClassificationResult
+from src.llm_client.base import LLMClient, LLMError
+from src.llm_client.scheduler import LLMScheduler, ScheduledLLMClient, llm_lane
+from src.server.http_server import ClassificationServer
+from src.server.online import OnlineClassifier
+
+CATEGORIES = [Category(code="A01", direction="ЛС", need="Боль", group="НПВС", inn_cluster="Ибупрофен")]
+CONFIG = ServerConfig(host="127.0.0.1", port=0, request_timeout_seconds=1.0, max_batch=3, snapshot_refresh_seconds=0)
+
+
+class SlowLLMClient(LLMClient):
+    """Отвечает через delay секунд; считает вызовы; SKU со словом FAIL — ошибка LLM."""
+
+    def __init__(self, delay: float = 0.05) -> None:
+        self.delay = delay
+        self.calls = 0
+        self.names = []
+
+    async def classify_sku_raw(self, sku_name: str):
+        raise NotImplementedError
+
+    async def classify_sku(self, sku: SKU) -> ClassificationResult:
+        self.calls += 1
+        self.names.append(sku.name)
+        await asyncio.sleep(self.delay)
+        if "FAIL" in sku.name:
+            raise LLMError("provider is down")
+        return ClassificationResult(
+            sku_name=sku.name, category_code="A01", category_path=None, inn="ибупрофен", dosage_form=None,
+            age_restriction=None, otc=True, confidence=0.9, needs_review=False, reason="ok",
+        )
+
+
+def _online(client: LLMClient, **overrides) -> OnlineClassifier:
+    conf = ServerConfig(**{**CONFIG.__dict__, **overrides})
+    return OnlineClassifier(ClassifierService(client, CATEGORIES), conf)
+
+
+def test_singleflight_and_cache():
+    client = SlowLLMClient()
+
+    async def run():
+        online = _online(client)
+        first = await asyncio.gather(
+            online.classify(SKU(name="НУРОФЕН ТАБЛ. 200МГ")),
+            online.classify(SKU(name="  нурофен табл. 200мг ")),
+        )
+        again = await online.classify(SKU(name="Нурофен табл. 200мг"))
+        return first, again
+
+    (llm, coalesced), again = asyncio.run(run())
+    assert client.calls == 1
+    assert (llm.source, coalesced.source, again.source) == ("llm", "coalesced", "cache")
+    assert coalesced.result.sku_name == "  нурофен табл. 200мг "  # результат — с названием запроса
+    assert again.result.category_path == "ЛС > Боль > НПВС"
+
+
+def test_timeout_keeps_shared_call_and_errors_are_not_cached():
+    client = SlowLLMClient(delay=0.1)
+
+    async def run():
+        online = _online(client)
+        with pytest.raises(asyncio.TimeoutError):
+            await online.classify(SKU(name="НУРОФЕН"), timeout=0.01)
+        await asyncio.sleep(0.15)  # общий вызов доработал и попал в кэш
+        cached = await online.classify(SKU(name="НУРОФЕН"))
+        with pytest.raises(LLMError):
+            await online.classify(SKU(name="FAIL"))
+        with pytest.raises(LLMError):
+            await online.classify(SKU(name="FAIL"))
+        return cached
+
+    assert asyncio.run(run()).source == "cache"
+    assert client.calls == 3
+
+
+def test_http_routes():
+    client = SlowLLMClient(delay=0.01)
+
+    async def run():
+        server = ClassificationServer(_online(client), CONFIG, health=lambda: {"categories": len(CATEGORIES)})
+        await server.start()
+        base = f"http://127.0.0.1:{server.port}"
+        try:
+            async with httpx.AsyncClient(base_url=base) as http:
+                single = await http.post("/classify", json={"name": "НУРОФЕН", "external_id": 7})
+                batch = await http.post("/classify/batch", json={"items": [{"name": "НУРОФЕН"}, {"name": "FAIL"}]})
+                too_big = await http.post("/classify/batch", json={"items": [{"name": "X"}] * 4})
+                bad = await http.post("/classify", json={"name": ""})
+                bad_priority = await http.post("/classify", json={"name": "НУРОФЕН", "priority": "urgent"})
+                health = await http.get("/health")
+                metrics_text = await http.get("/metrics")
+                missing = await http.get("/nope")
+                wrong_method = await http.get("/classify")
+        finally:
+            await server.close()
+        return single, batch, too_big, bad, bad_priority, health, metrics_text, missing, wrong_method
+
+    single, batch, too_big, bad, bad_priority, health, metrics_text, missing, wrong_method = asyncio.run(run())
+    assert single.status_code == 200 and single.json()["result"]["category_code"] == "A01"
+    assert "raw_llm_response" not in single.json()["result"]
+    results = batch.json()["results"]
+    assert results[0]["source"] == "cache" and results[1]["status"] == 502
+    assert too_big.status_code == 413 and bad.status_code == 400 and bad_priority.status_code == 400
+    assert health.json() == {"status": "ok", "cache_size": 1, "inflight": 0, "categories": 1}
+    assert "farmacat_online_requests_total" in metrics_text.text
+    assert missing.status_code == 404 and wrong_method.status_code == 405
+
+
+def test_interactive_duplicate_promotes_queued_batch_call():
+    client = SlowLLMClient(delay=0.02)
+    scheduler = LLMScheduler(SchedulerConfig(max_concurrency=1, reserved={}))
+
+    async def run():
+        online = OnlineClassifier(ClassifierService(ScheduledLLMClient(client, scheduler), CATEGORIES), CONFIG)
+        with llm_lane("batch"):
+            batch = asyncio.ensure_future(online.classify_batch([SKU(name=n) for n in ("A", "B", "C", "D")]))
+        await asyncio.sleep(0.005)
+        with llm_lane("interactive"):
+            urgent = await online.classify(SKU(name="D"))
+        await batch
+        return urgent
+
+    urgent = asyncio.run(run())
+    assert urgent.source == "coalesced"
+    assert client.names == ["A", "D", "B", "C"]  # общий вызов D не ждал хвост пачки
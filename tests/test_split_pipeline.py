@@ -0,0 +1,104 @@
+# tests/test_split_pipeline.py
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from src.benchmarks.synthetic import make_categories
+from src.classifier.prompt_builder import EXTRACT_OUTPUT_FORMAT, PromptBuilder
+from src.classifier.rescoring import rescore_frame, responses_to_frame
+from src.config import ArchiveConfig, config
+from src.data_models import SKU, Category
+from src.io.response_archive import ResponseArchive
+from src.llm_client.base import LLMError
+from src.llm_client.provider_client import ProviderLLMClient
+
+CATEGORIES = [
+    Category(code="A01", direction="ЛС", need="Боль", group="НПВС", inn_cluster="Ибупрофен"),
+    Category(code="A39_02", inn_cluster="Валацикловир", dosage_form="Таблетки", age_segment="Взрослые"),
+    Category(code="A39_03", inn_cluster="Валацикловир", dosage_form="Таблетки", age_segment="Дети"),
+]
+
+
+def _classify(monkeypatch, name, contents, archive=None, external_id=None):
+    """ProviderLLMClient в split-режиме на MockTransport: ответы по очереди из contents."""
+    monkeypatch.setenv(config.llm.api_key_env_var, "test-key")
+    monkeypatch.setattr(config.llm, "pipeline", "split")
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": contents[len(requests) - 1]}}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 10},
+        })
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            client = ProviderLLMClient(categories=CATEGORIES, http_client=http, archive=archive)
+            return await client.classify_sku(SKU(name=name, external_id=external_id))
+
+    return asyncio.run(run()), requests
+
+
+def test_single_code_cluster_resolved_without_tree(monkeypatch):
+    result, requests = _classify(monkeypatch, "НУРОФЕН ТАБЛ. 200МГ", [
+        '{"inn": "ибупрофен", "dosage_form": "таблетки", "age_restriction": null, "otc": "да", "confidence": 0.9}',
+    ])
+    assert len(requests) == 1
+    prompt = requests[0]["messages"][1]["content"]
+    assert EXTRACT_OUTPUT_FORMAT in prompt and "Дерево категорий" not in prompt
+    assert requests[0]["max_tokens"] == config.llm.extract_max_tokens
+    assert result.category_code == "A01" and result.category_path == "ЛС > Боль > НПВС"
+    assert result.otc is True and result.confidence == 0.9
+    assert result.raw_llm_response["_pipeline"] == "split_local"
+
+    # Промпт первого вызова не растёт с деревом: на 500 строках — меньше 10% полного
+    tree = make_categories(500)
+    sku = SKU(name="НУРОФЕН ТАБЛ. 200МГ")
+    assert len(PromptBuilder().build_extract_prompt(sku)) < 0.1 * len(PromptBuilder().build_user_prompt(sku, tree))
+
+
+def test_ambiguous_cluster_asks_with_shortlist(monkeypatch):
+    result, requests = _classify(monkeypatch, "ВАЛТРЕКС ТАБЛ. 500МГ №10", [
+        '{"inn": "Валацикловир", "confidence": 0.9}',
+        '{"inn": "Валацикловир", "category_code": "A39_02", "confidence": 0.8, "reason": "взрослые"}',
+    ])
+    assert len(requests) == 2
+    second = requests[1]["messages"][1]["content"]
+    assert "A39_02" in second and "A39_03" in second and "A01" not in second
+    assert result.category_code == "A39_02"
+    assert result.raw_llm_response["_pipeline"] == "split_shortlist"
+    assert result.llm_usage == {"prompt_tokens": 200, "completion_tokens": 20}
+
+
+def test_unknown_inn_asks_with_full_tree(monkeypatch):
+    result, requests = _classify(monkeypatch, "ПЛАСТЫРЬ БАКТЕРИЦИДНЫЙ", [
+        '{"inn": null, "confidence": 0.3}',
+        '{"inn": null, "category_code": "A01", "confidence": 0.4}',
+    ])
+    assert len(requests) == 2
+    assert "A01" in requests[1]["messages"][1]["content"]
+    assert result.raw_llm_response["_pipeline"] == "split_full"
+
+
+def test_rescore_resolves_archived_extraction_locally(monkeypatch, tmp_path):
+    archive = ResponseArchive(tmp_path, ArchiveConfig(directory=str(tmp_path)))
+    _classify(monkeypatch, "НУРОФЕН ТАБЛ. 200МГ", ['{"inn": "ибупрофен", "confidence": 0.9}'], archive, "1")
+    _classify(monkeypatch, "ВАЛТРЕКС ТАБЛ. 500МГ №10", [
+        '{"inn": "Валацикловир", "confidence": 0.9}',
+        '{"inn": "Валацикловир", "category_code": "A39_02", "confidence": 0.8, "reason": "взрослые"}',
+    ], archive, "2")
+    # Второй вызов не удался: в архиве только извлечение, код по нему не выбрать
+    with pytest.raises(LLMError):
+        _classify(monkeypatch, "ВАЛАЦИКЛОВИР", ['{"inn": "Валацикловир", "confidence": 0.9}'] + ["{broken"] * 3, archive, "3")
+    archive.close()
+
+    df = responses_to_frame(ResponseArchive(tmp_path).iter_records())
+    assert df.set_index("product_link_id")["kind"].to_dict() == {1: "extract", 2: "classify", 3: "extract"}
+    rescored = rescore_frame(df, CATEGORIES).set_index("id")
+    assert sorted(rescored.index) == [1, 2]  # строку 3 не затираем
+    assert rescored.loc[1, "category_code"] == "A01" and not rescored.loc[1, "needs_review"]
+    assert rescored.loc[1, "category_path"] == "ЛС > Боль > НПВС"
+    assert rescored.loc[2, "category_code"] == "A39_02"
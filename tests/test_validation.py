@@ -0,0 +1,143 @@
+# tests/test_validation.py
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from src.classifier.validation import ResponseValidator, coerce_fields, parse_llm_json
+from src.config import config
+from src.data_models import SKU, Category
+from src.llm_client.provider_client import ProviderLLMClient
+
+CATEGORIES = [
+    Category(code="LS_ORVI_MNN_A39_01", inn_cluster="Парацетамол"),
+    Category(code="LS_ORVI_MNN_A39_02", inn_cluster="Ибупрофен/Ibuprofen"),
+    Category(code="LS_ORVI_MNN_A39_03", inn_cluster="Ибупрофен/Ibuprofen"),
+    Category(code="LS_GIT_MNN_B01_01", inn_cluster="Омепразол"),
+]
+
+
+@pytest.fixture(autouse=True)
+def set_dummy_env(monkeypatch):
+    monkeypatch.setenv(config.llm.api_key_env_var, "test-key")
+
+
+@pytest.mark.parametrize(
+    "content, fixes",
+    [
+        ('{"a": 1}', []),
+        ('```json\n{"a": 1,}\n```', ["json:code_fence", "json:punctuation"]),
+        ('Ответ: {"a": 1, "otc": True, "x": None} готово', ["json:surrounding_text", "json:python_literals"]),
+        ('{"a": 1, "reason": "обрез', ["json:truncated"]),
+        ('[{"a": 1}]', ["json:single_item_list"]),
+    ],
+)
+def test_parse_llm_json_repairs(content, fixes):
+    data, applied = parse_llm_json(content)
+    assert data["a"] == 1
+    assert applied == fixes
+
+
+def test_parse_llm_json_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_llm_json("не знаю")
+
+
+def test_coerce_fields():
+    data, fixes = coerce_fields(
+        {"result": {"confidence": "85%", "otc": "Rx", "inn": "null", "needs_review": "да", "reason": None}}
+    )
+    assert data == {"confidence": 0.85, "otc": False, "inn": None, "needs_review_hint": True, "reason": ""}
+    assert "unwrapped:result" in fixes
+    assert coerce_fields({"confidence": "0,7"})[0]["confidence"] == 0.7
+
+
+def test_validator_snaps_codes_and_inn():
+    validator = ResponseValidator(CATEGORIES)
+
+    report = validator.validate({"inn": "Ибупрофен", "category_code": "ls-orvi-mnn-a39-02"})
+    assert report.data["category_code"] == "LS_ORVI_MNN_A39_02"
+    assert not report.problems and "needs_review_hint" not in report.data
+
+    # Хвост кода однозначен
+    report = validator.validate({"inn": "Омепразол", "category_code": "B01_01"})
+    assert report.data["category_code"] == "LS_GIT_MNN_B01_01"
+
+    # Код выдуман, но кластер МНН из одного кода: берём его, но на ревью
+    report = validator.validate({"inn": "Омепразол", "category_code": "LS_GIT_XXX"})
+    assert report.data["category_code"] == "LS_GIT_MNN_B01_01"
+    assert report.data["needs_review_hint"] is True
+
+    # Опечатка в МНН
+    report = validator.validate({"inn": "Ибупрофн", "category_code": "LS_ORVI_MNN_A39_03"})
+    assert report.data["inn"] == "ибупрофен" and not report.problems
+
+
+def test_validator_reports_unfixable_problems():
+    validator = ResponseValidator(CATEGORIES)
+
+    report = validator.validate({"inn": "Омепразол", "category_code": "LS_ORVI_MNN_A39_01"})
+    assert report.needs_followup
+    assert report.candidates == ["LS_GIT_MNN_B01_01"]
+
+    report = validator.validate({"inn": "Ибупрофен", "category_code": "QQQ"})
+    assert report.needs_followup
+    assert report.candidates == ["LS_ORVI_MNN_A39_02", "LS_ORVI_MNN_A39_03"]
+
+    assert validator.validate_content("мусор").problems[0].startswith("invalid_json")
+
+
+def _mock_client(contents):
+    """ProviderLLMClient на MockTransport: ответы по очереди из contents."""
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        content = contents[len(requests) - 1]
+        return httpx.Response(
+            200,
+            json={
+                "choices": [{"message": {"content": content}}],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 10},
+            },
+        )
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return ProviderLLMClient(categories=CATEGORIES, http_client=http_client), requests
+
+
+def test_provider_repairs_locally_without_followup():
+    client, requests = _mock_client(['```json\n{"inn": "Ибупрофен", "category_code": "a39_02", "confidence": "90%",}\n```'])
+
+    result = asyncio.run(client.classify_sku(SKU(name="Ибупрофен 200мг")))
+    assert len(requests) == 1
+    assert result.category_code == "LS_ORVI_MNN_A39_02"
+    assert result.confidence == 0.9
+    assert "json:code_fence" in result.raw_llm_response["_validation"]["fixes"]
+
+
+def test_provider_asks_followup_with_candidates():
+    client, requests = _mock_client([
+        '{"inn": "Омепразол", "category_code": "LS_ORVI_MNN_A39_01", "confidence": 0.9}',
+        '{"inn": "Омепразол", "category_code": "LS_GIT_MNN_B01_01", "confidence": 0.9}',
+    ])
+
+    result = asyncio.run(client.classify_sku(SKU(name="Омез 20мг")))
+    assert len(requests) == 2
+    followup = requests[1]["messages"]
+    assert followup[-2]["role"] == "assistant"
+    assert "LS_GIT_MNN_B01_01" in followup[-1]["content"]
+    assert result.category_code == "LS_GIT_MNN_B01_01"
+    assert result.needs_review is False
+    assert result.llm_usage == {"prompt_tokens": 200, "completion_tokens": 20}
+
+
+def test_provider_marks_review_when_followup_fails():
+    bad = '{"inn": "Ибупрофен", "category_code": "QQQ", "confidence": 0.9}'
+    client, requests = _mock_client([bad, bad])
+
+    result = asyncio.run(client.classify_sku(SKU(name="Ибупрофен 200мг")))
+    assert len(requests) == 2
+    assert result.category_code == "QQQ"
+    assert result.needs_review is True
@@ -0,0 +1,69 @@
+import pytest
+from openpyxl import Workbook
+from sqlalchemy import inspect, text
+
+from src.io.db_io import get_all_categories, load_categories_from_xlsx
+from src.io.xlsx_stream import iter_xlsx_rows
+from src.scripts.evaluate_on_testset import load_testset
+
+HEADER = ["Код категории", "Направление", "МНН‑кластер", "Лишняя колонка"]
+
+
+def _write_xlsx(path, rows, header=HEADER):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+    return str(path)
+
+
+def test_iter_xlsx_rows_normalizes_headers_and_cells(tmp_path):
+    path = _write_xlsx(tmp_path / "c.xlsx", [["A01", "Боль", "Ибупрофен", "x"], [None, None, None, None], [15.0, " ", "nan", None]])
+    rows = list(iter_xlsx_rows(path, column_mapping={"Код категории": "code", "МНН-кластер": "inn_cluster"}))
+    assert rows == [{"code": "A01", "inn_cluster": "Ибупрофен"}, {"code": "15", "inn_cluster": None}]
+
+    with pytest.raises(ValueError, match="Missing columns"):
+        list(iter_xlsx_rows(path, required=["Нет такой"]))
+
+
+def test_load_categories_swaps_table_atomically(tmp_path, db_engine, session_factory):
+    first = _write_xlsx(tmp_path / "v1.xlsx", [[f"C{i:03d}", "Боль", "Ибупрофен", None] for i in range(7)])
+    assert load_categories_from_xlsx(first, engine_=db_engine, chunk_size=3) == 7
+
+    # Схема ORM сохранена: code — первичный ключ
+    assert inspect(db_engine).get_pk_constraint("categories")["constrained_columns"] == ["code"]
+
+    broken = _write_xlsx(tmp_path / "v2.xlsx", [["X1", None, None, None], ["X1", None, None, None]])
+    with pytest.raises(ValueError, match="Duplicate category code"):
+        load_categories_from_xlsx(broken, engine_=db_engine)
+
+    # Старое дерево осталось целым, staging убран
+    with session_factory() as session:
+        categories = get_all_categories(session)
+        assert len(categories) == 7
+        assert categories[0].inn_cluster == "Ибупрофен"
+        assert not inspect(db_engine).has_table("categories__staging")
+
+    second = _write_xlsx(tmp_path / "v3.xlsx", [["N1", "Кожа", None, None]])
+    assert load_categories_from_xlsx(second, engine_=db_engine) == 1
+    with db_engine.connect() as conn:
+        assert conn.execute(text("SELECT code FROM categories")).scalars().all() == ["N1"]
+
+
+def test_load_testset_streams_and_validates(tmp_path):
+    header = ["Название", "Производитель", "Название АСНА", "МНН", "Код категории"]
+    path = _write_xlsx(
+        tmp_path / "t.xlsx",
+        [["НУРОФЕН", None, "Нурофен", "ибупрофен", "A01"], [None, "x", None, None, None]],
+        header=header,
+    )
+    df = load_testset(path)
+    assert df.to_dict(orient="records") == [
+        {"Название": "НУРОФЕН", "Производитель": "", "Название АСНА": "Нурофен", "МНН": "ибупрофен", "Код категории": "A01"}
+    ]
+
+    bad = _write_xlsx(tmp_path / "bad.xlsx", [["x"]], header=["Название"])
+    with pytest.raises(ValueError, match="Missing columns"):
+        load_testset(bad)